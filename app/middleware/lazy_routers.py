@@ -0,0 +1,163 @@
+"""
+Optional Router Groups
+======================
+Router groups that a deployment can switch on or off with
+``OPTIONAL_ROUTERS`` (comma separated group names):
+
+- ``migration``: AMY -> FHIR migration endpoints (``/fhir/R5/migration/...``)
+- ``visualization``: chart endpoints (``/visualization``)
+- ``reports``: report templates and jobs (``/admin/reports``), plus the
+  report scheduler
+- ``fhir_validation``: FHIR validation and data quality (``/fhir/validation``)
+
+Disabled groups are never imported. With ``LAZY_ROUTERS`` on (default) an
+enabled group is imported in a worker thread and mounted on the first
+request under one of its prefixes, or on the first OpenAPI schema request,
+so their modules stay off the startup path; with it off they are mounted
+when ``main.py`` is imported, as before. A group that fails to import is
+logged and left unmounted (its paths answer 404).
+"""
+
+import asyncio
+import importlib
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
+
+from config import settings, logger
+
+OPENAPI_PATHS = ("/openapi.json", "/api/openapi.json")
+
+@dataclass(frozen=True)
+class RouterGroup:
+    """Routers of one optional group and the URL prefixes they serve"""
+    routers: Tuple[Tuple[str, str], ...]  # (module, tag)
+    prefixes: Tuple[str, ...]
+
+OPTIONAL_ROUTER_GROUPS: Dict[str, RouterGroup] = {
+    "migration": RouterGroup(
+        routers=(("app.routes.fhir_migration", "fhir-r5"),),
+        prefixes=("/fhir/R5/migration/",)
+    ),
+    "visualization": RouterGroup(
+        routers=(("app.routes.visualization", "visualization"),),
+        prefixes=("/visualization/",)
+    ),
+    "reports": RouterGroup(
+        routers=(("app.routes.reports", "reports"),),
+        prefixes=("/admin/reports/",)
+    ),
+    "fhir_validation": RouterGroup(
+        routers=(("app.routes.fhir_validation", "fhir-validation"),),
+        prefixes=("/fhir/validation/",)
+    )
+}
+
+def enabled_router_groups() -> List[str]:
+    """Groups listed in ``OPTIONAL_ROUTERS`` (unknown names are ignored)"""
+    groups = [name.strip() for name in settings.optional_routers.split(",") if name.strip()]
+    unknown = [name for name in groups if name not in OPTIONAL_ROUTER_GROUPS]
+    if unknown:
+        logger.warning(f"⚠️ Unknown optional router groups ignored: {', '.join(unknown)}")
+    return [name for name in groups if name in OPTIONAL_ROUTER_GROUPS]
+
+class OptionalRouters:
+    """Imports and mounts the enabled optional router groups"""
+
+    def __init__(self):
+        self.enabled = enabled_router_groups()
+        self.mounted: Dict[str, float] = {}  # group -> import time (ms)
+        self.failed: Dict[str, str] = {}  # group -> import error
+        self._lock = asyncio.Lock()
+
+    def is_enabled(self, group: str) -> bool:
+        return group in self.enabled
+
+    @property
+    def pending(self) -> List[str]:
+        return [group for group in self.enabled if group not in self.mounted and group not in self.failed]
+
+    def group_for_path(self, path: str):
+        for group in self.pending:
+            if any((path + "/").startswith(prefix) for prefix in OPTIONAL_ROUTER_GROUPS[group].prefixes):
+                return group
+        return None
+
+    def _import(self, group: str):
+        started = time.perf_counter()
+        modules = [importlib.import_module(module) for module, _ in OPTIONAL_ROUTER_GROUPS[group].routers]
+        return modules, (time.perf_counter() - started) * 1000
+
+    def _include(self, app, group: str, modules, import_ms: float):
+        for module, (_, tag) in zip(modules, OPTIONAL_ROUTER_GROUPS[group].routers):
+            app.include_router(module.router, tags=[tag])
+        app.openapi_schema = None
+        self.mounted[group] = round(import_ms, 1)
+        logger.info(f"✅ Mounted optional router group '{group}' (import {import_ms:.0f} ms)")
+
+    def _failed(self, group: str, error: Exception):
+        self.failed[group] = str(error)
+        logger.error(f"❌ Failed to mount optional router group '{group}': {error}")
+        logger.error(traceback.format_exc())
+
+    def mount_all(self, app):
+        """Import and mount every enabled group now (``LAZY_ROUTERS`` off)"""
+        for group in self.pending:
+            try:
+                modules, import_ms = self._import(group)
+                self._include(app, group, modules, import_ms)
+            except Exception as e:
+                self._failed(group, e)
+
+    async def mount(self, app, group: str):
+        """Import ``group`` off the event loop and mount it once"""
+        async with self._lock:
+            if group not in self.pending:
+                return
+            try:
+                modules, import_ms = await asyncio.to_thread(self._import, group)
+                self._include(app, group, modules, import_ms)
+            except Exception as e:
+                self._failed(group, e)
+
+    async def mount_for_path(self, app, path: str):
+        if path in OPENAPI_PATHS:
+            for group in self.pending:
+                await self.mount(app, group)
+            return
+        group = self.group_for_path(path)
+        if group:
+            await self.mount(app, group)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "lazy": settings.lazy_routers,
+            "groups": {
+                group: {
+                    "enabled": group in self.enabled,
+                    "mounted": group in self.mounted,
+                    "import_ms": self.mounted.get(group),
+                    "error": self.failed.get(group)
+                }
+                for group in OPTIONAL_ROUTER_GROUPS
+            }
+        }
+
+class LazyRouterMiddleware:
+    """
+    ASGI middleware that mounts an optional router group before the first
+    request reaching it is routed
+    """
+
+    def __init__(self, app, routers: "OptionalRouters" = None):
+        self.app = app
+        self.routers = routers or optional_routers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self.routers.pending:
+            await self.routers.mount_for_path(scope["app"], scope["path"])
+        await self.app(scope, receive, send)
+
+# Global optional routers instance
+optional_routers = OptionalRouters()
@@ -472,12 +472,19 @@ class FHIRResourceDocument(BaseModel):
     organization_id: Optional[str] = Field(None, description="Organization reference for indexing")
     device_id: Optional[str] = Field(None, description="Device reference for indexing")
     encounter_id: Optional[str] = Field(None, description="Encounter reference for indexing")
+    subject_reference: Optional[str] = Field(None, description="Full subject reference (e.g. Patient/123)")
+    
+    # Token search indexing ("system|code", "system|" and bare "code" entries)
+    code_tokens: Optional[List[str]] = Field(None, description="Search tokens for the resource code")
+    category_tokens: Optional[List[str]] = Field(None, description="Search tokens for the resource category")
     
     # Temporal indexing
     effective_datetime: Optional[datetime] = Field(None, description="Clinical effective time")
     recorded_datetime: Optional[datetime] = Field(None, description="When recorded in system")
+    last_updated: Optional[datetime] = Field(None, description="meta.lastUpdated for _lastUpdated search")
     
     # Source tracking
+    meta_source: Optional[str] = Field(None, description="meta.source for _source search")
     source_system: Optional[str] = Field(None, description="Source system (AVA4, manual, import)")
     source_message_id: Optional[str] = Field(None, description="Original MQTT message ID")
     device_mac_address: Optional[str] = Field(None, description="Source device MAC address")
@@ -514,6 +521,8 @@ class FHIRSearchParams(BaseModel):
     security: Optional[str] = Field(None, alias="_security", description="Security label")
     source: Optional[str] = Field(None, alias="_source", description="Source system")
     tag: Optional[str] = Field(None, alias="_tag", description="Resource tag")
+    elements: Optional[str] = Field(None, alias="_elements", description="Comma-separated elements to return")
+    summary: Optional[str] = Field(None, alias="_summary", description="Summary mode: true | text | data | count | false")
     
     # Common search parameters
     identifier: Optional[str] = Field(None, description="Resource identifier")
@@ -523,10 +532,18 @@ class FHIRSearchParams(BaseModel):
     date: Optional[str] = Field(None, description="Date range")
     status: Optional[str] = Field(None, description="Resource status")
     
+    # Token search parameters ([system]|[code], comma-separated values are OR'ed)
+    code: Optional[str] = Field(None, description="Code token")
+    category: Optional[str] = Field(None, description="Category token")
+    device: Optional[str] = Field(None, description="Device reference")
+    
     # Pagination
     count: Optional[int] = Field(10, alias="_count", description="Number of results", ge=1, le=1000)
     offset: Optional[int] = Field(0, alias="_offset", description="Search offset", ge=0)
     sort: Optional[str] = Field(None, alias="_sort", description="Sort parameters")
+    
+    class Config:
+        populate_by_name = True
 
 class FHIRSearchResponse(BaseModel):
     """FHIR search response bundle"""
@@ -10,7 +10,13 @@ from loguru import logger
 from app.services.mongo import mongodb_service
 from app.services.auth import require_auth
 from app.services.audit_logger import audit_logger
-from app.utils.json_encoder import serialize_mongodb_response, MongoJSONEncoder, serialize_field_analysis, create_mongodb_compatible_response
+from app.services.patient_search import (
+    build_search_filter, build_search_tokens, tokens_for_update,
+    PATIENT_LIST_PROJECTION, SEARCH_TOKENS_FIELD
+)
+from app.services.reference_data import reference_data_store, sort_key, thai_name
+from app.services.vital_timeseries import vital_history_store
+from app.utils.json_encoder import serialize_mongodb_response, MongoJSONEncoder, serialize_field_analysis, create_mongodb_compatible_response, MongoJSONResponse
 from app.utils.error_definitions import create_error_response, create_success_response, SuccessResponse
 from app.models.hospital_user import (
     HospitalUserCreate, HospitalUserUpdate, HospitalUserResponse, 
@@ -28,7 +34,7 @@ from app.models.medical_history import (
 from config import settings
 import time
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], default_response_class=MongoJSONResponse)
 
 # Pydantic models for admin operations
 class PatientCreate(BaseModel):
@@ -210,6 +216,7 @@ async def get_patients(
     page: Optional[int] = Query(None, ge=1, description="Page number (alternative to skip)"),
     search: Optional[str] = None,
     hospital_id: Optional[str] = None,
+    full: bool = Query(False, description="Return full patient documents instead of the list fields"),
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
     """Get patients with filtering and pagination"""
@@ -223,12 +230,21 @@ async def get_patients(
         filter_query = {"is_deleted": {"$ne": True}}
         
         if search:
-            filter_query["$or"] = [
-                {"first_name": {"$regex": search, "$options": "i"}},
-                {"last_name": {"$regex": search, "$options": "i"}},
-                {"id_card": {"$regex": search, "$options": "i"}},
-                {"phone": {"$regex": search, "$options": "i"}}
-            ]
+            try:
+                filter_query.update(build_search_filter(
+                    search, legacy_fields=["first_name", "last_name", "id_card", "phone"]
+                ))
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=create_error_response(
+                        "VALIDATION_INVALID_FORMAT",
+                        field="search",
+                        value=search,
+                        custom_message=str(e),
+                        request_id=request_id
+                    ).dict()
+                )
         
         if hospital_id:
             filter_query["new_hospital_ids"] = ObjectId(hospital_id)
@@ -241,7 +257,8 @@ async def get_patients(
             skip = (page - 1) * limit
 
         # Get patients with consistent ordering for pagination
-        cursor = collection.find(filter_query).sort("_id", 1).skip(skip).limit(limit)
+        projection = {SEARCH_TOKENS_FIELD: 0} if full else PATIENT_LIST_PROJECTION
+        cursor = collection.find(filter_query, projection).sort("_id", 1).skip(skip).limit(limit)
         patients = await cursor.to_list(length=limit)
         
         # Serialize ObjectIds to strings
@@ -259,6 +276,8 @@ async def get_patients(
         )
         return success_response
         
+    except HTTPException:
+        raise
     except Exception as e:
         request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
         raise HTTPException(
@@ -281,6 +300,7 @@ async def search_patients_post(
         skip = search_request.get("skip", 0)
         search = search_request.get("search")
         hospital_id = search_request.get("hospital_id")
+        full = bool(search_request.get("full", False))
         
         # Validate limit
         if limit > 1000:
@@ -296,13 +316,12 @@ async def search_patients_post(
         filter_query = {"is_deleted": {"$ne": True}}
         
         if search:
-            filter_query["$or"] = [
-                {"first_name": {"$regex": search, "$options": "i"}},
-                {"last_name": {"$regex": search, "$options": "i"}},
-                {"id_card": {"$regex": search, "$options": "i"}},
-                {"phone": {"$regex": search, "$options": "i"}},
-                {"mobile_no": {"$regex": search, "$options": "i"}}
-            ]
+            try:
+                filter_query.update(build_search_filter(
+                    search, legacy_fields=["first_name", "last_name", "id_card", "phone", "mobile_no"]
+                ))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
         if hospital_id:
             filter_query["new_hospital_ids"] = ObjectId(hospital_id)
@@ -311,7 +330,8 @@ async def search_patients_post(
         total = await collection.count_documents(filter_query)
         
         # Get patients with consistent ordering for pagination
-        cursor = collection.find(filter_query).sort("_id", 1).skip(skip).limit(limit)
+        projection = {SEARCH_TOKENS_FIELD: 0} if full else PATIENT_LIST_PROJECTION
+        cursor = collection.find(filter_query, projection).sort("_id", 1).skip(skip).limit(limit)
         patients = await cursor.to_list(length=limit)
         
         # Serialize ObjectIds to strings
@@ -327,6 +347,8 @@ async def search_patients_post(
         
         return JSONResponse(content=response_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -338,7 +360,7 @@ async def get_patient(
     """Get specific patient"""
     try:
         collection = mongodb_service.get_collection("patients")
-        patient = await collection.find_one({"_id": ObjectId(patient_id)})
+        patient = await collection.find_one({"_id": ObjectId(patient_id)}, {SEARCH_TOKENS_FIELD: 0})
         
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
@@ -682,6 +704,7 @@ async def create_patient(
         patient_data["updated_at"] = datetime.utcnow()
         patient_data["is_active"] = True
         patient_data["is_deleted"] = False
+        patient_data[SEARCH_TOKENS_FIELD] = build_search_tokens(patient_data)
         
         result = await collection.insert_one(patient_data)
         
@@ -715,6 +738,9 @@ async def update_patient(
         if "new_hospital_ids" in update_data and update_data["new_hospital_ids"]:
             update_data["new_hospital_ids"] = [ObjectId(hid) for hid in update_data["new_hospital_ids"]]
         
+        search_tokens = await tokens_for_update(ObjectId(patient_id), update_data)
+        if search_tokens is not None:
+            update_data[SEARCH_TOKENS_FIELD] = search_tokens
         update_data["updated_at"] = datetime.utcnow()
         
         result = await collection.update_one(
@@ -1081,7 +1107,7 @@ async def get_medical_history(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Build filter
         filter_query = {}
@@ -1248,7 +1274,7 @@ async def get_medical_history_record(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         record = await collection.find_one({"_id": ObjectId(record_id)})
         
@@ -1285,6 +1311,74 @@ async def get_medical_history_record(
             ).dict()
         )
 
+def _reference_indices(table, data_type: str, is_active: Optional[bool], province_code: Optional[int],
+                       district_code: Optional[int], search: Optional[str]) -> List[int]:
+    """Indices of a reference table matching the master-data list filters"""
+    if data_type == "sub_districts" and province_code and district_code:
+        candidates = table.children((province_code, district_code))
+    elif data_type in ["districts", "sub_districts"] and province_code:
+        candidates = table.children(province_code)
+    else:
+        candidates = range(len(table))
+    
+    indices = []
+    for index in candidates:
+        doc = table.documents[index]
+        if data_type == "hospital_types":
+            if doc.get("active") is not True:
+                continue
+        else:
+            if doc.get("is_deleted") is True:
+                continue
+            if is_active is not None and doc.get("is_active") != is_active:
+                continue
+            if data_type == "sub_districts" and district_code and doc.get("district_code") != district_code:
+                continue
+        indices.append(index)
+    
+    if search:
+        indices = table.search(search, indices)
+    return indices
+
+async def _get_master_data_from_store(request: Request, data_type: str, limit: int, skip: int, search: Optional[str],
+                                      province_code: Optional[int], district_code: Optional[int],
+                                      sub_district_code: Optional[int], is_active: Optional[bool], request_id: str):
+    """Serve a master-data list from the in-memory reference store"""
+    table = await reference_data_store.get_table(data_type)
+    
+    def build():
+        indices = _reference_indices(table, data_type, is_active, province_code, district_code, search)
+        total = len(indices)
+        data = [table.records[index] for index in indices[skip:skip + limit]]
+        return {
+            "data": data,
+            "total": total,
+            "data_type": data_type,
+            "limit": limit,
+            "skip": skip,
+            "pagination": {
+                "current_page": (skip // limit) + 1,
+                "total_pages": (total + limit - 1) // limit,
+                "has_next": (skip + limit) < total,
+                "has_prev": skip > 0,
+                "total_records": total,
+                "records_on_page": len(data)
+            },
+            "filters": {
+                "search": search,
+                "province_code": province_code,
+                "district_code": district_code,
+                "sub_district_code": sub_district_code,
+                "is_active": is_active
+            },
+            "fields_info": get_master_data_fields_info(data_type),
+            "relationships": get_master_data_relationships(data_type)
+        }
+    
+    cache_key = ("master_data", limit, skip, search, province_code, district_code, sub_district_code, is_active)
+    body, etag = table.cached_data(cache_key, build)
+    return reference_data_store.respond(request, "Master data retrieved successfully", body, etag, request_id)
+
 # Master Data Management
 @router.get("/master-data/{data_type}", 
             response_model=SuccessResponse,
@@ -1335,6 +1429,13 @@ async def get_master_data(
         if not collection_name:
             raise HTTPException(status_code=400, detail=f"Invalid data type: {data_type}. Supported types: {', '.join(collection_mapping.keys())}")
         
+        # Reference lists (everything but hospitals) are served from memory
+        if reference_data_store.supports(normalized_data_type):
+            return await _get_master_data_from_store(
+                request, normalized_data_type, limit, skip, search,
+                province_code, district_code, sub_district_code, is_active, request_id
+            )
+        
         collection = mongodb_service.get_collection(collection_name)
         
         # Build filter based on data type structure
@@ -3147,7 +3248,7 @@ async def get_medical_history_management(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         patients_collection = mongodb_service.get_collection("patients")
         
         # Build filter query
@@ -3425,7 +3526,7 @@ async def create_medical_history_record(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Prepare record data
         new_record = {
@@ -3526,7 +3627,7 @@ async def update_medical_history_record(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Check if record exists
         existing_record = await collection.find_one({"_id": object_id})
@@ -3643,7 +3744,7 @@ async def delete_medical_history_record(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Check if record exists
         existing_record = await collection.find_one({"_id": object_id})
@@ -3729,7 +3830,7 @@ async def search_medical_history_records(
                 ).dict()
             )
         
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Build advanced filter query
         filter_query: Dict[str, Any] = {}
@@ -3895,7 +3996,7 @@ async def get_medical_history_stats(
         
         for collection_name, display_name in collections_info.items():
             try:
-                collection = mongodb_service.get_collection(collection_name)
+                collection = vital_history_store.get_analytics_collection(collection_name)
                 count = await collection.count_documents({})
                 
                 # Get date range
@@ -3941,7 +4042,7 @@ async def get_medical_history_stats(
             # Sample top patients with medical data
             for collection_name in collections_info.keys():
                 if any(r["collection_name"] == collection_name and r.get("count", 0) > 0 for r in records_by_type):
-                    collection = mongodb_service.get_collection(collection_name)
+                    collection = vital_history_store.get_analytics_collection(collection_name)
                     patient_counts = await collection.aggregate([
                         {"$group": {"_id": "$patient_id", "count": {"$sum": 1}}},
                         {"$sort": {"count": -1}},
@@ -3982,7 +4083,7 @@ async def get_medical_history_stats(
             device_stats = {}
             for collection_name in collections_info.keys():
                 if any(r["collection_name"] == collection_name and r.get("count", 0) > 0 for r in records_by_type):
-                    collection = mongodb_service.get_collection(collection_name)
+                    collection = vital_history_store.get_analytics_collection(collection_name)
                     device_counts = await collection.aggregate([
                         {"$match": {"device_type": {"$ne": None, "$ne": ""}}},
                         {"$group": {"_id": "$device_type", "count": {"$sum": 1}}},
@@ -4196,6 +4297,8 @@ async def create_master_data(
             request_id=request_id
         )
         
+        await reference_data_store.invalidate(normalized_data_type)
+        
         success_response = create_success_response(
             message="Master data record created successfully",
             data=serialize_mongodb_response(document),
@@ -4365,6 +4468,8 @@ async def update_master_data(
             request_id=request_id
         )
         
+        await reference_data_store.invalidate(normalized_data_type)
+        
         success_response = create_success_response(
             message="Master data record updated successfully",
             data=serialize_mongodb_response(updated_record),
@@ -4529,6 +4634,8 @@ async def patch_master_data(
             request_id=request_id
         )
         
+        await reference_data_store.invalidate(normalized_data_type)
+        
         success_response = create_success_response(
             message="Master data record partially updated successfully",
             data=serialize_mongodb_response(updated_record),
@@ -4678,6 +4785,8 @@ async def delete_master_data(
             request_id=request_id
         )
         
+        await reference_data_store.invalidate(normalized_data_type)
+        
         success_response = create_success_response(
             message="Master data record deleted successfully",
             data=serialize_mongodb_response(deleted_record),
@@ -5015,6 +5124,81 @@ async def get_raw_hospital_documents(
             ).dict()
         )
 
+def _dropdown_status_ok(doc: Dict[str, Any], include_inactive: bool, include_deleted: bool) -> bool:
+    return (include_inactive or doc.get("is_active") is True) and (include_deleted or doc.get("is_deleted") is False)
+
+def _dropdown_items(table, candidates, include_inactive: bool, include_deleted: bool, search: Optional[str],
+                    sort_field: str, limit: Optional[int], with_active: bool = True) -> List[Dict[str, Any]]:
+    """Filter, sort and format reference table rows for a dropdown"""
+    indices = [
+        index for index in candidates
+        if _dropdown_status_ok(table.documents[index], include_inactive, include_deleted)
+    ]
+    if search:
+        indices = table.search(search, indices)
+    indices.sort(key=lambda index: sort_key(table.documents[index].get(sort_field)))
+    if limit:
+        indices = indices[:limit]
+    
+    items = []
+    for index in indices:
+        row = table.dropdown[index]
+        item = {"code": row["code"], "en_name": row["en_name"], "th_name": row["th_name"]}
+        if with_active:
+            item["is_active"] = row["is_active"]
+        items.append(item)
+    return items
+
+def _dropdown_status_filter(query: Dict[str, Any], include_inactive: bool, include_deleted: bool) -> Dict[str, Any]:
+    query = dict(query)
+    if not include_inactive:
+        query["is_active"] = True
+    if not include_deleted:
+        query["is_deleted"] = False
+    return query
+
+async def _dropdown_record_exists(data_type: str, query: Dict[str, Any], include_inactive: bool,
+                                  include_deleted: bool) -> bool:
+    """Whether a reference record matching ``query`` passes the dropdown status filters"""
+    if not reference_data_store.supports(data_type):
+        collection = mongodb_service.get_collection(data_type)
+        return await collection.find_one(_dropdown_status_filter(query, include_inactive, include_deleted)) is not None
+    
+    table = await reference_data_store.get_table(data_type)
+    candidates = table.children(query["province_code"]) if "province_code" in query else range(len(table))
+    return any(
+        all(table.documents[index].get(key) == value for key, value in query.items())
+        and _dropdown_status_ok(table.documents[index], include_inactive, include_deleted)
+        for index in candidates
+    )
+
+async def _dropdown_items_from_db(collection_name: str, query: Dict[str, Any], include_inactive: bool,
+                                  include_deleted: bool, search: Optional[str], sort_field: str,
+                                  limit: Optional[int], with_active: bool = True) -> List[Dict[str, Any]]:
+    """Query and format dropdown rows from MongoDB (reference data cache disabled)"""
+    filter_query = _dropdown_status_filter(query, include_inactive, include_deleted)
+    if search:
+        filter_query["$or"] = [
+            {"en_name": {"$regex": search, "$options": "i"}},
+            {"name.name": {"$regex": search, "$options": "i"}}
+        ]
+    
+    projection = {"code": 1, "en_name": 1, "name": 1, "_id": 0}
+    if with_active:
+        projection["is_active"] = 1
+    
+    cursor = mongodb_service.get_collection(collection_name).find(filter_query, projection).sort(sort_field, 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    items = []
+    async for doc in cursor:
+        item = {"code": doc["code"], "en_name": doc["en_name"], "th_name": thai_name(doc)}
+        if with_active:
+            item["is_active"] = doc.get("is_active", True)
+        items.append(item)
+    return items
+
 @router.get("/dropdown/provinces", 
             response_model=SuccessResponse,
             summary="Get Provinces for Dropdown",
@@ -5109,59 +5293,11 @@ async def get_provinces_dropdown(
     """Get provinces optimized for dropdown forms with flexible filtering"""
     request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
     try:
-        collection = mongodb_service.get_collection("provinces")
-        
-        # Build dynamic filter based on parameters
-        filter_query = {}
-        
-        # Apply status filters
-        if not include_inactive:
-            filter_query["is_active"] = True
-        if not include_deleted:
-            filter_query["is_deleted"] = False
-            
-        # Apply search filter
-        if search:
-            filter_query["$or"] = [
-                {"en_name": {"$regex": search, "$options": "i"}},
-                {"name.name": {"$regex": search, "$options": "i"}}
-            ]
-        
-        # Select fields to return (include is_active for response)
-        projection = {"code": 1, "en_name": 1, "name": 1, "is_active": 1, "_id": 0}
-        
         # Determine sort field
         sort_field = sort_by if sort_by in ["en_name", "code"] else "en_name"
         
-        # Execute query
-        cursor = collection.find(filter_query, projection).sort(sort_field, 1)
-        
-        # Apply limit if specified
-        if limit:
-            cursor = cursor.limit(limit)
-            
-        provinces_data = await cursor.to_list(length=None)
-        
-        # Format for dropdown (extract Thai name from name array)
-        provinces = []
-        for province in provinces_data:
-            th_name = ""
-            if province.get("name"):
-                for name_obj in province["name"]:
-                    if name_obj.get("code") == "th":
-                        th_name = name_obj.get("name", "")
-                        break
-            
-            provinces.append({
-                "code": province["code"],
-                "en_name": province["en_name"],
-                "th_name": th_name,
-                "is_active": province.get("is_active", True)
-            })
-        
-        return create_success_response(
-            message="Provinces retrieved successfully for dropdown",
-            data={
+        def payload(provinces):
+            return {
                 "provinces": provinces,
                 "total": len(provinces),
                 "filters_applied": {
@@ -5171,8 +5307,28 @@ async def get_provinces_dropdown(
                     "limit": limit,
                     "sort_by": sort_field
                 }
-            },
-            request_id=request_id
+            }
+        
+        if not reference_data_store.supports("provinces"):
+            provinces = await _dropdown_items_from_db(
+                "provinces", {}, include_inactive, include_deleted, search, sort_field, limit
+            )
+            return create_success_response(
+                message="Provinces retrieved successfully for dropdown",
+                data=payload(provinces),
+                request_id=request_id
+            )
+        
+        table = await reference_data_store.get_table("provinces")
+        
+        def build():
+            return payload(_dropdown_items(
+                table, range(len(table)), include_inactive, include_deleted, search, sort_field, limit
+            ))
+        
+        body, etag = table.cached_data(("dropdown", include_inactive, include_deleted, search, limit, sort_field), build)
+        return reference_data_store.respond(
+            request, "Provinces retrieved successfully for dropdown", body, etag, request_id
         )
         
     except Exception as e:
@@ -5285,14 +5441,9 @@ async def get_districts_dropdown(
     request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
     try:
         # Validate province exists (use flexible validation based on include flags)
-        provinces_collection = mongodb_service.get_collection("provinces")
-        province_filter = {"code": province_code}
-        if not include_inactive:
-            province_filter["is_active"] = True
-        if not include_deleted:
-            province_filter["is_deleted"] = False
-            
-        province_exists = await provinces_collection.find_one(province_filter)
+        province_exists = await _dropdown_record_exists(
+            "provinces", {"code": province_code}, include_inactive, include_deleted
+        )
         
         if not province_exists:
             raise HTTPException(
@@ -5306,58 +5457,11 @@ async def get_districts_dropdown(
                 ).dict()
             )
         
-        # Build dynamic filter for districts
-        filter_query = {"province_code": province_code}
-        
-        # Apply status filters
-        if not include_inactive:
-            filter_query["is_active"] = True
-        if not include_deleted:
-            filter_query["is_deleted"] = False
-            
-        # Apply search filter
-        if search:
-            filter_query["$or"] = [
-                {"en_name": {"$regex": search, "$options": "i"}},
-                {"name.name": {"$regex": search, "$options": "i"}}
-            ]
-        
-        # Select fields to return (include is_active for response)
-        projection = {"code": 1, "en_name": 1, "name": 1, "is_active": 1, "_id": 0}
-        
         # Determine sort field
         sort_field = sort_by if sort_by in ["en_name", "code"] else "en_name"
         
-        # Execute query
-        collection = mongodb_service.get_collection("districts")
-        cursor = collection.find(filter_query, projection).sort(sort_field, 1)
-        
-        # Apply limit if specified
-        if limit:
-            cursor = cursor.limit(limit)
-        
-        districts_data = await cursor.to_list(length=None)
-        
-        # Format for dropdown (extract Thai name from name array)
-        districts = []
-        for district in districts_data:
-            th_name = ""
-            if district.get("name"):
-                for name_obj in district["name"]:
-                    if name_obj.get("code") == "th":
-                        th_name = name_obj.get("name", "")
-                        break
-            
-            districts.append({
-                "code": district["code"],
-                "en_name": district["en_name"],
-                "th_name": th_name,
-                "is_active": district.get("is_active", True)
-            })
-        
-        return create_success_response(
-            message="Districts retrieved successfully for dropdown",
-            data={
+        def payload(districts):
+            return {
                 "districts": districts,
                 "total": len(districts),
                 "province_code": province_code,
@@ -5368,8 +5472,30 @@ async def get_districts_dropdown(
                     "limit": limit,
                     "sort_by": sort_field
                 }
-            },
-            request_id=request_id
+            }
+        
+        if not reference_data_store.supports("districts"):
+            districts = await _dropdown_items_from_db(
+                "districts", {"province_code": province_code}, include_inactive, include_deleted,
+                search, sort_field, limit
+            )
+            return create_success_response(
+                message="Districts retrieved successfully for dropdown",
+                data=payload(districts),
+                request_id=request_id
+            )
+        
+        table = await reference_data_store.get_table("districts")
+        
+        def build():
+            return payload(_dropdown_items(
+                table, table.children(province_code), include_inactive, include_deleted, search, sort_field, limit
+            ))
+        
+        cache_key = ("dropdown", province_code, include_inactive, include_deleted, search, limit, sort_field)
+        body, etag = table.cached_data(cache_key, build)
+        return reference_data_store.respond(
+            request, "Districts retrieved successfully for dropdown", body, etag, request_id
         )
         
     except HTTPException:
@@ -5466,10 +5592,7 @@ async def get_sub_districts_dropdown(
     request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
     try:
         # Validate province exists
-        provinces_collection = mongodb_service.get_collection("provinces")
-        province_exists = await provinces_collection.find_one(
-            {"code": province_code, "is_active": True, "is_deleted": False}
-        )
+        province_exists = await _dropdown_record_exists("provinces", {"code": province_code}, False, False)
         
         if not province_exists:
             raise HTTPException(
@@ -5484,14 +5607,8 @@ async def get_sub_districts_dropdown(
             )
         
         # Validate district exists
-        districts_collection = mongodb_service.get_collection("districts")
-        district_exists = await districts_collection.find_one(
-            {
-                "code": district_code,
-                "province_code": province_code,
-                "is_active": True, 
-                "is_deleted": False
-            }
+        district_exists = await _dropdown_record_exists(
+            "districts", {"code": district_code, "province_code": province_code}, False, False
         )
         
         if not district_exists:
@@ -5506,45 +5623,36 @@ async def get_sub_districts_dropdown(
                 ).dict()
             )
         
-        # Get sub-districts for the province and district
-        collection = mongodb_service.get_collection("sub_districts")
-        cursor = collection.find(
-            {
-                "province_code": province_code,
-                "district_code": district_code,
-                "is_active": True, 
-                "is_deleted": False
-            },
-            {"code": 1, "en_name": 1, "name": 1, "_id": 0}
-        ).sort("en_name", 1)
-        
-        sub_districts_data = await cursor.to_list(length=None)
-        
-        # Format for dropdown (extract Thai name from name array)
-        sub_districts = []
-        for sub_district in sub_districts_data:
-            th_name = ""
-            if sub_district.get("name"):
-                for name_obj in sub_district["name"]:
-                    if name_obj.get("code") == "th":
-                        th_name = name_obj.get("name", "")
-                        break
-            
-            sub_districts.append({
-                "code": sub_district["code"],
-                "en_name": sub_district["en_name"],
-                "th_name": th_name
-            })
-        
-        return create_success_response(
-            message="Sub-districts retrieved successfully for dropdown",
-            data={
+        def payload(sub_districts):
+            return {
                 "sub_districts": sub_districts,
                 "total": len(sub_districts),
                 "province_code": province_code,
                 "district_code": district_code
-            },
-            request_id=request_id
+            }
+        
+        if not reference_data_store.supports("sub_districts"):
+            sub_districts = await _dropdown_items_from_db(
+                "sub_districts", {"province_code": province_code, "district_code": district_code},
+                False, False, None, "en_name", None, with_active=False
+            )
+            return create_success_response(
+                message="Sub-districts retrieved successfully for dropdown",
+                data=payload(sub_districts),
+                request_id=request_id
+            )
+        
+        table = await reference_data_store.get_table("sub_districts")
+        
+        def build():
+            return payload(_dropdown_items(
+                table, table.children((province_code, district_code)), False, False, None, "en_name", None,
+                with_active=False
+            ))
+        
+        body, etag = table.cached_data(("dropdown", province_code, district_code), build)
+        return reference_data_store.respond(
+            request, "Sub-districts retrieved successfully for dropdown", body, etag, request_id
         )
         
     except HTTPException:
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Optional, List, Dict, Any
+import os
+import aiofiles
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from bson import ObjectId
 
 from app.services.analytics import healthcare_analytics
+from app.services.analytics_export import (
+    analytics_export_service, ExportFormat, EXPORT_FORMAT_ALIASES, EXPORT_MEDIA_TYPES,
+    SUMMARY_REPORT_TYPES, ROW_REPORT_TYPES
+)
 from app.services.auth import get_current_user
 from app.services.cache_service import cache_service, cache_result
+from app.services.connection_factory import read_workload_dependency
 from app.models.base import SuccessResponse
 from app.utils.structured_logging import get_logger
 
-router = APIRouter(prefix="/admin/analytics", tags=["analytics"])
+router = APIRouter(
+    prefix="/admin/analytics",
+    tags=["analytics"],
+    dependencies=[Depends(read_workload_dependency("analytics"))]
+)
 logger = get_logger(__name__)
 analytics_service = healthcare_analytics
 
@@ -455,30 +467,44 @@ async def generate_summary_report(
 
 @router.post("/export/{format}",
              response_model=SuccessResponse,
+             status_code=202,
              responses={
-                 200: {"description": "Analytics data exported successfully"},
+                 202: {"description": "Analytics export job accepted"},
                  401: {"description": "Unauthorized"},
-                 400: {"description": "Invalid export format"},
+                 400: {"description": "Invalid export format or report type"},
                  500: {"description": "Internal server error"}
              })
 async def export_analytics_data(
     format: str,
-    report_type: str = Query(..., description="Type of report to export"),
+    report_type: str = Query(..., description="Type of report to export: patient, hospital, device, health_risk, system_overview, patients, observations"),
     hospital_id: Optional[str] = Query(None, description="Filter by hospital ID"),
     start_date: Optional[datetime] = Query(None, description="Start date for export"),
     end_date: Optional[datetime] = Query(None, description="End date for export"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Export analytics data in various formats"""
+    """Queue an analytics export.
+    
+    The export runs in a background worker; poll the returned ``status_url`` and fetch the
+    artifact from ``download_url`` once completed. Identical requests within the cache window
+    reuse the existing artifact.
+    """
     try:
         # Validate format
-        valid_formats = ["json", "csv", "excel", "pdf"]
+        valid_formats = [f.value for f in ExportFormat] + list(EXPORT_FORMAT_ALIASES)
         if format not in valid_formats:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid export format. Must be one of: {', '.join(valid_formats)}"
             )
         
+        # Validate report type
+        valid_reports = SUMMARY_REPORT_TYPES + ROW_REPORT_TYPES
+        if report_type not in valid_reports:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid report type. Must be one of: {', '.join(valid_reports)}"
+            )
+        
         # Validate hospital_id if provided
         if hospital_id and not ObjectId.is_valid(hospital_id):
             raise HTTPException(
@@ -486,25 +512,19 @@ async def export_analytics_data(
                 detail=f"Invalid hospital_id format: '{hospital_id}'. Must be a valid ObjectId."
             )
         
-        # For now, we'll return the data structure that would be exported
-        # In a real implementation, this would generate actual files
-        export_info = {
-            "format": format,
-            "report_type": report_type,
-            "export_date": datetime.utcnow().isoformat(),
-            "filters": {
-                "hospital_id": hospital_id,
-                "start_date": start_date.isoformat() if start_date else None,
-                "end_date": end_date.isoformat() if end_date else None
-            },
-            "status": "ready_for_download",
-            "download_url": f"/analytics/download/{format}/{report_type}"  # Placeholder
-        }
+        job = await analytics_export_service.submit_export(
+            export_format=analytics_export_service.parse_format(format),
+            report_type=report_type,
+            hospital_id=hospital_id,
+            start_date=start_date,
+            end_date=end_date,
+            requested_by=current_user.get("username") or current_user.get("user_id")
+        )
         
         return SuccessResponse(
             success=True,
-            message=f"Analytics data prepared for export in {format} format",
-            data=export_info
+            message=f"Analytics export in {job['format']} format {'reused from cache' if job['cached'] else 'queued'}",
+            data=_export_job_info(job)
         )
     except HTTPException:
         raise
@@ -513,4 +533,145 @@ async def export_analytics_data(
         raise HTTPException(
             status_code=500,
             detail="Failed to export analytics data"
-        ) 
\ No newline at end of file
+        )
+
+def _export_job_info(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of an analytics export job"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "cached": job.get("cached", False),
+        "format": job["format"],
+        "report_type": job["report_type"],
+        "filters": job["filters"],
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "completed_at": job["completed_at"].isoformat() if job.get("completed_at") else None,
+        "row_count": job.get("row_count"),
+        "size_bytes": job.get("size_bytes"),
+        "content_hash": job.get("content_hash"),
+        "error_message": job.get("error_message"),
+        "status_url": f"/admin/analytics/export/jobs/{job['id']}",
+        "download_url": f"/admin/analytics/export/jobs/{job['id']}/download" if job["status"] == "completed" else None
+    }
+
+@router.get("/export/jobs/{job_id}",
+            response_model=SuccessResponse,
+            responses={
+                200: {"description": "Export job status retrieved successfully"},
+                401: {"description": "Unauthorized"},
+                404: {"description": "Export job not found"},
+                500: {"description": "Internal server error"}
+            })
+async def get_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the status of an analytics export job"""
+    try:
+        job = await analytics_export_service.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+        
+        return SuccessResponse(
+            success=True,
+            message="Export job status retrieved successfully",
+            data=_export_job_info(job)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting export job {job_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to retrieve export job"
+        )
+
+def _parse_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
+    """Parse a single ``bytes=start-end`` range into inclusive offsets"""
+    try:
+        unit, _, byte_range = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in byte_range:
+            raise ValueError
+        start_str, _, end_str = byte_range.strip().partition("-")
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(file_size - int(end_str), 0)
+            end = file_size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Invalid Range header", headers={"Content-Range": f"bytes */{file_size}"})
+    
+    end = min(end, file_size - 1)
+    if start > end or start >= file_size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{file_size}"})
+    return start, end
+
+async def _iter_file_range(path: str, start: int, end: int, chunk_size: int = 256 * 1024):
+    """Yield bytes ``start..end`` (inclusive) of a file"""
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+@router.get("/export/jobs/{job_id}/download",
+            responses={
+                200: {"description": "Export artifact"},
+                206: {"description": "Partial export artifact"},
+                401: {"description": "Unauthorized"},
+                404: {"description": "Export job or artifact not found"},
+                409: {"description": "Export job not completed"},
+                416: {"description": "Requested range not satisfiable"}
+            })
+async def download_export_artifact(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Download a completed analytics export, honouring ``Range`` and ``If-None-Match``"""
+    job = await analytics_export_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    
+    artifact_path = job.get("artifact_path")
+    if not artifact_path or not os.path.exists(artifact_path):
+        raise HTTPException(status_code=404, detail="Export artifact is no longer available")
+    
+    file_size = os.path.getsize(artifact_path)
+    etag = f'"{job["content_hash"]}"'
+    export_format = ExportFormat(job["format"])
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="analytics_{job["report_type"]}_{job["content_hash"][:12]}.{export_format.value}"'
+    }
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if range_header:
+        start, end = _parse_range_header(range_header, file_size)
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _iter_file_range(artifact_path, start, end),
+            status_code=206,
+            media_type=EXPORT_MEDIA_TYPES[export_format],
+            headers=headers
+        )
+    
+    headers["Content-Length"] = str(file_size)
+    return StreamingResponse(
+        _iter_file_range(artifact_path, 0, file_size - 1),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=headers
+    )
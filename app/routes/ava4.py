@@ -6,14 +6,16 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from app.services.auth import require_auth
 from app.services.audit_logger import audit_logger
 from app.services.fhir_r5_service import fhir_service
-from app.utils.json_encoder import serialize_mongodb_response
+from app.services.device_ingestion_queue import device_ingestion_queue, IngestionSteps
+from app.utils.json_encoder import serialize_mongodb_response, MongoJSONResponse
 from app.utils.error_definitions import create_error_response, create_success_response
 from config import settings, logger
 
-router = APIRouter(prefix="/api/ava4", tags=["ava4"])
+router = APIRouter(prefix="/api/ava4", tags=["ava4"], default_response_class=MongoJSONResponse)
 
 # Response Models for Swagger Documentation
 class MedicalHistoryCollection(BaseModel):
@@ -91,10 +93,18 @@ async def receive_ava4_data(
     request: Request,
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
-    """Receive data from AVA4 device"""
+    """Receive data from AVA4 device.
+    
+    When the fast-ack ingestion mode is enabled (``DEVICE_INGEST_FAST_ACK=true``)
+    the payload is queued durably and the endpoint answers 202 with an
+    idempotency key; poll ``/api/ava4/data/status/{idempotency_key}`` for the result.
+    """
     try:
         request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
         
+        if device_ingestion_queue.enabled:
+            return await device_ingestion_queue.accept_response("ava4", data.dict(), request, current_user, request_id)
+        
         # Validate device exists
         collection = mongodb_service.get_collection("amy_boxes")
         device = await collection.find_one({"mac_address": data.device_id})
@@ -111,81 +121,12 @@ async def receive_ava4_data(
                 ).dict()
             )
         
-        # Create observation document
-        observation = {
-            "resourceType": "Observation",
-            "status": "final",
-            "category": [
-                {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/observation-category",
-                            "code": "vital-signs",
-                            "display": "Vital Signs"
-                        }
-                    ]
-                }
-            ],
-            "code": {
-                "coding": [
-                    {
-                        "system": "https://my-firstcare.com/observations",
-                        "code": data.type,
-                        "display": data.type
-                    }
-                ]
-            },
-            "subject": {
-                "reference": f"Patient/{device.get('patient_id')}"
-            },
-            "effectiveDateTime": data.timestamp.isoformat() + "Z",
-            "issued": datetime.utcnow().isoformat() + "Z",
-            "valueQuantity": {
-                "value": data.data.get("value"),
-                "unit": data.data.get("unit", ""),
-                "system": "http://unitsofmeasure.org",
-                "code": data.data.get("unit_code", "")
-            },
-            "device": {
-                "reference": f"Device/{data.device_id}"
-            },
-            "meta": {
-                "source": "https://opera.my-firstcare.com",
-                "profile": ["http://hl7.org/fhir/StructureDefinition/Observation"]
-            }
-        }
-        
-        # Save observation
-        obs_collection = mongodb_service.get_fhir_collection("fhir_observations")
-        result = await obs_collection.insert_one(observation)
-        observation_id = str(result.inserted_id)
-        
-        # Route to appropriate medical history collection (legacy)
-        await route_to_medical_history(data, device.get("patient_id"))
-        
-        # Create FHIR R5 Observations (new implementation)
-        await create_fhir_observations_from_ava4(data, device.get("patient_id"), data.device_id)
-        
-        # Log audit trail
-        await audit_logger.log_device_data_received(
-            device_id=data.device_id,
-            device_type="AVA4",
-            data_type=data.type,
-            observation_id=observation_id,
-            user_id=current_user.get("username")
-        )
-        
-        logger.info(f"AVA4 data received: {data.type} from {data.device_id}")
+        result = await process_ava4_data(data, device, current_user.get("username"))
         
         # Create success response
         success_response = create_success_response(
             message="AVA4 data received successfully",
-            data={
-                "observation_id": observation_id,
-                "device_id": data.device_id,
-                "data_type": data.type,
-                "timestamp": data.timestamp.isoformat()
-            },
+            data=result,
             request_id=request_id
         )
         return success_response.dict()
@@ -203,6 +144,111 @@ async def receive_ava4_data(
             ).dict()
         )
 
+@router.get("/data/status/{idempotency_key}")
+async def get_ava4_data_status(
+    idempotency_key: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get the processing status of a fast-ack AVA4 data submission"""
+    return await device_ingestion_queue.status_response(idempotency_key, request)
+
+async def process_ava4_data(
+    data: Ava4DataRequest,
+    device: Dict[str, Any],
+    username: Optional[str],
+    steps: Optional[IngestionSteps] = None
+) -> Dict[str, Any]:
+    """Store an AVA4 reading: raw observation, medical history, FHIR R5 and audit log.
+
+    Queued jobs pass their ``steps`` so a retry skips the writes already done.
+    """
+    steps = steps or IngestionSteps()
+    # Create observation document
+    observation = {
+        "resourceType": "Observation",
+        "status": "final",
+        "category": [
+            {
+                "coding": [
+                    {
+                        "system": "http://terminology.hl7.org/CodeSystem/observation-category",
+                        "code": "vital-signs",
+                        "display": "Vital Signs"
+                    }
+                ]
+            }
+        ],
+        "code": {
+            "coding": [
+                {
+                    "system": "https://my-firstcare.com/observations",
+                    "code": data.type,
+                    "display": data.type
+                }
+            ]
+        },
+        "subject": {
+            "reference": f"Patient/{device.get('patient_id')}"
+        },
+        "effectiveDateTime": data.timestamp.isoformat() + "Z",
+        "issued": datetime.utcnow().isoformat() + "Z",
+        "valueQuantity": {
+            "value": data.data.get("value"),
+            "unit": data.data.get("unit", ""),
+            "system": "http://unitsofmeasure.org",
+            "code": data.data.get("unit_code", "")
+        },
+        "device": {
+            "reference": f"Device/{data.device_id}"
+        },
+        "meta": {
+            "source": "https://opera.my-firstcare.com",
+            "profile": ["http://hl7.org/fhir/StructureDefinition/Observation"]
+        }
+    }
+    
+    # Save observation
+    async def save_observation():
+        obs_collection = mongodb_service.get_fhir_collection("fhir_observations")
+        result = await obs_collection.insert_one(observation)
+        return str(result.inserted_id)
+    observation_id = await steps.run("observation", save_observation)
+    
+    # Route to appropriate medical history collection (legacy)
+    await steps.run("medical_history", lambda: route_to_medical_history(data, device.get("patient_id")))
+    
+    # Create FHIR R5 Observations (new implementation)
+    await steps.run("fhir_r5", lambda: create_fhir_observations_from_ava4(data, device.get("patient_id"), data.device_id))
+    
+    # Log audit trail
+    await steps.run("audit", lambda: audit_logger.log_device_data_received(
+        device_id=data.device_id,
+        device_type="AVA4",
+        data_type=data.type,
+        observation_id=observation_id,
+        user_id=username
+    ))
+    
+    logger.info(f"AVA4 data received: {data.type} from {data.device_id}")
+    
+    return {
+        "observation_id": observation_id,
+        "device_id": data.device_id,
+        "data_type": data.type,
+        "timestamp": data.timestamp.isoformat()
+    }
+
+async def _process_queued_ava4_data(payload: Dict[str, Any], username: Optional[str], steps: IngestionSteps) -> Dict[str, Any]:
+    """Background worker handler for fast-ack AVA4 submissions"""
+    data = Ava4DataRequest(**payload)
+    device = await mongodb_service.get_collection("amy_boxes").find_one({"mac_address": data.device_id})
+    if not device:
+        raise LookupError(f"AVA4 device with MAC address '{data.device_id}' not found")
+    return await process_ava4_data(data, device, username, steps)
+
+device_ingestion_queue.register_handler("ava4", _process_queued_ava4_data)
+
 async def route_to_medical_history(data: Ava4DataRequest, patient_id: str):
     """Route data to appropriate medical history collection"""
     try:
@@ -223,7 +269,7 @@ async def route_to_medical_history(data: Ava4DataRequest, patient_id: str):
             collection_name = "lipid_histories"
         
         if collection_name:
-            collection = mongodb_service.get_collection(collection_name)
+            collection = vital_history_store.get_collection(collection_name)
             
             # Create history entry
             history_entry = {
@@ -2861,7 +2907,7 @@ async def get_medical_history_collections(
         
         for collection_name, info in collections_info.items():
             try:
-                collection = mongodb_service.get_collection(collection_name)
+                collection = vital_history_store.get_collection(collection_name)
                 count = await collection.count_documents({})
                 collection_stats[collection_name] = {
                     **info,
@@ -3079,7 +3125,7 @@ async def get_patient_medical_history(
         
         for collection_name in collections_to_query:
             try:
-                collection = mongodb_service.get_collection(collection_name)
+                collection = vital_history_store.get_collection(collection_name)
                 
                 # Build query - patient_id might be stored as $oid format
                 query = {"patient_id.$oid": patient_id}
@@ -3350,7 +3396,7 @@ async def get_patient_medical_trends(
         start_date = end_date - timedelta(days=days)
         
         # Query the specific collection
-        collection = mongodb_service.get_collection(collection_name)
+        collection = vital_history_store.get_collection(collection_name)
         
         # Try both query formats for patient_id
         query = {"patient_id.$oid": patient_id}
@@ -3581,7 +3627,7 @@ async def get_medical_history_analytics(
         
         for collection_name in collections:
             try:
-                collection = mongodb_service.get_collection(collection_name)
+                collection = vital_history_store.get_collection(collection_name)
                 count = await collection.count_documents({})
                 analytics[collection_name] = {
                     "record_count": count,
@@ -3600,7 +3646,7 @@ async def get_medical_history_analytics(
         for collection_name in collections:
             if analytics[collection_name]["record_count"] > 0:
                 try:
-                    collection = mongodb_service.get_collection(collection_name)
+                    collection = vital_history_store.get_collection(collection_name)
                     # Get distinct patient IDs
                     patient_ids = await collection.distinct("patient_id")
                     for pid in patient_ids:
@@ -3708,7 +3754,7 @@ async def get_patient_medical_analytics(
         
         for collection_name, config in collections_config.items():
             try:
-                collection = mongodb_service.get_collection(collection_name)
+                collection = vital_history_store.get_collection(collection_name)
                 
                 # Query with patient_id.$oid format
                 records = await collection.find({"patient_id.$oid": patient_id}).to_list(length=None)
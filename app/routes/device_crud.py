@@ -6,6 +6,7 @@ from pydantic import BaseModel
 from bson import ObjectId
 from loguru import logger
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from app.services.auth import require_auth
 from app.services.audit_logger import audit_logger
 from app.services.realtime_events import realtime_events
@@ -782,7 +783,7 @@ async def route_to_medical_history(data: DeviceDataCreate, patient_id: str):
         
         collection_name = collection_mapping.get(data.data_type.upper())
         if collection_name and patient_id:
-            collection = mongodb_service.get_collection(collection_name)
+            collection = vital_history_store.get_collection(collection_name)
             
             history_entry = {
                 "patient_id": ObjectId(patient_id),
@@ -0,0 +1,340 @@
+"""
+FHIR R5 AMY Migration Endpoints
+===============================
+One-off endpoints that convert AMY patient data (medications, allergies,
+body data, emergency contacts, devices, ...) into FHIR R5 resources.
+
+They share the ``/fhir/R5`` prefix with ``fhir_r5.py`` but live in their
+own router so deployments that do not migrate can leave them out (the
+``migration`` group of ``OPTIONAL_ROUTERS``).
+"""
+
+import uuid
+from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, Body
+from bson import ObjectId
+
+from app.services.auth import require_auth
+from app.services.fhir_r5_service import fhir_service
+from app.utils.error_definitions import create_error_response, create_success_response
+from app.utils.json_encoder import MongoJSONResponse
+from app.utils.structured_logging import get_logger
+from app.utils.performance_decorators import api_endpoint_timing
+
+logger = get_logger(__name__)
+router = APIRouter(prefix="/fhir/R5", tags=["fhir-r5"], default_response_class=MongoJSONResponse)
+
+# =============== AMY Data Migration Endpoints ===============
+
+@router.post("/migration/amy/medication-history", summary="Migrate AMY Medication History")
+@api_endpoint_timing("fhir_migrate_amy_medication")
+async def migrate_amy_medication_history(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY medication history to FHIR R5 MedicationStatement resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        # Get medication history from AMY database
+        from app.services.mongo import mongodb_service
+        from bson import ObjectId
+        medication_collection = mongodb_service.get_collection("medication_histories")
+        medication_doc = await medication_collection.find_one({"patient_id": ObjectId(patient_id)})
+        
+        if not medication_doc:
+            return create_error_response(
+                error_code="RESOURCE_NOT_FOUND",
+                message=f"No medication history found for patient {patient_id}",
+                request_id=request_id
+            )
+        
+        # Migrate to FHIR
+        medication_ids = await fhir_service.migrate_medication_history_to_fhir(medication_doc)
+        
+        return create_success_response(
+            message=f"Migrated {len(medication_ids)} medication statements",
+            data={
+                "patient_id": patient_id,
+                "medication_statement_ids": medication_ids,
+                "total_migrated": len(medication_ids)
+            },
+            request_id=request_id
+        )
+        
+    except Exception as e:
+        logger.error(f"Failed to migrate medication history: {e}")
+        return create_error_response(
+            error_code="MIGRATION_ERROR",
+            message=f"Failed to migrate medication history: {str(e)}",
+            request_id=request_id
+        )
+
+@router.post("/migration/amy/allergy-history", summary="Migrate AMY Allergy History")
+@api_endpoint_timing("fhir_migrate_amy_allergy")
+async def migrate_amy_allergy_history(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY allergy history to FHIR R5 AllergyIntolerance resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        # Get allergy history from AMY database
+        from app.services.mongo import mongodb_service
+        from bson import ObjectId
+        allergy_collection = mongodb_service.get_collection("allergy_histories")
+        allergy_doc = await allergy_collection.find_one({"patient_id": ObjectId(patient_id)})
+        
+        if not allergy_doc:
+            return create_error_response(
+                error_code="RESOURCE_NOT_FOUND",
+                message=f"No allergy history found for patient {patient_id}",
+                request_id=request_id
+            )
+        
+        # Migrate to FHIR
+        allergy_ids = await fhir_service.migrate_allergy_history_to_fhir(allergy_doc)
+        
+        return create_success_response(
+            message=f"Migrated {len(allergy_ids)} allergy intolerances",
+            data={
+                "patient_id": patient_id,
+                "allergy_intolerance_ids": allergy_ids,
+                "total_migrated": len(allergy_ids)
+            },
+            request_id=request_id
+        )
+        
+    except Exception as e:
+        logger.error(f"Failed to migrate allergy history: {e}")
+        return create_error_response(
+            error_code="MIGRATION_ERROR",
+            message=f"Failed to migrate allergy history: {str(e)}",
+            request_id=request_id
+        )
+
+@router.post("/migration/amy/body-data", summary="Migrate AMY Body Data")
+@api_endpoint_timing("fhir_migrate_amy_body_data")
+async def migrate_amy_body_data(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY body data to FHIR R5 Observation resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        # Get body data from AMY database
+        from app.services.vital_timeseries import vital_history_store
+        from bson import ObjectId
+        body_data_collection = vital_history_store.get_collection("body_data_histories")
+        body_data_doc = await body_data_collection.find_one({"patient_id": ObjectId(patient_id)})
+        
+        if not body_data_doc:
+            return create_error_response(
+                error_code="RESOURCE_NOT_FOUND",
+                message=f"No body data found for patient {patient_id}",
+                request_id=request_id
+            )
+        
+        # Migrate to FHIR
+        observation_ids = await fhir_service.migrate_body_data_to_observations(body_data_doc)
+        
+        return create_success_response(
+            message=f"Migrated {len(observation_ids)} body measurement observations",
+            data={
+                "patient_id": patient_id,
+                "observation_ids": observation_ids,
+                "total_migrated": len(observation_ids)
+            },
+            request_id=request_id
+        )
+        
+    except Exception as e:
+        logger.error(f"Failed to migrate body data: {e}")
+        return create_error_response(
+            error_code="MIGRATION_ERROR",
+            message=f"Failed to migrate body data: {str(e)}",
+            request_id=request_id
+        )
+
+# =============== Comprehensive AMY Migration Endpoints ===============
+
+@router.post("/migration/amy/comprehensive-patient", summary="Comprehensive AMY Patient Migration")
+@api_endpoint_timing("fhir_migrate_amy_comprehensive")
+async def migrate_amy_comprehensive_patient(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Comprehensive migration of AMY patient data to all relevant FHIR R5 resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        # Get patient document from AMY database
+        patients_collection = fhir_service.mongodb_service.get_collection('patients')
+        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
+        
+        if not patient_doc:
+            raise HTTPException(
+                status_code=404,
+                detail=create_error_response(
+                    "PATIENT_NOT_FOUND",
+                    custom_message=f"Patient with ID {patient_id} not found in AMY database",
+                    request_id=request_id
+                ).dict()
+            )
+        
+        # Perform comprehensive migration
+        migration_results = await fhir_service.migrate_comprehensive_patient_to_fhir(patient_doc)
+        
+        response = create_success_response(
+            message="Comprehensive AMY patient migration completed successfully",
+            data=migration_results,
+            request_id=request_id
+        )
+        
+        return MongoJSONResponse(
+            content=response.dict(),
+            media_type="application/fhir+json"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in comprehensive AMY patient migration: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=create_error_response(
+                "AMY_MIGRATION_ERROR",
+                custom_message=f"Comprehensive migration failed: {str(e)}",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
+        )
+
+@router.post("/migration/amy/patient-goals", summary="Migrate AMY Patient Goals")
+@api_endpoint_timing("fhir_migrate_amy_goals")
+async def migrate_amy_patient_goals(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY patient goal data to FHIR Goal resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        patients_collection = fhir_service.mongodb_service.get_collection('patients')
+        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
+        
+        if not patient_doc:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        
+        goal_ids = await fhir_service.migrate_patient_goals_to_fhir(patient_doc)
+        
+        response = create_success_response(
+            message=f"Successfully migrated {len(goal_ids)} goals from AMY patient data",
+            data={"goal_ids": goal_ids, "total_goals": len(goal_ids)},
+            request_id=request_id
+        )
+        
+        return MongoJSONResponse(content=response.dict(), media_type="application/fhir+json")
+        
+    except Exception as e:
+        logger.error(f"Error migrating AMY patient goals: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/migration/amy/emergency-contacts", summary="Migrate AMY Emergency Contacts")
+@api_endpoint_timing("fhir_migrate_amy_contacts")
+async def migrate_amy_emergency_contacts(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY emergency contact data to FHIR RelatedPerson resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        patients_collection = fhir_service.mongodb_service.get_collection('patients')
+        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
+        
+        if not patient_doc:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        
+        related_person_ids = await fhir_service.migrate_emergency_contacts_to_fhir(patient_doc)
+        
+        response = create_success_response(
+            message=f"Successfully migrated {len(related_person_ids)} emergency contacts from AMY patient data",
+            data={"related_person_ids": related_person_ids, "total_contacts": len(related_person_ids)},
+            request_id=request_id
+        )
+        
+        return MongoJSONResponse(content=response.dict(), media_type="application/fhir+json")
+        
+    except Exception as e:
+        logger.error(f"Error migrating AMY emergency contacts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/migration/amy/patient-alerts", summary="Migrate AMY Patient Alerts")
+@api_endpoint_timing("fhir_migrate_amy_alerts")
+async def migrate_amy_patient_alerts(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY patient alert data to FHIR Flag resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        patients_collection = fhir_service.mongodb_service.get_collection('patients')
+        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
+        
+        if not patient_doc:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        
+        flag_ids = await fhir_service.migrate_patient_alerts_to_flags(patient_doc)
+        
+        response = create_success_response(
+            message=f"Successfully migrated {len(flag_ids)} alerts from AMY patient data",
+            data={"flag_ids": flag_ids, "total_flags": len(flag_ids)},
+            request_id=request_id
+        )
+        
+        return MongoJSONResponse(content=response.dict(), media_type="application/fhir+json")
+        
+    except Exception as e:
+        logger.error(f"Error migrating AMY patient alerts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/migration/amy/patient-devices", summary="Migrate AMY Patient Devices")
+@api_endpoint_timing("fhir_migrate_amy_devices")
+async def migrate_amy_patient_devices(
+    request: Request,
+    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Migrate AMY patient device data to FHIR Device resources"""
+    try:
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        
+        patients_collection = fhir_service.mongodb_service.get_collection('patients')
+        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
+        
+        if not patient_doc:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        
+        device_ids = await fhir_service.migrate_patient_devices_to_fhir(patient_doc)
+        
+        response = create_success_response(
+            message=f"Successfully migrated {len(device_ids)} devices from AMY patient data",
+            data={"device_ids": device_ids, "total_devices": len(device_ids)},
+            request_id=request_id
+        )
+        
+        return MongoJSONResponse(content=response.dict(), media_type="application/fhir+json")
+        
+    except Exception as e:
+        logger.error(f"Error migrating AMY patient devices: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -11,21 +11,25 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
 from fastapi import APIRouter, Depends, HTTPException, Request, Query, Path, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 from app.services.auth import require_auth
-from app.services.fhir_r5_service import fhir_service
+from app.services.fhir_r5_service import fhir_service, FHIRPreconditionFailedError
+from app.services.fhir_history import fhir_history_service, etag_matches, resource_etag
+from app.services.observation_lastn import observation_lastn_service
+from app.services.pipeline_tracing import pipeline_tracer
 from app.models.fhir_r5 import (
     FHIRCreateRequest, FHIRSearchParams, FHIRSearchResponse,
     Patient, Observation, Device, Organization, Location,
     Condition, Medication, AllergyIntolerance, Encounter, Provenance
 )
 from app.utils.error_definitions import create_error_response, create_success_response
+from app.utils.json_encoder import MongoJSONResponse
 from app.utils.structured_logging import get_logger
 from app.utils.performance_decorators import api_endpoint_timing
 
 logger = get_logger(__name__)
-router = APIRouter(prefix="/fhir/R5", tags=["fhir-r5"])
+router = APIRouter(prefix="/fhir/R5", tags=["fhir-r5"], default_response_class=MongoJSONResponse)
 
 # =============== FHIR R5 Capability Statement ===============
 
@@ -268,7 +272,7 @@ async def get_capability_statement(
             }]
         }
         
-        return JSONResponse(content=capability, media_type="application/fhir+json")
+        return MongoJSONResponse(content=capability, media_type="application/fhir+json")
         
     except Exception as e:
         logger.error(f"Error getting capability statement: {e}")
@@ -304,7 +308,7 @@ async def create_fhir_resource_endpoint(
             "Content-Type": "application/fhir+json"
         }
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             status_code=201,
             headers=headers
@@ -329,9 +333,14 @@ async def get_fhir_resource_endpoint(
 ):
     """Generic get FHIR resource endpoint"""
     try:
-        resource = await fhir_service.get_fhir_resource(resource_type, resource_id)
+        result = await fhir_service.get_fhir_resource_with_etag(
+            resource_type,
+            resource_id,
+            elements=request.query_params.get("_elements"),
+            summary=request.query_params.get("_summary")
+        )
         
-        if not resource:
+        if not result:
             raise HTTPException(
                 status_code=404,
                 detail=create_error_response(
@@ -341,13 +350,30 @@ async def get_fhir_resource_endpoint(
                 ).dict()
             )
         
-        return JSONResponse(
-            content=resource,
-            media_type="application/fhir+json"
+        headers = {"ETag": result["etag"]}
+        if result.get("last_modified"):
+            headers["Last-Modified"] = result["last_modified"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+        
+        if etag_matches(request.headers.get("If-None-Match"), result["etag"]):
+            return Response(status_code=304, headers=headers)
+        
+        return MongoJSONResponse(
+            content=result["resource"],
+            media_type="application/fhir+json",
+            headers=headers
         )
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=create_error_response(
+                "FHIR_GET_ERROR",
+                custom_message=str(e),
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
+        )
     except Exception as e:
         logger.error(f"Error getting FHIR {resource_type} {resource_id}: {e}")
         raise HTTPException(
@@ -372,14 +398,25 @@ async def update_fhir_resource_endpoint(
             resource_type=resource_type,
             resource_id=resource_id,
             resource_data=resource_data,
-            source_system="api"
+            source_system="api",
+            if_match=request.headers.get("If-Match")
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=result["resource"],
-            media_type="application/fhir+json"
+            media_type="application/fhir+json",
+            headers={"ETag": result["etag"]}
         )
         
+    except FHIRPreconditionFailedError as e:
+        raise HTTPException(
+            status_code=412,
+            detail=create_error_response(
+                "FHIR_VERSION_CONFLICT",
+                custom_message=str(e),
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
+        )
     except Exception as e:
         logger.error(f"Error updating FHIR {resource_type} {resource_id}: {e}")
         raise HTTPException(
@@ -401,7 +438,7 @@ async def delete_fhir_resource_endpoint(
     try:
         await fhir_service.delete_fhir_resource(resource_type, resource_id)
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content={"resourceType": "OperationOutcome", "id": str(uuid.uuid4())},
             status_code=204,
             media_type="application/fhir+json"
@@ -450,14 +487,24 @@ async def search_fhir_resources_endpoint(
             else:
                 mapped_params[key] = value
         
+        # _elements/_summary apply to every resource type, so read them from the query string
+        for key, field in (("_elements", "elements"), ("_summary", "summary")):
+            if field not in mapped_params and key in request.query_params:
+                mapped_params[field] = request.query_params[key]
+        
         # Convert query parameters to FHIRSearchParams
         fhir_search_params = FHIRSearchParams(**mapped_params)
         
-        result = await fhir_service.search_fhir_resources(resource_type, fhir_search_params)
+        etag, total = await fhir_service.search_etag(resource_type, fhir_search_params)
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        result = await fhir_service.search_fhir_resources(resource_type, fhir_search_params, total=total)
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=result.dict(),
-            media_type="application/fhir+json"
+            media_type="application/fhir+json",
+            headers={"ETag": etag}
         )
         
     except Exception as e:
@@ -547,7 +594,40 @@ async def create_observation(
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
     """Create a new FHIR R5 Observation resource"""
-    return await create_fhir_resource_endpoint("Observation", observation_data, request, current_user)
+    with pipeline_tracer.trace(request.headers):
+        return await create_fhir_resource_endpoint("Observation", observation_data, request, current_user)
+
+@router.get("/Observation/$lastn", summary="Last N Observations")
+@api_endpoint_timing("fhir_observation_lastn")
+async def observation_lastn(
+    request: Request,
+    patient: str = Query(..., description="Patient reference(s), comma-separated"),
+    code: Optional[str] = Query(None, description="Observation code token(s)"),
+    category: Optional[str] = Query(None, description="Observation category token(s)"),
+    max: int = Query(1, ge=1, le=100, description="Maximum observations per code"),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """FHIR Observation $lastn operation: the most recent Observations per patient and code"""
+    try:
+        patient_ids = [
+            ref.strip().replace("Patient/", "", 1)
+            for ref in patient.split(",") if ref.strip()
+        ]
+        bundle = await observation_lastn_service.lastn(
+            patient_ids, code=code, category=category, max_per_code=max
+        )
+        return MongoJSONResponse(content=bundle, media_type="application/fhir+json")
+        
+    except Exception as e:
+        logger.error(f"Error in Observation $lastn: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=create_error_response(
+                "FHIR_SEARCH_ERROR",
+                custom_message=f"Failed to run Observation $lastn: {str(e)}",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
+        )
 
 @router.get("/Observation/{observation_id}", summary="Get Observation by ID")
 @api_endpoint_timing("fhir_get_observation")
@@ -590,6 +670,10 @@ async def search_observations(
     date: Optional[str] = Query(None, description="Date range"),
     device: Optional[str] = Query(None, description="Device reference"),
     status: Optional[str] = Query(None, description="Observation status"),
+    subject: Optional[str] = Query(None, description="Subject reference"),
+    encounter: Optional[str] = Query(None, description="Encounter reference"),
+    _lastUpdated: Optional[str] = Query(None, description="Last updated date range"),
+    _source: Optional[str] = Query(None, description="Source system"),
     _count: Optional[int] = Query(10, description="Number of results"),
     _offset: Optional[int] = Query(0, description="Search offset"),
     _sort: Optional[str] = Query(None, description="Sort parameters"),
@@ -598,8 +682,15 @@ async def search_observations(
     """Search FHIR R5 Observation resources"""
     search_params = {
         "patient": patient,
+        "code": code,
+        "category": category,
+        "device": device,
+        "subject": subject,
+        "encounter": encounter,
         "status": status,
         "date": date,
+        "_lastUpdated": _lastUpdated,
+        "_source": _source,
         "_count": _count,
         "_offset": _offset,
         "_sort": _sort
@@ -620,7 +711,9 @@ async def create_observations_batch(
         
         for i, observation_data in enumerate(observations_data):
             try:
-                result = await create_fhir_resource_endpoint("Observation", observation_data, request, current_user)
+                # One trace per Observation so api_total and received_to_fhir_stored stay per resource
+                with pipeline_tracer.trace(request.headers):
+                    result = await create_fhir_resource_endpoint("Observation", observation_data, request, current_user)
                 results.append({
                     "index": i,
                     "success": True,
@@ -1181,7 +1274,7 @@ async def create_observation_from_mqtt(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             status_code=201,
             media_type="application/fhir+json"
@@ -1396,143 +1489,6 @@ async def search_document_references(
     }
     return await search_fhir_resources_endpoint("DocumentReference", request, current_user, **search_params)
 
-# =============== AMY Data Migration Endpoints ===============
-
-@router.post("/migration/amy/medication-history", summary="Migrate AMY Medication History")
-@api_endpoint_timing("fhir_migrate_amy_medication")
-async def migrate_amy_medication_history(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY medication history to FHIR R5 MedicationStatement resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        # Get medication history from AMY database
-        from app.services.mongo import mongodb_service
-        from bson import ObjectId
-        medication_collection = mongodb_service.get_collection("medication_histories")
-        medication_doc = await medication_collection.find_one({"patient_id": ObjectId(patient_id)})
-        
-        if not medication_doc:
-            return create_error_response(
-                error_code="RESOURCE_NOT_FOUND",
-                message=f"No medication history found for patient {patient_id}",
-                request_id=request_id
-            )
-        
-        # Migrate to FHIR
-        medication_ids = await fhir_service.migrate_medication_history_to_fhir(medication_doc)
-        
-        return create_success_response(
-            message=f"Migrated {len(medication_ids)} medication statements",
-            data={
-                "patient_id": patient_id,
-                "medication_statement_ids": medication_ids,
-                "total_migrated": len(medication_ids)
-            },
-            request_id=request_id
-        )
-        
-    except Exception as e:
-        logger.error(f"Failed to migrate medication history: {e}")
-        return create_error_response(
-            error_code="MIGRATION_ERROR",
-            message=f"Failed to migrate medication history: {str(e)}",
-            request_id=request_id
-        )
-
-@router.post("/migration/amy/allergy-history", summary="Migrate AMY Allergy History")
-@api_endpoint_timing("fhir_migrate_amy_allergy")
-async def migrate_amy_allergy_history(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY allergy history to FHIR R5 AllergyIntolerance resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        # Get allergy history from AMY database
-        from app.services.mongo import mongodb_service
-        from bson import ObjectId
-        allergy_collection = mongodb_service.get_collection("allergy_histories")
-        allergy_doc = await allergy_collection.find_one({"patient_id": ObjectId(patient_id)})
-        
-        if not allergy_doc:
-            return create_error_response(
-                error_code="RESOURCE_NOT_FOUND",
-                message=f"No allergy history found for patient {patient_id}",
-                request_id=request_id
-            )
-        
-        # Migrate to FHIR
-        allergy_ids = await fhir_service.migrate_allergy_history_to_fhir(allergy_doc)
-        
-        return create_success_response(
-            message=f"Migrated {len(allergy_ids)} allergy intolerances",
-            data={
-                "patient_id": patient_id,
-                "allergy_intolerance_ids": allergy_ids,
-                "total_migrated": len(allergy_ids)
-            },
-            request_id=request_id
-        )
-        
-    except Exception as e:
-        logger.error(f"Failed to migrate allergy history: {e}")
-        return create_error_response(
-            error_code="MIGRATION_ERROR",
-            message=f"Failed to migrate allergy history: {str(e)}",
-            request_id=request_id
-        )
-
-@router.post("/migration/amy/body-data", summary="Migrate AMY Body Data")
-@api_endpoint_timing("fhir_migrate_amy_body_data")
-async def migrate_amy_body_data(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY body data to FHIR R5 Observation resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        # Get body data from AMY database
-        from app.services.mongo import mongodb_service
-        from bson import ObjectId
-        body_data_collection = mongodb_service.get_collection("body_data_histories")
-        body_data_doc = await body_data_collection.find_one({"patient_id": ObjectId(patient_id)})
-        
-        if not body_data_doc:
-            return create_error_response(
-                error_code="RESOURCE_NOT_FOUND",
-                message=f"No body data found for patient {patient_id}",
-                request_id=request_id
-            )
-        
-        # Migrate to FHIR
-        observation_ids = await fhir_service.migrate_body_data_to_observations(body_data_doc)
-        
-        return create_success_response(
-            message=f"Migrated {len(observation_ids)} body measurement observations",
-            data={
-                "patient_id": patient_id,
-                "observation_ids": observation_ids,
-                "total_migrated": len(observation_ids)
-            },
-            request_id=request_id
-        )
-        
-    except Exception as e:
-        logger.error(f"Failed to migrate body data: {e}")
-        return create_error_response(
-            error_code="MIGRATION_ERROR",
-            message=f"Failed to migrate body data: {str(e)}",
-            request_id=request_id
-        )
-
 # =============== FHIR R5 Analytics and Summary Endpoints ===============
 
 @router.get("/analytics/summary", summary="FHIR R5 Resources Summary")
@@ -1582,7 +1538,7 @@ async def get_fhir_summary(
             request_id=request.headers.get("X-Request-ID")
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
@@ -2073,183 +2029,97 @@ async def search_specimens(
     }
     return await search_fhir_resources_endpoint("Specimen", request, current_user, **search_params)
 
-# =============== Comprehensive AMY Migration Endpoints ===============
+# =============== History / Version Read Endpoints ===============
 
-@router.post("/migration/amy/comprehensive-patient", summary="Comprehensive AMY Patient Migration")
-@api_endpoint_timing("fhir_migrate_amy_comprehensive")
-async def migrate_amy_comprehensive_patient(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+def _validate_history_resource_type(resource_type: str, request: Request):
+    if resource_type not in fhir_service.fhir_collections:
+        raise HTTPException(
+            status_code=400,
+            detail=create_error_response(
+                "INVALID_RESOURCE_TYPE",
+                custom_message=f"Unsupported resource type: {resource_type}",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
+        )
+
+@router.get("/{resource_type}/{resource_id}/_history", summary="Resource History")
+@api_endpoint_timing("fhir_resource_history")
+async def get_resource_history(
+    resource_type: str = Path(..., description="FHIR resource type"),
+    resource_id: str = Path(..., description="Resource ID"),
+    _count: int = Query(50, ge=1, le=1000, description="Number of versions"),
+    _offset: int = Query(0, ge=0, description="Version offset"),
+    request: Request = None,
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
-    """Comprehensive migration of AMY patient data to all relevant FHIR R5 resources"""
+    """FHIR history interaction: all stored versions of a resource, newest first"""
+    _validate_history_resource_type(resource_type, request)
     try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        # Get patient document from AMY database
-        patients_collection = fhir_service.mongodb_service.get_collection('patients')
-        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
-        
-        if not patient_doc:
-            raise HTTPException(
-                status_code=404,
-                detail=create_error_response(
-                    "PATIENT_NOT_FOUND",
-                    custom_message=f"Patient with ID {patient_id} not found in AMY database",
-                    request_id=request_id
-                ).dict()
-            )
-        
-        # Perform comprehensive migration
-        migration_results = await fhir_service.migrate_comprehensive_patient_to_fhir(patient_doc)
-        
-        response = create_success_response(
-            message="Comprehensive AMY patient migration completed successfully",
-            data=migration_results,
-            request_id=request_id
-        )
+        bundle = await fhir_history_service.get_history(resource_type, resource_id, count=_count, offset=_offset)
+        return MongoJSONResponse(content=bundle, media_type="application/fhir+json")
         
-        return JSONResponse(
-            content=response.dict(),
-            media_type="application/fhir+json"
-        )
-        
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error in comprehensive AMY patient migration: {e}")
+        logger.error(f"Error getting history for {resource_type}/{resource_id}: {e}")
         raise HTTPException(
             status_code=500,
             detail=create_error_response(
-                "AMY_MIGRATION_ERROR",
-                custom_message=f"Comprehensive migration failed: {str(e)}",
+                "FHIR_GET_ERROR",
+                custom_message=f"Failed to get history for {resource_type}: {str(e)}",
                 request_id=request.headers.get("X-Request-ID")
             ).dict()
         )
 
-@router.post("/migration/amy/patient-goals", summary="Migrate AMY Patient Goals")
-@api_endpoint_timing("fhir_migrate_amy_goals")
-async def migrate_amy_patient_goals(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
+@router.get("/{resource_type}/{resource_id}/_history/{version_id}", summary="Read Resource Version")
+@api_endpoint_timing("fhir_resource_vread")
+async def vread_resource(
+    resource_type: str = Path(..., description="FHIR resource type"),
+    resource_id: str = Path(..., description="Resource ID"),
+    version_id: str = Path(..., description="Version ID"),
+    request: Request = None,
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
-    """Migrate AMY patient goal data to FHIR Goal resources"""
+    """FHIR vread interaction: a specific version of a resource"""
+    _validate_history_resource_type(resource_type, request)
     try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        patients_collection = fhir_service.mongodb_service.get_collection('patients')
-        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
-        
-        if not patient_doc:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        goal_ids = await fhir_service.migrate_patient_goals_to_fhir(patient_doc)
-        
-        response = create_success_response(
-            message=f"Successfully migrated {len(goal_ids)} goals from AMY patient data",
-            data={"goal_ids": goal_ids, "total_goals": len(goal_ids)},
-            request_id=request_id
-        )
-        
-        return JSONResponse(content=response.dict(), media_type="application/fhir+json")
-        
+        snapshot = await fhir_service.get_fhir_resource_version(resource_type, resource_id, version_id)
     except Exception as e:
-        logger.error(f"Error migrating AMY patient goals: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.post("/migration/amy/emergency-contacts", summary="Migrate AMY Emergency Contacts")
-@api_endpoint_timing("fhir_migrate_amy_contacts")
-async def migrate_amy_emergency_contacts(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY emergency contact data to FHIR RelatedPerson resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        patients_collection = fhir_service.mongodb_service.get_collection('patients')
-        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
-        
-        if not patient_doc:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        related_person_ids = await fhir_service.migrate_emergency_contacts_to_fhir(patient_doc)
-        
-        response = create_success_response(
-            message=f"Successfully migrated {len(related_person_ids)} emergency contacts from AMY patient data",
-            data={"related_person_ids": related_person_ids, "total_contacts": len(related_person_ids)},
-            request_id=request_id
+        logger.error(f"Error reading {resource_type}/{resource_id} version {version_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=create_error_response(
+                "FHIR_GET_ERROR",
+                custom_message=f"Failed to read {resource_type} version: {str(e)}",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
         )
-        
-        return JSONResponse(content=response.dict(), media_type="application/fhir+json")
-        
-    except Exception as e:
-        logger.error(f"Error migrating AMY emergency contacts: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.post("/migration/amy/patient-alerts", summary="Migrate AMY Patient Alerts")
-@api_endpoint_timing("fhir_migrate_amy_alerts")
-async def migrate_amy_patient_alerts(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY patient alert data to FHIR Flag resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        patients_collection = fhir_service.mongodb_service.get_collection('patients')
-        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
-        
-        if not patient_doc:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        flag_ids = await fhir_service.migrate_patient_alerts_to_flags(patient_doc)
-        
-        response = create_success_response(
-            message=f"Successfully migrated {len(flag_ids)} alerts from AMY patient data",
-            data={"flag_ids": flag_ids, "total_flags": len(flag_ids)},
-            request_id=request_id
+    
+    if not snapshot:
+        raise HTTPException(
+            status_code=404,
+            detail=create_error_response(
+                "FHIR_RESOURCE_NOT_FOUND",
+                custom_message=f"{resource_type} {resource_id} version {version_id} not found",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
         )
-        
-        return JSONResponse(content=response.dict(), media_type="application/fhir+json")
-        
-    except Exception as e:
-        logger.error(f"Error migrating AMY patient alerts: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.post("/migration/amy/patient-devices", summary="Migrate AMY Patient Devices")
-@api_endpoint_timing("fhir_migrate_amy_devices")
-async def migrate_amy_patient_devices(
-    request: Request,
-    patient_id: str = Body(..., description="Patient ObjectId from AMY"),
-    current_user: Dict[str, Any] = Depends(require_auth())
-):
-    """Migrate AMY patient device data to FHIR Device resources"""
-    try:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        
-        patients_collection = fhir_service.mongodb_service.get_collection('patients')
-        patient_doc = await patients_collection.find_one({"_id": ObjectId(patient_id)})
-        
-        if not patient_doc:
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        device_ids = await fhir_service.migrate_patient_devices_to_fhir(patient_doc)
-        
-        response = create_success_response(
-            message=f"Successfully migrated {len(device_ids)} devices from AMY patient data",
-            data={"device_ids": device_ids, "total_devices": len(device_ids)},
-            request_id=request_id
+    
+    if snapshot["method"] == "DELETE":
+        raise HTTPException(
+            status_code=410,
+            detail=create_error_response(
+                "FHIR_RESOURCE_DELETED",
+                custom_message=f"{resource_type} {resource_id} was deleted in version {version_id}",
+                request_id=request.headers.get("X-Request-ID")
+            ).dict()
         )
-        
-        return JSONResponse(content=response.dict(), media_type="application/fhir+json")
-        
-    except Exception as e:
-        logger.error(f"Error migrating AMY patient devices: {e}")
-        raise HTTPException(status_code=500, detail=str(e)) 
+    
+    # Versions are immutable, so clients may cache them indefinitely
+    etag = resource_etag(snapshot["version_id"], snapshot.get("blockchain_hash"))
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    return MongoJSONResponse(content=snapshot["resource_data"], media_type="application/fhir+json", headers=headers)
 
 # =============== Blockchain Hash Verification Endpoints ===============
 
@@ -2287,7 +2157,7 @@ async def verify_resource_blockchain_hash(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
@@ -2349,7 +2219,7 @@ async def verify_batch_blockchain_hashes(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
@@ -2385,7 +2255,7 @@ async def get_blockchain_chain_info(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
@@ -2419,7 +2289,7 @@ async def verify_blockchain_chain_integrity(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
@@ -2453,7 +2323,7 @@ async def export_blockchain_chain(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/json",
             headers={
@@ -2525,7 +2395,7 @@ async def get_blockchain_statistics(
             request_id=request_id
         )
         
-        return JSONResponse(
+        return MongoJSONResponse(
             content=response.dict(),
             media_type="application/fhir+json"
         )
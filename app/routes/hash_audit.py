@@ -11,12 +11,18 @@ Endpoints:
 - User-specific audit trails
 - Resource-specific audit trails
 - Audit log cleanup and maintenance
+- Streaming, resumable audit log export
 """
 
+import csv
+import io
+import json
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple
 from fastapi import APIRouter, Depends, Query, Path, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.services.auth import require_auth
@@ -24,6 +30,7 @@ from app.services.hash_audit_log import (
     hash_audit_service, HashAuditOperation, HashAuditStatus, 
     HashAuditSeverity, HashAuditMetrics, HashAuditContext
 )
+from app.utils.json_encoder import MongoJSONEncoder
 from app.utils.performance_decorators import api_endpoint_timing
 from app.utils.structured_logging import get_logger
 
@@ -512,18 +519,125 @@ async def get_audit_system_health(
 
 # =============== Audit Log Export Endpoints ===============
 
+# Flat columns written by the CSV export; nested fields are JSON-encoded
+EXPORT_CSV_COLUMNS = [
+    "_id", "timestamp", "operation_type", "status", "severity", "message",
+    "blockchain_hash", "previous_hash", "user_id", "request_id", "session_id",
+    "fhir_resource_type", "fhir_resource_id", "fhir_resource_version", "patient_id",
+    "organization_id", "device_id", "encounter_id", "batch_id", "batch_size",
+    "source_system", "source_ip", "has_error", "error_details", "metrics", "additional_data"
+]
+
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _parse_resume_after(resume_after: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """Parse a ``<timestamp>,<_id>`` resume cursor taken from the last exported record"""
+    if not resume_after:
+        return None
+    try:
+        timestamp_part, last_id = resume_after.rsplit(",", 1)
+        last_timestamp = datetime.fromisoformat(timestamp_part.strip().rstrip("Z"))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid resume_after cursor. Expected '<timestamp>,<_id>' of the last exported record"
+        )
+    if last_timestamp.tzinfo is not None:
+        last_timestamp = last_timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_timestamp, last_id.strip()
+
+def _csv_value(value: Any) -> Any:
+    """Render a single CSV cell, JSON-encoding nested structures"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=MongoJSONEncoder, separators=(",", ":"))
+    return value
+
+async def _export_chunks(
+    log_iterator: AsyncIterator[Dict[str, Any]],
+    format: str,
+    export_metadata: Dict[str, Any],
+    chunk_records: int
+) -> AsyncIterator[bytes]:
+    """Serialize streamed audit logs into NDJSON, CSV or JSON text chunks"""
+    buffer = io.StringIO()
+    buffered = 0
+    record_count = 0
+    last_cursor = None
+    
+    if format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+    elif format == "json":
+        buffer.write('{"metadata": ')
+        buffer.write(json.dumps(export_metadata, cls=MongoJSONEncoder))
+        buffer.write(', "audit_logs": [')
+    
+    async for log in log_iterator:
+        if format == "csv":
+            writer.writerow({column: _csv_value(log.get(column)) for column in EXPORT_CSV_COLUMNS})
+        elif format == "ndjson":
+            buffer.write(json.dumps(log, cls=MongoJSONEncoder))
+            buffer.write("\n")
+        else:
+            if record_count:
+                buffer.write(",")
+            buffer.write(json.dumps(log, cls=MongoJSONEncoder))
+        
+        record_count += 1
+        buffered += 1
+        last_cursor = f"{log.get('timestamp')},{log.get('_id')}"
+        
+        if buffered >= chunk_records:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            buffered = 0
+    
+    if format == "json":
+        summary = {"record_count": record_count, "resume_after": last_cursor}
+        buffer.write('], "export_summary": ')
+        buffer.write(json.dumps(summary))
+        buffer.write("}")
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+    
+    logger.info(f"Audit log export {export_metadata['export_id']} completed - Records: {record_count}, Last cursor: {last_cursor}")
+
+async def _gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip-compress a byte stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
 @router.get("/export", summary="Export Audit Logs")
 @api_endpoint_timing("hash_audit_export")
 async def export_audit_logs(
     start_date: Optional[datetime] = Query(None, description="Export start date"),
     end_date: Optional[datetime] = Query(None, description="Export end date"),
-    format: str = Query("json", description="Export format: json, csv"),
+    format: str = Query("json", description="Export format: json, ndjson, csv"),
     operation_types: Optional[str] = Query(None, description="Filter by operation types"),
-    max_records: int = Query(10000, ge=1, le=100000, description="Maximum records to export"),
+    max_records: Optional[int] = Query(None, ge=1, description="Maximum records to export (unlimited when omitted)"),
+    resume_after: Optional[str] = Query(None, description="Resume cursor '<timestamp>,<_id>' of the last record already received"),
+    compress: bool = Query(False, description="Gzip-compress the export stream"),
+    batch_size: int = Query(1000, ge=100, le=10000, description="MongoDB cursor batch size"),
     request: Request = None,
     current_user: Dict[str, Any] = Depends(require_auth())
 ):
-    """Export audit logs in various formats for compliance and analysis"""
+    """Stream audit logs for compliance and analysis.
+    
+    Records are read from a MongoDB cursor in chronological ``(timestamp, _id)`` order and
+    written out in chunks, so memory stays constant regardless of export size. Pass the
+    ``timestamp`` and ``_id`` of the last received record as ``resume_after`` to continue
+    an interrupted export.
+    """
     try:
         request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
         
@@ -536,8 +650,8 @@ async def export_audit_logs(
             )
         
         # Validate format
-        if format not in ["json", "csv"]:
-            raise HTTPException(status_code=400, detail="Invalid format. Must be 'json' or 'csv'")
+        if format not in EXPORT_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="Invalid format. Must be 'json', 'ndjson' or 'csv'")
         
         # Parse operation types
         parsed_operation_types = None
@@ -547,20 +661,11 @@ async def export_audit_logs(
             except ValueError as e:
                 raise HTTPException(status_code=400, detail=f"Invalid operation type: {e}")
         
-        # Get audit logs for export
-        result = await hash_audit_service.get_audit_logs(
-            start_date=start_date,
-            end_date=end_date,
-            operation_types=parsed_operation_types,
-            limit=max_records,
-            offset=0,
-            sort_by="timestamp",
-            sort_order=1  # Chronological order for export
-        )
+        parsed_resume_after = _parse_resume_after(resume_after)
         
-        # Add export metadata
+        export_id = str(uuid.uuid4())
         export_metadata = {
-            "export_id": str(uuid.uuid4()),
+            "export_id": export_id,
             "exported_by": current_user.get("user_id"),
             "exported_at": datetime.utcnow().isoformat() + "Z",
             "request_id": request_id,
@@ -569,32 +674,42 @@ async def export_audit_logs(
                 "end_date": end_date.isoformat() + "Z" if end_date else None,
                 "format": format,
                 "operation_types": operation_types,
-                "max_records": max_records
-            },
-            "record_count": result["returned_count"],
-            "total_available": result["total_count"],
-            "truncated": result["total_count"] > max_records
+                "max_records": max_records,
+                "resume_after": resume_after,
+                "compress": compress
+            }
         }
         
-        # Format response based on requested format
-        if format == "json":
-            response_data = {
-                "metadata": export_metadata,
-                "audit_logs": result["logs"]
-            }
-        else:  # CSV format - simplified for now, could be enhanced
-            response_data = {
-                "metadata": export_metadata,
-                "message": "CSV export format would be implemented with proper CSV serialization",
-                "audit_logs": result["logs"]  # In real implementation, convert to CSV
-            }
+        log_iterator = hash_audit_service.iter_audit_logs(
+            start_date=start_date,
+            end_date=end_date,
+            operation_types=parsed_operation_types,
+            resume_after=parsed_resume_after,
+            max_records=max_records,
+            batch_size=batch_size
+        )
+        body = _export_chunks(log_iterator, format, export_metadata, chunk_records=batch_size)
+        
+        extension = format
+        media_type = EXPORT_MEDIA_TYPES[format]
+        headers = {
+            "X-Export-ID": export_id,
+            "X-Request-ID": request_id
+        }
+        if compress:
+            # A .gz file download, not Content-Encoding: clients would
+            # transparently decompress it and save plaintext under .gz
+            body = _gzip_chunks(body)
+            extension = f"{format}.gz"
+            media_type = "application/gzip"
+        headers["Content-Disposition"] = f'attachment; filename="hash_audit_export_{export_id}.{extension}"'
         
-        logger.info(f"Audit logs exported - Request: {request_id}, Format: {format}, Records: {result['returned_count']}, User: {current_user.get('user_id')}")
+        logger.info(f"Audit log export started - Request: {request_id}, Export: {export_id}, Format: {format}, Compressed: {compress}, User: {current_user.get('user_id')}")
         
-        return response_data
+        return StreamingResponse(body, media_type=media_type, headers=headers)
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Failed to export audit logs: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to export audit logs: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to export audit logs: {str(e)}")
@@ -6,6 +6,7 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from bson import ObjectId
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from app.services.auth import require_auth
 from app.services.audit_logger import audit_logger
 from app.utils.json_encoder import serialize_mongodb_response
@@ -177,7 +178,7 @@ async def route_to_medical_history(data: KatiDataRequest, patient_id: str):
             collection_name = "temprature_data_histories"
         
         if collection_name:
-            collection = mongodb_service.get_collection(collection_name)
+            collection = vital_history_store.get_collection(collection_name)
             
             # Create history entry
             history_entry = {
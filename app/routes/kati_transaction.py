@@ -11,6 +11,7 @@ from bson import ObjectId
 import json
 
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from app.utils.error_definitions import create_success_response, create_error_response, SuccessResponse, ErrorResponse
 from app.utils.structured_logging import get_structured_logger
 
@@ -124,7 +125,7 @@ async def get_kati_transactions(
         start_time = end_time - timedelta(hours=hours)
         
         # Get Kati Watch data from medical_data collection
-        medical_data_collection = mongodb_service.main_db.medical_data
+        medical_data_collection = vital_history_store.get_collection("medical_data")
         
         # Get Kati Watch transactions
         kati_cursor = medical_data_collection.find({
@@ -416,7 +417,7 @@ async def get_kati_transaction_stats(request: Request):
         one_day_ago = now - timedelta(days=1)
         one_week_ago = now - timedelta(days=7)
         
-        medical_data_collection = mongodb_service.main_db.medical_data
+        medical_data_collection = vital_history_store.get_collection("medical_data")
         emergency_collection = mongodb_service.main_db.emergency_alarm
         
         # Get transaction counts for different periods
@@ -562,7 +563,7 @@ async def get_kati_topic_distribution(
         end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(hours=hours)
         
-        medical_data_collection = mongodb_service.main_db.medical_data
+        medical_data_collection = vital_history_store.get_collection("medical_data")
         emergency_collection = mongodb_service.main_db.emergency_alarm
         
         # Get all Kati transactions in the time range
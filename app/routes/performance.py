@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Any
+import json
+from datetime import datetime
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from typing import Dict, Any, Optional
 from app.services.auth import require_auth
 from app.services.cache_service import cache_service
 from app.services.index_manager import index_manager
 from app.services.mongo import mongodb_service
+from app.services.pipeline_tracing import pipeline_tracer
+from app.services.retention import retention_manager
+from app.middleware.lazy_routers import optional_routers
+from app.utils.json_encoder import serialize_mongodb_response
 from app.utils.error_definitions import create_success_response
 from config import logger
 
@@ -196,4 +202,137 @@ async def get_database_statistics(
         
     except Exception as e:
         logger.error(f"Failed to get database stats: {e}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/connection-pools", response_model=Dict[str, Any])
+async def get_connection_pool_metrics(
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get MongoDB connection pool utilization for this worker"""
+    try:
+        return create_success_response(
+            message="Connection pool metrics retrieved",
+            data={
+                "mongodb": mongodb_service.pool_metrics(),
+                "read_routing": mongodb_service.read_routing_status()
+            }
+        ).dict()
+        
+    except Exception as e:
+        logger.error(f"Failed to get connection pool metrics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/routers", response_model=Dict[str, Any])
+async def get_optional_routers(
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get which optional router groups are enabled and mounted in this worker"""
+    try:
+        return create_success_response(
+            message="Optional router groups retrieved",
+            data=optional_routers.status()
+        ).dict()
+        
+    except Exception as e:
+        logger.error(f"Failed to get optional router groups: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/pipeline-traces", response_model=Dict[str, Any])
+async def get_pipeline_traces(
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get per-stage latency histograms of the device data pipeline"""
+    try:
+        return create_success_response(
+            message="Pipeline trace histograms retrieved",
+            data=pipeline_tracer.snapshot()
+        ).dict()
+        
+    except Exception as e:
+        logger.error(f"Failed to get pipeline traces: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/pipeline-traces", response_model=Dict[str, Any], status_code=202)
+async def ingest_pipeline_traces(
+    batch: Dict[str, Any] = Body(...),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Merge a batch of stage histograms exported by an MQTT listener"""
+    try:
+        merged = pipeline_tracer.ingest(batch)
+        
+        return create_success_response(
+            message=f"Merged {merged} stage histograms",
+            data={"merged": merged}
+        ).dict()
+        
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid trace batch: {e}")
+    except Exception as e:
+        logger.error(f"Failed to ingest pipeline traces: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/retention", response_model=Dict[str, Any])
+async def get_retention_status(
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get retention policies and the last archiver run per collection"""
+    try:
+        return create_success_response(
+            message="Retention status retrieved",
+            data=retention_manager.status()
+        ).dict()
+        
+    except Exception as e:
+        logger.error(f"Failed to get retention status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/retention/run", response_model=Dict[str, Any])
+async def run_retention(
+    collection: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Archive aged documents now (one collection, or every policy with an archive horizon)"""
+    try:
+        if collection:
+            results = [await retention_manager.archive_collection(collection)]
+        else:
+            results = await retention_manager.run_once()
+        
+        return create_success_response(
+            message="Retention run completed",
+            data={"results": results}
+        ).dict()
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Retention run failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/retention/archives/{collection}", response_model=Dict[str, Any])
+async def query_archived_documents(
+    collection: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    filter: Optional[str] = Query(None, description="JSON filter, e.g. {\"user_id\": \"u1\", \"status\": {\"$in\": [\"failure\"]}}"),
+    limit: int = Query(100, ge=1, le=10000),
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Read archived documents of a collection (for audits)"""
+    try:
+        query = json.loads(filter) if filter else None
+        if query is not None and not isinstance(query, dict):
+            raise ValueError("filter must be a JSON object")
+        documents = await retention_manager.query_archive(collection, start, end, query, limit)
+        
+        return create_success_response(
+            message=f"Retrieved {len(documents)} archived {collection} documents",
+            data={"documents": serialize_mongodb_response(documents), "count": len(documents)}
+        ).dict()
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive query: {e}")
+    except Exception as e:
+        logger.error(f"Failed to query archives of {collection}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
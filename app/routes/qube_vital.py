@@ -6,13 +6,15 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from app.services.auth import require_auth
 from app.services.audit_logger import audit_logger
-from app.utils.json_encoder import serialize_mongodb_response
+from app.services.device_ingestion_queue import device_ingestion_queue, IngestionSteps
+from app.utils.json_encoder import serialize_mongodb_response, MongoJSONResponse
 from app.utils.error_definitions import create_error_response, create_success_response
 from config import settings, logger
 
-router = APIRouter(prefix="/api/qube-vital", tags=["qube-vital"])
+router = APIRouter(prefix="/api/qube-vital", tags=["qube-vital"], default_response_class=MongoJSONResponse)
 
 class QubeVitalDataRequest(BaseModel):
     timestamp: datetime
@@ -100,6 +102,9 @@ async def receive_qube_vital_data(
     try:
         request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
         
+        if device_ingestion_queue.enabled:
+            return await device_ingestion_queue.accept_response("qube-vital", data.dict(), request, current_user, request_id)
+        
         # Validate device exists
         collection = mongodb_service.get_collection("mfc_hv01_boxes")
         device = await collection.find_one({"imei_of_hv01_box": data.device_id})
@@ -132,78 +137,12 @@ async def receive_qube_vital_data(
                 ).dict()
             )
         
-        # Create observation document
-        observation = {
-            "resourceType": "Observation",
-            "status": "final",
-            "category": [
-                {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/observation-category",
-                            "code": "vital-signs",
-                            "display": "Vital Signs"
-                        }
-                    ]
-                }
-            ],
-            "code": {
-                "coding": [
-                    {
-                        "system": "https://my-firstcare.com/observations",
-                        "code": data.type,
-                        "display": data.type
-                    }
-                ]
-            },
-            "subject": {
-                "reference": f"Organization/{hospital.get('_id')}"
-            },
-            "effectiveDateTime": data.timestamp.isoformat() + "Z",
-            "issued": datetime.utcnow().isoformat() + "Z",
-            "valueQuantity": {
-                "value": data.data.get("value"),
-                "unit": data.data.get("unit", ""),
-                "system": "http://unitsofmeasure.org",
-                "code": data.data.get("unit_code", "")
-            },
-            "device": {
-                "reference": f"Device/{data.device_id}"
-            },
-            "meta": {
-                "source": "https://opera.my-firstcare.com",
-                "profile": ["http://hl7.org/fhir/StructureDefinition/Observation"]
-            }
-        }
-        
-        # Save observation
-        obs_collection = mongodb_service.get_fhir_collection("fhir_observations")
-        result = await obs_collection.insert_one(observation)
-        observation_id = str(result.inserted_id)
-        
-        # Route to appropriate medical history collection
-        await route_to_medical_history(data, hospital.get("_id"))
-        
-        # Log audit trail
-        username = current_user.get("username", "unknown")
-        await audit_logger.log_device_data_received(
-            device_id=data.device_id,
-            device_type="Qube-Vital",
-            data_type=data.type,
-            observation_id=observation_id,
-            user_id=username
-        )
+        result = await process_qube_vital_data(data, hospital, current_user.get("username", "unknown"))
         
         # Create success response
         success_response = create_success_response(
             message="Qube-Vital data received successfully",
-            data={
-                "observation_id": observation_id,
-                "device_id": data.device_id,
-                "data_type": data.type,
-                "timestamp": data.timestamp.isoformat(),
-                "hospital_id": str(hospital.get("_id"))
-            },
+            data=result,
             request_id=request_id
         )
         return success_response.dict()
@@ -220,6 +159,110 @@ async def receive_qube_vital_data(
             ).dict()
         )
 
+@router.get("/data/status/{idempotency_key}")
+async def get_qube_vital_data_status(
+    idempotency_key: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(require_auth())
+):
+    """Get the processing status of a fast-ack Qube-Vital data submission"""
+    return await device_ingestion_queue.status_response(idempotency_key, request)
+
+async def process_qube_vital_data(
+    data: QubeVitalDataRequest,
+    hospital: Dict[str, Any],
+    username: str,
+    steps: Optional[IngestionSteps] = None
+) -> Dict[str, Any]:
+    """Store a Qube-Vital reading: raw observation, medical history and audit log.
+
+    Queued jobs pass their ``steps`` so a retry skips the writes already done.
+    """
+    steps = steps or IngestionSteps()
+    # Create observation document
+    observation = {
+        "resourceType": "Observation",
+        "status": "final",
+        "category": [
+            {
+                "coding": [
+                    {
+                        "system": "http://terminology.hl7.org/CodeSystem/observation-category",
+                        "code": "vital-signs",
+                        "display": "Vital Signs"
+                    }
+                ]
+            }
+        ],
+        "code": {
+            "coding": [
+                {
+                    "system": "https://my-firstcare.com/observations",
+                    "code": data.type,
+                    "display": data.type
+                }
+            ]
+        },
+        "subject": {
+            "reference": f"Organization/{hospital.get('_id')}"
+        },
+        "effectiveDateTime": data.timestamp.isoformat() + "Z",
+        "issued": datetime.utcnow().isoformat() + "Z",
+        "valueQuantity": {
+            "value": data.data.get("value"),
+            "unit": data.data.get("unit", ""),
+            "system": "http://unitsofmeasure.org",
+            "code": data.data.get("unit_code", "")
+        },
+        "device": {
+            "reference": f"Device/{data.device_id}"
+        },
+        "meta": {
+            "source": "https://opera.my-firstcare.com",
+            "profile": ["http://hl7.org/fhir/StructureDefinition/Observation"]
+        }
+    }
+    
+    # Save observation
+    async def save_observation():
+        obs_collection = mongodb_service.get_fhir_collection("fhir_observations")
+        result = await obs_collection.insert_one(observation)
+        return str(result.inserted_id)
+    observation_id = await steps.run("observation", save_observation)
+    
+    # Route to appropriate medical history collection
+    await steps.run("medical_history", lambda: route_to_medical_history(data, hospital.get("_id")))
+    
+    # Log audit trail
+    await steps.run("audit", lambda: audit_logger.log_device_data_received(
+        device_id=data.device_id,
+        device_type="Qube-Vital",
+        data_type=data.type,
+        observation_id=observation_id,
+        user_id=username
+    ))
+    
+    return {
+        "observation_id": observation_id,
+        "device_id": data.device_id,
+        "data_type": data.type,
+        "timestamp": data.timestamp.isoformat(),
+        "hospital_id": str(hospital.get("_id"))
+    }
+
+async def _process_queued_qube_vital_data(payload: Dict[str, Any], username: Optional[str], steps: IngestionSteps) -> Dict[str, Any]:
+    """Background worker handler for fast-ack Qube-Vital submissions"""
+    data = QubeVitalDataRequest(**payload)
+    device = await mongodb_service.get_collection("mfc_hv01_boxes").find_one({"imei_of_hv01_box": data.device_id})
+    if not device:
+        raise LookupError(f"Qube-Vital device with IMEI '{data.device_id}' not found")
+    hospital = await mongodb_service.get_collection("hospitals").find_one({"_id": device.get("hospital_id")})
+    if not hospital:
+        raise LookupError(f"Hospital not found for device '{data.device_id}'")
+    return await process_qube_vital_data(data, hospital, username or "unknown", steps)
+
+device_ingestion_queue.register_handler("qube-vital", _process_queued_qube_vital_data)
+
 async def route_to_medical_history(data: QubeVitalDataRequest, hospital_id: str):
     """Route data to appropriate medical history collection"""
     try:
@@ -236,7 +279,7 @@ async def route_to_medical_history(data: QubeVitalDataRequest, hospital_id: str)
             collection_name = "temprature_data_histories"
         
         if collection_name:
-            collection = mongodb_service.get_collection(collection_name)
+            collection = vital_history_store.get_collection(collection_name)
             
             # Create history entry
             history_entry = {
@@ -5,11 +5,16 @@ from pydantic import BaseModel
 
 from app.services.reporting_engine import reporting_engine, ReportType, ReportFormat, ReportFrequency
 from app.services.auth import get_current_user
+from app.services.connection_factory import read_workload_dependency
 from app.models.base import SuccessResponse
 from app.utils.error_definitions import ErrorCode, ErrorResponse, create_error_response, create_success_response
 from app.utils.structured_logging import get_logger
 
-router = APIRouter(prefix="/admin/reports", tags=["reports"])
+router = APIRouter(
+    prefix="/admin/reports",
+    tags=["reports"],
+    dependencies=[Depends(read_workload_dependency("reporting"))]
+)
 logger = get_logger(__name__)
 
 # Pydantic models for request/response
@@ -6,12 +6,17 @@ from bson import ObjectId
 from app.services.analytics import healthcare_analytics as analytics_service
 from app.services.auth import get_current_user
 from app.services.cache_service import cache_service, cache_result
+from app.services.connection_factory import read_workload_dependency
 from app.models.base import SuccessResponse
 from app.utils.error_definitions import ErrorResponse
 from app.utils.error_definitions import ErrorCode, create_error_response
 from app.utils.structured_logging import get_logger
 
-router = APIRouter(prefix="/visualization", tags=["visualization"])
+router = APIRouter(
+    prefix="/visualization",
+    tags=["visualization"],
+    dependencies=[Depends(read_workload_dependency("visualization"))]
+)
 logger = get_logger(__name__)
 
 # Chart type configurations
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+FHIR Search Field Backfill
+==========================
+Populate the denormalized search fields (code/category tokens, subject
+reference, meta.lastUpdated, meta.source) on FHIR resources written before
+they were extracted at write time, so token searches hit the compound indexes,
+and optionally rebuild the Observation $lastn latest-value index.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mongo import mongodb_service
+from app.services.fhir_r5_service import fhir_service
+from app.services.observation_lastn import observation_lastn_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+async def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill denormalized FHIR search fields")
+    parser.add_argument("--resource-types", nargs="+", default=["Observation"], help="FHIR resource types to backfill")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    parser.add_argument("--force", action="store_true", help="Recompute fields on every document")
+    parser.add_argument("--rebuild-lastn", action="store_true", help="Rebuild the Observation $lastn index afterwards")
+    parser.add_argument("--patients", nargs="+", help="Limit the $lastn rebuild to these patient IDs")
+
+    args = parser.parse_args()
+
+    try:
+        await mongodb_service.connect()
+        for resource_type in args.resource_types:
+            result = await fhir_service.backfill_search_index_fields(
+                resource_type, batch_size=args.batch_size, force=args.force
+            )
+            logger.info(f"✅ {resource_type}: {result['updated_count']:,} documents backfilled")
+        if args.rebuild_lastn:
+            result = await observation_lastn_service.rebuild(patient_ids=args.patients, batch_size=args.batch_size)
+            logger.info(f"✅ $lastn index: {result['entries_written']:,} entries rebuilt")
+    except Exception as e:
+        logger.error(f"❌ Backfill failed: {e}")
+        sys.exit(1)
+    finally:
+        await mongodb_service.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Patient Search Token Backfill
+=============================
+Populate ``search_tokens`` on patients written before the field existed (or
+by services that do not maintain it, such as the Qube-Vital listener) so the
+admin patient search hits the ``patient_search_tokens_idx`` index.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mongo import mongodb_service
+from app.services.patient_search import backfill_search_tokens
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+async def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill patient search tokens")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    parser.add_argument("--force", action="store_true", help="Recompute tokens on every patient")
+
+    args = parser.parse_args()
+
+    try:
+        await mongodb_service.connect()
+        result = await backfill_search_tokens(batch_size=args.batch_size, force=args.force)
+        logger.info(f"✅ Patients: {result['updated_count']:,} of {result['scanned_count']:,} documents backfilled")
+    except Exception as e:
+        logger.error(f"❌ Backfill failed: {e}")
+        sys.exit(1)
+    finally:
+        await mongodb_service.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
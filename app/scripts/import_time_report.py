@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Import Time Report
+==================
+Digest of ``python -X importtime`` for the API entry point (or any other
+module): the slowest imports by cumulative and self time, and the total
+per top-level package, so it is visible what the API pays for before the
+lifespan starts.
+
+The import runs in a fresh interpreter in the project root, with the
+current environment (set ``LAZY_ROUTERS`` / ``OPTIONAL_ROUTERS`` to
+compare deployments). ``--budget-ms`` makes the script exit with status 1
+when the total import time is over budget, for use in CI.
+
+Usage:
+    python app/scripts/import_time_report.py
+    python app/scripts/import_time_report.py --top 40 --budget-ms 4000
+    LAZY_ROUTERS=false python app/scripts/import_time_report.py --json
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, Any, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+START_MARKER = "-- import_time_report start --"
+
+def parse_import_times(stderr: str) -> List[Dict[str, Any]]:
+    """Entries of ``-X importtime`` output: module, self/cumulative microseconds, depth
+
+    Imports logged before ``START_MARKER`` (interpreter startup) are skipped.
+    """
+    lines = stderr.splitlines()
+    if START_MARKER in lines:
+        lines = lines[lines.index(START_MARKER) + 1:]
+    entries = []
+    for line in lines:
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(indent) - 1) // 2
+            })
+    return entries
+
+def measure(module: str, top: int = 25, python: str = sys.executable) -> Dict[str, Any]:
+    """Import ``module`` under ``-X importtime`` in a fresh interpreter"""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c",
+         f"import sys; sys.stderr.write({START_MARKER!r} + '\\n'); sys.stderr.flush(); import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines()
+                  if not line.startswith("import time:") and line != START_MARKER]
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(errors[-20:]))
+    return summarize(parse_import_times(result.stderr), top=top)
+
+def summarize(entries: List[Dict[str, Any]], top: int = 25) -> Dict[str, Any]:
+    """Totals, slowest imports and per-package self time"""
+    packages = defaultdict(lambda: {"self_us": 0, "modules": 0})
+    for entry in entries:
+        package = packages[entry["module"].split(".")[0]]
+        package["self_us"] += entry["self_us"]
+        package["modules"] += 1
+
+    return {
+        "total_ms": round(sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0) / 1000, 1),
+        "modules": len(entries),
+        "by_cumulative": sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top],
+        "by_self": sorted(entries, key=lambda e: e["self_us"], reverse=True)[:top],
+        "by_package": sorted(
+            ({"package": name, **totals} for name, totals in packages.items()),
+            key=lambda p: p["self_us"], reverse=True
+        )[:top]
+    }
+
+def print_report(module: str, report: Dict[str, Any]):
+    print(f"import {module}: {report['total_ms']:,.1f} ms over {report['modules']:,} modules\n")
+
+    print("Slowest imports (cumulative, includes what they import):")
+    for entry in report["by_cumulative"]:
+        print(f"  {entry['cumulative_us'] / 1000:9.1f} ms  {entry['module']}")
+
+    print("\nSlowest imports (self):")
+    for entry in report["by_self"]:
+        print(f"  {entry['self_us'] / 1000:9.1f} ms  {entry['module']}")
+
+    print("\nSelf time per top-level package:")
+    for package in report["by_package"]:
+        print(f"  {package['self_us'] / 1000:9.1f} ms  {package['package']} ({package['modules']} modules)")
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize python -X importtime for the API")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=25, help="Rows per table")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--budget-ms", type=float, help="Exit with status 1 when the import takes longer")
+
+    args = parser.parse_args()
+
+    try:
+        report = measure(args.module, top=args.top)
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(2)
+
+    if args.json:
+        print(json.dumps({"module": args.module, **report}, indent=2))
+    else:
+        print_report(args.module, report)
+
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"\n❌ import {args.module} took {report['total_ms']:,.1f} ms, budget {args.budget_ms:,.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
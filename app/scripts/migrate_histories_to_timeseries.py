@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Vital History Time-Series Migration
+===================================
+Copy the device vital history collections (``blood_pressure_histories``,
+``spo2_histories``, ..., ``medical_data``) into their time-series
+companions (``<name>_ts``) used when ``VITAL_TIMESERIES_ENABLED`` is on.
+
+Progress is kept per collection in ``timeseries_migrations`` (last copied
+``_id``), so the script can be stopped and re-run; a run after switching
+the mode on picks up whatever the legacy collections received in between.
+The legacy collections are not modified.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store, TIMESERIES_COLLECTIONS
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+async def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate vital histories to time-series collections")
+    parser.add_argument("--collection", action="append", choices=sorted(TIMESERIES_COLLECTIONS),
+                        help="Collection to migrate (repeatable; default: all)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per insert")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and copy from the beginning")
+
+    args = parser.parse_args()
+
+    failed = False
+    try:
+        await mongodb_service.connect()
+        for collection_name in args.collection or list(TIMESERIES_COLLECTIONS):
+            try:
+                result = await vital_history_store.migrate_collection(
+                    collection_name, batch_size=args.batch_size, restart=args.restart
+                )
+                logger.info(
+                    f"✅ {result['collection']} -> {result['target']}: {result['copied']:,} copied "
+                    f"(source ~{result['source_count']:,}, target ~{result['target_count']:,})"
+                )
+            except Exception as e:
+                failed = True
+                logger.error(f"❌ Migration of {collection_name} failed: {e}")
+    finally:
+        await mongodb_service.disconnect()
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
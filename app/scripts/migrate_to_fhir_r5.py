@@ -10,17 +10,25 @@ This script migrates:
 - Devices to FHIR Device resources
 - Hospitals to FHIR Organization resources
 - Medical conditions to FHIR Condition resources
+
+Medical history collections are migrated by a resumable engine that pages by
+_id, checkpoints progress per collection and writes with bulk upserts.
+Use --legacy for the original per-document migration.
 """
 
+import argparse
 import asyncio
 import sys
 import os
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Tuple
 from enum import Enum
 from dataclasses import dataclass
 from bson import ObjectId
+from pymongo import UpdateOne
 import socket
 import re
 
@@ -28,12 +36,24 @@ import re
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.mongo import mongodb_service
-from app.services.fhir_r5_service import FHIRR5Service
+from app.services.vital_timeseries import vital_history_store
+from app.services.fhir_r5_service import FHIRR5Service, fhir_service
 from app.utils.structured_logging import get_logger
 from config import settings
 
 logger = get_logger(__name__)
 
+# Medical history collections migrated to FHIR Observations
+HISTORY_COLLECTIONS = [
+    {"name": "blood_pressure_histories", "loinc_code": "85354-9", "display": "Blood pressure panel"},
+    {"name": "blood_sugar_histories", "loinc_code": "33747-0", "display": "Glucose measurement"},
+    {"name": "temprature_data_histories", "loinc_code": "8310-5", "display": "Body temperature"},
+    {"name": "spo2_histories", "loinc_code": "59408-5", "display": "Oxygen saturation"},
+    {"name": "body_data_histories", "loinc_code": "29463-7", "display": "Body weight"},
+    {"name": "creatinine_histories", "loinc_code": "2160-0", "display": "Creatinine"},
+    {"name": "lipid_histories", "loinc_code": "2093-3", "display": "Cholesterol"}
+]
+
 class FHIRMigrationService:
     """Service for migrating existing data to FHIR R5"""
     
@@ -784,15 +804,7 @@ class FHIRMigrationService:
         logger.info("📊 Migrating medical history to FHIR R5 Observations...")
         
         # Medical history collections to migrate
-        history_collections = [
-            {"name": "blood_pressure_histories", "loinc_code": "85354-9", "display": "Blood pressure panel"},
-            {"name": "blood_sugar_histories", "loinc_code": "33747-0", "display": "Glucose measurement"},
-            {"name": "temprature_data_histories", "loinc_code": "8310-5", "display": "Body temperature"},
-            {"name": "spo2_histories", "loinc_code": "59408-5", "display": "Oxygen saturation"},
-            {"name": "body_data_histories", "loinc_code": "29463-7", "display": "Body weight"},
-            {"name": "creatinine_histories", "loinc_code": "2160-0", "display": "Creatinine"},
-            {"name": "lipid_histories", "loinc_code": "2093-3", "display": "Cholesterol"}
-        ]
+        history_collections = HISTORY_COLLECTIONS
         
         try:
             for collection_info in history_collections:
@@ -800,7 +812,7 @@ class FHIRMigrationService:
                 logger.info(f"Migrating {collection_name}...")
                 
                 try:
-                    collection = mongodb_service.get_collection(collection_name)
+                    collection = vital_history_store.get_collection(collection_name)
                     
                     # Check if we have permission to access this collection
                     try:
@@ -884,6 +896,34 @@ class FHIRMigrationService:
         batch_id = f"obs-migration-{obs_id}"
         audit_context = self._create_audit_context(batch_id)
         
+        observation_resource = self.build_observation_resource(record, collection_info, obs_id)
+        
+        # Debug logging for blood pressure data structure
+        if "blood_pressure" in collection_info["name"]:
+            logger.info(f"🩺 DEBUG - Blood pressure data entry: {record.get('data')}")
+        
+        # Create FHIR Observation with audit context
+        result = await fhir_service.create_fhir_resource(
+            "Observation", 
+            observation_resource,
+            source_system="migration",
+            user_id=self.migration_user_id,
+            request_id=str(uuid.uuid4()),
+            session_id=audit_context["session_id"],
+            batch_id=audit_context["batch_id"],
+            source_ip=audit_context["source_ip"],
+            user_agent=audit_context["user_agent"]
+        )
+        
+        return obs_id
+    
+    @staticmethod
+    def build_observation_resource(
+        record: Dict[str, Any],
+        collection_info: Dict[str, str],
+        obs_id: str
+    ) -> Dict[str, Any]:
+        """Build a FHIR Observation from a medical history record (no I/O, safe for worker processes)"""
         # Extract data from the record
         data_list = record.get("data", [])
         if not data_list:
@@ -893,7 +933,7 @@ class FHIRMigrationService:
         data_entry = data_list[0] if isinstance(data_list, list) else data_list
         
         # Determine if this is a vital sign based on collection name and LOINC code
-        is_vital_sign = self._is_vital_sign_observation(collection_info["name"], collection_info["loinc_code"])
+        is_vital_sign = FHIRMigrationService._is_vital_sign_observation(collection_info["name"], collection_info["loinc_code"])
         
         # Build basic observation
         observation_resource = {
@@ -914,7 +954,7 @@ class FHIRMigrationService:
                     "display": collection_info["display"]
                 }]
             },
-            "effectiveDateTime": self._extract_datetime(data_entry).isoformat() + "Z",
+            "effectiveDateTime": FHIRMigrationService._extract_datetime(data_entry).isoformat() + "Z",
             "issued": datetime.utcnow().isoformat() + "Z"
         }
         
@@ -935,29 +975,13 @@ class FHIRMigrationService:
                 "reference": f"Patient/{patient_id}"
             }
         
-        # Debug logging for blood pressure data structure
-        if "blood_pressure" in collection_info["name"]:
-            logger.info(f"🩺 DEBUG - Blood pressure data entry: {data_entry}")
-        
         # Add value based on collection type
-        self._add_observation_value(observation_resource, data_entry, collection_info["name"])
-        
-        # Create FHIR Observation with audit context
-        result = await fhir_service.create_fhir_resource(
-            "Observation", 
-            observation_resource,
-            source_system="migration",
-            user_id=self.migration_user_id,
-            request_id=str(uuid.uuid4()),
-            session_id=audit_context["session_id"],
-            batch_id=audit_context["batch_id"],
-            source_ip=audit_context["source_ip"],
-            user_agent=audit_context["user_agent"]
-        )
+        FHIRMigrationService._add_observation_value(observation_resource, data_entry, collection_info["name"])
         
-        return obs_id
+        return observation_resource
     
-    def _is_vital_sign_observation(self, collection_name: str, loinc_code: str) -> bool:
+    @staticmethod
+    def _is_vital_sign_observation(collection_name: str, loinc_code: str) -> bool:
         """Determine if this observation should be categorized as vital signs"""
         # Define vital signs collections and LOINC codes
         vital_signs_collections = [
@@ -980,7 +1004,8 @@ class FHIRMigrationService:
         return (collection_name in vital_signs_collections or 
                 loinc_code in vital_signs_loinc_codes)
 
-    def _extract_datetime(self, data_entry: Dict[str, Any]) -> datetime:
+    @staticmethod
+    def _extract_datetime(data_entry: Dict[str, Any]) -> datetime:
         """Extract datetime from medical history data entry"""
         # Try various datetime fields
         datetime_fields = [
@@ -1002,8 +1027,8 @@ class FHIRMigrationService:
         # Default to current time if no datetime found
         return datetime.utcnow()
 
+    @staticmethod
     def _add_observation_value(
-        self, 
         observation: Dict[str, Any], 
         data_entry: Dict[str, Any], 
         collection_name: str
@@ -1216,11 +1241,282 @@ class FHIRMigrationService:
         logger.info(f"{'TOTAL':15} | {total_migrated:5}/{total_records:5} ({overall_success:5.1f}%) | Errors: {total_errors}")
         logger.info("="*60)
 
+# Namespace for deterministic Observation IDs, so re-running a batch upserts instead of duplicating
+MIGRATION_ID_NAMESPACE = uuid.UUID("6f1c3d52-8f0e-4b7a-9d4a-2c5e7b1f0a93")
+
+def _observation_id(collection_name: str, source_id: Any) -> str:
+    """Deterministic Observation ID for a history record"""
+    return str(uuid.uuid5(MIGRATION_ID_NAMESPACE, f"{collection_name}:{source_id}"))
+
+def _convert_history_batch(
+    records: List[Dict[str, Any]],
+    collection_info: Dict[str, str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Convert a batch of history records to Observations (runs in a worker process)"""
+    resources = []
+    errors = []
+    for record in records:
+        try:
+            obs_id = _observation_id(collection_info["name"], record.get("_id"))
+            resources.append(FHIRMigrationService.build_observation_resource(record, collection_info, obs_id))
+        except Exception as e:
+            errors.append({"source_id": str(record.get("_id")), "error": str(e)})
+    return resources, errors
+
+class IncrementalMigrationEngine:
+    """Resumable, bulk-writing migration of medical history collections to FHIR Observations.
+    
+    Each collection is paged by ``_id`` ranges (no ``skip``), batches are converted in a
+    process pool and written with one unordered upsert ``bulk_write``. The last migrated
+    ``_id`` is checkpointed per collection after every batch, so a restarted run continues
+    where it stopped. Records that fail to convert or write are kept in
+    ``fhir_migration_failures`` and retried at the start of the next run, and resources
+    already stored with a blockchain hash are not hashed again. Several collections are
+    migrated concurrently.
+    """
+    
+    def __init__(
+        self,
+        migration_service: FHIRMigrationService,
+        batch_size: int = 500,
+        max_workers: int = 4,
+        max_concurrent_collections: int = 3
+    ):
+        self.migration_service = migration_service
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_concurrent_collections = max_concurrent_collections
+        self.checkpoint_collection = "fhir_migration_checkpoints"
+        self.failure_collection = "fhir_migration_failures"
+        self.progress: Dict[str, Dict[str, Any]] = {}
+    
+    async def _load_checkpoint(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        checkpoints = mongodb_service.get_fhir_collection(self.checkpoint_collection)
+        return await checkpoints.find_one({"_id": collection_name})
+    
+    async def _save_checkpoint(self, collection_name: str, **fields):
+        checkpoints = mongodb_service.get_fhir_collection(self.checkpoint_collection)
+        await checkpoints.update_one(
+            {"_id": collection_name},
+            {"$set": {**fields, "updated_at": datetime.utcnow(), "session_id": self.migration_service.migration_session_id}},
+            upsert=True
+        )
+    
+    async def _save_failures(self, collection_name: str, failed: Dict[Any, str], succeeded: List[Any]):
+        """Record records that failed (source _id -> error) and forget those that now succeeded"""
+        failures = mongodb_service.get_fhir_collection(self.failure_collection)
+        operations = [
+            UpdateOne(
+                {"_id": f"{collection_name}:{source_id}"},
+                {
+                    "$set": {"collection": collection_name, "source_id": source_id, "error": error, "updated_at": datetime.utcnow()},
+                    "$inc": {"attempts": 1}
+                },
+                upsert=True
+            )
+            for source_id, error in failed.items()
+        ]
+        if operations:
+            await failures.bulk_write(operations, ordered=False)
+        if succeeded:
+            await failures.delete_many({"_id": {"$in": [f"{collection_name}:{source_id}" for source_id in succeeded]}})
+    
+    async def reset_checkpoints(self, collection_names: Optional[List[str]] = None):
+        """Forget saved progress and failures of ``collection_names`` (all when None) so they start from the beginning"""
+        checkpoints = mongodb_service.get_fhir_collection(self.checkpoint_collection)
+        query = {"_id": {"$in": collection_names}} if collection_names is not None else {}
+        result = await checkpoints.delete_many(query)
+        failures = mongodb_service.get_fhir_collection(self.failure_collection)
+        await failures.delete_many({"collection": {"$in": collection_names}} if collection_names is not None else {})
+        logger.info(f"🧹 Reset {result.deleted_count} migration checkpoints")
+    
+    async def run(self, collections: Optional[List[Dict[str, str]]] = None):
+        """Migrate the given history collections (all by default) concurrently"""
+        collections = collections or HISTORY_COLLECTIONS
+        semaphore = asyncio.Semaphore(self.max_concurrent_collections)
+        
+        async def run_one(collection_info: Dict[str, str]):
+            async with semaphore:
+                try:
+                    await self.migrate_collection(collection_info, pool)
+                except Exception as e:
+                    if "not authorized" in str(e):
+                        logger.warning(f"🔒 No access to {collection_info['name']} - skipping migration")
+                    else:
+                        logger.error(f"❌ Failed to migrate {collection_info['name']}: {e}")
+        
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            await asyncio.gather(*(run_one(info) for info in collections))
+        
+        self.print_progress_summary()
+    
+    async def _migrate_batch(
+        self,
+        collection_info: Dict[str, str],
+        records: List[Dict[str, Any]],
+        pool: ProcessPoolExecutor
+    ) -> Tuple[int, Dict[Any, str]]:
+        """Convert and write one batch; returns (records migrated, failed source _id -> error)"""
+        collection_name = collection_info["name"]
+        loop = asyncio.get_event_loop()
+        source_ids = {str(record["_id"]): record["_id"] for record in records}
+        
+        resources, conversion_errors = await loop.run_in_executor(
+            pool, _convert_history_batch, records, collection_info
+        )
+        failed = {source_ids[error["source_id"]]: error["error"] for error in conversion_errors}
+        for error in conversion_errors[:5]:
+            logger.error(f"Failed to convert {collection_name} record {error['source_id']}: {error['error']}")
+        
+        if not resources:
+            return 0, failed
+        
+        write_result = await fhir_service.bulk_upsert_fhir_resources(
+            "Observation",
+            resources,
+            source_system="migration",
+            user_id=self.migration_service.migration_user_id,
+            skip_hashed=True,
+            **{k: v for k, v in self.migration_service._create_audit_context(
+                f"obs-migration-{collection_name}-{records[-1]['_id']}"
+            ).items() if k != "source_system"}
+        )
+        if write_result["failed"]:
+            by_resource_id = {
+                _observation_id(collection_name, source_id): source_id for source_id in source_ids.values()
+            }
+            for item in write_result["failed"]:
+                source_id = by_resource_id.get(item.get("resource_id"))
+                if source_id is not None:
+                    failed[source_id] = item["error"]
+        
+        # Already-hashed resources were migrated by an earlier run
+        return write_result["written_count"] + write_result["skipped_count"], failed
+    
+    async def _retry_failures(self, collection_info: Dict[str, str], pool: ProcessPoolExecutor) -> Tuple[int, int]:
+        """Retry records that failed in earlier runs; returns (recovered, still failing)"""
+        collection_name = collection_info["name"]
+        failures = mongodb_service.get_fhir_collection(self.failure_collection)
+        failed_ids = [doc["source_id"] async for doc in failures.find({"collection": collection_name}, {"source_id": 1})]
+        if not failed_ids:
+            return 0, 0
+        
+        logger.info(f"🔁 {collection_name}: retrying {len(failed_ids)} previously failed records")
+        collection = vital_history_store.get_collection(collection_name)
+        recovered = 0
+        still_failing = 0
+        for start in range(0, len(failed_ids), self.batch_size):
+            chunk = failed_ids[start:start + self.batch_size]
+            records = await collection.find({"_id": {"$in": chunk}}).to_list(length=len(chunk))
+            migrated, failed = await self._migrate_batch(collection_info, records, pool) if records else (0, {})
+            # Source records deleted since the failure have nothing left to migrate either
+            await self._save_failures(collection_name, failed, [source_id for source_id in chunk if source_id not in failed])
+            recovered += migrated
+            still_failing += len(failed)
+        return recovered, still_failing
+    
+    async def migrate_collection(self, collection_info: Dict[str, str], pool: ProcessPoolExecutor):
+        """Retry earlier failures, then migrate one collection from its checkpoint to the end"""
+        collection_name = collection_info["name"]
+        collection = vital_history_store.get_collection(collection_name)
+        stats = self.migration_service.migration_stats["observations"]
+        
+        checkpoint = await self._load_checkpoint(collection_name) or {}
+        last_id = checkpoint.get("last_id")
+        migrated = checkpoint.get("migrated", 0)
+        
+        # Every record counted in "errors" is in the failure collection
+        recovered, errors = await self._retry_failures(collection_info, pool)
+        migrated += recovered
+        stats["migrated"] += recovered
+        if recovered:
+            await self._save_checkpoint(collection_name, migrated=migrated, errors=errors)
+        
+        if checkpoint.get("completed"):
+            logger.info(f"⏭️ {collection_name} already migrated ({migrated} records, {errors} failing), skipping")
+            return
+        
+        remaining_query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        remaining = await collection.count_documents(remaining_query)
+        stats["total"] += remaining
+        progress = {
+            "total": migrated + errors + remaining,
+            "done": migrated + errors,
+            "migrated": migrated,
+            "errors": errors,
+            "started": time.monotonic(),
+            "processed_this_run": 0
+        }
+        self.progress[collection_name] = progress
+        
+        logger.info(f"📊 {collection_name}: {remaining} records remaining" + (f" (resuming after {last_id})" if last_id is not None else ""))
+        
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            records = await collection.find(query).sort("_id", 1).limit(self.batch_size).to_list(length=self.batch_size)
+            if not records:
+                break
+            
+            batch_migrated, failed = await self._migrate_batch(collection_info, records, pool)
+            # Failures are persisted before the checkpoint moves past them
+            await self._save_failures(collection_name, failed, [])
+            
+            migrated += batch_migrated
+            errors += len(failed)
+            stats["migrated"] += batch_migrated
+            stats["errors"] += len(failed)
+            last_id = records[-1]["_id"]
+            
+            await self._save_checkpoint(collection_name, last_id=last_id, migrated=migrated, errors=errors, completed=False)
+            
+            progress.update(done=migrated + errors, migrated=migrated, errors=errors)
+            progress["processed_this_run"] += len(records)
+            self._log_progress(collection_name)
+        
+        await self._save_checkpoint(collection_name, last_id=last_id, migrated=migrated, errors=errors, completed=True)
+        logger.info(f"✅ Completed migration of {collection_name}: {migrated} records ({errors} errors)")
+    
+    def _log_progress(self, collection_name: str):
+        """Log throughput and ETA for a collection"""
+        progress = self.progress[collection_name]
+        elapsed = max(time.monotonic() - progress["started"], 1e-6)
+        rate = progress["processed_this_run"] / elapsed
+        left = max(progress["total"] - progress["done"], 0)
+        eta = timedelta(seconds=int(left / rate)) if rate > 0 else "unknown"
+        percent = progress["done"] / progress["total"] * 100 if progress["total"] else 100.0
+        logger.info(
+            f"⏱️ {collection_name}: {progress['done']}/{progress['total']} ({percent:.1f}%) | "
+            f"{rate:.0f} records/s | ETA {eta} | Errors: {progress['errors']}"
+        )
+    
+    def print_progress_summary(self):
+        """Print per-collection results of this run"""
+        logger.info("\n" + "="*60)
+        logger.info("📊 INCREMENTAL FHIR MIGRATION SUMMARY")
+        logger.info("="*60)
+        for collection_name, progress in self.progress.items():
+            elapsed = time.monotonic() - progress["started"]
+            rate = progress["processed_this_run"] / elapsed if elapsed > 0 else 0
+            logger.info(
+                f"{collection_name:28} | {progress['migrated']:8}/{progress['total']:8} | "
+                f"Errors: {progress['errors']:6} | {rate:7.0f} records/s"
+            )
+        logger.info("="*60)
+
 async def main():
     """Main migration function"""
     print("🔄 FHIR R5 Data Migration")
     print("========================")
     
+    parser = argparse.ArgumentParser(description="Migrate legacy data to FHIR R5")
+    parser.add_argument("--legacy", action="store_true", help="Use the original per-document migration for all collections")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per batch")
+    parser.add_argument("--workers", type=int, default=4, help="Conversion worker processes")
+    parser.add_argument("--concurrency", type=int, default=3, help="History collections migrated concurrently")
+    parser.add_argument("--collections", nargs="*", help="Only migrate these history collections")
+    parser.add_argument("--reset-checkpoints", action="store_true", help="Ignore saved progress of the selected collections and start them from the beginning")
+    args = parser.parse_args()
+    
     migration_service = FHIRMigrationService()
     
     try:
@@ -1243,7 +1539,27 @@ async def main():
             raise Exception("Database health check failed after connection")
         
         # Run migration
-        await migration_service.migrate_all_data(batch_size=50)
+        if args.legacy:
+            await migration_service.migrate_all_data(batch_size=args.batch_size)
+        else:
+            # Small reference collections keep the per-document path;
+            # medical histories go through the resumable bulk engine
+            await migration_service.migrate_hospitals_to_organizations(args.batch_size)
+            await migration_service.migrate_patients_to_fhir(args.batch_size)
+            await migration_service.migrate_devices_to_fhir(args.batch_size)
+            
+            engine = IncrementalMigrationEngine(
+                migration_service,
+                batch_size=args.batch_size,
+                max_workers=args.workers,
+                max_concurrent_collections=args.concurrency
+            )
+            selected = [c for c in HISTORY_COLLECTIONS if not args.collections or c["name"] in args.collections]
+            if args.reset_checkpoints:
+                # Only the collections being migrated; the others keep their resume state
+                await engine.reset_checkpoints([c["name"] for c in selected])
+            await engine.run(selected)
+            migration_service.print_migration_summary()
         print("\n✅ Migration completed successfully!")
         
     except Exception as e:
@@ -126,7 +126,7 @@ class HealthcareAnalytics:
                 base_filter["hospital_id"] = ObjectId(hospital_id)
             
             # Get patient counts
-            patients_collection = mongodb_service.get_collection(self.collections["patients"])
+            patients_collection = mongodb_service.get_analytics_collection(self.collections["patients"])
             
             # Total patients
             total_patients = await patients_collection.count_documents(base_filter)
@@ -277,7 +277,7 @@ class HealthcareAnalytics:
                 filter_query["subject.reference"] = f"Patient/{patient_id}"
             
             # Get observations
-            observations_collection = mongodb_service.get_collection(self.collections["observations"])
+            observations_collection = mongodb_service.get_analytics_collection(self.collections["observations"])
             
             # Aggregate by vital type
             vital_types = ["blood_pressure", "heart_rate", "temperature", "spo2", "glucose"]
@@ -624,7 +624,7 @@ class HealthcareAnalytics:
                 if dtype not in collection_map:
                     continue
                 
-                device_collection = mongodb_service.get_collection(collection_map[dtype])
+                device_collection = mongodb_service.get_analytics_collection(collection_map[dtype])
                 
                 # Build filter
                 filter_query = {}
@@ -635,7 +635,7 @@ class HealthcareAnalytics:
                 total_devices = await device_collection.count_documents(filter_query)
                 
                 # Get active devices (had readings in period)
-                observations_collection = mongodb_service.get_collection("fhir_observations")
+                observations_collection = mongodb_service.get_analytics_collection("fhir_observations")
                 
                 active_pipeline = [
                     {
@@ -714,7 +714,7 @@ class HealthcareAnalytics:
         """Predict health risks based on historical data"""
         try:
             # Get patient data
-            patients_collection = mongodb_service.get_collection("patients")
+            patients_collection = mongodb_service.get_analytics_collection("patients")
             patient = await patients_collection.find_one({"_id": ObjectId(patient_id)})
             
             if not patient:
@@ -932,7 +932,7 @@ class HealthcareAnalytics:
             query = {}
             if hospital_id:
                 # Get all patients from this hospital
-                patients_collection = mongodb_service.get_collection("patients")
+                patients_collection = mongodb_service.get_analytics_collection("patients")
                 patients = await patients_collection.find(
                     {"hospital_id": ObjectId(hospital_id)},
                     {"_id": 1}
@@ -957,7 +957,7 @@ class HealthcareAnalytics:
                 query["device_type"] = device_type_map[vital_type]
             
             # Get vital data
-            device_data_collection = mongodb_service.get_collection("device_data")
+            device_data_collection = mongodb_service.get_analytics_collection("device_data")
             vital_data = await device_data_collection.find(query).to_list(None)
             
             if not vital_data:
@@ -1059,7 +1059,7 @@ class HealthcareAnalytics:
             # Calculate additional metrics
             if hospital_id:
                 # Get hospital info
-                hospitals_collection = mongodb_service.get_collection("hospitals")
+                hospitals_collection = mongodb_service.get_analytics_collection("hospitals")
                 hospital = await hospitals_collection.find_one({"_id": ObjectId(hospital_id)})
                 if hospital:
                     report["hospital_name"] = hospital.get("name", "Unknown")
@@ -1104,7 +1104,7 @@ class HealthcareAnalytics:
                 query.setdefault("created_at", {})["$lte"] = end_date
             
             # Get patients
-            patients_collection = mongodb_service.get_collection("patients")
+            patients_collection = mongodb_service.get_analytics_collection("patients")
             patients = await patients_collection.find(query).to_list(None)
             
             # Analyze risks for all patients
@@ -1184,7 +1184,7 @@ class HealthcareAnalytics:
                 query["patient_id"] = ObjectId(patient_id)
             elif hospital_id:
                 # Get patients from hospital
-                patients_collection = mongodb_service.get_collection("patients")
+                patients_collection = mongodb_service.get_analytics_collection("patients")
                 patients = await patients_collection.find(
                     {"hospital_id": ObjectId(hospital_id)},
                     {"_id": 1}
@@ -1198,7 +1198,7 @@ class HealthcareAnalytics:
                 query.setdefault("timestamp", {})["$lte"] = end_date
             
             # Get device data
-            device_data_collection = mongodb_service.get_collection("device_data")
+            device_data_collection = mongodb_service.get_analytics_collection("device_data")
             device_data = await device_data_collection.find(query).to_list(None)
             
             anomalies = []
@@ -1336,7 +1336,7 @@ class HealthcareAnalytics:
     ) -> List[Dict[str, Any]]:
         """Get health recommendations based on risk factors"""
         # Get patient data
-        patients_collection = mongodb_service.get_collection(self.collections["patients"])
+        patients_collection = mongodb_service.get_analytics_collection(self.collections["patients"])
         patient = await patients_collection.find_one({"_id": ObjectId(patient_id)})
         
         if not patient:
@@ -0,0 +1,558 @@
+"""
+Analytics Export Service
+========================
+Background export job runner for ``/admin/analytics/export/{format}``.
+
+Query results from ``HealthcareAnalytics`` and the underlying collections are
+streamed in batches into CSV, JSON, Parquet or XLSX writers. Blocking file I/O
+runs in the default executor so exports never hold the event loop. Finished
+artifacts are stored on local disk under their SHA-256 content hash and are
+reused when the same report/filters are requested again within the cache TTL.
+
+Each job records its owner (``hostname:pid``) and a heartbeat refreshed while
+it runs; jobs whose heartbeat has gone stale (their process died) are marked
+failed, so other API processes never fail a job a live replica is running.
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+
+from bson import ObjectId
+
+from app.services.analytics import healthcare_analytics
+from app.services.mongo import mongodb_service
+from app.utils.json_encoder import MongoJSONEncoder
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+class ExportFormat(Enum):
+    """Supported analytics export formats"""
+    JSON = "json"
+    CSV = "csv"
+    PARQUET = "parquet"
+    XLSX = "xlsx"
+
+# Accept the historical "excel" name used by the API
+EXPORT_FORMAT_ALIASES = {"excel": ExportFormat.XLSX}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.JSON: "application/json",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+    ExportFormat.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+}
+
+# Report types producing one row per metric from HealthcareAnalytics summaries
+SUMMARY_REPORT_TYPES = ["patient", "hospital", "device", "health_risk", "system_overview"]
+# Report types streaming one row per document straight from MongoDB
+ROW_REPORT_TYPES = ["patients", "observations"]
+
+# (column name, column type) where type is one of: string, int, float, bool, timestamp
+ExportColumn = Tuple[str, str]
+
+SUMMARY_COLUMNS: List[ExportColumn] = [
+    ("section", "string"),
+    ("metric", "string"),
+    ("value", "string")
+]
+
+PATIENT_COLUMNS: List[ExportColumn] = [
+    ("_id", "string"),
+    ("first_name", "string"),
+    ("last_name", "string"),
+    ("gender", "string"),
+    ("age", "int"),
+    ("hospital_id", "string"),
+    ("risk_level", "string"),
+    ("created_at", "timestamp"),
+    ("last_activity", "timestamp")
+]
+
+OBSERVATION_COLUMNS: List[ExportColumn] = [
+    ("_id", "string"),
+    ("id", "string"),
+    ("subject", "string"),
+    ("code", "string"),
+    ("effective_datetime", "string"),
+    ("value", "float"),
+    ("unit", "string"),
+    ("status", "string")
+]
+
+class CsvExportWriter:
+    """Writes export rows as CSV"""
+
+    def __init__(self, path: str, columns: List[ExportColumn]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._names = [name for name, _ in columns]
+        self._writer.writerow(self._names)
+
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        self._writer.writerows([[row.get(name) for name in self._names] for row in rows])
+
+    def close(self):
+        self._file.close()
+
+class JsonExportWriter:
+    """Writes export rows as a single JSON array without buffering it in memory"""
+
+    def __init__(self, path: str, columns: List[ExportColumn]):
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        self._first = True
+
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            if not self._first:
+                self._file.write(",\n")
+            self._file.write(json.dumps(row, cls=MongoJSONEncoder))
+            self._first = False
+
+    def close(self):
+        self._file.write("]")
+        self._file.close()
+
+class ParquetExportWriter:
+    """Writes export rows as a zstd-compressed Parquet file, one row group per batch"""
+
+    def __init__(self, path: str, columns: List[ExportColumn]):
+        # Import here so the API starts without pyarrow installed
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        type_map = {
+            "string": pa.string(),
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "bool": pa.bool_(),
+            "timestamp": pa.timestamp("ms")
+        }
+        self._columns = columns
+        self._schema = pa.schema([(name, type_map[col_type]) for name, col_type in columns])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        arrays = {name: [row.get(name) for row in rows] for name, _ in self._columns}
+        table = self._pa.Table.from_pydict(arrays, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+class XlsxExportWriter:
+    """Writes export rows with openpyxl's constant-memory write-only workbook"""
+
+    def __init__(self, path: str, columns: List[ExportColumn]):
+        # Import here so the API starts without openpyxl installed
+        from openpyxl import Workbook
+
+        self._path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("export")
+        self._names = [name for name, _ in columns]
+        self._sheet.append(self._names)
+
+    def write_batch(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self._sheet.append([row.get(name) for name in self._names])
+
+    def close(self):
+        self._workbook.save(self._path)
+
+EXPORT_WRITERS = {
+    ExportFormat.JSON: JsonExportWriter,
+    ExportFormat.CSV: CsvExportWriter,
+    ExportFormat.PARQUET: ParquetExportWriter,
+    ExportFormat.XLSX: XlsxExportWriter
+}
+
+class AnalyticsExportService:
+    """Runs analytics exports in the background and manages their artifacts"""
+
+    def __init__(self):
+        self.collection_jobs = "analytics_export_jobs"
+        self.export_dir = os.getenv("ANALYTICS_EXPORT_DIR", "exports/analytics")
+        self.cache_ttl = timedelta(seconds=int(os.getenv("ANALYTICS_EXPORT_CACHE_TTL", "3600")))
+        self.batch_size = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", "2000"))
+        self.max_concurrent_jobs = int(os.getenv("ANALYTICS_EXPORT_MAX_JOBS", "2"))
+        self.heartbeat_interval = int(os.getenv("ANALYTICS_EXPORT_HEARTBEAT_SECONDS", "30"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.running_jobs: Dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        """Fail orphaned jobs and keep this process's jobs' heartbeats fresh"""
+        await self._fail_orphaned_jobs()
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat_task is None:
+            return
+        self._heartbeat_task.cancel()
+        await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        self._heartbeat_task = None
+
+    async def _fail_orphaned_jobs(self):
+        """Fail pending/running jobs whose owner stopped sending heartbeats (its task is gone)"""
+        try:
+            collection = mongodb_service.get_collection(self.collection_jobs)
+            stale_before = datetime.utcnow() - timedelta(seconds=self.heartbeat_interval * 4)
+            result = await collection.update_many(
+                {
+                    "status": {"$in": ["pending", "running"]},
+                    "id": {"$nin": list(self.running_jobs)},
+                    "heartbeat_at": {"$not": {"$gte": stale_before}}
+                },
+                {"$set": {
+                    "status": "failed",
+                    "completed_at": datetime.utcnow(),
+                    "error_message": "Interrupted: the API process running the export stopped"
+                }}
+            )
+            if result.modified_count:
+                logger.warning(f"Marked {result.modified_count} orphaned analytics export jobs as failed")
+        except Exception as e:
+            logger.error(f"Failed to clean up orphaned analytics export jobs: {e}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if self.running_jobs:
+                    collection = mongodb_service.get_collection(self.collection_jobs)
+                    await collection.update_many(
+                        {"id": {"$in": list(self.running_jobs)}, "owner": self.owner},
+                        {"$set": {"heartbeat_at": datetime.utcnow()}}
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to refresh analytics export heartbeats: {e}")
+            await self._fail_orphaned_jobs()
+
+    @staticmethod
+    def parse_format(format: str) -> ExportFormat:
+        """Resolve a format name (including aliases) to an ExportFormat"""
+        if format in EXPORT_FORMAT_ALIASES:
+            return EXPORT_FORMAT_ALIASES[format]
+        return ExportFormat(format)
+
+    @staticmethod
+    def _cache_key(report_type: str, export_format: ExportFormat, filters: Dict[str, Any]) -> str:
+        """Stable key identifying the same report and filters"""
+        payload = json.dumps(
+            {"report_type": report_type, "format": export_format.value, "filters": filters},
+            sort_keys=True,
+            cls=MongoJSONEncoder
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def submit_export(
+        self,
+        export_format: ExportFormat,
+        report_type: str,
+        hospital_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        requested_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create an export job, reusing a cached artifact or an in-flight job when possible"""
+        filters = {
+            "hospital_id": hospital_id,
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None
+        }
+        cache_key = self._cache_key(report_type, export_format, filters)
+        collection = mongodb_service.get_collection(self.collection_jobs)
+
+        # Reuse a completed artifact that is still fresh and on disk,
+        # or attach to an identical job this process is still running
+        existing = await collection.find_one(
+            {
+                "cache_key": cache_key,
+                "$or": [
+                    {"status": {"$in": ["pending", "running"]}, "id": {"$in": list(self.running_jobs)}},
+                    {"status": "completed", "completed_at": {"$gte": datetime.utcnow() - self.cache_ttl}}
+                ]
+            },
+            sort=[("created_at", -1)]
+        )
+        if existing and (existing["status"] != "completed" or os.path.exists(existing.get("artifact_path") or "")):
+            logger.info(f"Reusing analytics export job {existing['id']} ({existing['status']}) for cache key {cache_key[:12]}")
+            existing["cached"] = True
+            return existing
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "cache_key": cache_key,
+            "report_type": report_type,
+            "format": export_format.value,
+            "filters": filters,
+            "status": "pending",
+            "requested_by": requested_by,
+            "owner": self.owner,
+            "heartbeat_at": datetime.utcnow(),
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "completed_at": None,
+            "row_count": 0,
+            "artifact_path": None,
+            "content_hash": None,
+            "size_bytes": None,
+            "error_message": None
+        }
+        await collection.insert_one(dict(job))
+
+        task = asyncio.create_task(self._run_job(job, export_format, hospital_id, start_date, end_date))
+        self.running_jobs[job["id"]] = task
+        task.add_done_callback(lambda _: self.running_jobs.pop(job["id"], None))
+
+        job["cached"] = False
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get an export job by ID"""
+        collection = mongodb_service.get_collection(self.collection_jobs)
+        return await collection.find_one({"id": job_id})
+
+    async def _update_job(self, job_id: str, **fields):
+        collection = mongodb_service.get_collection(self.collection_jobs)
+        await collection.update_one({"id": job_id}, {"$set": fields})
+
+    async def _run_job(
+        self,
+        job: Dict[str, Any],
+        export_format: ExportFormat,
+        hospital_id: Optional[str],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ):
+        """Stream rows into the format writer, then store the artifact under its content hash"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        loop = asyncio.get_event_loop()
+        temp_path = os.path.join(self.export_dir, f".{job['id']}.partial")
+        writer = None
+
+        async with self._semaphore:
+            try:
+                await self._update_job(job["id"], status="running", started_at=datetime.utcnow())
+                os.makedirs(self.export_dir, exist_ok=True)
+
+                columns, rows = self._row_source(job["report_type"], hospital_id, start_date, end_date)
+                writer = await loop.run_in_executor(None, EXPORT_WRITERS[export_format], temp_path, columns)
+
+                row_count = 0
+                async for batch in rows:
+                    await loop.run_in_executor(None, writer.write_batch, batch)
+                    row_count += len(batch)
+
+                await loop.run_in_executor(None, writer.close)
+                writer = None
+
+                content_hash, size_bytes = await loop.run_in_executor(None, self._hash_file, temp_path)
+                artifact_path = os.path.join(self.export_dir, f"{content_hash}.{export_format.value}")
+                os.replace(temp_path, artifact_path)
+
+                await self._update_job(
+                    job["id"],
+                    status="completed",
+                    completed_at=datetime.utcnow(),
+                    row_count=row_count,
+                    artifact_path=artifact_path,
+                    content_hash=content_hash,
+                    size_bytes=size_bytes
+                )
+                logger.info(f"Analytics export {job['id']} completed: {row_count} rows, {size_bytes} bytes, sha256={content_hash[:12]}")
+
+            except Exception as e:
+                logger.error(f"Analytics export {job['id']} failed: {e}")
+                if writer is not None:
+                    try:
+                        await loop.run_in_executor(None, writer.close)
+                    except Exception:
+                        pass
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                await self._update_job(job["id"], status="failed", completed_at=datetime.utcnow(), error_message=str(e))
+
+    @staticmethod
+    def _hash_file(path: str) -> Tuple[str, int]:
+        """SHA-256 and size of a file, read in chunks"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _row_source(
+        self,
+        report_type: str,
+        hospital_id: Optional[str],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Tuple[List[ExportColumn], AsyncIterator[List[Dict[str, Any]]]]:
+        """Columns and batched row iterator for a report type"""
+        if report_type == "patients":
+            return PATIENT_COLUMNS, self._patient_rows(hospital_id, start_date, end_date)
+        if report_type == "observations":
+            return OBSERVATION_COLUMNS, self._observation_rows(start_date, end_date)
+        if report_type in SUMMARY_REPORT_TYPES:
+            return SUMMARY_COLUMNS, self._summary_rows(report_type, hospital_id, start_date, end_date)
+        raise ValueError(f"Unsupported report type: {report_type}")
+
+    async def _patient_rows(
+        self,
+        hospital_id: Optional[str],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Patient roster rows streamed from the patients collection"""
+        query: Dict[str, Any] = {}
+        if hospital_id:
+            query["hospital_id"] = ObjectId(hospital_id)
+        if start_date or end_date:
+            query["created_at"] = {}
+            if start_date:
+                query["created_at"]["$gte"] = start_date
+            if end_date:
+                query["created_at"]["$lte"] = end_date
+
+        projection = {name: 1 for name, _ in PATIENT_COLUMNS}
+        collection = mongodb_service.get_analytics_collection(healthcare_analytics.collections["patients"], workload="reporting")
+        cursor = collection.find(query, projection).batch_size(self.batch_size)
+
+        batch = []
+        async for doc in cursor:
+            batch.append({
+                "_id": str(doc.get("_id")),
+                "first_name": doc.get("first_name"),
+                "last_name": doc.get("last_name"),
+                "gender": doc.get("gender"),
+                "age": doc.get("age") if isinstance(doc.get("age"), int) else None,
+                "hospital_id": str(doc["hospital_id"]) if doc.get("hospital_id") else None,
+                "risk_level": doc.get("risk_level"),
+                "created_at": doc.get("created_at") if isinstance(doc.get("created_at"), datetime) else None,
+                "last_activity": doc.get("last_activity") if isinstance(doc.get("last_activity"), datetime) else None
+            })
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _observation_rows(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Observation rows streamed from the observations collection"""
+        query: Dict[str, Any] = {"resourceType": "Observation"}
+        if start_date or end_date:
+            query["effectiveDateTime"] = {}
+            if start_date:
+                query["effectiveDateTime"]["$gte"] = start_date.isoformat() + "Z"
+            if end_date:
+                query["effectiveDateTime"]["$lte"] = end_date.isoformat() + "Z"
+
+        projection = {"id": 1, "subject": 1, "code": 1, "effectiveDateTime": 1, "valueQuantity": 1, "status": 1}
+        collection = mongodb_service.get_analytics_collection(healthcare_analytics.collections["observations"], workload="reporting")
+        cursor = collection.find(query, projection).batch_size(self.batch_size)
+
+        batch = []
+        async for doc in cursor:
+            codings = (doc.get("code") or {}).get("coding") or [{}]
+            quantity = doc.get("valueQuantity") or {}
+            value = quantity.get("value")
+            batch.append({
+                "_id": str(doc.get("_id")),
+                "id": doc.get("id"),
+                "subject": (doc.get("subject") or {}).get("reference"),
+                "code": codings[0].get("code"),
+                "effective_datetime": doc.get("effectiveDateTime"),
+                "value": float(value) if isinstance(value, (int, float)) else None,
+                "unit": quantity.get("unit"),
+                "status": doc.get("status")
+            })
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _summary_rows(
+        self,
+        report_type: str,
+        hospital_id: Optional[str],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Flattened (section, metric, value) rows for HealthcareAnalytics summary reports"""
+        if report_type == "patient":
+            report_data = await healthcare_analytics.get_patient_statistics(
+                hospital_id=hospital_id, start_date=start_date, end_date=end_date
+            )
+        elif report_type == "hospital":
+            report_data = await healthcare_analytics._generate_hospital_report(
+                hospital_id=hospital_id, start_date=start_date, end_date=end_date
+            )
+        elif report_type == "device":
+            report_data = await healthcare_analytics.get_device_utilization_analytics(
+                hospital_id=hospital_id, period="monthly"
+            )
+        elif report_type == "health_risk":
+            report_data = await healthcare_analytics._generate_health_risk_report(
+                hospital_id=hospital_id, start_date=start_date, end_date=end_date
+            )
+        else:
+            report_data = {
+                "patients": await healthcare_analytics.get_patient_statistics(),
+                "devices": await healthcare_analytics.get_device_utilization_analytics()
+            }
+
+        # The report generators catch their own errors and return {"error": ...}
+        if isinstance(report_data, dict) and set(report_data) == {"error"}:
+            raise RuntimeError(f"{report_type} report generation failed: {report_data['error']}")
+
+        batch = []
+        for section, metric, value in self._flatten(report_data):
+            batch.append({"section": section, "metric": metric, "value": value})
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _flatten(self, data: Any, path: Tuple[str, ...] = ()):
+        """Yield (section, metric, value) triples from a nested report dict"""
+        if isinstance(data, dict):
+            for key, value in data.items():
+                yield from self._flatten(value, path + (str(key),))
+        elif isinstance(data, list) and any(isinstance(item, (dict, list)) for item in data):
+            for index, item in enumerate(data):
+                yield from self._flatten(item, path + (str(index),))
+        else:
+            if isinstance(data, (list, datetime, ObjectId)):
+                value = json.dumps(data, cls=MongoJSONEncoder).strip('"')
+            else:
+                value = None if data is None else str(data)
+            section = path[0] if len(path) > 1 else ""
+            metric = ".".join(path[1:]) if len(path) > 1 else (path[0] if path else "")
+            yield section, metric, value
+
+# Global analytics export service instance
+analytics_export_service = AnalyticsExportService()
@@ -22,6 +22,7 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
+from app.services.pipeline_tracing import pipeline_tracer
 from app.utils.structured_logging import get_logger
 
 logger = get_logger(__name__)
@@ -176,7 +177,8 @@ class BlockchainHashService:
             
             # Compute resource hash with timing
             hash_computation_start = time.time()
-            resource_hash = self._compute_hash(hash_input)
+            with pipeline_tracer.span("blockchain.compute_hash"):
+                resource_hash = self._compute_hash(hash_input)
             hash_computation_time = (time.time() - hash_computation_start) * 1000
             
             # Generate Merkle root if requested
@@ -265,24 +267,25 @@ class BlockchainHashService:
                             context.encounter_id = encounter_ref.replace('Encounter/', '')
                     
                     # Log hash generation
-                    await self.audit_service.log_hash_operation(
-                        operation_type=self.HashAuditOperation.HASH_GENERATE,
-                        status=self.HashAuditStatus.SUCCESS,
-                        blockchain_hash=resource_hash,
-                        previous_hash=previous_hash,
-                        user_id=user_id,
-                        request_id=request_id,
-                        message=f"Generated blockchain hash for {resource_data.get('resourceType', 'Unknown')} resource",
-                        metrics=metrics,
-                        context=context,
-                        severity=self.HashAuditSeverity.LOW,
-                        additional_data={
-                            "block_height": block_height,
-                            "merkle_root": merkle_root,
-                            "nonce": nonce,
-                            "include_merkle": include_merkle
-                        }
-                    )
+                    with pipeline_tracer.span("blockchain.audit_log"):
+                        await self.audit_service.log_hash_operation(
+                            operation_type=self.HashAuditOperation.HASH_GENERATE,
+                            status=self.HashAuditStatus.SUCCESS,
+                            blockchain_hash=resource_hash,
+                            previous_hash=previous_hash,
+                            user_id=user_id,
+                            request_id=request_id,
+                            message=f"Generated blockchain hash for {resource_data.get('resourceType', 'Unknown')} resource",
+                            metrics=metrics,
+                            context=context,
+                            severity=self.HashAuditSeverity.LOW,
+                            additional_data={
+                                "block_height": block_height,
+                                "merkle_root": merkle_root,
+                                "nonce": nonce,
+                                "include_merkle": include_merkle
+                            }
+                        )
                 except Exception as audit_e:
                     logger.warning(f"Failed to log hash generation audit: {audit_e}")
             
@@ -10,7 +10,7 @@ import redis.asyncio as redis
 from redis.asyncio import Redis
 from redis.exceptions import RedisError
 
-from app.utils.json_encoder import MongoJSONEncoder
+from app.utils.json_encoder import dumps_mongodb_str
 from config import logger, settings
 
 class CacheService:
@@ -126,7 +126,7 @@ class CacheService:
             # Serialize value
             try:
                 # Try JSON serialization first (with MongoDB encoder)
-                serialized = json.dumps(value, cls=MongoJSONEncoder)
+                serialized = dumps_mongodb_str(value)
             except (TypeError, ValueError):
                 # Fall back to pickle for complex objects
                 serialized = pickle.dumps(value)
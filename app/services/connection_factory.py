@@ -0,0 +1,193 @@
+"""
+Connection Factory
+==================
+MongoDB client options shared by every connection the API opens, plus
+connection pool utilization metrics.
+
+Each worker process holds one ``AsyncIOMotorClient`` (``mongodb_service``)
+sized by ``MONGODB_MAX_POOL_SIZE`` / ``MONGODB_MIN_POOL_SIZE`` /
+``MONGODB_MAX_IDLE_TIME_MS`` and using wire compression
+(``MONGODB_COMPRESSORS``).
+
+Read-only workloads (``analytics``, ``visualization``, ``reporting``) are
+routed by ``MONGODB_READ_ROUTING`` (``workload=route`` pairs):
+
+- ``primary``: the ingest primary
+- ``secondary``: ``MONGODB_ANALYTICS_READ_PREFERENCE`` (default
+  ``secondaryPreferred``) bounded by ``MONGODB_ANALYTICS_MAX_STALENESS_SECONDS``;
+  the driver falls back to the primary when no secondary is fresh enough
+- ``analytics_node``: a separate client on ``MONGODB_ANALYTICS_URI``; while
+  its heartbeats fail, reads take the ``secondary`` route instead
+
+Routers declare their workload with ``read_workload_dependency``; code
+outside a request (report jobs, exports) calls ``set_read_workload``.
+
+The MQTT listeners have the synchronous counterpart in
+``services/mqtt-listeners/shared/connections.py``.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Any
+
+from pymongo import ReadPreference
+from pymongo.monitoring import ConnectionPoolListener, ServerHeartbeatListener
+from pymongo.read_preferences import PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+from config import settings
+
+READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+READ_ROUTES = ("primary", "secondary", "analytics_node")
+DEFAULT_READ_WORKLOAD = "analytics"
+
+_read_workload: ContextVar[str] = ContextVar("mongodb_read_workload", default=DEFAULT_READ_WORKLOAD)
+
+class PoolMetrics(ConnectionPoolListener):
+    """Connection pool counters fed by the driver's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+        self.pools_cleared = 0
+        self._checkout_started: Dict[Any, float] = {}
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_started.pop(threading.get_ident(), None)
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            if started is not None:
+                self.checkout_wait_ms += (time.perf_counter() - started) * 1000
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "max_pool_size": settings.mongodb_max_pool_size,
+                "utilization": round(self.checked_out / settings.mongodb_max_pool_size, 3) if settings.mongodb_max_pool_size else None,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": round(self.checkout_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "pools_cleared": self.pools_cleared
+            }
+
+def mongo_pool_options() -> Dict[str, Any]:
+    """Pool sizing, compression and monitoring options for a Mongo client"""
+    return {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+        "compressors": settings.mongodb_compressors,
+        "event_listeners": [pool_metrics]
+    }
+
+class NodeHealth(ServerHeartbeatListener):
+    """Tracks whether any server of a client answers its heartbeats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[Any, bool] = {}
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        with self._lock:
+            return any(self._servers.values())
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            self._servers[event.connection_id] = True
+
+    def failed(self, event):
+        with self._lock:
+            self._servers[event.connection_id] = False
+            self.failures += 1
+
+def analytics_read_preference():
+    """Read preference for the ``secondary`` route (defaults to secondaryPreferred)"""
+    mode = settings.mongodb_analytics_read_preference
+    if mode == "primary":
+        return ReadPreference.PRIMARY
+    staleness = settings.mongodb_analytics_max_staleness_seconds
+    return READ_PREFERENCES.get(mode, SecondaryPreferred)(max_staleness=staleness if staleness > 0 else -1)
+
+def read_routes() -> Dict[str, str]:
+    """Workload -> route from ``MONGODB_READ_ROUTING`` (unknown routes become ``secondary``)"""
+    routes = {}
+    for item in settings.mongodb_read_routing.split(","):
+        workload, _, route = item.partition("=")
+        if workload.strip():
+            route = route.strip()
+            routes[workload.strip()] = route if route in READ_ROUTES else "secondary"
+    return routes
+
+def current_read_workload() -> str:
+    return _read_workload.get()
+
+def set_read_workload(workload: str):
+    """Route reads of the current task (and tasks it creates) as ``workload``"""
+    return _read_workload.set(workload)
+
+def read_workload_dependency(workload: str):
+    """Router dependency that routes the request's analytics reads as ``workload``"""
+    async def route_reads():
+        set_read_workload(workload)
+    return route_reads
+
+# Global pool metrics instance
+pool_metrics = PoolMetrics()
@@ -0,0 +1,412 @@
+"""
+Device Ingestion Queue
+=====================
+Durable local queue for the fast-ack device ingestion mode of
+``/api/ava4/data`` and ``/api/qube-vital/data``.
+
+In fast-ack mode the endpoint only validates the payload, assigns an
+idempotency key and appends it to a SQLite (WAL) file on local disk, then
+answers ``202 Accepted``. Background workers drain the queue and run the
+regular fan-out (device lookup, raw observation, medical history, FHIR R5,
+audit log) through handlers registered by the route modules.
+
+- Re-posting a payload with the same idempotency key returns the existing
+  job instead of processing it twice, so gateway retries are cheap.
+- Jobs survive API restarts. A claimed job holds a lease
+  (``DEVICE_INGEST_LEASE_SECONDS``, also the handler timeout); a job still
+  ``processing`` after its lease expired (its worker crashed) is re-queued on
+  start and periodically, while jobs another worker is handling are left alone.
+- Failed jobs are retried with exponential backoff up to a maximum number of
+  attempts, then kept as ``failed`` for inspection via the status endpoint.
+- Handlers run their fan-out writes through ``IngestionSteps``; the steps a
+  job completed are stored with it, so a retry after a partial failure skips
+  them instead of writing duplicate observations and history rows.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.utils.error_definitions import create_error_response, create_success_response
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+class IngestionSteps:
+    """Fan-out steps a queued job has completed, with their results.
+
+    ``run`` skips a step recorded by an earlier attempt and returns its stored
+    result; otherwise it runs the step and persists the result before moving
+    on. Outside the queue (synchronous ingestion) nothing is recorded.
+    """
+
+    def __init__(self, queue: Optional["DeviceIngestionQueue"] = None, key: Optional[str] = None,
+                 done: Optional[Dict[str, Any]] = None):
+        self._queue = queue
+        self._key = key
+        self.done: Dict[str, Any] = done or {}
+
+    async def run(self, name: str, step: Callable[[], Awaitable[Any]]) -> Any:
+        if name in self.done:
+            return self.done[name]
+        result = await step()
+        if self._queue is not None:
+            self.done[name] = result
+            await self._queue._run(self._queue._save_steps, self._key, json.dumps(self.done, default=str))
+        return result
+
+IngestionHandler = Callable[[Dict[str, Any], Optional[str], IngestionSteps], Awaitable[Dict[str, Any]]]
+
+class DeviceIngestionQueue:
+    """SQLite-backed durable queue with asyncio workers"""
+
+    def __init__(self):
+        self.enabled = os.getenv("DEVICE_INGEST_FAST_ACK", "false").lower() == "true"
+        self.db_path = os.getenv("DEVICE_INGEST_QUEUE_PATH", "data/device_ingest_queue.db")
+        self.worker_count = int(os.getenv("DEVICE_INGEST_WORKERS", "4"))
+        self.max_attempts = int(os.getenv("DEVICE_INGEST_MAX_ATTEMPTS", "5"))
+        self.retention_seconds = int(os.getenv("DEVICE_INGEST_RETENTION_SECONDS", "86400"))
+        self.lease_seconds = int(os.getenv("DEVICE_INGEST_LEASE_SECONDS", "300"))
+        self.poll_interval = 0.5
+
+        self._handlers: Dict[str, IngestionHandler] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+
+    # =============== Setup ===============
+
+    def register_handler(self, source: str, handler: IngestionHandler):
+        """Register the coroutine that processes queued payloads of ``source``"""
+        self._handlers[source] = handler
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    idempotency_key TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    steps TEXT,
+                    lease_until REAL
+                )
+            """)
+            # Queue files created before steps/leases were tracked
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(ingest_jobs)")}
+            for column, column_type in (("steps", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE ingest_jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS ingest_jobs_ready ON ingest_jobs (status, next_attempt_at)")
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def start(self):
+        """Open the queue, recover interrupted jobs and start the workers"""
+        if not self.enabled or self._running:
+            return
+
+        recovered = await self._run(self._recover)
+        if recovered:
+            logger.info(f"♻️ Re-queued {recovered} interrupted device ingestion jobs")
+
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(self.worker_count)
+        ]
+        logger.info(f"✅ Device ingestion queue started: {self.db_path} ({self.worker_count} workers)")
+
+    async def stop(self):
+        """Stop the workers; queued jobs stay on disk for the next start"""
+        if not self._running:
+            return
+        self._running = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _recover(self) -> int:
+        """Re-queue jobs whose worker died: still ``processing`` after their lease expired"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                """
+                UPDATE ingest_jobs SET status = ?, lease_until = NULL, updated_at = ?
+                WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)
+                """,
+                (STATUS_QUEUED, now, STATUS_PROCESSING, now)
+            )
+            return cursor.rowcount
+
+    # =============== Producer side ===============
+
+    @staticmethod
+    def derive_idempotency_key(source: str, payload: Dict[str, Any]) -> str:
+        """Deterministic key for payloads sent without an Idempotency-Key header"""
+        canonical = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(f"{source}:{canonical}".encode()).hexdigest()
+
+    async def enqueue(
+        self,
+        source: str,
+        payload: Dict[str, Any],
+        user_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Durably store a payload. Returns the job and whether it was newly created."""
+        if source not in self._handlers:
+            raise ValueError(f"No ingestion handler registered for '{source}'")
+
+        key = idempotency_key or self.derive_idempotency_key(source, payload)
+        created = await self._run(self._insert, key, source, json.dumps(payload, default=str), user_id)
+        job = await self.get_job(key)
+
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    def _insert(self, key: str, source: str, payload: str, user_id: Optional[str]) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                """
+                INSERT OR IGNORE INTO ingest_jobs
+                    (idempotency_key, source, payload, user_id, status, attempts, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+                """,
+                (key, source, payload, user_id, STATUS_QUEUED, now, now, now)
+            )
+            return cursor.rowcount == 1
+
+    async def get_job(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """Return the public status of a job"""
+        row = await self._run(self._select, idempotency_key)
+        if row is None:
+            return None
+        return {
+            "idempotency_key": row["idempotency_key"],
+            "source": row["source"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": datetime.utcfromtimestamp(row["created_at"]).isoformat() + "Z",
+            "updated_at": datetime.utcfromtimestamp(row["updated_at"]).isoformat() + "Z"
+        }
+
+    def _select(self, key: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT * FROM ingest_jobs WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Job counts per status"""
+        rows = await self._run(self._count_by_status)
+        return {
+            "enabled": self.enabled,
+            "workers": len(self._workers),
+            "jobs": {row["status"]: row["count"] for row in rows}
+        }
+
+    def _count_by_status(self):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT status, COUNT(*) AS count FROM ingest_jobs GROUP BY status"
+            ).fetchall()
+
+    async def accept_response(
+        self,
+        source: str,
+        payload: Dict[str, Any],
+        request: Request,
+        current_user: Dict[str, Any],
+        request_id: str
+    ) -> JSONResponse:
+        """Queue a validated device payload and acknowledge it with 202"""
+        job, created = await self.enqueue(
+            source,
+            payload,
+            user_id=current_user.get("username"),
+            idempotency_key=request.headers.get("Idempotency-Key")
+        )
+        status_url = f"{request.url.path}/status/{job['idempotency_key']}"
+        response = create_success_response(
+            message="Device data accepted for processing" if created else "Device data already received",
+            data={**job, "duplicate": not created, "status_url": status_url},
+            request_id=request_id
+        )
+        return JSONResponse(
+            content=response.dict(),
+            status_code=202,
+            headers={"Location": status_url}
+        )
+
+    async def status_response(self, idempotency_key: str, request: Request) -> Dict[str, Any]:
+        """Status lookup for a fast-ack device submission"""
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        job = await self.get_job(idempotency_key)
+        if not job:
+            raise HTTPException(
+                status_code=404,
+                detail=create_error_response(
+                    "INGESTION_JOB_NOT_FOUND",
+                    field="idempotency_key",
+                    value=idempotency_key,
+                    custom_message=f"No device data submission with key '{idempotency_key}'",
+                    request_id=request_id
+                ).dict()
+            )
+        return create_success_response(
+            message=f"Device data submission is {job['status']}",
+            data=job,
+            request_id=request_id
+        ).dict()
+
+    # =============== Consumer side ===============
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """
+                    SELECT * FROM ingest_jobs
+                    WHERE status = ? AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at LIMIT 1
+                    """,
+                    (STATUS_QUEUED, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        """
+                        UPDATE ingest_jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ?
+                        WHERE idempotency_key = ?
+                        """,
+                        (STATUS_PROCESSING, now + self.lease_seconds, now, row["idempotency_key"])
+                    )
+                conn.execute("COMMIT")
+                return row
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _finish(self, key: str, status: str, result: Optional[str], error: Optional[str], next_attempt_at: float):
+        with self._lock:
+            self._connect().execute(
+                """
+                UPDATE ingest_jobs
+                SET status = ?, result = ?, error = ?, next_attempt_at = ?, lease_until = NULL, updated_at = ?
+                WHERE idempotency_key = ?
+                """,
+                (status, result, error, next_attempt_at, time.time(), key)
+            )
+
+    def _save_steps(self, key: str, steps: str):
+        with self._lock:
+            self._connect().execute(
+                "UPDATE ingest_jobs SET steps = ?, updated_at = ? WHERE idempotency_key = ?",
+                (steps, time.time(), key)
+            )
+
+    def _prune(self) -> int:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            cursor = self._connect().execute(
+                "DELETE FROM ingest_jobs WHERE status = ? AND updated_at < ?",
+                (STATUS_COMPLETED, cutoff)
+            )
+            return cursor.rowcount
+
+    async def _worker(self, index: int):
+        last_prune = 0.0
+        while self._running:
+            try:
+                row = await self._run(self._claim)
+                if row is None:
+                    if index == 0 and time.time() - last_prune > 300:
+                        last_prune = time.time()
+                        await self._run(self._prune)
+                        recovered = await self._run(self._recover)
+                        if recovered:
+                            logger.warning(f"♻️ Re-queued {recovered} device ingestion jobs with expired leases")
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(row)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Device ingestion worker {index} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, row: sqlite3.Row):
+        key = row["idempotency_key"]
+        attempts = row["attempts"] + 1
+        handler = self._handlers.get(row["source"])
+        try:
+            if handler is None:
+                raise ValueError(f"No ingestion handler registered for '{row['source']}'")
+            steps = IngestionSteps(self, key, json.loads(row["steps"]) if row["steps"] else None)
+            # Never run past the lease, or _recover could hand the job to another worker
+            result = await asyncio.wait_for(
+                handler(json.loads(row["payload"]), row["user_id"], steps), timeout=self.lease_seconds
+            )
+            await self._run(self._finish, key, STATUS_COMPLETED, json.dumps(result, default=str), None, time.time())
+        except asyncio.CancelledError:
+            # Shutdown: hand the job back now rather than when its lease expires
+            self._finish(key, STATUS_QUEUED, None, "Interrupted by shutdown", time.time())
+            raise
+        except Exception as e:
+            permanent = isinstance(e, (ValueError, LookupError)) or attempts >= self.max_attempts
+            status = STATUS_FAILED if permanent else STATUS_QUEUED
+            next_attempt_at = time.time() + min(2 ** attempts, 300)
+            await self._run(self._finish, key, status, None, str(e), next_attempt_at)
+            logger.warning(f"Device ingestion job {key[:16]} ({row['source']}) attempt {attempts} failed: {e}")
+
+# Global device ingestion queue instance
+device_ingestion_queue = DeviceIngestionQueue()
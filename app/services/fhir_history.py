@@ -0,0 +1,193 @@
+"""
+FHIR Resource History Store
+==========================
+Keeps an immutable snapshot of every FHIR resource version so ``_history``
+and vread (``/{type}/{id}/_history/{vid}``) are served with a single indexed
+lookup instead of recomputing past versions from the audit trail.
+
+Snapshots live in ``fhir_resource_history`` (FHIR database), one document per
+``(resource_type, resource_id, version_id)``.
+
+ETags are weak and carry both the FHIR ``versionId`` and the resource's
+blockchain hash (``W/"<versionId>.<hash>"``). The hash lets an ``If-Match``
+update link the new version to the previous one without reading it first;
+a plain ``W/"<versionId>"`` is accepted as well.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+from pymongo import DESCENDING, ReplaceOne
+
+from app.services.mongo import mongodb_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+HISTORY_COLLECTION = "fhir_resource_history"
+
+def resource_etag(version_id: Any, blockchain_hash: Optional[str] = None, representation: Optional[str] = None) -> str:
+    """Build the weak ETag for a resource version.
+
+    ``representation`` tags subsetted reads (_elements/_summary), so a cached
+    subset never validates against the full resource or another subset.
+    """
+    value = f"{version_id}.{blockchain_hash}" if blockchain_hash else f"{version_id}"
+    if representation:
+        value = f"{value}~{representation}"
+    return f'W/"{value}"'
+
+def _split_etag(etag: str) -> Tuple[str, Optional[str]]:
+    """Strip the weak prefix and quotes; return (version[.hash], representation)"""
+    value = etag.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value, _, representation = value.strip('"').partition("~")
+    return value, representation or None
+
+def parse_resource_etag(etag: str) -> Tuple[Optional[str], Optional[str]]:
+    """Split an ETag into (versionId, blockchain_hash); either may be None"""
+    value, _ = _split_etag(etag)
+    if not value:
+        return None, None
+    version_id, _, blockchain_hash = value.partition(".")
+    return version_id, blockchain_hash or None
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    current = parse_resource_etag(etag)
+    current_representation = _split_etag(etag)[1]
+    for candidate in header.split(","):
+        if _split_etag(candidate)[1] != current_representation:
+            continue
+        version_id, blockchain_hash = parse_resource_etag(candidate)
+        if version_id == current[0] and (blockchain_hash is None or blockchain_hash == current[1]):
+            return True
+    return False
+
+class FHIRHistoryService:
+    """Store and read FHIR resource versions"""
+
+    def _collection(self):
+        return mongodb_service.get_fhir_collection(HISTORY_COLLECTION)
+
+    def _snapshot(
+        self,
+        resource_type: str,
+        resource_data: Dict[str, Any],
+        method: str,
+        blockchain_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        meta = resource_data.get("meta") or {}
+        return {
+            "resource_type": resource_type,
+            "resource_id": resource_data["id"],
+            "version_id": str(meta.get("versionId", "1")),
+            "method": method,
+            "resource_data": resource_data,
+            "blockchain_hash": blockchain_hash or meta.get("blockchain_hash"),
+            "recorded_at": datetime.utcnow()
+        }
+
+    async def record_version(
+        self,
+        resource_type: str,
+        resource_data: Dict[str, Any],
+        method: str = "PUT",
+        blockchain_hash: Optional[str] = None
+    ):
+        """Store a resource version (idempotent per version)"""
+        snapshot = self._snapshot(resource_type, resource_data, method, blockchain_hash)
+        await self._collection().replace_one(
+            {
+                "resource_type": resource_type,
+                "resource_id": snapshot["resource_id"],
+                "version_id": snapshot["version_id"]
+            },
+            snapshot,
+            upsert=True
+        )
+
+    async def record_versions(self, resource_type: str, resources: List[Dict[str, Any]], method: str = "PUT"):
+        """Store a batch of resource versions with one bulk write"""
+        operations = []
+        for resource_data in resources:
+            snapshot = self._snapshot(resource_type, resource_data, method)
+            operations.append(ReplaceOne(
+                {
+                    "resource_type": resource_type,
+                    "resource_id": snapshot["resource_id"],
+                    "version_id": snapshot["version_id"]
+                },
+                snapshot,
+                upsert=True
+            ))
+        if operations:
+            await self._collection().bulk_write(operations, ordered=False)
+
+    async def record_deletion(self, resource_type: str, resource_id: str, version_id: str):
+        """Store a deletion marker so _history shows the DELETE interaction"""
+        await self._collection().replace_one(
+            {"resource_type": resource_type, "resource_id": resource_id, "version_id": version_id},
+            {
+                "resource_type": resource_type,
+                "resource_id": resource_id,
+                "version_id": version_id,
+                "method": "DELETE",
+                "resource_data": None,
+                "recorded_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+
+    async def get_version(self, resource_type: str, resource_id: str, version_id: str) -> Optional[Dict[str, Any]]:
+        """vread: return one stored version snapshot"""
+        return await self._collection().find_one(
+            {"resource_type": resource_type, "resource_id": resource_id, "version_id": str(version_id)},
+            {"_id": 0}
+        )
+
+    async def get_history(
+        self,
+        resource_type: str,
+        resource_id: str,
+        count: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Return a FHIR history Bundle for a resource, newest version first"""
+        collection = self._collection()
+        query = {"resource_type": resource_type, "resource_id": resource_id}
+        total = await collection.count_documents(query)
+        cursor = collection.find(query, {"_id": 0}).sort("recorded_at", DESCENDING).skip(offset).limit(count)
+
+        entries = []
+        async for snapshot in cursor:
+            entry = {
+                "fullUrl": f"/{resource_type}/{resource_id}/_history/{snapshot['version_id']}",
+                "request": {
+                    "method": snapshot["method"],
+                    "url": f"{resource_type}/{resource_id}"
+                },
+                "response": {
+                    "status": "204" if snapshot["method"] == "DELETE" else "200",
+                    "etag": resource_etag(snapshot["version_id"], snapshot.get("blockchain_hash")),
+                    "lastModified": snapshot["recorded_at"].isoformat() + "Z"
+                }
+            }
+            if snapshot.get("resource_data"):
+                entry["resource"] = snapshot["resource_data"]
+            entries.append(entry)
+
+        return {
+            "resourceType": "Bundle",
+            "type": "history",
+            "total": total,
+            "entry": entries
+        }
+
+# Global FHIR history service instance
+fhir_history_service = FHIRHistoryService()
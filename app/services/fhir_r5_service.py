@@ -8,16 +8,22 @@ Transforms AVA4 MQTT data and existing medical records into FHIR R5 format.
 """
 
 import asyncio
+import hashlib
 import json
+import re
 import uuid
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any, Union, Tuple
 from bson import ObjectId
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 import os
 
 from app.services.mongo import mongodb_service
+from app.services.observation_lastn import observation_lastn_service
+from app.services.fhir_history import fhir_history_service, resource_etag, parse_resource_etag
 from app.services.blockchain_hash import blockchain_hash_service, BlockchainHash, HashVerificationResult
+from app.services.pipeline_tracing import pipeline_tracer
 from app.models.fhir_r5 import (
     FHIRResourceDocument, Patient, Observation, Device, Organization,
     Location, Condition, Medication, AllergyIntolerance, Encounter,
@@ -30,6 +36,67 @@ from app.models.master_data import Hospital
 
 logger = get_logger(__name__)
 
+# Elements flagged isSummary in the FHIR R5 spec, used for _summary=true.
+# Resource types not listed fall back to the full resource minus narrative.
+SUMMARY_ELEMENTS = {
+    "Patient": ["identifier", "active", "name", "telecom", "gender", "birthDate", "deceased",
+                "address", "managingOrganization", "link"],
+    "Observation": ["identifier", "basedOn", "partOf", "status", "category", "code", "subject",
+                    "focus", "encounter", "effective", "issued", "performer", "value",
+                    "dataAbsentReason", "interpretation", "hasMember", "derivedFrom", "component"],
+    "Device": ["identifier", "displayName", "status", "manufacturer", "manufactureDate",
+               "expirationDate", "lotNumber", "serialNumber", "name", "modelNumber", "partNumber",
+               "type", "version", "owner", "contact", "location", "url", "parent"],
+    "Organization": ["identifier", "active", "type", "name", "alias", "description", "partOf"],
+    "Location": ["identifier", "status", "operationalStatus", "name", "alias", "description",
+                 "mode", "type", "contact", "address", "form", "position", "managingOrganization", "partOf"],
+    "MedicationStatement": ["identifier", "partOf", "status", "category", "medication", "subject",
+                            "encounter", "effective", "dateAsserted", "informationSource",
+                            "derivedFrom", "reason", "adherence"],
+    "Encounter": ["identifier", "status", "class", "priority", "type", "serviceType", "subject",
+                  "subjectStatus", "episodeOfCare", "basedOn", "careTeam", "partOf",
+                  "serviceProvider", "participant", "appointment", "actualPeriod", "plannedStartDate",
+                  "plannedEndDate", "location"],
+    "AllergyIntolerance": ["identifier", "clinicalStatus", "verificationStatus", "type", "category",
+                           "criticality", "code", "patient", "onset", "recordedDate", "lastOccurrence"],
+    "Condition": ["identifier", "clinicalStatus", "verificationStatus", "category", "severity", "code",
+                  "bodySite", "subject", "encounter", "onset", "abatement", "recordedDate"]
+}
+
+# Elements that must always be returned for a valid subsetted resource
+MANDATORY_ELEMENTS = {
+    "Observation": ["status", "code"],
+    "Device": [],
+    "MedicationStatement": ["status", "medication", "subject"],
+    "Encounter": ["status"],
+    "AllergyIntolerance": ["patient"],
+    "Condition": ["subject"]
+}
+
+# Choice elements ([x]) expand to their typed field names in MongoDB
+CHOICE_ELEMENTS = {"value", "effective", "onset", "abatement", "deceased", "multipleBirth",
+                   "medication", "occurrence", "performed", "born", "timing"}
+CHOICE_TYPES = ["Quantity", "CodeableConcept", "CodeableReference", "String", "Boolean", "Integer",
+                "Range", "Ratio", "SampledData", "Time", "DateTime", "Period", "Attachment",
+                "Reference", "Instant", "Age", "Timing", "Date", "Duration"]
+
+# meta children kept on subsetted resources (the blockchain_* block is dropped)
+SUBSET_META_FIELDS = ["versionId", "lastUpdated", "source", "profile", "tag", "security"]
+
+BLOCKCHAIN_META_FIELDS = ["blockchain_hash", "blockchain_timestamp", "blockchain_nonce",
+                          "blockchain_block_height", "blockchain_previous_hash"]
+
+SUMMARY_MODES = {"true", "false", "text", "data", "count"}
+
+# Elements every subsetted resource already carries (meta as SUBSET_META_FIELDS)
+BASE_ELEMENTS = {"resourceType", "id", "meta"}
+
+ELEMENT_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+class FHIRPreconditionFailedError(Exception):
+    """Raised when an If-Match version does not match the stored resource"""
+    pass
+
 class FHIRR5Service:
     """Service for FHIR R5 resource management and data transformation"""
     
@@ -135,13 +202,14 @@ class FHIRR5Service:
             }
             
             # Generate blockchain hash for the resource
-            blockchain_hash_obj = await blockchain_hash_service.generate_resource_hash(
-                resource_data=resource_data,
-                include_merkle=True,
-                user_id=user_id,
-                request_id=request_id,
-                audit_context=audit_context
-            )
+            with pipeline_tracer.span("fhir.blockchain_hash"):
+                blockchain_hash_obj = await blockchain_hash_service.generate_resource_hash(
+                    resource_data=resource_data,
+                    include_merkle=True,
+                    user_id=user_id,
+                    request_id=request_id,
+                    audit_context=audit_context
+                )
             
             # Add blockchain metadata to FHIR resource
             resource_data["meta"]["blockchain_hash"] = blockchain_hash_obj.resource_hash
@@ -178,7 +246,14 @@ class FHIRR5Service:
             
             # Convert to dict and exclude None values (especially _id: null)
             doc_dict = fhir_doc.dict(by_alias=True, exclude_none=True)
-            result = await collection.insert_one(doc_dict)
+            with pipeline_tracer.span("fhir.insert"):
+                result = await collection.insert_one(doc_dict)
+            
+            with pipeline_tracer.span("fhir.history"):
+                await self._record_history(resource_type, resource_data, "POST", blockchain_hash_obj.resource_hash)
+            if resource_type == "Observation":
+                with pipeline_tracer.span("fhir.lastn_index"):
+                    await self._record_latest_observation(doc_dict)
             
             logger.info(f"Created FHIR {resource_type} resource: {resource_data['id']} with blockchain hash: {blockchain_hash_obj.resource_hash[:16]}...")
             
@@ -187,6 +262,7 @@ class FHIRR5Service:
                 "resource_id": resource_data["id"],
                 "mongo_id": str(result.inserted_id),
                 "resource": resource_data,
+                "etag": resource_etag(resource_data["meta"]["versionId"], blockchain_hash_obj.resource_hash),
                 "blockchain_hash": blockchain_hash_obj.resource_hash,
                 "blockchain_metadata": {
                     "hash": blockchain_hash_obj.resource_hash,
@@ -201,35 +277,257 @@ class FHIRR5Service:
             logger.error(f"Failed to create FHIR {resource_type}: {e}")
             raise
 
+    async def bulk_upsert_fhir_resources(
+        self,
+        resource_type: str,
+        resources: List[Dict[str, Any]],
+        source_system: str = "manual",
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        source_ip: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        skip_hashed: bool = False
+    ) -> Dict[str, Any]:
+        """Hash and store a batch of FHIR resources with a single unordered bulk write.
+        
+        Resources are upserted by ``resource_id`` so re-running a batch (e.g. after a
+        crashed migration) does not create duplicates. Blockchain hashes are still
+        generated one by one because each hash links to the previous one. With
+        ``skip_hashed``, resources already stored with a blockchain hash are left
+        untouched (reported in ``skipped``) instead of being hashed again.
+        """
+        if resource_type not in self.fhir_collections:
+            raise ValueError(f"Unsupported FHIR resource type: {resource_type}")
+        
+        collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
+        skipped = []
+        if skip_hashed:
+            ids = [resource_data["id"] for resource_data in resources if "id" in resource_data]
+            hashed = set()
+            if ids:
+                cursor = collection.find(
+                    {"resource_type": resource_type, "resource_id": {"$in": ids}, "blockchain_hash": {"$exists": True}},
+                    {"resource_id": 1}
+                )
+                hashed = {doc["resource_id"] async for doc in cursor}
+            skipped = [resource_data["id"] for resource_data in resources if resource_data.get("id") in hashed]
+            resources = [resource_data for resource_data in resources if resource_data.get("id") not in hashed]
+        
+        audit_context = {
+            "source_system": source_system,
+            "source_ip": source_ip,
+            "user_agent": user_agent,
+            "session_id": session_id,
+            "batch_id": batch_id
+        }
+        
+        operations = []
+        written_docs = []
+        failed = []
+        for resource_data in resources:
+            try:
+                if "id" not in resource_data:
+                    resource_data["id"] = str(uuid.uuid4())
+                resource_data["resourceType"] = resource_type
+                resource_data["meta"] = {
+                    "versionId": "1",
+                    "lastUpdated": datetime.utcnow().isoformat() + "Z",
+                    "source": source_system,
+                    "profile": [f"http://hl7.org/fhir/StructureDefinition/{resource_type}"]
+                }
+                
+                blockchain_hash_obj = await blockchain_hash_service.generate_resource_hash(
+                    resource_data=resource_data,
+                    include_merkle=True,
+                    user_id=user_id,
+                    request_id=str(uuid.uuid4()),
+                    audit_context=audit_context
+                )
+                
+                resource_data["meta"]["blockchain_hash"] = blockchain_hash_obj.resource_hash
+                resource_data["meta"]["blockchain_timestamp"] = blockchain_hash_obj.timestamp
+                resource_data["meta"]["blockchain_nonce"] = blockchain_hash_obj.nonce
+                resource_data["meta"]["blockchain_block_height"] = blockchain_hash_obj.block_height
+                
+                fhir_doc = FHIRResourceDocument(
+                    resource_type=resource_type,
+                    resource_id=resource_data["id"],
+                    fhir_version=self.fhir_version,
+                    resource_data=resource_data,
+                    source_system=source_system,
+                    recorded_datetime=datetime.utcnow(),
+                    blockchain_hash=blockchain_hash_obj.resource_hash,
+                    blockchain_previous_hash=blockchain_hash_obj.previous_hash,
+                    blockchain_timestamp=blockchain_hash_obj.timestamp,
+                    blockchain_nonce=blockchain_hash_obj.nonce,
+                    blockchain_merkle_root=blockchain_hash_obj.merkle_root,
+                    blockchain_block_height=blockchain_hash_obj.block_height,
+                    blockchain_signature=blockchain_hash_obj.signature,
+                    blockchain_verified=True,
+                    blockchain_verification_date=datetime.utcnow()
+                )
+                await self._extract_references(fhir_doc, resource_data)
+                
+                doc_dict = fhir_doc.dict(by_alias=True, exclude_none=True)
+                operations.append(ReplaceOne(
+                    {"resource_type": resource_type, "resource_id": resource_data["id"]},
+                    doc_dict,
+                    upsert=True
+                ))
+                written_docs.append(doc_dict)
+            except Exception as e:
+                failed.append({"resource_id": resource_data.get("id"), "error": str(e)})
+        
+        written = 0
+        if operations:
+            try:
+                result = await collection.bulk_write(operations, ordered=False)
+                written = result.upserted_count + result.matched_count
+            except BulkWriteError as e:
+                details = e.details or {}
+                written = details.get("nUpserted", 0) + details.get("nMatched", 0)
+                for write_error in details.get("writeErrors", []):
+                    index = write_error.get("index")
+                    failed.append({
+                        "index": index,
+                        "resource_id": written_docs[index]["resource_id"] if index is not None else None,
+                        "error": write_error.get("errmsg")
+                    })
+        
+        failed_ids = {item.get("resource_id") for item in failed}
+        written_docs = [doc_dict for doc_dict in written_docs if doc_dict["resource_id"] not in failed_ids]
+        try:
+            await fhir_history_service.record_versions(
+                resource_type, [doc_dict["resource_data"] for doc_dict in written_docs], method="PUT"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record history for bulk {resource_type} upsert: {e}")
+        if resource_type == "Observation":
+            for doc_dict in written_docs:
+                await self._record_latest_observation(doc_dict, replace=True)
+        
+        logger.info(f"Bulk upserted {written}/{len(resources)} FHIR {resource_type} resources ({len(failed)} failed)")
+        
+        return {
+            "success": not failed,
+            "written_count": written,
+            "failed_count": len(failed),
+            "failed": failed,
+            "skipped_count": len(skipped),
+            "skipped": skipped
+        }
+
+    async def _record_history(
+        self,
+        resource_type: str,
+        resource_data: Dict[str, Any],
+        method: str,
+        blockchain_hash: Optional[str] = None
+    ):
+        """Store the written version for _history/vread"""
+        try:
+            await fhir_history_service.record_version(resource_type, resource_data, method, blockchain_hash)
+        except Exception as e:
+            logger.warning(f"Failed to record history for {resource_type} {resource_data.get('id')}: {e}")
+
+    async def _record_latest_observation(self, doc: Dict[str, Any], replace: bool = False):
+        """Keep the $lastn index in step with a stored Observation"""
+        try:
+            await observation_lastn_service.record_observation(doc, replace=replace)
+        except Exception as e:
+            # The Observation itself is stored; the index can be rebuilt from it
+            logger.warning(f"Failed to update $lastn index for Observation {doc.get('resource_id')}: {e}")
+
     async def get_fhir_resource(
         self, 
         resource_type: str, 
-        resource_id: str
+        resource_id: str,
+        elements: Optional[str] = None,
+        summary: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Get a FHIR resource by ID, optionally subsetted with _elements/_summary"""
+        result = await self.get_fhir_resource_with_etag(resource_type, resource_id, elements, summary)
+        return result["resource"] if result else None
+
+    async def get_fhir_resource_with_etag(
+        self,
+        resource_type: str,
+        resource_id: str,
+        elements: Optional[str] = None,
+        summary: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
-        """Get a FHIR resource by ID"""
+        """Get a FHIR resource together with its ETag and last-modified time"""
         try:
             collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
+            projection, subsetted = self._resource_projection(resource_type, elements, summary)
+            if any(value == 1 for value in projection.values()):
+                # Inclusion projection: also fetch what the ETag is derived from
+                projection.update({"blockchain_hash": 1, "updated_at": 1})
             doc = await collection.find_one({
                 "resource_id": resource_id,
                 "is_deleted": False
-            })
+            }, projection)
             
-            if doc:
-                return doc["resource_data"]
-            return None
+            if not doc:
+                return None
+            
+            version_id = ((doc.get("resource_data") or {}).get("meta") or {}).get("versionId", "1")
+            representation = None
+            if subsetted:
+                # Subsets get their own ETag so they never validate a cached full resource
+                representation = hashlib.sha1(
+                    json.dumps(sorted(projection.items())).encode()
+                ).hexdigest()[:12]
+            return {
+                "resource": self._subsetted_resource(doc, subsetted),
+                "etag": resource_etag(version_id, doc.get("blockchain_hash"), representation),
+                "last_modified": doc.get("updated_at")
+            }
             
         except Exception as e:
             logger.error(f"Failed to get FHIR {resource_type} {resource_id}: {e}")
             raise
 
+    async def get_fhir_resource_version(
+        self,
+        resource_type: str,
+        resource_id: str,
+        version_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """vread: get a specific version of a FHIR resource from the history store"""
+        snapshot = await fhir_history_service.get_version(resource_type, resource_id, version_id)
+        if snapshot:
+            return snapshot
+        
+        # Versions written before the history store existed: only the current one is known
+        current = await self.get_fhir_resource_with_etag(resource_type, resource_id)
+        if current and str(current["resource"].get("meta", {}).get("versionId", "1")) == str(version_id):
+            return {
+                "resource_type": resource_type,
+                "resource_id": resource_id,
+                "version_id": str(version_id),
+                "method": "PUT",
+                "resource_data": current["resource"],
+                "blockchain_hash": parse_resource_etag(current["etag"])[1],
+                "recorded_at": current["last_modified"]
+            }
+        return None
+
     async def update_fhir_resource(
         self, 
         resource_type: str, 
         resource_id: str, 
         resource_data: Dict[str, Any],
-        source_system: str = "manual"
+        source_system: str = "manual",
+        if_match: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Update a FHIR resource with new blockchain hash"""
+        """Update a FHIR resource with new blockchain hash.
+        
+        ``if_match`` is the client's ETag. When it carries the blockchain hash the
+        update is applied conditionally without reading the current document;
+        a stale ETag raises FHIRPreconditionFailedError.
+        """
         try:
             collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
             
@@ -237,12 +535,32 @@ class FHIRR5Service:
             resource_data["id"] = resource_id
             resource_data["resourceType"] = resource_type
             
-            current_doc = await collection.find_one({"resource_id": resource_id})
-            if not current_doc:
-                raise ValueError(f"FHIR {resource_type} {resource_id} not found")
+            expected_version, expected_hash = parse_resource_etag(if_match) if if_match else (None, None)
+            update_filter: Dict[str, Any] = {"resource_id": resource_id}
+            
+            if expected_version and expected_hash:
+                current_version = int(expected_version)
+                previous_hash = expected_hash
+                update_filter["blockchain_hash"] = expected_hash
+                update_filter["is_deleted"] = False
+            else:
+                current_doc = await collection.find_one(
+                    {"resource_id": resource_id},
+                    {"resource_data.meta.versionId": 1, "blockchain_hash": 1}
+                )
+                if not current_doc:
+                    raise ValueError(f"FHIR {resource_type} {resource_id} not found")
+                current_version = int(current_doc["resource_data"].get("meta", {}).get("versionId", "1"))
+                previous_hash = current_doc.get("blockchain_hash")
+                if expected_version and expected_version != str(current_version):
+                    raise FHIRPreconditionFailedError(
+                        f"FHIR {resource_type} {resource_id} is at version {current_version}, not {expected_version}"
+                    )
+            
+            if expected_version:
+                update_filter["resource_data.meta.versionId"] = str(current_version)
             
             # Increment version
-            current_version = int(current_doc["resource_data"].get("meta", {}).get("versionId", "1"))
             new_version = current_version + 1
             
             resource_data["meta"] = {
@@ -253,7 +571,6 @@ class FHIRR5Service:
             }
             
             # Generate new blockchain hash for the updated resource
-            previous_hash = current_doc.get("blockchain_hash")
             blockchain_hash_obj = await blockchain_hash_service.generate_resource_hash(
                 resource_data=resource_data,
                 previous_hash=previous_hash,
@@ -282,21 +599,32 @@ class FHIRR5Service:
                 "blockchain_verified": True,
                 "blockchain_verification_date": datetime.utcnow()
             }
+            update_data.update(self._extract_index_fields(resource_data))
             
             result = await collection.update_one(
-                {"resource_id": resource_id},
+                update_filter,
                 {"$set": update_data}
             )
             
+            if expected_version and result.matched_count == 0:
+                raise FHIRPreconditionFailedError(
+                    f"FHIR {resource_type} {resource_id} does not match If-Match {if_match}"
+                )
+            
             if result.modified_count == 0:
                 raise ValueError(f"Failed to update FHIR {resource_type} {resource_id}")
             
+            await self._record_history(resource_type, resource_data, "PUT", blockchain_hash_obj.resource_hash)
+            if resource_type == "Observation":
+                await self._record_latest_observation({"resource_id": resource_id, **update_data}, replace=True)
+            
             logger.info(f"Updated FHIR {resource_type} resource: {resource_id} with new blockchain hash: {blockchain_hash_obj.resource_hash[:16]}...")
             
             return {
                 "success": True,
                 "resource_id": resource_id,
                 "resource": resource_data,
+                "etag": resource_etag(new_version, blockchain_hash_obj.resource_hash),
                 "blockchain_hash": blockchain_hash_obj.resource_hash,
                 "blockchain_metadata": {
                     "hash": blockchain_hash_obj.resource_hash,
@@ -307,6 +635,8 @@ class FHIRR5Service:
                 }
             }
             
+        except FHIRPreconditionFailedError:
+            raise
         except Exception as e:
             logger.error(f"Failed to update FHIR {resource_type} {resource_id}: {e}")
             raise
@@ -320,19 +650,31 @@ class FHIRR5Service:
         try:
             collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
             
-            result = await collection.update_one(
+            previous = await collection.find_one_and_update(
                 {"resource_id": resource_id},
                 {
                     "$set": {
                         "is_deleted": True,
                         "updated_at": datetime.utcnow()
                     }
-                }
+                },
+                projection={"is_deleted": 1, "resource_data.meta.versionId": 1},
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.modified_count == 0:
+            if previous is None:
                 raise ValueError(f"FHIR {resource_type} {resource_id} not found")
             
+            if not previous.get("is_deleted"):
+                version_id = int(previous.get("resource_data", {}).get("meta", {}).get("versionId", "1"))
+                try:
+                    await fhir_history_service.record_deletion(resource_type, resource_id, str(version_id + 1))
+                except Exception as e:
+                    logger.warning(f"Failed to record deletion history for {resource_type} {resource_id}: {e}")
+            
+            if resource_type == "Observation":
+                await observation_lastn_service.remove_observation(resource_id)
+            
             logger.info(f"Deleted FHIR {resource_type} resource: {resource_id}")
             
             return {
@@ -344,42 +686,113 @@ class FHIRR5Service:
             logger.error(f"Failed to delete FHIR {resource_type} {resource_id}: {e}")
             raise
 
-    async def search_fhir_resources(
+    def _build_search_query(self, search_params: FHIRSearchParams) -> Dict[str, Any]:
+        """Translate FHIR search parameters into a MongoDB query"""
+        # Build MongoDB query
+        query = {"is_deleted": False}
+        
+        # Add search filters
+        if search_params.id:
+            query["resource_id"] = search_params.id
+        
+        if search_params.patient:
+            query["patient_id"] = self._reference_filter(search_params.patient, "Patient")
+        
+        if search_params.subject:
+            query["subject_reference"] = {"$in": [ref.strip() for ref in search_params.subject.split(",")]}
+        
+        if search_params.encounter:
+            query["encounter_id"] = self._reference_filter(search_params.encounter, "Encounter")
+        
+        if search_params.device:
+            query["device_id"] = self._reference_filter(search_params.device, "Device")
+            
+        if search_params.status:
+            query["status"] = search_params.status
+            
+        if search_params.identifier:
+            query["resource_data.identifier.value"] = search_params.identifier
+        
+        # Token searches against the denormalized token fields
+        if search_params.code:
+            query["code_tokens"] = self._token_filter(search_params.code)
+        
+        if search_params.category:
+            query["category_tokens"] = self._token_filter(search_params.category)
+        
+        if search_params.source:
+            query["meta_source"] = search_params.source
+        
+        # Date range search
+        if search_params.date:
+            date_filter = self._parse_date_range(search_params.date)
+            if date_filter:
+                query["effective_datetime"] = date_filter
+        
+        if search_params.lastUpdated:
+            last_updated_filter = self._parse_date_range(search_params.lastUpdated)
+            if last_updated_filter:
+                query["last_updated"] = last_updated_filter
+        
+        return query
+
+    async def search_etag(
         self,
         resource_type: str,
         search_params: FHIRSearchParams
+    ) -> Tuple[str, int]:
+        """Compute a weak Bundle ETag from the matching count and newest updated_at.
+        
+        The count is the one the search needs anyway (``count_documents``, which
+        can be answered from an index); the newest ``updated_at`` is one extra
+        top-1 query that uses ``fhir_updated_at_idx`` or a top-k sort, never a
+        fetch of every match. Unchanged searches can then be answered with 304
+        before any resources are fetched. Returns the ETag and the total so the
+        search does not count again.
+        """
+        collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
+        query = self._build_search_query(search_params)
+        total = await collection.count_documents(query)
+        latest = None
+        if total:
+            newest = await collection.find(query, {"updated_at": 1, "_id": 0}).sort("updated_at", -1).limit(1).to_list(length=1)
+            latest = newest[0].get("updated_at") if newest else None
+        latest_updated = latest.isoformat() if isinstance(latest, datetime) else ""
+        
+        params = json.dumps(search_params.dict(exclude_none=True), sort_keys=True, default=str)
+        digest = hashlib.sha1(f"{resource_type}|{params}|{total}|{latest_updated}".encode()).hexdigest()
+        return f'W/"{digest}"', total
+
+    async def search_fhir_resources(
+        self,
+        resource_type: str,
+        search_params: FHIRSearchParams,
+        total: Optional[int] = None
     ) -> FHIRSearchResponse:
         """Search FHIR resources with standard parameters"""
         try:
             collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
             
-            # Build MongoDB query
-            query = {"is_deleted": False}
+            query = self._build_search_query(search_params)
             
-            # Add search filters
-            if search_params.id:
-                query["resource_id"] = search_params.id
+            # Count total results (reused when the caller already computed it for the ETag)
+            if total is None:
+                total = await collection.count_documents(query)
             
-            if search_params.patient:
-                query["patient_id"] = search_params.patient
-                
-            if search_params.status:
-                query["status"] = search_params.status
-                
-            if search_params.identifier:
-                query["resource_data.identifier.value"] = search_params.identifier
-            
-            # Date range search
-            if search_params.date:
-                date_filter = self._parse_date_range(search_params.date)
-                if date_filter:
-                    query["effective_datetime"] = date_filter
+            # _summary=count only needs the total
+            if search_params.summary == "count":
+                return FHIRSearchResponse(
+                    total=total,
+                    entry=[],
+                    link=self._build_search_links(resource_type, search_params, total)
+                )
             
-            # Count total results
-            total = await collection.count_documents(query)
+            projection, subsetted = self._resource_projection(
+                resource_type, search_params.elements, search_params.summary
+            )
             
             # Apply pagination and sorting
-            cursor = collection.find(query)
+            cursor = collection.find(query, projection)
             
             if search_params.sort:
                 sort_spec = self._parse_sort_spec(search_params.sort)
@@ -397,7 +810,7 @@ class FHIRR5Service:
             for doc in docs:
                 entries.append({
                     "fullUrl": f"/{resource_type}/{doc['resource_id']}",
-                    "resource": doc["resource_data"],
+                    "resource": self._subsetted_resource(doc, subsetted),
                     "search": {
                         "mode": "match"
                     }
@@ -416,6 +829,41 @@ class FHIRR5Service:
             logger.error(f"Failed to search FHIR {resource_type}: {e}")
             raise
 
+    async def backfill_search_index_fields(
+        self,
+        resource_type: str,
+        batch_size: int = 500,
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """Populate denormalized search fields on documents written before they existed"""
+        collection = mongodb_service.get_fhir_collection(self.fhir_collections[resource_type])
+        query: Dict[str, Any] = {} if force else {"code_tokens": {"$exists": False}}
+        projection = {"resource_data": 1}
+        
+        updated = 0
+        last_id = None
+        while True:
+            page_query = dict(query)
+            if last_id is not None:
+                page_query["_id"] = {"$gt": last_id}
+            docs = await collection.find(page_query, projection).sort("_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+            if not docs:
+                break
+            
+            operations = []
+            for doc in docs:
+                fields = self._extract_index_fields(doc.get("resource_data") or {})
+                # Mark the document as processed even when it carries no code
+                fields.setdefault("code_tokens", [])
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            last_id = docs[-1]["_id"]
+            logger.info(f"Backfilled search fields for {updated} {resource_type} resources")
+        
+        return {"success": True, "resource_type": resource_type, "updated_count": updated}
+
     # =============== AVA4 MQTT Data Transformation ===============
 
     async def transform_ava4_mqtt_to_fhir(
@@ -1119,34 +1567,93 @@ class FHIRR5Service:
 
     async def _extract_references(self, fhir_doc: FHIRResourceDocument, resource_data: Dict[str, Any]):
         """Extract references for MongoDB indexing"""
+        for field, value in self._extract_index_fields(resource_data).items():
+            setattr(fhir_doc, field, value)
+
+    def _extract_index_fields(self, resource_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the denormalized, indexed search fields for a FHIR resource"""
+        fields: Dict[str, Any] = {}
         
         # Extract patient reference
         if "subject" in resource_data and "reference" in resource_data["subject"]:
             ref = resource_data["subject"]["reference"]
+            fields["subject_reference"] = ref
             if ref.startswith("Patient/"):
-                fhir_doc.patient_id = ref.replace("Patient/", "")
+                fields["patient_id"] = ref.replace("Patient/", "")
         
         # Extract encounter reference
         if "encounter" in resource_data and "reference" in resource_data["encounter"]:
             ref = resource_data["encounter"]["reference"]
             if ref.startswith("Encounter/"):
-                fhir_doc.encounter_id = ref.replace("Encounter/", "")
+                fields["encounter_id"] = ref.replace("Encounter/", "")
         
         # Extract device reference
         if "device" in resource_data and "reference" in resource_data["device"]:
             ref = resource_data["device"]["reference"]
             if ref.startswith("Device/"):
-                fhir_doc.device_id = ref.replace("Device/", "")
+                fields["device_id"] = ref.replace("Device/", "")
         
         # Extract effective datetime
         if "effectiveDateTime" in resource_data:
-            fhir_doc.effective_datetime = datetime.fromisoformat(
+            fields["effective_datetime"] = datetime.fromisoformat(
                 resource_data["effectiveDateTime"].replace("Z", "+00:00")
             )
         
         # Extract status
         if "status" in resource_data:
-            fhir_doc.status = resource_data["status"]
+            fields["status"] = resource_data["status"]
+        
+        # Extract code/category search tokens
+        if "code" in resource_data:
+            fields["code_tokens"] = self._coding_tokens([resource_data["code"]])
+        if "category" in resource_data:
+            fields["category_tokens"] = self._coding_tokens(resource_data["category"])
+        
+        # Extract meta.lastUpdated / meta.source
+        meta = resource_data.get("meta") or {}
+        if meta.get("lastUpdated"):
+            try:
+                fields["last_updated"] = datetime.fromisoformat(meta["lastUpdated"].replace("Z", "+00:00"))
+            except ValueError:
+                pass
+        if meta.get("source"):
+            fields["meta_source"] = meta["source"]
+        
+        return fields
+
+    def _coding_tokens(self, concepts: Any) -> List[str]:
+        """Flatten CodeableConcepts into FHIR token search values.
+
+        Each coding yields "system|code", "system|" and the bare "code" so every
+        token form ([system]|[code], |[code], [code], [system]|) is an exact match.
+        """
+        if isinstance(concepts, dict):
+            concepts = [concepts]
+        tokens: List[str] = []
+        for concept in concepts or []:
+            if not isinstance(concept, dict):
+                continue
+            for coding in concept.get("coding") or []:
+                system = coding.get("system") or ""
+                code = coding.get("code")
+                if not code:
+                    continue
+                for token in (f"{system}|{code}", code, f"{system}|" if system else None):
+                    if token and token not in tokens:
+                        tokens.append(token)
+        return tokens
+
+    def _token_filter(self, value: str) -> Dict[str, Any]:
+        """Build a query for a token search parameter (comma-separated values are OR'ed)"""
+        tokens = [token.strip() for token in value.split(",") if token.strip()]
+        return {"$in": tokens}
+
+    def _reference_filter(self, value: str, resource_type: str) -> Dict[str, Any]:
+        """Build a query for a reference parameter given as "Type/id" or a bare id"""
+        prefix = f"{resource_type}/"
+        ids = [ref.strip().replace(prefix, "", 1) if ref.strip().startswith(prefix) else ref.strip()
+               for ref in value.split(",") if ref.strip()]
+        return {"$in": ids}
 
     def _convert_timestamp(self, timestamp: Union[int, str, None]) -> datetime:
         """Convert various timestamp formats to datetime"""
@@ -1215,6 +1722,89 @@ class FHIRR5Service:
         except:
             return None
 
+    def _resource_projection(
+        self,
+        resource_type: str,
+        elements: Optional[str] = None,
+        summary: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Translate _elements/_summary into a MongoDB projection.
+
+        Returns the projection and whether the resulting resources are a subset
+        (and must carry the SUBSETTED meta tag).
+        """
+        if summary and summary not in SUMMARY_MODES:
+            raise ValueError(f"Invalid _summary value: {summary}")
+        
+        projection: Dict[str, Any] = {"_id": 0, "resource_id": 1}
+        
+        if elements:
+            names = self._element_names(resource_type, elements) + MANDATORY_ELEMENTS.get(resource_type, [])
+        elif summary == "true" and resource_type in SUMMARY_ELEMENTS:
+            names = SUMMARY_ELEMENTS[resource_type] + MANDATORY_ELEMENTS.get(resource_type, [])
+        elif summary == "text":
+            names = ["text"] + MANDATORY_ELEMENTS.get(resource_type, [])
+        elif summary in ("true", "data"):
+            # Exclusion projection: everything except the narrative and blockchain meta
+            projection = {"_id": 0, "resource_data.text": 0}
+            for field in BLOCKCHAIN_META_FIELDS:
+                projection[f"resource_data.meta.{field}"] = 0
+            return projection, True
+        else:
+            projection["resource_data"] = 1
+            return projection, False
+        
+        for field in ("resourceType", "id"):
+            projection[f"resource_data.{field}"] = 1
+        for field in SUBSET_META_FIELDS:
+            projection[f"resource_data.meta.{field}"] = 1
+        for name in names:
+            if name in BASE_ELEMENTS:
+                continue
+            if name in CHOICE_ELEMENTS:
+                for type_name in CHOICE_TYPES:
+                    projection[f"resource_data.{name}{type_name}"] = 1
+            else:
+                projection[f"resource_data.{name}"] = 1
+        
+        return projection, True
+
+    @staticmethod
+    def _element_names(resource_type: str, elements: str) -> List[str]:
+        """Validate _elements: top-level element names only, as the FHIR spec requires.
+
+        ``Observation.code`` is accepted as ``code`` and ``value[x]`` as ``value``;
+        any other dotted path is rejected (it would also collide with its parent
+        in the MongoDB projection).
+        """
+        names = []
+        for name in elements.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name.startswith(f"{resource_type}."):
+                name = name[len(resource_type) + 1:]
+            if name.endswith("[x]"):
+                name = name[:-3]
+            if not ELEMENT_NAME.match(name):
+                raise ValueError(f"Invalid _elements value '{name}': only top-level element names are supported")
+            if name not in names:
+                names.append(name)
+        return names
+
+    def _subsetted_resource(self, doc: Dict[str, Any], subsetted: bool) -> Dict[str, Any]:
+        """Return the resource from a projected document, tagged if subsetted"""
+        resource = doc.get("resource_data") or {}
+        if subsetted:
+            meta = resource.setdefault("meta", {})
+            tags = meta.setdefault("tag", [])
+            tags.append({
+                "system": "http://terminology.hl7.org/CodeSystem/v3-ObservationValue",
+                "code": "SUBSETTED",
+                "display": "subsetted"
+            })
+        return resource
+
     def _parse_sort_spec(self, sort_param: str) -> List[Tuple[str, int]]:
         """Parse FHIR sort parameter"""
         sort_spec = []
@@ -16,12 +16,13 @@ Features:
 
 import uuid
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, AsyncIterator, Tuple
 from enum import Enum
 from dataclasses import dataclass
 from bson import ObjectId
 
 from app.services.mongo import mongodb_service
+from app.services.retention import retention_manager
 from app.utils.structured_logging import get_logger
 
 logger = get_logger(__name__)
@@ -117,6 +118,8 @@ class HashAuditLogService:
             await collection.create_index([("timestamp", -1), ("operation_type", 1)])
             await collection.create_index([("fhir_resource_type", 1), ("timestamp", -1)])
             await collection.create_index([("user_id", 1), ("timestamp", -1)])
+            # Keyset index for streaming exports (timestamp, _id) cursor
+            await collection.create_index([("timestamp", 1), ("_id", 1)])
             
             self.indexes_created = True
             logger.info("Hash audit log indexes created successfully")
@@ -240,6 +243,72 @@ class HashAuditLogService:
             # Don't raise exception to avoid breaking main operations
             return str(uuid.uuid4())  # Return dummy ID
     
+    def _build_audit_query(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        operation_types: Optional[List[HashAuditOperation]] = None,
+        status_filter: Optional[List[HashAuditStatus]] = None,
+        severity_filter: Optional[List[HashAuditSeverity]] = None,
+        user_id: Optional[str] = None,
+        fhir_resource_type: Optional[str] = None,
+        fhir_resource_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        blockchain_hash: Optional[str] = None,
+        has_errors_only: bool = False
+    ) -> Dict[str, Any]:
+        """Build the MongoDB filter shared by audit log queries and exports"""
+        query = {}
+        
+        # Date range filter
+        if start_date or end_date:
+            date_filter = {}
+            if start_date:
+                date_filter["$gte"] = start_date
+            if end_date:
+                date_filter["$lte"] = end_date
+            query["timestamp"] = date_filter
+        
+        # Operation type filter
+        if operation_types:
+            query["operation_type"] = {"$in": [op.value for op in operation_types]}
+        
+        # Status filter
+        if status_filter:
+            query["status"] = {"$in": [status.value for status in status_filter]}
+        
+        # Severity filter
+        if severity_filter:
+            query["severity"] = {"$in": [sev.value for sev in severity_filter]}
+        
+        # User filter
+        if user_id:
+            query["user_id"] = user_id
+        
+        # FHIR resource filters
+        if fhir_resource_type:
+            query["fhir_resource_type"] = fhir_resource_type
+        
+        if fhir_resource_id:
+            query["fhir_resource_id"] = fhir_resource_id
+        
+        if patient_id:
+            query["patient_id"] = patient_id
+        
+        if blockchain_hash:
+            query["blockchain_hash"] = blockchain_hash
+        
+        # Error filter
+        if has_errors_only:
+            query["has_error"] = True
+        
+        # Additional filters
+        if filters:
+            query.update(filters)
+        
+        return query
+    
     async def get_audit_logs(
         self,
         filters: Optional[Dict[str, Any]] = None,
@@ -264,54 +333,20 @@ class HashAuditLogService:
             await self._ensure_indexes()
             collection = mongodb_service.get_collection(self.collection_name)
             
-            # Build query
-            query = {}
-            
-            # Date range filter
-            if start_date or end_date:
-                date_filter = {}
-                if start_date:
-                    date_filter["$gte"] = start_date
-                if end_date:
-                    date_filter["$lte"] = end_date
-                query["timestamp"] = date_filter
-            
-            # Operation type filter
-            if operation_types:
-                query["operation_type"] = {"$in": [op.value for op in operation_types]}
-            
-            # Status filter
-            if status_filter:
-                query["status"] = {"$in": [status.value for status in status_filter]}
-            
-            # Severity filter
-            if severity_filter:
-                query["severity"] = {"$in": [sev.value for sev in severity_filter]}
-            
-            # User filter
-            if user_id:
-                query["user_id"] = user_id
-            
-            # FHIR resource filters
-            if fhir_resource_type:
-                query["fhir_resource_type"] = fhir_resource_type
-            
-            if fhir_resource_id:
-                query["fhir_resource_id"] = fhir_resource_id
-            
-            if patient_id:
-                query["patient_id"] = patient_id
-            
-            if blockchain_hash:
-                query["blockchain_hash"] = blockchain_hash
-            
-            # Error filter
-            if has_errors_only:
-                query["has_error"] = True
-            
-            # Additional filters
-            if filters:
-                query.update(filters)
+            query = self._build_audit_query(
+                filters=filters,
+                start_date=start_date,
+                end_date=end_date,
+                operation_types=operation_types,
+                status_filter=status_filter,
+                severity_filter=severity_filter,
+                user_id=user_id,
+                fhir_resource_type=fhir_resource_type,
+                fhir_resource_id=fhir_resource_id,
+                patient_id=patient_id,
+                blockchain_hash=blockchain_hash,
+                has_errors_only=has_errors_only
+            )
             
             # Count total results
             total_count = await collection.count_documents(query)
@@ -343,6 +378,52 @@ class HashAuditLogService:
             logger.error(f"Failed to query audit logs: {e}")
             raise
     
+    async def iter_audit_logs(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        operation_types: Optional[List[HashAuditOperation]] = None,
+        resume_after: Optional[Tuple[datetime, str]] = None,
+        max_records: Optional[int] = None,
+        batch_size: int = 1000,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream audit logs in chronological order straight from a MongoDB cursor.
+        
+        Documents are ordered by ``(timestamp, _id)`` so an interrupted export can be
+        resumed by passing the timestamp and ``_id`` of the last record received as
+        ``resume_after``. Only ``batch_size`` documents are held in memory at a time.
+        """
+        await self._ensure_indexes()
+        collection = mongodb_service.get_collection(self.collection_name)
+        
+        query = self._build_audit_query(
+            filters=filters,
+            start_date=start_date,
+            end_date=end_date,
+            operation_types=operation_types
+        )
+        
+        # Keyset pagination: strictly after the last exported (timestamp, _id)
+        if resume_after:
+            last_timestamp, last_id = resume_after
+            keyset = {"$or": [
+                {"timestamp": {"$gt": last_timestamp}},
+                {"timestamp": last_timestamp, "_id": {"$gt": last_id}}
+            ]}
+            query = {"$and": [query, keyset]} if query else keyset
+        
+        cursor = collection.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+        if max_records:
+            cursor = cursor.limit(max_records)
+        
+        async for log in cursor:
+            if "_id" in log and isinstance(log["_id"], ObjectId):
+                log["_id"] = str(log["_id"])
+            if "timestamp" in log and isinstance(log["timestamp"], datetime):
+                log["timestamp"] = log["timestamp"].isoformat() + "Z"
+            yield log
+    
     async def get_audit_statistics(
         self,
         start_date: Optional[datetime] = None,
@@ -629,11 +710,12 @@ class HashAuditLogService:
             }
             
             if not dry_run and count_to_delete > 0:
-                # Perform actual deletion
-                delete_result = await collection.delete_many(query)
-                result["deleted_count"] = delete_result.deleted_count
+                # Archive to disk before deleting so old entries stay available for audits
+                archive = await retention_manager.archive_collection(self.collection_name, older_than_days=retention_days)
+                result["deleted_count"] = archive["archived"]
+                result["archive_files"] = archive["files"]
                 
-                logger.info(f"Cleaned up {delete_result.deleted_count} old audit logs older than {retention_days} days")
+                logger.info(f"Archived and cleaned up {archive['archived']} old audit logs older than {retention_days} days")
             
             return result
             
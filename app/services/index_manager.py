@@ -3,6 +3,7 @@ from datetime import datetime
 from pymongo import ASCENDING, DESCENDING, TEXT, GEO2D
 from pymongo.errors import OperationFailure
 from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
 from config import logger
 import asyncio
 
@@ -31,6 +32,11 @@ class IndexManager:
                     "keys": [("first_name", TEXT), ("last_name", TEXT), ("phone", TEXT), ("email", TEXT)],
                     "background": True
                 },
+                {
+                    "name": "patient_search_tokens_idx",
+                    "keys": [("search_tokens", ASCENDING), ("_id", ASCENDING)],
+                    "background": True
+                },
                 {
                     "name": "patient_hospital_idx",
                     "keys": [("new_hospital_ids", ASCENDING), ("is_deleted", ASCENDING)],
@@ -374,6 +380,76 @@ class IndexManager:
                     "name": "obs_encounter_idx",
                     "keys": [("encounter_id", ASCENDING)],
                     "background": True
+                },
+                {
+                    "name": "obs_patient_code_time_idx",
+                    "keys": [("patient_id", ASCENDING), ("code_tokens", ASCENDING), ("effective_datetime", DESCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "obs_patient_category_time_idx",
+                    "keys": [("patient_id", ASCENDING), ("category_tokens", ASCENDING), ("effective_datetime", DESCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "obs_device_time_idx",
+                    "keys": [("device_id", ASCENDING), ("effective_datetime", DESCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "obs_subject_reference_idx",
+                    "keys": [("subject_reference", ASCENDING), ("effective_datetime", DESCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "obs_last_updated_idx",
+                    "keys": [("last_updated", DESCENDING)],
+                    "background": True,
+                    "sparse": True
+                },
+                {
+                    "name": "obs_meta_source_idx",
+                    "keys": [("meta_source", ASCENDING)],
+                    "background": True,
+                    "sparse": True
+                }
+            ],
+            
+            "fhir_observation_latest": [
+                {
+                    "name": "lastn_patient_code_idx",
+                    "keys": [("patient_id", ASCENDING), ("code", ASCENDING)],
+                    "unique": True,
+                    "background": True
+                },
+                {
+                    "name": "lastn_patient_code_tokens_idx",
+                    "keys": [("patient_id", ASCENDING), ("code_tokens", ASCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "lastn_patient_category_idx",
+                    "keys": [("patient_id", ASCENDING), ("category_tokens", ASCENDING)],
+                    "background": True
+                },
+                {
+                    "name": "lastn_resource_idx",
+                    "keys": [("recent.resource_id", ASCENDING)],
+                    "background": True
+                }
+            ],
+            
+            "fhir_resource_history": [
+                {
+                    "name": "history_version_idx",
+                    "keys": [("resource_type", ASCENDING), ("resource_id", ASCENDING), ("version_id", ASCENDING)],
+                    "unique": True,
+                    "background": True
+                },
+                {
+                    "name": "history_recorded_idx",
+                    "keys": [("resource_type", ASCENDING), ("resource_id", ASCENDING), ("recorded_at", DESCENDING)],
+                    "background": True
                 }
             ],
             
@@ -762,6 +838,9 @@ class IndexManager:
             skipped = len(master_data_collections) - len(accessible_collections)
             logger.info(f"⚠️ Skipped {skipped} collections due to insufficient permissions")
         
+        # Time-series companions of the device vital histories (opt-in)
+        await vital_history_store.ensure_collections()
+        
         logger.info("✅ Database index creation completed")
         
         # Log summary
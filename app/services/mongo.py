@@ -1,6 +1,12 @@
 import ssl
+from collections import Counter
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
+from app.services.connection_factory import (
+    mongo_pool_options, analytics_read_preference, pool_metrics,
+    NodeHealth, read_routes, current_read_workload
+)
 from config import settings
 from config import logger
 
@@ -9,6 +15,10 @@ class MongoDBService:
         self.client = None
         self.main_db = None  # AMY database for legacy data
         self.fhir_db = None  # MFC_FHIR_R5 database for FHIR resources
+        self.analytics_client = None  # Optional dedicated analytics node
+        self.analytics_health = NodeHealth()
+        self.read_routes = read_routes()
+        self.read_route_counts = Counter()
         
     async def connect(self):
         """Connect to MongoDB with production SSL configuration"""
@@ -29,7 +39,8 @@ class MongoDBService:
                 "tlsAllowInvalidCertificates": True,
                 "tlsAllowInvalidHostnames": True,
                 "serverSelectionTimeoutMS": 10000,
-                "connectTimeoutMS": 10000
+                "connectTimeoutMS": 10000,
+                **mongo_pool_options()
             }
             
             # Only add SSL certificate files if they exist
@@ -50,7 +61,11 @@ class MongoDBService:
             
             # Test connection
             await self.client.admin.command('ping')
-            logger.info("✅ Connected to production MongoDB cluster")
+            logger.info(
+                f"✅ Connected to production MongoDB cluster "
+                f"(pool {settings.mongodb_min_pool_size}-{settings.mongodb_max_pool_size}, "
+                f"compressors {settings.mongodb_compressors})"
+            )
             
             # Set databases
             self.main_db = self.client[settings.mongodb_main_db]  # AMY database
@@ -58,6 +73,10 @@ class MongoDBService:
             
             logger.info(f"📊 Main database: {settings.mongodb_main_db}")
             logger.info(f"🏥 FHIR database: {settings.mongodb_fhir_db}")
+            logger.info(f"🔀 Read routing: {self.read_routes}")
+            
+            if settings.mongodb_analytics_uri:
+                await self._connect_analytics_node()
             
         except Exception as e:
             logger.error(f"❌ Production MongoDB connection failed: {e}")
@@ -68,8 +87,20 @@ class MongoDBService:
             self.main_db = None
             self.fhir_db = None
     
+    async def _connect_analytics_node(self):
+        """Connect the dedicated analytics node; reads fall back while it is unreachable"""
+        options = {**mongo_pool_options(), "event_listeners": [self.analytics_health]}
+        self.analytics_client = AsyncIOMotorClient(settings.mongodb_analytics_uri, **options)
+        try:
+            await self.analytics_client.admin.command('ping')
+            logger.info("✅ Connected to MongoDB analytics node")
+        except Exception as e:
+            logger.warning(f"⚠️ MongoDB analytics node unavailable, routing its reads to the main cluster: {e}")
+    
     async def disconnect(self):
         """Disconnect from MongoDB"""
+        if self.analytics_client:
+            self.analytics_client.close()
         if self.client:
             self.client.close()
             logger.info("Disconnected from MongoDB")
@@ -88,6 +119,47 @@ class MongoDBService:
             raise Exception("FHIR database not connected - check connection configuration")
         return self.fhir_db[collection_name]
     
+    def read_route(self, workload: Optional[str] = None) -> str:
+        """Route (primary / secondary / analytics_node) that serves a read-only workload"""
+        route = self.read_routes.get(workload or current_read_workload(), "secondary")
+        if route == "analytics_node" and not (self.analytics_client and self.analytics_health.available):
+            route = "secondary"
+        return route
+    
+    def get_analytics_collection(self, collection_name: str, db_type: str = "main", workload: Optional[str] = None):
+        """Collection handle for read-only analytics, visualization and reporting queries
+        
+        The workload defaults to the one set for the current request
+        (``read_workload_dependency``) and is routed by MONGODB_READ_ROUTING.
+        """
+        route = self.read_route(workload)
+        self.read_route_counts[route] += 1
+        if route == "analytics_node":
+            db_name = settings.mongodb_fhir_db if db_type == "fhir" else settings.mongodb_main_db
+            return self.analytics_client[db_name][collection_name]
+        collection = self.get_fhir_collection(collection_name) if db_type == "fhir" else self.get_collection(collection_name)
+        if route == "primary":
+            return collection
+        return collection.with_options(read_preference=analytics_read_preference())
+    
+    def pool_metrics(self):
+        """Connection pool utilization for this worker"""
+        return pool_metrics.snapshot()
+    
+    def read_routing_status(self):
+        """Configured read routes, analytics node health and reads served per route"""
+        return {
+            "routes": self.read_routes,
+            "read_preference": settings.mongodb_analytics_read_preference,
+            "max_staleness_seconds": settings.mongodb_analytics_max_staleness_seconds,
+            "analytics_node": {
+                "configured": bool(settings.mongodb_analytics_uri),
+                "available": bool(self.analytics_client) and self.analytics_health.available,
+                "heartbeat_failures": self.analytics_health.failures
+            },
+            "reads_by_route": dict(self.read_route_counts)
+        }
+    
     def get_database(self, db_type: str = "main"):
         """Get database instance by type"""
         if db_type == "fhir":
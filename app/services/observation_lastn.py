@@ -0,0 +1,277 @@
+"""
+Observation Latest-Value Index
+=============================
+Backs the FHIR ``Observation/$lastn`` operation with a small collection holding
+the most recent Observations per ``(patient_id, code)``, so ward overviews and
+dashboards load the latest vitals with one indexed query instead of sorting
+full Observation searches.
+
+Each index document looks like::
+
+    {
+        "patient_id": "...",
+        "code": "http://loinc.org|8867-4",      # primary coding of the Observation
+        "code_tokens": [...],                    # same tokens as fhir_observations
+        "category_tokens": [...],
+        "recent": [                              # newest first, at most LASTN_DEPTH
+            {"resource_id": "...", "effective_datetime": ..., "resource": {...}}
+        ],
+        "updated_at": ...
+    }
+
+The ``recent`` array is maintained with a single pipeline update that drops any
+previous version of the Observation and inserts the new one at its sorted
+position, so concurrent readers and writers never see it missing, unsorted or
+oversized.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+from app.services.mongo import mongodb_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+LASTN_COLLECTION = "fhir_observation_latest"
+OBSERVATION_COLLECTION = "fhir_observations"
+
+class ObservationLastNService:
+    """Maintain and query the latest Observations per patient and code"""
+
+    def __init__(self):
+        # Number of Observations kept per (patient_id, code); larger ``max``
+        # values fall back to the (patient_id, code_tokens, effective_datetime) index
+        self.depth = int(os.getenv("FHIR_LASTN_DEPTH", "10"))
+
+    def _collection(self):
+        return mongodb_service.get_fhir_collection(LASTN_COLLECTION)
+
+    @staticmethod
+    def primary_code(resource_data: Dict[str, Any]) -> Optional[str]:
+        """Return "system|code" of the first coding of the Observation code"""
+        for coding in (resource_data.get("code") or {}).get("coding") or []:
+            if coding.get("code"):
+                return f"{coding.get('system') or ''}|{coding['code']}"
+        return None
+
+    def _entry(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "resource_id": doc["resource_id"],
+            "effective_datetime": doc.get("effective_datetime") or doc.get("recorded_datetime") or datetime.utcnow(),
+            "resource": doc["resource_data"]
+        }
+
+    def _insert_pipeline(self, entry: Dict[str, Any], code_tokens: List[str], category_tokens: List[str]) -> List[Dict[str, Any]]:
+        """Update pipeline replacing ``entry``'s resource in ``recent`` (kept newest first)"""
+        effective = {"$literal": entry["effective_datetime"]}
+        return [{
+            "$set": {
+                "code_tokens": {"$literal": code_tokens},
+                "category_tokens": {"$literal": category_tokens},
+                "updated_at": datetime.utcnow(),
+                "recent": {
+                    "$let": {
+                        "vars": {
+                            "others": {
+                                "$filter": {
+                                    "input": {"$ifNull": ["$recent", []]},
+                                    "cond": {"$ne": ["$$this.resource_id", {"$literal": entry["resource_id"]}]}
+                                }
+                            }
+                        },
+                        "in": {
+                            "$slice": [
+                                {
+                                    "$concatArrays": [
+                                        {"$filter": {"input": "$$others", "cond": {"$gte": ["$$this.effective_datetime", effective]}}},
+                                        {"$literal": [entry]},
+                                        {"$filter": {"input": "$$others", "cond": {"$lt": ["$$this.effective_datetime", effective]}}}
+                                    ]
+                                },
+                                self.depth
+                            ]
+                        }
+                    }
+                }
+            }
+        }]
+
+    async def record_observation(self, doc: Dict[str, Any], replace: bool = False):
+        """Add a stored Observation document to the latest-value index.
+
+        The previous version of the same Observation is replaced in the same
+        update. ``replace`` also drops it from other entries (used on update,
+        where the code or patient may have changed); that happens after the new
+        version is in place, so a reader never finds the Observation missing.
+        """
+        resource_id = doc.get("resource_id")
+        patient_id = doc.get("patient_id")
+        code = self.primary_code(doc.get("resource_data") or {})
+        if not patient_id or not code or doc.get("is_deleted"):
+            if replace and resource_id:
+                await self.remove_observation(resource_id)
+            return
+
+        await self._collection().update_one(
+            {"patient_id": patient_id, "code": code},
+            self._insert_pipeline(self._entry(doc), doc.get("code_tokens") or [], doc.get("category_tokens") or []),
+            upsert=True
+        )
+        if replace and resource_id:
+            await self.remove_observation(resource_id, keep=(patient_id, code))
+
+    async def remove_observation(self, resource_id: str, keep: Optional[Tuple[str, str]] = None):
+        """Drop an Observation from every index entry that references it, except ``keep`` (patient_id, code)"""
+        query: Dict[str, Any] = {"recent.resource_id": resource_id}
+        if keep:
+            query["$nor"] = [{"patient_id": keep[0], "code": keep[1]}]
+        await self._collection().update_many(
+            query,
+            {
+                "$pull": {"recent": {"resource_id": resource_id}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+
+    async def lastn(
+        self,
+        patient_ids: List[str],
+        code: Optional[str] = None,
+        category: Optional[str] = None,
+        max_per_code: int = 1
+    ) -> Dict[str, Any]:
+        """Return a searchset Bundle with the last ``max_per_code`` Observations per code"""
+        query: Dict[str, Any] = {"patient_id": {"$in": patient_ids}}
+        if code:
+            query["code_tokens"] = {"$in": [token.strip() for token in code.split(",") if token.strip()]}
+        if category:
+            query["category_tokens"] = {"$in": [token.strip() for token in category.split(",") if token.strip()]}
+
+        projection = {"patient_id": 1, "code": 1, "recent": {"$slice": max_per_code}}
+        cursor = self._collection().find(query, projection).sort([("patient_id", ASCENDING), ("code", ASCENDING)])
+
+        entries = []
+        async for doc in cursor:
+            recent = doc.get("recent") or []
+            if max_per_code > self.depth and len(recent) == self.depth:
+                resources = await self._query_observations(doc["patient_id"], doc["code"], max_per_code)
+            else:
+                resources = [item["resource"] for item in recent]
+
+            for resource in resources:
+                entries.append({
+                    "fullUrl": f"/Observation/{resource.get('id')}",
+                    "resource": resource,
+                    "search": {"mode": "match"}
+                })
+
+        return {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(entries),
+            "entry": entries,
+            "link": []
+        }
+
+    async def _query_observations(self, patient_id: str, code: str, limit: int) -> List[Dict[str, Any]]:
+        """Read beyond the stored depth from fhir_observations via the compound index"""
+        collection = mongodb_service.get_fhir_collection(OBSERVATION_COLLECTION)
+        cursor = collection.find(
+            {"patient_id": patient_id, "code_tokens": code, "is_deleted": False},
+            {"resource_data": 1}
+        ).sort("effective_datetime", DESCENDING).limit(limit)
+        return [doc["resource_data"] async for doc in cursor]
+
+    async def rebuild(self, patient_ids: Optional[List[str]] = None, batch_size: int = 1000) -> Dict[str, Any]:
+        """Backfill the index from fhir_observations.
+
+        Observations are streamed in patient order and entries are written one
+        patient at a time, so memory holds a single patient's groups. Entries
+        are replaced in place and stale ones removed afterwards, so the index
+        stays readable while the rebuild runs.
+        """
+        started_at = datetime.utcnow()
+        scope: Dict[str, Any] = {"patient_id": {"$in": patient_ids}} if patient_ids else {}
+
+        source = mongodb_service.get_fhir_collection(OBSERVATION_COLLECTION)
+        collection = self._collection()
+        projection = {
+            "resource_id": 1, "resource_data": 1, "patient_id": 1, "effective_datetime": 1,
+            "recorded_datetime": 1, "code_tokens": 1, "category_tokens": 1
+        }
+
+        groups: Dict[str, Dict[str, Any]] = {}
+        current_patient = None
+        operations: List[ReplaceOne] = []
+        scanned = 0
+        written = 0
+
+        async def flush(force: bool = False):
+            nonlocal operations, written
+            if operations and (force or len(operations) >= batch_size):
+                await collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+                operations = []
+
+        cursor = source.find({**scope, "is_deleted": False}, projection).sort("patient_id", ASCENDING).batch_size(batch_size)
+        async for doc in cursor:
+            scanned += 1
+            code = self.primary_code(doc.get("resource_data") or {})
+            if not doc.get("patient_id") or not code:
+                continue
+
+            if doc["patient_id"] != current_patient:
+                operations.extend(self._entry_replacements(current_patient, groups))
+                await flush()
+                groups = {}
+                current_patient = doc["patient_id"]
+
+            group = groups.setdefault(code, {
+                "code_tokens": doc.get("code_tokens") or [],
+                "category_tokens": doc.get("category_tokens") or [],
+                "recent": []
+            })
+            group["recent"].append(self._entry(doc))
+            if len(group["recent"]) > 2 * self.depth:
+                group["recent"].sort(key=lambda item: item["effective_datetime"], reverse=True)
+                del group["recent"][self.depth:]
+
+        operations.extend(self._entry_replacements(current_patient, groups))
+        await flush(force=True)
+
+        stale = await collection.delete_many({**scope, "updated_at": {"$lt": started_at}})
+
+        logger.info(f"Rebuilt $lastn index: {written} entries from {scanned} observations, {stale.deleted_count} stale entries removed")
+
+        return {
+            "success": True,
+            "observations_scanned": scanned,
+            "entries_written": written,
+            "stale_entries_removed": stale.deleted_count
+        }
+
+    def _entry_replacements(self, patient_id: Optional[str], groups: Dict[str, Dict[str, Any]]) -> List[ReplaceOne]:
+        """Index entries of one patient's (code -> group) map as upserting replacements"""
+        operations = []
+        for code, group in groups.items():
+            group["recent"].sort(key=lambda item: item["effective_datetime"], reverse=True)
+            operations.append(ReplaceOne(
+                {"patient_id": patient_id, "code": code},
+                {
+                    "patient_id": patient_id,
+                    "code": code,
+                    "code_tokens": group["code_tokens"],
+                    "category_tokens": group["category_tokens"],
+                    "recent": group["recent"][:self.depth],
+                    "updated_at": datetime.utcnow()
+                },
+                upsert=True
+            ))
+        return operations
+
+# Global $lastn service instance
+observation_lastn_service = ObservationLastNService()
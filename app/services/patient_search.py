@@ -0,0 +1,184 @@
+"""
+Patient Search Tokens
+====================
+Indexed prefix search for the admin patient list.
+
+Every patient carries a ``search_tokens`` array built from its names and
+identifiers:
+
+- names (``first_name``, ``last_name``, ``nickname``; Thai or English) are
+  NFKC-normalized, case-folded, split into words and expanded into edge
+  n-grams (``somchai`` → ``s``, ``so``, ``som``, …)
+- ``id_card``, ``phone`` and ``mobile_no`` are reduced to digits and expanded
+  the same way; ``+66`` numbers also get their local ``0`` form
+
+A search term then becomes an equality match on the multikey
+``search_tokens`` index instead of an unanchored ``$regex`` scan. Documents
+written without tokens (e.g. Qube-Vital patients created by the MQTT
+listener) are still found by a legacy regex branch that only looks at the
+untokenized documents, until the backfill is re-run.
+"""
+
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+from pymongo import UpdateOne
+
+from app.services.mongo import mongodb_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+SEARCH_TOKENS_FIELD = "search_tokens"
+NAME_FIELDS = ("first_name", "last_name", "nickname")
+NUMBER_FIELDS = ("id_card", "phone", "mobile_no")
+SEARCH_SOURCE_FIELDS = NAME_FIELDS + NUMBER_FIELDS
+
+# Longest prefix stored per word; longer search terms are truncated to it
+MAX_PREFIX_LENGTH = 20
+
+# Fields returned by the patient list/search endpoints unless full documents are requested
+PATIENT_LIST_PROJECTION = {
+    "first_name": 1,
+    "last_name": 1,
+    "nickname": 1,
+    "gender": 1,
+    "birth_date": 1,
+    "id_card": 1,
+    "phone": 1,
+    "mobile_no": 1,
+    "email": 1,
+    "new_hospital_ids": 1,
+    "watch_mac_address": 1,
+    "ava_mac_address": 1,
+    "registration_status": 1,
+    "is_active": 1,
+    "created_at": 1,
+    "updated_at": 1
+}
+
+_WORD_SPLIT = re.compile(r"[\s\-_.,/()'\"]+")
+_NON_DIGITS = re.compile(r"\D")
+_PHONE_LIKE = re.compile(r"[\d\s\-+().]+")
+
+def _normalize(value: Any) -> str:
+    return unicodedata.normalize("NFKC", str(value)).casefold().strip()
+
+def _edge_ngrams(word: str) -> List[str]:
+    return [word[:length] for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1)]
+
+def _is_international(digits: str) -> bool:
+    """Whether stored digits also get a local ``0`` form (``66`` country code, full length)"""
+    return digits.startswith("66") and len(digits) >= 10
+
+def _number_variants(value: Any) -> List[str]:
+    digits = _NON_DIGITS.sub("", str(value))
+    if not digits:
+        return []
+    variants = [digits]
+    if _is_international(digits):
+        variants.append("0" + digits[2:])
+    return variants
+
+def build_search_tokens(patient: Dict[str, Any]) -> List[str]:
+    """Edge n-gram tokens for a patient document (or a partial one)"""
+    tokens = set()
+    for field in NAME_FIELDS:
+        value = patient.get(field)
+        if value:
+            for word in _WORD_SPLIT.split(_normalize(value)):
+                if word:
+                    tokens.update(_edge_ngrams(word))
+    for field in NUMBER_FIELDS:
+        value = patient.get(field)
+        if value:
+            for digits in _number_variants(value):
+                tokens.update(_edge_ngrams(digits))
+    return sorted(tokens)
+
+def search_terms(search: str) -> List[str]:
+    """Normalize a search string into the tokens it must match.
+
+    Numbers are matched in their local ``0`` form, which every stored phone
+    number has: "+66 81 234" (even partially typed) and "66812345678" both
+    search for ``0812…``.
+    """
+    normalized = _normalize(search)
+    if _PHONE_LIKE.fullmatch(normalized):
+        # "081-234-5678" or "+66 81 234" is one number, not several words
+        words = [normalized]
+    else:
+        words = _WORD_SPLIT.split(normalized)
+    terms = []
+    for word in words:
+        if _PHONE_LIKE.fullmatch(word):
+            digits = _NON_DIGITS.sub("", word)
+            if (word.startswith("+66") and digits.startswith("66")) or _is_international(digits):
+                digits = "0" + digits[2:]
+            word = digits
+        if word:
+            terms.append(word[:MAX_PREFIX_LENGTH])
+    return list(dict.fromkeys(terms))
+
+def build_search_filter(search: str, legacy_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Filter matching ``search`` by indexed token prefix.
+
+    ``legacy_fields`` adds a regex branch restricted to documents without
+    tokens so patients written by other services stay findable. Raises
+    ``ValueError`` when the search has no letters or digits, which would
+    otherwise leave the query unfiltered.
+    """
+    terms = search_terms(search)
+    if not terms:
+        raise ValueError("Search must contain at least one letter or digit")
+    token_filter = {SEARCH_TOKENS_FIELD: terms[0] if len(terms) == 1 else {"$all": terms}}
+    if not legacy_fields:
+        return token_filter
+    pattern = re.escape(search.strip())
+    return {
+        "$or": [
+            token_filter,
+            {
+                SEARCH_TOKENS_FIELD: {"$exists": False},
+                "$or": [{field: {"$regex": pattern, "$options": "i"}} for field in legacy_fields]
+            }
+        ]
+    }
+
+async def tokens_for_update(patient_id: Any, update_data: Dict[str, Any]) -> Optional[List[str]]:
+    """Recompute tokens when an update touches a searchable field; None otherwise"""
+    if not any(field in update_data for field in SEARCH_SOURCE_FIELDS):
+        return None
+    collection = mongodb_service.get_collection("patients")
+    current = await collection.find_one(
+        {"_id": patient_id}, {field: 1 for field in SEARCH_SOURCE_FIELDS}
+    ) or {}
+    current.update(update_data)
+    return build_search_tokens(current)
+
+async def backfill_search_tokens(batch_size: int = 500, force: bool = False) -> Dict[str, int]:
+    """Populate ``search_tokens`` on patients written before it existed"""
+    collection = mongodb_service.get_collection("patients")
+    query = {} if force else {SEARCH_TOKENS_FIELD: {"$exists": False}}
+    projection = {field: 1 for field in SEARCH_SOURCE_FIELDS}
+
+    scanned = 0
+    updated = 0
+    operations = []
+    async for patient in collection.find(query, projection):
+        scanned += 1
+        operations.append(UpdateOne(
+            {"_id": patient["_id"]},
+            {"$set": {SEARCH_TOKENS_FIELD: build_search_tokens(patient)}}
+        ))
+        if len(operations) >= batch_size:
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    if operations:
+        result = await collection.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+    logger.info(f"Patient search tokens backfilled: {updated}/{scanned} documents updated")
+    return {"scanned_count": scanned, "updated_count": updated}
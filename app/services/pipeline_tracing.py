@@ -0,0 +1,268 @@
+"""
+Pipeline Span Tracing
+====================
+In-process stage timing for the device data pipeline
+(MQTT receipt → listener stages → ``/fhir/R5/Observation`` →
+``FHIRR5Service`` → ``BlockchainHashService``).
+
+- The MQTT listeners time their own stages and post fixed-bucket histograms
+  in batch to ``POST /admin/performance/pipeline-traces``; they are merged
+  here with the API's spans.
+- Requests carrying a ``traceparent`` header open a trace in a context
+  variable; ``span()`` blocks inside the FHIR and blockchain services charge
+  their time to it with no I/O on the hot path.
+- ``X-Trace-Received-At`` (epoch seconds of MQTT receipt) gives the
+  end-to-end ``received_to_fhir_stored`` latency.
+- Histograms are cumulative for ``GET /admin/performance/pipeline-traces`` and
+  are also flushed every ``PIPELINE_TRACE_EXPORT_INTERVAL`` seconds as one
+  document per interval into ``pipeline_trace_stats``.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.services.mongo import mongodb_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended.
+# Must match services/mqtt-listeners/shared/pipeline_tracing.py.
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+TRACEPARENT_HEADER = "traceparent"
+RECEIVED_AT_HEADER = "X-Trace-Received-At"
+SOURCE_HEADER = "X-Trace-Source"
+
+STATS_COLLECTION = "pipeline_trace_stats"
+
+class StageHistogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ("buckets", "count", "sum_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        index = 0
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if duration_ms <= bound:
+                break
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def merge(self, data: Dict[str, Any]):
+        """Add an exported histogram (``to_dict`` shape) into this one"""
+        for index, value in enumerate(data.get("buckets", [])[:len(self.buckets)]):
+            self.buckets[index] += int(value)
+        self.count += int(data.get("count", 0))
+        self.sum_ms += float(data.get("sum_ms", 0.0))
+        self.max_ms = max(self.max_ms, float(data.get("max_ms", 0.0)))
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bucket bound containing the ``pct`` percentile (max for the open bucket)"""
+        if not self.count:
+            return None
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for index, value in enumerate(self.buckets):
+            seen += value
+            if seen >= rank and value:
+                return float(HISTOGRAM_BUCKETS_MS[index]) if index < len(HISTOGRAM_BUCKETS_MS) else round(self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": list(self.buckets)
+        }
+
+class ApiTrace:
+    """Trace context of one API request"""
+
+    __slots__ = ("trace_id", "source", "received_at", "started")
+
+    def __init__(self, trace_id: str, source: str, received_at: Optional[float]):
+        self.trace_id = trace_id
+        self.source = source
+        self.received_at = received_at
+        self.started = time.perf_counter()
+
+_current_trace: ContextVar[Optional[ApiTrace]] = ContextVar("pipeline_trace", default=None)
+
+def _parse_traceparent(value: Optional[str]) -> Optional[str]:
+    parts = (value or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32:
+        return parts[1]
+    return None
+
+class PipelineTracingService:
+    """Collect pipeline stage histograms from the API and the MQTT listeners"""
+
+    def __init__(self):
+        self.enabled = os.getenv("PIPELINE_TRACING_ENABLED", "true").lower() == "true"
+        self.export_interval = float(os.getenv("PIPELINE_TRACE_EXPORT_INTERVAL", "60"))
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], StageHistogram] = {}
+        self._totals: Dict[Tuple[str, str], StageHistogram] = {}
+        self._interval_start = time.time()
+        self._started_at = datetime.utcnow()
+        self._export_task: Optional[asyncio.Task] = None
+
+    # =============== Recording ===============
+
+    def record(self, source: str, stage: str, duration_ms: float):
+        with self._lock:
+            for histograms in (self._pending, self._totals):
+                histogram = histograms.get((source, stage))
+                if histogram is None:
+                    histogram = histograms[(source, stage)] = StageHistogram()
+                histogram.observe(duration_ms)
+
+    def ingest(self, batch: Dict[str, Any]) -> int:
+        """Merge a batch of histograms exported by an MQTT listener"""
+        if list(batch.get("buckets_ms") or HISTOGRAM_BUCKETS_MS) != list(HISTOGRAM_BUCKETS_MS):
+            raise ValueError("Histogram bucket bounds do not match")
+        merged = 0
+        with self._lock:
+            for item in batch.get("stages", []):
+                key = (str(item["source"]), str(item["stage"]))
+                for histograms in (self._pending, self._totals):
+                    histogram = histograms.get(key)
+                    if histogram is None:
+                        histogram = histograms[key] = StageHistogram()
+                    histogram.merge(item)
+                merged += 1
+        return merged
+
+    @contextmanager
+    def trace(self, headers, source: str = "api"):
+        """Open a trace for a request that carries a ``traceparent`` header"""
+        trace_id = _parse_traceparent(headers.get(TRACEPARENT_HEADER)) if self.enabled else None
+        if trace_id is None:
+            yield None
+            return
+        try:
+            received_at = float(headers.get(RECEIVED_AT_HEADER))
+        except (TypeError, ValueError):
+            received_at = None
+        trace = ApiTrace(trace_id, headers.get(SOURCE_HEADER) or source, received_at)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self.record(trace.source, "api_total", (time.perf_counter() - trace.started) * 1000)
+            if trace.received_at is not None:
+                # Clock skew between hosts can make this negative; clamp it
+                self.record(trace.source, "received_to_fhir_stored", max((time.time() - trace.received_at) * 1000, 0.0))
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a stage of the current request's trace (no-op when untraced)"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(trace.source, stage, (time.perf_counter() - started) * 1000)
+
+    # =============== Reporting ===============
+
+    @staticmethod
+    def _summarize(histograms: Dict[Tuple[str, str], StageHistogram]) -> List[Dict[str, Any]]:
+        stages = []
+        for (source, stage), histogram in sorted(histograms.items()):
+            item = histogram.to_dict()
+            item.update({
+                "source": source,
+                "stage": stage,
+                "mean_ms": round(histogram.sum_ms / histogram.count, 3) if histogram.count else None,
+                "p50_ms": histogram.percentile(50),
+                "p95_ms": histogram.percentile(95),
+                "p99_ms": histogram.percentile(99)
+            })
+            stages.append(item)
+        return stages
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative histograms since the API started"""
+        with self._lock:
+            stages = self._summarize(self._totals)
+        return {
+            "since": self._started_at.isoformat() + "Z",
+            "buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+            "stages": stages
+        }
+
+    def drain(self) -> Dict[str, Any]:
+        """Histograms collected since the last export; resets them"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            interval_start, self._interval_start = self._interval_start, time.time()
+            stages = self._summarize(pending)
+        return {
+            "interval_start": datetime.utcfromtimestamp(interval_start),
+            "interval_end": datetime.utcfromtimestamp(self._interval_start),
+            "buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+            "stages": stages
+        }
+
+    # =============== Batch export ===============
+
+    async def export(self):
+        """Write the current interval as one document"""
+        batch = self.drain()
+        if not batch["stages"]:
+            return
+        try:
+            await mongodb_service.get_collection(STATS_COLLECTION).insert_one(batch)
+        except Exception as e:
+            logger.warning(f"Failed to export pipeline trace stats: {e}")
+        slowest = max(batch["stages"], key=lambda item: item["p95_ms"] or 0)
+        logger.info(
+            f"📈 Pipeline trace stats exported: {len(batch['stages'])} stages, "
+            f"slowest p95 {slowest['source']}/{slowest['stage']} {slowest['p95_ms']}ms"
+        )
+
+    async def _export_loop(self):
+        while True:
+            await asyncio.sleep(self.export_interval)
+            await self.export()
+
+    async def start(self):
+        if not self.enabled or self._export_task is not None:
+            return
+        self._export_task = asyncio.create_task(self._export_loop())
+        logger.info(f"✅ Pipeline trace export started (every {self.export_interval:.0f}s)")
+
+    async def stop(self):
+        if self._export_task is None:
+            return
+        self._export_task.cancel()
+        await asyncio.gather(self._export_task, return_exceptions=True)
+        self._export_task = None
+        await self.export()
+
+# Global pipeline tracer instance
+pipeline_tracer = PipelineTracingService()
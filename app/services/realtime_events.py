@@ -4,7 +4,7 @@ from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
 import redis.asyncio as redis
 from app.services.websocket_manager import websocket_manager, Rooms
-from app.utils.json_encoder import MongoJSONEncoder
+from app.utils.json_encoder import dumps_mongodb_str
 from config import settings, logger
 
 class RealtimeEventHandler:
@@ -200,7 +200,7 @@ class RealtimeEventHandler:
         
         try:
             channel = f"realtime:{event_type}"
-            message = json.dumps(data, cls=MongoJSONEncoder)
+            message = dumps_mongodb_str(data)
             
             await self.redis_client.publish(channel, message)
             logger.debug(f"Published event to {channel}")
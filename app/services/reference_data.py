@@ -0,0 +1,324 @@
+"""
+Reference Data Store
+===================
+In-memory copy of the slow-changing reference collections (provinces,
+districts, sub-districts and the master-data lists) so the dropdown and
+``/admin/master-data/{data_type}`` readers never query MongoDB.
+
+Each collection is loaded once per worker into a ``ReferenceTable``:
+
+- records serialized once (ObjectIds/datetimes already converted)
+- lookups by ``code`` and by parent (``province_code``,
+  ``(province_code, district_code)``)
+- a sorted index of normalized name-word prefixes (English and Thai) for
+  search, with an in-memory substring scan as fallback
+
+Responses are cached per table as pre-serialized JSON bytes of the ``data``
+payload with a strong ETag (hash of those bytes), so repeat calls are a dict
+lookup and ``If-None-Match`` answers ``304``.
+
+Tables are refreshed when MongoDB reports a change (change stream on the
+main database) or, when change streams are unavailable (standalone server),
+when the per-collection version stamp (document count + latest
+``updated_at``) moves. Admin writes invalidate the local table immediately.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import unicodedata
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable
+
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.services.mongo import mongodb_service
+from app.utils.json_encoder import serialize_mongodb_response
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# data_type -> collection name
+REFERENCE_COLLECTIONS = {
+    "provinces": "provinces",
+    "districts": "districts",
+    "sub_districts": "sub_districts",
+    "hospital_types": "master_hospital_types",
+    "blood_groups": "blood_groups",
+    "human_skin_colors": "human_skin_colors",
+    "nations": "nations",
+    "ward_lists": "ward_lists",
+    "staff_types": "staff_types",
+    "underlying_diseases": "underlying_diseases"
+}
+
+# Types the master-data list endpoint sorts by created_at (the rest by _id)
+CREATED_AT_SORTED = {"provinces", "districts", "sub_districts", "blood_groups", "human_skin_colors", "nations"}
+
+RESPONSE_CACHE_SIZE = 512
+
+def _normalize(value: Any) -> str:
+    return unicodedata.normalize("NFKC", str(value)).casefold().strip()
+
+def sort_key(value: Any) -> Tuple[int, Any]:
+    """Order mixed values roughly like MongoDB (null < numbers < strings < ObjectId < dates)"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (5, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (4, value)
+    if isinstance(value, datetime):
+        return (6, value)
+    return (3, str(value))
+
+def thai_name(document: Dict[str, Any]) -> str:
+    """Thai name from a ``name`` list (``[{"code": "th", "name": ...}]``) or ``name.th``"""
+    names = document.get("name")
+    if isinstance(names, list):
+        for name_obj in names:
+            if isinstance(name_obj, dict) and name_obj.get("code") == "th":
+                return name_obj.get("name", "")
+    elif isinstance(names, dict):
+        return names.get("th", "")
+    return ""
+
+def _search_names(document: Dict[str, Any]) -> List[str]:
+    names = []
+    value = document.get("name")
+    if isinstance(value, list):
+        names.extend(item.get("name") for item in value if isinstance(item, dict))
+    elif isinstance(value, dict):
+        names.extend(value.values())
+    names.append(document.get("en_name"))
+    return [_normalize(name) for name in names if name]
+
+class ReferenceTable:
+    """Immutable, indexed snapshot of one reference collection"""
+
+    def __init__(self, data_type: str, documents: List[Dict[str, Any]], version: Tuple[Any, ...]):
+        self.data_type = data_type
+        self.version = version
+        sort_field = "created_at" if data_type in CREATED_AT_SORTED else "_id"
+        documents = sorted(documents, key=lambda doc: sort_key(doc.get(sort_field)))
+
+        self.documents = documents
+        self.records = serialize_mongodb_response(documents)
+        self.dropdown = [
+            {
+                "code": doc.get("code"),
+                "en_name": doc.get("en_name"),
+                "th_name": thai_name(doc),
+                "is_active": doc.get("is_active", True),
+                "is_deleted": doc.get("is_deleted", False),
+                "province_code": doc.get("province_code"),
+                "district_code": doc.get("district_code")
+            }
+            for doc in documents
+        ]
+
+        self.by_code: Dict[Any, int] = {}
+        self.by_parent: Dict[Any, List[int]] = {}
+        for index, doc in enumerate(documents):
+            if doc.get("code") is not None:
+                self.by_code.setdefault(doc["code"], index)
+            if doc.get("province_code") is not None:
+                self.by_parent.setdefault(doc["province_code"], []).append(index)
+                if doc.get("district_code") is not None:
+                    self.by_parent.setdefault((doc["province_code"], doc["district_code"]), []).append(index)
+
+        self._names = [_search_names(doc) for doc in documents]
+        prefixes = []
+        for index, names in enumerate(self._names):
+            for name in names:
+                for word in set(name.split()) | {name}:
+                    prefixes.append((word, index))
+        prefixes.sort()
+        self._prefix_words = [word for word, _ in prefixes]
+        self._prefix_index = [index for _, index in prefixes]
+
+        self._responses: Dict[Any, Tuple[bytes, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def get_by_code(self, code: Any) -> Optional[Dict[str, Any]]:
+        index = self.by_code.get(code)
+        return self.documents[index] if index is not None else None
+
+    def children(self, parent: Any) -> List[int]:
+        return self.by_parent.get(parent, [])
+
+    def search(self, text: str, candidates: Optional[Iterable[int]] = None) -> List[int]:
+        """Indices whose names contain a word starting with ``text`` (substring match as fallback)"""
+        query = _normalize(text)
+        allowed = None if candidates is None else set(candidates)
+        matches = set()
+        position = bisect.bisect_left(self._prefix_words, query)
+        while position < len(self._prefix_words) and self._prefix_words[position].startswith(query):
+            index = self._prefix_index[position]
+            if allowed is None or index in allowed:
+                matches.add(index)
+            position += 1
+        if not matches:
+            pool = range(len(self.documents)) if allowed is None else allowed
+            matches = {index for index in pool if any(query in name for name in self._names[index])}
+        return sorted(matches)
+
+    def cached_data(self, key: Any, build: Callable[[], Dict[str, Any]]) -> Tuple[bytes, str]:
+        """Pre-serialized ``data`` payload and its strong ETag for a query key"""
+        cached = self._responses.get(key)
+        if cached is None:
+            body = json.dumps(build(), ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+            cached = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+            if len(self._responses) >= RESPONSE_CACHE_SIZE:
+                self._responses.pop(next(iter(self._responses)))
+            self._responses[key] = cached
+        return cached
+
+class ReferenceDataStore:
+    """Per-worker cache of reference tables with change-driven refresh"""
+
+    def __init__(self):
+        self.enabled = os.getenv("REFERENCE_DATA_CACHE_ENABLED", "true").lower() == "true"
+        self.poll_interval = float(os.getenv("REFERENCE_DATA_POLL_SECONDS", "60"))
+        self._tables: Dict[str, ReferenceTable] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._watching: Optional[bool] = None
+
+    # =============== Loading ===============
+
+    async def _version(self, collection_name: str) -> Tuple[Any, ...]:
+        collection = mongodb_service.get_collection(collection_name)
+        result = await collection.aggregate([
+            {"$group": {"_id": None, "count": {"$sum": 1}, "updated": {"$max": "$updated_at"}}}
+        ]).to_list(length=1)
+        if not result:
+            return (0, None)
+        return (result[0]["count"], result[0]["updated"])
+
+    async def _load(self, data_type: str, cache: bool = True) -> ReferenceTable:
+        collection_name = REFERENCE_COLLECTIONS[data_type]
+        version = await self._version(collection_name)
+        documents = await mongodb_service.get_collection(collection_name).find({}).to_list(length=None)
+        table = ReferenceTable(data_type, documents, version)
+        if cache:
+            self._tables[data_type] = table
+            logger.info(f"📚 Reference data loaded: {data_type} ({len(table)} records)")
+        return table
+
+    async def get_table(self, data_type: str) -> ReferenceTable:
+        """Return the cached table, loading it on first use (a fresh, uncached read when disabled)"""
+        if not self.enabled:
+            return await self._load(data_type, cache=False)
+        table = self._tables.get(data_type)
+        if table is not None:
+            return table
+        lock = self._locks.setdefault(data_type, asyncio.Lock())
+        async with lock:
+            table = self._tables.get(data_type)
+            if table is None:
+                table = await self._load(data_type)
+            return table
+
+    def supports(self, data_type: str) -> bool:
+        return self.enabled and data_type in REFERENCE_COLLECTIONS
+
+    async def invalidate(self, data_type: str):
+        """Reload a table after a local write"""
+        if data_type in REFERENCE_COLLECTIONS and data_type in self._tables:
+            try:
+                await self._load(data_type)
+            except Exception as e:
+                self._tables.pop(data_type, None)
+                logger.warning(f"Failed to reload reference data {data_type}: {e}")
+
+    # =============== Refresh ===============
+
+    async def _watch_changes(self) -> bool:
+        """Reload tables from change-stream events until the stream closes; False if it cannot be opened"""
+        collections = {name: data_type for data_type, name in REFERENCE_COLLECTIONS.items()}
+        pipeline = [{"$match": {"ns.coll": {"$in": list(collections)}}}]
+        try:
+            async with mongodb_service.get_database("main").watch(pipeline) as stream:
+                if not self._watching:
+                    logger.info("✅ Reference data refresh: watching change stream")
+                self._watching = True
+                async for change in stream:
+                    data_type = collections.get(change.get("ns", {}).get("coll"))
+                    if data_type:
+                        await self.invalidate(data_type)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self._watching is not False:
+                logger.info(f"Reference data change stream unavailable ({e}); polling every {self.poll_interval:.0f}s")
+            self._watching = False
+            return False
+        return True
+
+    async def _check_versions(self):
+        """Reload every cached table whose version stamp moved"""
+        for data_type, table in list(self._tables.items()):
+            try:
+                if await self._version(REFERENCE_COLLECTIONS[data_type]) != table.version:
+                    await self._load(data_type)
+            except Exception as e:
+                logger.warning(f"Reference data version check failed for {data_type}: {e}")
+
+    async def _refresh_loop(self):
+        # A closed stream (invalidate, failover) is reopened after a short
+        # pause; when change streams are unavailable, poll and try the stream
+        # again each interval. Versions are checked in between to catch
+        # changes made while no stream was open.
+        while True:
+            watched = await self._watch_changes()
+            await asyncio.sleep(1 if watched else self.poll_interval)
+            await self._check_versions()
+
+    async def start(self):
+        """Preload all tables and start the refresh task (nothing is cached while disabled)"""
+        if not self.enabled or self._refresh_task is not None:
+            return
+        for data_type in REFERENCE_COLLECTIONS:
+            try:
+                await self.get_table(data_type)
+            except Exception as e:
+                logger.warning(f"Failed to preload reference data {data_type}: {e}")
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        await asyncio.gather(self._refresh_task, return_exceptions=True)
+        self._refresh_task = None
+
+    # =============== Responses ===============
+
+    @staticmethod
+    def respond(request: Request, message: str, body: bytes, etag: str, request_id: str) -> Response:
+        """Wrap a cached ``data`` payload in the standard success envelope"""
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        envelope = b"".join([
+            b'{"success":true,"message":', json.dumps(message, ensure_ascii=False).encode("utf-8"),
+            b',"data":', body,
+            b',"request_id":', json.dumps(request_id).encode("utf-8"),
+            b',"timestamp":"', (datetime.utcnow().isoformat() + "Z").encode("ascii"), b'"}'
+        ])
+        return Response(content=envelope, media_type="application/json", headers=headers)
+
+# Global reference data store instance
+reference_data_store = ReferenceDataStore()
@@ -3,11 +3,12 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import uuid
 
 from app.services.analytics import healthcare_analytics
 from app.services.mongo import mongodb_service
+from app.services.connection_factory import set_read_workload
 from app.utils.structured_logging import get_logger
 from app.utils.json_encoder import MongoJSONEncoder
 import smtplib
@@ -79,6 +80,18 @@ class ReportJob:
     output_path: Optional[str] = None
     output_size: Optional[int] = None
 
+@dataclass
+class ReportRunContext:
+    """State shared by all reports generated in one run (e.g. one scheduler tick).
+    
+    ``now`` anchors every relative date range so identical sub-queries across
+    templates produce identical keys, ``results`` memoizes those sub-queries and
+    ``section_semaphore`` bounds how many analytics queries run at once.
+    """
+    now: datetime
+    section_semaphore: asyncio.Semaphore
+    results: Dict[tuple, asyncio.Task] = field(default_factory=dict)
+
 class ReportingEngine:
     """Automated reporting engine with scheduling capabilities"""
     
@@ -88,6 +101,11 @@ class ReportingEngine:
         self.collection_outputs = "report_outputs"
         self.running_jobs = {}
         
+        # Concurrency limits for report generation
+        self.max_concurrent_sections = 4  # Analytics queries in flight per run
+        self.max_concurrent_reports = 3  # Scheduled templates generated at once
+        self.report_timeout_seconds = 600  # Per-template generation timeout
+        
         # Email configuration (from environment or config)
         self.smtp_server = "smtp.gmail.com"  # Configure as needed
         self.smtp_port = 587
@@ -188,17 +206,7 @@ class ReportingEngine:
             
             template = ReportTemplate(**template_doc)
             
-            # Create job
-            job = ReportJob(
-                id=str(uuid.uuid4()),
-                template_id=template_id,
-                status="pending",
-                created_at=datetime.utcnow()
-            )
-            
-            # Save job
-            jobs_collection = mongodb_service.get_collection(self.collection_jobs)
-            await jobs_collection.insert_one(asdict(job))
+            job = await self._create_job(template_id)
             
             # Start generation
             asyncio.create_task(self._execute_report_job(job, template))
@@ -209,14 +217,56 @@ class ReportingEngine:
             logger.error(f"Error generating report: {str(e)}")
             raise
 
-    async def _execute_report_job(self, job: ReportJob, template: ReportTemplate):
+    async def _create_job(self, template_id: str) -> ReportJob:
+        """Create and persist a pending report job"""
+        job = ReportJob(
+            id=str(uuid.uuid4()),
+            template_id=template_id,
+            status="pending",
+            created_at=datetime.utcnow()
+        )
+        
+        jobs_collection = mongodb_service.get_collection(self.collection_jobs)
+        await jobs_collection.insert_one(asdict(job))
+        
+        return job
+
+    def _new_run_context(self) -> ReportRunContext:
+        """Create a fresh context for a single report run or scheduler tick"""
+        return ReportRunContext(
+            now=datetime.utcnow(),
+            section_semaphore=asyncio.Semaphore(self.max_concurrent_sections)
+        )
+
+    async def _shared(self, context: ReportRunContext, key: tuple, factory):
+        """Run an analytics query once per context and share its result.
+        
+        Concurrent callers with the same key await the same task; the task is
+        shielded so a timed-out report does not cancel it for the others.
+        """
+        task = context.results.get(key)
+        if task is None:
+            async def bounded():
+                async with context.section_semaphore:
+                    return await factory()
+            task = asyncio.ensure_future(bounded())
+            context.results[key] = task
+        return await asyncio.shield(task)
+
+    async def _execute_report_job(
+        self,
+        job: ReportJob,
+        template: ReportTemplate,
+        context: Optional[ReportRunContext] = None
+    ):
         """Execute a report generation job"""
+        set_read_workload("reporting")
         try:
             # Update job status
             await self._update_job_status(job.id, "running", started_at=datetime.utcnow())
             
             # Generate report data
-            report_data = await self._generate_report_data(template)
+            report_data = await self._generate_report_data(template, context)
             
             # Format report
             formatted_report = await self._format_report(report_data, template)
@@ -245,9 +295,22 @@ class ReportingEngine:
             logger.error(f"Error executing report job {job.id}: {str(e)}")
             await self._update_job_status(job.id, "failed", error_message=str(e))
 
-    async def _generate_report_data(self, template: ReportTemplate) -> Dict[str, Any]:
-        """Generate the data for a report based on template type"""
+    async def _generate_report_data(
+        self,
+        template: ReportTemplate,
+        context: Optional[ReportRunContext] = None
+    ) -> Dict[str, Any]:
+        """Generate the data for a report based on template type.
+        
+        Independent sections are fetched concurrently; sub-results are shared
+        through ``context`` with other reports generated in the same run.
+        """
         try:
+            if context is None:
+                context = self._new_run_context()
+            now = context.now
+            hospital_id = template.filters.get("hospital_id")
+            
             report_data = {
                 "metadata": {
                     "report_type": template.type.value,
@@ -260,17 +323,24 @@ class ReportingEngine:
             
             if template.type == ReportType.DAILY_SUMMARY:
                 # Daily summary report
-                yesterday = datetime.utcnow() - timedelta(days=1)
-                
-                patient_stats = await healthcare_analytics.get_patient_statistics(
-                    hospital_id=template.filters.get("hospital_id"),
-                    start_date=yesterday,
-                    end_date=datetime.utcnow()
-                )
+                yesterday = now - timedelta(days=1)
                 
-                device_stats = await healthcare_analytics.get_device_utilization_analytics(
-                    hospital_id=template.filters.get("hospital_id"),
-                    period="daily"
+                patient_stats, device_stats = await asyncio.gather(
+                    self._shared(
+                        context, ("patient_statistics", hospital_id, yesterday, now),
+                        lambda: healthcare_analytics.get_patient_statistics(
+                            hospital_id=hospital_id,
+                            start_date=yesterday,
+                            end_date=now
+                        )
+                    ),
+                    self._shared(
+                        context, ("device_utilization", hospital_id, "daily"),
+                        lambda: healthcare_analytics.get_device_utilization_analytics(
+                            hospital_id=hospital_id,
+                            period="daily"
+                        )
+                    )
                 )
                 
                 report_data.update({
@@ -286,25 +356,32 @@ class ReportingEngine:
                 
             elif template.type == ReportType.WEEKLY_ANALYTICS:
                 # Weekly analytics report
-                week_start = datetime.utcnow() - timedelta(days=7)
+                week_start = now - timedelta(days=7)
                 
-                patient_stats = await healthcare_analytics.get_patient_statistics(
-                    hospital_id=template.filters.get("hospital_id"),
-                    start_date=week_start,
-                    end_date=datetime.utcnow()
-                )
-                
-                # Get anomalies for the week
-                anomalies = await healthcare_analytics.detect_vital_anomalies(
-                    hospital_id=template.filters.get("hospital_id"),
-                    start_date=week_start,
-                    end_date=datetime.utcnow()
+                # Patient statistics and the week's anomalies are independent
+                patient_stats, anomalies = await asyncio.gather(
+                    self._shared(
+                        context, ("patient_statistics", hospital_id, week_start, now),
+                        lambda: healthcare_analytics.get_patient_statistics(
+                            hospital_id=hospital_id,
+                            start_date=week_start,
+                            end_date=now
+                        )
+                    ),
+                    self._shared(
+                        context, ("vital_anomalies", hospital_id, week_start, now),
+                        lambda: healthcare_analytics.detect_vital_anomalies(
+                            hospital_id=hospital_id,
+                            start_date=week_start,
+                            end_date=now
+                        )
+                    )
                 )
                 
                 report_data.update({
                     "period": {
                         "start": week_start.strftime("%Y-%m-%d"),
-                        "end": datetime.utcnow().strftime("%Y-%m-%d")
+                        "end": now.strftime("%Y-%m-%d")
                     },
                     "patient_analytics": patient_stats,
                     "anomalies": {
@@ -320,22 +397,33 @@ class ReportingEngine:
                 if not patient_id:
                     raise ValueError("Patient ID required for patient report")
                 
-                # Get patient info
-                patients_collection = mongodb_service.get_collection("patients")
-                patient = await patients_collection.find_one({"_id": patient_id})
+                patients_collection = mongodb_service.get_analytics_collection("patients")
                 
-                # Get vital signs analytics
-                vitals_analytics = await healthcare_analytics.get_vital_signs_analytics(
-                    patient_id=patient_id,
-                    period="weekly"
+                # Patient info, vital signs analytics and risk predictions are independent
+                patient, vitals_analytics, risk_data = await asyncio.gather(
+                    self._shared(
+                        context, ("patient", patient_id),
+                        lambda: patients_collection.find_one({"_id": patient_id})
+                    ),
+                    self._shared(
+                        context, ("vital_signs", patient_id, "weekly"),
+                        lambda: healthcare_analytics.get_vital_signs_analytics(
+                            patient_id=patient_id,
+                            period="weekly"
+                        )
+                    ),
+                    self._shared(
+                        context, ("health_risks", patient_id),
+                        lambda: healthcare_analytics.predict_health_risks(patient_id)
+                    )
                 )
                 
-                # Get risk predictions
-                risk_data = await healthcare_analytics.predict_health_risks(patient_id)
-                
-                # Get recommendations
-                recommendations = await healthcare_analytics.get_health_recommendations(
-                    patient_id, risk_data.get("risk_factors", [])
+                # Recommendations depend on the risk factors
+                recommendations = await self._shared(
+                    context, ("recommendations", patient_id),
+                    lambda: healthcare_analytics.get_health_recommendations(
+                        patient_id, risk_data.get("risk_factors", [])
+                    )
                 )
                 
                 report_data.update({
@@ -352,12 +440,15 @@ class ReportingEngine:
                 
             elif template.type == ReportType.HOSPITAL_PERFORMANCE:
                 # Hospital performance report
-                hospital_id = template.filters.get("hospital_id")
+                month_start = now - timedelta(days=30)
                 
-                hospital_report = await healthcare_analytics._generate_hospital_report(
-                    hospital_id=hospital_id,
-                    start_date=datetime.utcnow() - timedelta(days=30),
-                    end_date=datetime.utcnow()
+                hospital_report = await self._shared(
+                    context, ("hospital_report", hospital_id, month_start, now),
+                    lambda: healthcare_analytics._generate_hospital_report(
+                        hospital_id=hospital_id,
+                        start_date=month_start,
+                        end_date=now
+                    )
                 )
                 
                 report_data.update({
@@ -366,10 +457,15 @@ class ReportingEngine:
                 
             elif template.type == ReportType.RISK_ASSESSMENT:
                 # Risk assessment report
-                risk_report = await healthcare_analytics._generate_health_risk_report(
-                    hospital_id=template.filters.get("hospital_id"),
-                    start_date=datetime.utcnow() - timedelta(days=30),
-                    end_date=datetime.utcnow()
+                month_start = now - timedelta(days=30)
+                
+                risk_report = await self._shared(
+                    context, ("health_risk_report", hospital_id, month_start, now),
+                    lambda: healthcare_analytics._generate_health_risk_report(
+                        hospital_id=hospital_id,
+                        start_date=month_start,
+                        end_date=now
+                    )
                 )
                 
                 report_data.update({
@@ -656,10 +752,46 @@ class ReportingEngine:
                 "next_generation": {"$lte": now}
             }).to_list(None)
             
-            for template_doc in templates:
+            if not templates:
+                return
+            
+            # One context per tick so templates share sub-results and the
+            # analytics query budget; templates run in a bounded pool
+            context = self._new_run_context()
+            report_slots = asyncio.Semaphore(self.max_concurrent_reports)
+            
+            async def run_template(template_doc: Dict[str, Any]):
                 template = ReportTemplate(**template_doc)
-                logger.info(f"Generating scheduled report: {template.name}")
-                await self.generate_report_now(template.id)
+                async with report_slots:
+                    logger.info(f"Generating scheduled report: {template.name}")
+                    job = await self._create_job(template.id)
+                    try:
+                        await asyncio.wait_for(
+                            self._execute_report_job(job, template, context),
+                            timeout=self.report_timeout_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        logger.error(f"Scheduled report {template.name} timed out after {self.report_timeout_seconds}s")
+                        await self._update_job_status(
+                            job.id, "failed",
+                            error_message=f"Timed out after {self.report_timeout_seconds} seconds"
+                        )
+            
+            started = datetime.utcnow()
+            results = await asyncio.gather(
+                *(run_template(template_doc) for template_doc in templates),
+                return_exceptions=True
+            )
+            
+            for template_doc, result in zip(templates, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error generating scheduled report {template_doc.get('id')}: {str(result)}")
+            
+            logger.info(
+                f"Scheduled report tick finished: {len(templates)} templates, "
+                f"{len(context.results)} shared queries, "
+                f"{(datetime.utcnow() - started).total_seconds():.1f}s"
+            )
                 
         except Exception as e:
             logger.error(f"Error checking scheduled reports: {str(e)}")
@@ -0,0 +1,426 @@
+"""
+Data Retention
+==============
+Per-collection retention for the append-only collections that otherwise grow
+forever (``event_logs``, ``medical_data``, ``hash_audit_logs``,
+``security_audit_logs``, ...).
+
+Each ``RetentionPolicy`` combines:
+
+- ``ttl_days``: a TTL index on the time field, for hot data that is simply
+  dropped by MongoDB once it ages out
+- ``archive_after_days``: the archiver moves older documents to disk; they
+  are streamed in time order, written as gzip NDJSON (MongoDB Extended JSON,
+  so types survive) or Parquet files partitioned by day
+  (``<RETENTION_ARCHIVE_DIR>/<collection>/YYYY/MM/DD/``), and deleted in
+  batches only after their file has been written and fsynced.
+  ``RETENTION_ARCHIVE_DIR`` has no default: it must be an existing absolute
+  directory (a mounted volume), otherwise archiving refuses to run
+
+The archiver runs every ``RETENTION_INTERVAL_SECONDS`` when
+``RETENTION_ARCHIVER_ENABLED`` is set; one worker at a time holds a Redis
+lock (released only by the worker that took it). ``RETENTION_POLICIES`` (JSON) overrides fields of the default
+policies or adds new ones.
+
+``query_archive`` reads archived documents back (date range plus a simple
+filter: equality, ``$in``, ``$nin``, ``$ne``, ``$gt``/``$gte``/``$lt``/``$lte``)
+for audits. A document can appear twice if a run stopped between writing a
+file and deleting its batch; ``query_archive`` drops the duplicates.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import uuid
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Iterator
+
+from bson import ObjectId, json_util
+from pymongo.errors import OperationFailure
+
+from app.services.cache_service import cache_service
+from app.services.mongo import mongodb_service
+from app.services.vital_timeseries import vital_history_store
+from app.utils.structured_logging import get_logger
+from config import settings
+
+logger = get_logger(__name__)
+
+LOCK_KEY = "mfc:opera:retention:lock"
+# Delete the lock only if it still holds this worker's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+TTL_INDEX_NAME = "retention_ttl_idx"
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+@dataclass
+class RetentionPolicy:
+    """Retention rules for one collection"""
+    collection: str
+    time_field: str = "timestamp"
+    db_type: str = "main"
+    ttl_days: Optional[int] = None
+    archive_after_days: Optional[int] = None
+    format: str = "ndjson"  # ndjson | parquet
+
+DEFAULT_POLICIES = [
+    # Written by the web panel for every MQTT pipeline step; its own TTL index drops them after 30 days
+    RetentionPolicy("event_logs", archive_after_days=7),
+    RetentionPolicy("medical_data", archive_after_days=90),
+    # Kept 7 years in total (healthcare compliance); only the first year stays in MongoDB
+    RetentionPolicy("hash_audit_logs", archive_after_days=365, format="parquet"),
+    RetentionPolicy("security_audit_logs", archive_after_days=180),
+    RetentionPolicy("security_alerts", time_field="created_at", ttl_days=365),
+    RetentionPolicy("fhir_provenance", time_field="recorded", db_type="fhir", ttl_days=180)
+]
+
+def _matches(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return value == condition or (isinstance(value, list) and condition in value)
+    for operator, operand in condition.items():
+        if operator == "$in" and value not in operand:
+            return False
+        if operator == "$nin" and value in operand:
+            return False
+        if operator == "$ne" and value == operand:
+            return False
+        try:
+            if operator == "$gt" and not (value is not None and value > operand):
+                return False
+            if operator == "$gte" and not (value is not None and value >= operand):
+                return False
+            if operator == "$lt" and not (value is not None and value < operand):
+                return False
+            if operator == "$lte" and not (value is not None and value <= operand):
+                return False
+        except TypeError:
+            return False
+    return True
+
+def _lookup(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def matches_filter(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of MongoDB query syntax supported on archives"""
+    return all(_matches(_lookup(document, path), condition) for path, condition in (query or {}).items())
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+class RetentionManager:
+    """Applies retention policies: TTL indexes, archiving and archive queries"""
+
+    def __init__(self):
+        self.archive_dir = settings.retention_archive_dir
+        self.archiver_enabled = settings.retention_archiver_enabled
+        self.interval = settings.retention_interval_seconds
+        self.batch_size = settings.retention_batch_size
+        self.policies: Dict[str, RetentionPolicy] = {policy.collection: policy for policy in DEFAULT_POLICIES}
+        known = {field.name for field in fields(RetentionPolicy)}
+        for collection, overrides in (settings.retention_policies or {}).items():
+            base = asdict(self.policies.get(collection, RetentionPolicy(collection)))
+            base.update({key: value for key, value in overrides.items() if key in known and key != "collection"})
+            self.policies[collection] = RetentionPolicy(**base)
+        self.last_runs: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # =============== Collections ===============
+
+    def _policy(self, collection: str) -> RetentionPolicy:
+        policy = self.policies.get(collection)
+        if policy is None:
+            raise ValueError(f"No retention policy for {collection}")
+        return policy
+
+    def _collection(self, policy: RetentionPolicy):
+        if policy.db_type == "fhir":
+            return mongodb_service.get_fhir_collection(policy.collection)
+        return vital_history_store.get_collection(policy.collection)
+
+    async def ensure_ttl_indexes(self):
+        """Create (or retune) the TTL index of every policy with ``ttl_days``"""
+        for policy in self.policies.values():
+            if not policy.ttl_days:
+                continue
+            seconds = policy.ttl_days * 86400
+            try:
+                collection = self._collection(policy)
+                try:
+                    await collection.create_index(policy.time_field, expireAfterSeconds=seconds, name=TTL_INDEX_NAME)
+                except OperationFailure as e:
+                    if e.code not in (85, 86):  # IndexOptionsConflict / IndexKeySpecsConflict
+                        raise
+                    # An index on the same key exists (possibly with another TTL): retune it in place
+                    await mongodb_service.get_database(policy.db_type).command(
+                        "collMod", policy.collection,
+                        index={"keyPattern": {policy.time_field: 1}, "expireAfterSeconds": seconds}
+                    )
+                logger.info(f"⏳ TTL on {policy.collection}.{policy.time_field}: {policy.ttl_days} days")
+            except Exception as e:
+                logger.error(f"Failed to apply TTL policy for {policy.collection}: {e}")
+
+    # =============== Archive files ===============
+
+    def _archive_root(self) -> str:
+        """The configured archive directory; refuses a missing, relative or unmounted path"""
+        if not self.archive_dir:
+            raise ValueError("RETENTION_ARCHIVE_DIR is not set; refusing to archive and delete documents")
+        if not os.path.isabs(self.archive_dir):
+            raise ValueError(f"RETENTION_ARCHIVE_DIR must be an absolute path, got {self.archive_dir!r}")
+        if not os.path.isdir(self.archive_dir):
+            raise ValueError(f"RETENTION_ARCHIVE_DIR {self.archive_dir} does not exist (is the volume mounted?)")
+        return self.archive_dir
+
+    def _partition_dir(self, collection: str, day: datetime) -> str:
+        return os.path.join(self._archive_root(), collection, f"{day:%Y}", f"{day:%m}", f"{day:%d}")
+
+    @staticmethod
+    def _write_ndjson(path: str, documents: List[Dict[str, Any]]):
+        with gzip.open(path, "wt", encoding="utf-8") as handle:
+            for document in documents:
+                handle.write(json_util.dumps(document, json_options=JSON_OPTIONS))
+                handle.write("\n")
+
+    @staticmethod
+    def _write_parquet(path: str, documents: List[Dict[str, Any]]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns: Dict[str, List[Any]] = {}
+        for index, document in enumerate(documents):
+            for key in document:
+                columns.setdefault(key, [None] * len(documents))
+            for key, value in document.items():
+                columns[key][index] = value
+
+        # Columns holding one scalar type stay native; ObjectIds become strings and anything
+        # else (nested or mixed) is stored as Extended JSON, both recorded in the metadata
+        json_columns, objectid_columns = [], []
+        for key, values in columns.items():
+            kinds = {type(value) for value in values if value is not None}
+            if kinds == {ObjectId}:
+                columns[key] = [str(value) if value is not None else None for value in values]
+                objectid_columns.append(key)
+            elif len(kinds) > 1 or (kinds and not kinds <= {str, int, float, bool, datetime}):
+                columns[key] = [json_util.dumps(value, json_options=JSON_OPTIONS) if value is not None else None for value in values]
+                json_columns.append(key)
+
+        table = pa.table(columns).replace_schema_metadata({
+            "json_columns": json.dumps(json_columns),
+            "objectid_columns": json.dumps(objectid_columns)
+        })
+        pq.write_table(table, path, compression="zstd")
+
+    def _write_partition(self, policy: RetentionPolicy, day: datetime, documents: List[Dict[str, Any]]) -> str:
+        directory = self._partition_dir(policy.collection, day)
+        os.makedirs(directory, exist_ok=True)
+        extension = "parquet" if policy.format == "parquet" else "ndjson.gz"
+        path = os.path.join(directory, f"{policy.collection}-{day:%Y%m%d}-{uuid.uuid4().hex[:12]}.{extension}")
+        temporary = path + ".tmp"
+        if policy.format == "parquet":
+            self._write_parquet(temporary, documents)
+        else:
+            self._write_ndjson(temporary, documents)
+        with open(temporary, "rb") as handle:
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+        return path
+
+    @staticmethod
+    def _read_file(path: str) -> Iterator[Dict[str, Any]]:
+        if path.endswith(".ndjson.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as handle:
+                for line in handle:
+                    if line.strip():
+                        yield json_util.loads(line, json_options=JSON_OPTIONS)
+        elif path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(path)
+            metadata = table.schema.metadata or {}
+            json_columns = set(json.loads(metadata.get(b"json_columns", b"[]")))
+            objectid_columns = set(json.loads(metadata.get(b"objectid_columns", b"[]")))
+            for row in table.to_pylist():
+                document = {}
+                for key, value in row.items():
+                    if value is None:
+                        continue
+                    if key in json_columns:
+                        value = json_util.loads(value, json_options=JSON_OPTIONS)
+                    elif key in objectid_columns:
+                        value = ObjectId(value)
+                    document[key] = value
+                yield document
+
+    # =============== Archiver ===============
+
+    async def archive_collection(self, collection: str, older_than_days: Optional[int] = None) -> Dict[str, Any]:
+        """Move documents older than the policy horizon to archive files, then delete them"""
+        policy = self._policy(collection)
+        days = older_than_days if older_than_days is not None else policy.archive_after_days
+        if days is None:
+            raise ValueError(f"No archive horizon configured for {collection}")
+        self._archive_root()
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        source = self._collection(policy)
+        started = datetime.utcnow()
+        archived, files = 0, []
+
+        while True:
+            batch = await source.find({policy.time_field: {"$lt": cutoff}}).sort(
+                [(policy.time_field, 1), ("_id", 1)]
+            ).limit(self.batch_size).to_list(length=self.batch_size)
+            if not batch:
+                break
+
+            partitions: Dict[datetime, List[Dict[str, Any]]] = {}
+            undated = []
+            for document in batch:
+                moment = document.get(policy.time_field)
+                if isinstance(moment, datetime):
+                    day = _utc(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+                    partitions.setdefault(day, []).append(document)
+                else:
+                    undated.append(document)
+            if undated:
+                partitions.setdefault(datetime(1970, 1, 1, tzinfo=timezone.utc), []).extend(undated)
+
+            for day, documents in partitions.items():
+                files.append(await asyncio.to_thread(self._write_partition, policy, day, documents))
+            result = await source.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+            archived += result.deleted_count
+            if len(batch) < self.batch_size:
+                break
+
+        summary = {
+            "collection": collection,
+            "cutoff": cutoff.isoformat() + "Z",
+            "archived": archived,
+            "files": len(files),
+            "format": policy.format,
+            "duration_seconds": round((datetime.utcnow() - started).total_seconds(), 3),
+            "completed_at": datetime.utcnow().isoformat() + "Z"
+        }
+        self.last_runs[collection] = summary
+        if archived:
+            logger.info(f"🗄️ Archived {archived:,} {collection} documents older than {days} days into {len(files)} files")
+        return summary
+
+    async def run_once(self) -> List[Dict[str, Any]]:
+        """Archive every policy with ``archive_after_days`` (skipped while another worker holds the lock)"""
+        self._archive_root()
+        client = cache_service.redis_client
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        if client is not None:
+            try:
+                if not await client.set(LOCK_KEY, token, nx=True, ex=max(self.interval, 600)):
+                    return []
+            except Exception as e:
+                logger.warning(f"Retention lock unavailable, archiving without it: {e}")
+        results = []
+        try:
+            for policy in self.policies.values():
+                if policy.archive_after_days is None:
+                    continue
+                try:
+                    results.append(await self.archive_collection(policy.collection))
+                except Exception as e:
+                    logger.error(f"Archiving {policy.collection} failed: {e}")
+                    results.append({"collection": policy.collection, "error": str(e)})
+        finally:
+            if client is not None:
+                try:
+                    await client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+                except Exception:
+                    pass
+        return results
+
+    async def _archive_loop(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        """Apply TTL indexes and start the archiver"""
+        await self.ensure_ttl_indexes()
+        if self.archiver_enabled and self._task is None:
+            try:
+                self._archive_root()
+            except ValueError as e:
+                logger.error(f"❌ Retention archiver not started: {e}")
+                return
+            self._task = asyncio.create_task(self._archive_loop())
+            logger.info(f"✅ Retention archiver started (every {self.interval}s, archives in {self.archive_dir})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    # =============== Archive queries ===============
+
+    def _archive_files(self, collection: str, start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+        root = os.path.join(self._archive_root(), collection)
+        first = _utc(start).date() if start else None
+        last = _utc(end).date() if end else None
+        paths = []
+        for directory, _, names in os.walk(root):
+            parts = os.path.relpath(directory, root).split(os.sep)
+            if len(parts) != 3:
+                continue
+            try:
+                day = datetime(int(parts[0]), int(parts[1]), int(parts[2])).date()
+            except ValueError:
+                continue
+            if (first and day < first) or (last and day > last):
+                continue
+            paths.extend(os.path.join(directory, name) for name in names if not name.endswith(".tmp"))
+        return sorted(paths)
+
+    def _query_archive(self, collection: str, start: Optional[datetime], end: Optional[datetime],
+                       query: Optional[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        policy = self._policy(collection)
+        seen, results = set(), []
+        for path in self._archive_files(collection, start, end):
+            for document in self._read_file(path):
+                moment = document.get(policy.time_field)
+                if isinstance(moment, datetime):
+                    if (start and _utc(moment) < _utc(start)) or (end and _utc(moment) > _utc(end)):
+                        continue
+                if not matches_filter(document, query) or document.get("_id") in seen:
+                    continue
+                seen.add(document.get("_id"))
+                results.append(document)
+                if len(results) >= limit:
+                    return results
+        return results
+
+    async def query_archive(self, collection: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            query: Optional[Dict[str, Any]] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Archived documents of ``collection`` in ``[start, end]`` matching ``query``"""
+        return await asyncio.to_thread(self._query_archive, collection, start, end, query, limit)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "archiver_enabled": self.archiver_enabled,
+            "archive_dir": self.archive_dir,
+            "interval_seconds": self.interval,
+            "policies": [asdict(policy) for policy in self.policies.values()],
+            "last_runs": self.last_runs
+        }
+
+# Global retention manager instance
+retention_manager = RetentionManager()
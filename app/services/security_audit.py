@@ -6,6 +6,7 @@ import json
 from bson import ObjectId
 from app.services.mongo import mongodb_service
 from app.services.realtime_events import realtime_events
+from app.services.window_counter import SlidingWindowCounter
 from config import logger, settings
 
 class SecurityEventType(Enum):
@@ -66,7 +67,11 @@ class SecurityAuditLogger:
     def __init__(self):
         self.collection_name = "security_audit_logs"
         self.alerts_collection = "security_alerts"
-        self.failed_login_cache: Dict[str, List[datetime]] = {}
+        
+        # Windowed counters shared across workers (Redis) for pattern detection
+        self.failed_logins = SlidingWindowCounter("failed_logins", window_seconds=900, buckets=15)
+        self.high_severity_events = SlidingWindowCounter("high_severity_events", window_seconds=300, buckets=5)
+        self.event_counts = SlidingWindowCounter("security_events", window_seconds=86400, buckets=24)
         
     async def log_security_event(
         self,
@@ -104,6 +109,7 @@ class SecurityAuditLogger:
             # Insert event
             result = await collection.insert_one(event_doc)
             event_id = str(result.inserted_id)
+            await self.event_counts.hit(f"{severity.value}|{event_type.value}")
             
             # Check if alert should be triggered
             await self._check_security_alerts(event_type, severity, event_doc)
@@ -344,7 +350,9 @@ class SecurityAuditLogger:
         try:
             collection = mongodb_service.get_collection(self.collection_name)
             
-            # Default to last 24 hours
+            # Default to last 24 hours, served from the windowed counters once they cover it
+            if not start_date and not end_date and await self.event_counts.covers_window():
+                return await self._get_windowed_summary()
             if not start_date:
                 start_date = datetime.utcnow() - timedelta(days=1)
             if not end_date:
@@ -436,26 +444,50 @@ class SecurityAuditLogger:
             logger.error(f"Failed to get security summary: {e}")
             return {}
     
-    async def _track_failed_login(self, username: str, ip_address: str):
-        """Track failed login attempts for brute force detection"""
-        key = f"{username}:{ip_address}"
-        now = datetime.utcnow()
+    async def _get_windowed_summary(self) -> Dict[str, Any]:
+        """Last-24-hour summary from the ``security_events`` counter"""
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=1)
+        summary = {
+            "period": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            },
+            "by_severity": {},
+            "total_events": 0,
+            "top_threats": [],
+            "active_alerts": await self._get_active_alerts_count()
+        }
         
-        if key not in self.failed_login_cache:
-            self.failed_login_cache[key] = []
+        threat_events = {
+            SecurityEventType.BRUTE_FORCE_ATTEMPT.value,
+            SecurityEventType.SQL_INJECTION_ATTEMPT.value,
+            SecurityEventType.XSS_ATTEMPT.value,
+            SecurityEventType.UNAUTHORIZED_ACCESS_ATTEMPT.value
+        }
+        threat_counts: Dict[str, int] = {}
         
-        # Add current attempt
-        self.failed_login_cache[key].append(now)
+        for key, count in (await self.event_counts.totals()).items():
+            severity, _, event_type = key.partition("|")
+            bucket = summary["by_severity"].setdefault(severity, {"total": 0, "events": []})
+            bucket["total"] += count
+            bucket["events"].append({"event_type": event_type, "count": count})
+            summary["total_events"] += count
+            if event_type in threat_events:
+                threat_counts[event_type] = threat_counts.get(event_type, 0) + count
         
-        # Clean old attempts (older than 15 minutes)
-        cutoff = now - timedelta(minutes=15)
-        self.failed_login_cache[key] = [
-            attempt for attempt in self.failed_login_cache[key]
-            if attempt > cutoff
+        summary["top_threats"] = [
+            {"_id": event_type, "count": count}
+            for event_type, count in sorted(threat_counts.items(), key=lambda item: -item[1])[:5]
         ]
+        return summary
+    
+    async def _track_failed_login(self, username: str, ip_address: str):
+        """Track failed login attempts for brute force detection"""
+        attempts = await self.failed_logins.hit(f"{username}:{ip_address}")
         
         # Check for brute force (5 attempts in 15 minutes)
-        if len(self.failed_login_cache[key]) >= 5:
+        if attempts >= 5:
             await self.log_threat_detection(
                 threat_type=SecurityEventType.BRUTE_FORCE_ATTEMPT,
                 ip_address=ip_address,
@@ -482,14 +514,7 @@ class SecurityAuditLogger:
         # Alert on repeated high severity events
         elif severity == SecuritySeverity.HIGH:
             # Check for pattern (3 high severity events in 5 minutes)
-            collection = mongodb_service.get_collection(self.collection_name)
-            cutoff = datetime.utcnow() - timedelta(minutes=5)
-            
-            count = await collection.count_documents({
-                "event_type": event_type.value,
-                "severity": severity.value,
-                "timestamp": {"$gte": cutoff}
-            })
+            count = await self.high_severity_events.hit(event_type.value)
             
             if count >= 3:
                 await self._create_security_alert(
@@ -0,0 +1,340 @@
+"""
+Vital History Time-Series Storage
+=================================
+Opt-in storage of device vital histories as MongoDB time-series collections
+(``VITAL_TIMESERIES_ENABLED``).
+
+Each supported history collection gets a ``<name>_ts`` companion created
+with:
+
+- ``timeField``: ``created_at`` for the ``*_histories`` collections (the
+  field every writer sets and the history endpoints filter and sort on),
+  ``timestamp`` for ``medical_data``
+- ``metaField``: ``meta``, holding the patient / device / type fields
+  (``patient_id``, ``hospital_id``, ``device_id``, ``device_type``,
+  ``source``, ``data_type``, ``attribute``) so buckets are per patient and
+  device
+- ``granularity`` matched to how often the device reports: spot
+  measurements (AVA4 / Qube-Vital cuffs, scales, glucometers) use
+  ``hours``, Kati watch streams use ``minutes``
+
+``vital_history_store.get_collection(name)`` returns the ordinary Motor
+collection while the mode is off (or for collections without a time-series
+form) and otherwise a ``TimeSeriesHistoryCollection``: it exposes the
+collection methods the history endpoints use, moves meta fields into
+``meta`` on writes and in filters / sorts / projections, and flattens them
+back on reads, so documents keep their original shape.
+
+Existing data is copied with ``app/scripts/migrate_histories_to_timeseries.py``
+(``migrate_collection``); the legacy collections are left in place. The
+MQTT listeners write through ``services/mqtt-listeners/shared/timeseries.py``.
+FHIR Observations stay in ``fhir_observations``: they are versioned,
+updated in place and looked up by resource id, which time-series
+collections do not suit.
+"""
+
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.services.mongo import mongodb_service
+from app.utils.structured_logging import get_logger
+from config import settings
+
+logger = get_logger(__name__)
+
+TIMESERIES_SUFFIX = "_ts"
+META_FIELD = "meta"
+META_FIELDS = ("patient_id", "hospital_id", "device_id", "device_type", "source", "data_type", "attribute")
+MIGRATIONS_COLLECTION = "timeseries_migrations"
+
+# Legacy collection -> (timeField, granularity)
+TIMESERIES_COLLECTIONS: Dict[str, Tuple[str, str]] = {
+    "blood_pressure_histories": ("created_at", "hours"),
+    "blood_sugar_histories": ("created_at", "hours"),
+    "body_data_histories": ("created_at", "hours"),
+    "uric_acid_histories": ("created_at", "hours"),
+    "cholesterol_histories": ("created_at", "hours"),
+    "creatinine_histories": ("created_at", "hours"),
+    "lipid_histories": ("created_at", "hours"),
+    "sleep_data_histories": ("created_at", "hours"),
+    "step_histories": ("created_at", "hours"),
+    "spo2_histories": ("created_at", "minutes"),
+    "heart_rate_histories": ("created_at", "minutes"),
+    "temprature_data_histories": ("created_at", "minutes"),
+    "medical_data": ("timestamp", "minutes")
+}
+
+def storage_name(collection_name: str) -> str:
+    return collection_name + TIMESERIES_SUFFIX
+
+def to_storage(collection_name: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Time-series form of a history document (meta fields grouped, time field set)"""
+    time_field = TIMESERIES_COLLECTIONS[collection_name][0]
+    stored = {key: value for key, value in document.items() if key not in META_FIELDS}
+    stored[META_FIELD] = {key: document[key] for key in META_FIELDS if key in document}
+    if not isinstance(stored.get(time_field), datetime):
+        fallback = document.get("created_at") or document.get("timestamp")
+        if not isinstance(fallback, datetime):
+            object_id = document.get("_id")
+            fallback = object_id.generation_time.replace(tzinfo=None) if hasattr(object_id, "generation_time") else datetime.utcnow()
+        stored[time_field] = fallback
+    return stored
+
+def from_storage(document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Original document shape from its time-series form"""
+    if not document or META_FIELD not in document:
+        return document
+    meta = document.pop(META_FIELD) or {}
+    document.update(meta)
+    return document
+
+def _field(key: str) -> str:
+    return f"{META_FIELD}.{key}" if key.split(".", 1)[0] in META_FIELDS else key
+
+def storage_filter(query: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Rewrite meta field names in a query filter"""
+    translated = {}
+    for key, value in (query or {}).items():
+        if key in ("$and", "$or", "$nor"):
+            translated[key] = [storage_filter(clause) for clause in value]
+        else:
+            translated[_field(key)] = value
+    return translated
+
+def storage_sort(sort: Any, direction: Any = None) -> Any:
+    """Rewrite meta field names in a sort spec (key + direction or list of pairs)"""
+    if isinstance(sort, str):
+        return _field(sort), direction
+    return [(_field(key), order) for key, order in sort], None
+
+def storage_update(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Rewrite meta field names inside update operators"""
+    return {
+        operator: {_field(key): value for key, value in fields.items()} if isinstance(fields, dict) else fields
+        for operator, fields in update.items()
+    }
+
+def storage_projection(projection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not projection:
+        return projection
+    return {_field(key): value for key, value in projection.items()}
+
+class TimeSeriesHistoryCursor:
+    """Motor cursor wrapper that returns documents in their original shape"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, key_or_list, direction=None):
+        keys, direction = storage_sort(key_or_list, direction)
+        self._cursor = self._cursor.sort(keys, direction) if direction is not None else self._cursor.sort(keys)
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size: int):
+        self._cursor = self._cursor.batch_size(batch_size)
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [from_storage(document) for document in await self._cursor.to_list(length=length)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for document in self._cursor:
+            yield from_storage(document)
+
+class TimeSeriesHistoryCollection:
+    """The subset of the Motor collection API used by the history endpoints, on a time-series collection"""
+
+    def __init__(self, collection_name: str, collection):
+        self.collection_name = collection_name
+        self.name = collection.name
+        self._collection = collection
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs):
+        if "sort" in kwargs:
+            kwargs["sort"] = storage_sort(kwargs["sort"])[0]
+        return TimeSeriesHistoryCursor(
+            self._collection.find(storage_filter(filter), storage_projection(projection), **kwargs)
+        )
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs):
+        if "sort" in kwargs:
+            kwargs["sort"] = storage_sort(kwargs["sort"])[0]
+        return from_storage(await self._collection.find_one(storage_filter(filter), storage_projection(projection), **kwargs))
+
+    async def count_documents(self, filter: Dict[str, Any], **kwargs) -> int:
+        return await self._collection.count_documents(storage_filter(filter), **kwargs)
+
+    async def estimated_document_count(self) -> int:
+        return await self._collection.estimated_document_count()
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None):
+        return await self._collection.distinct(_field(key), storage_filter(filter))
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs):
+        """Leading ``$match`` / ``$sort`` stages run on the stored form, later stages on the original shape"""
+        stages = []
+        position = 0
+        while position < len(pipeline) and set(pipeline[position]) <= {"$match", "$sort"}:
+            stage = pipeline[position]
+            if "$match" in stage:
+                stages.append({"$match": storage_filter(stage["$match"])})
+            else:
+                stages.append({"$sort": {_field(key): order for key, order in stage["$sort"].items()}})
+            position += 1
+        stages.append({"$replaceWith": {"$mergeObjects": ["$$ROOT", f"${META_FIELD}"]}})
+        stages.append({"$unset": META_FIELD})
+        return self._collection.aggregate(stages + list(pipeline[position:]), **kwargs)
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs):
+        return await self._collection.insert_one(to_storage(self.collection_name, document), **kwargs)
+
+    async def insert_many(self, documents: List[Dict[str, Any]], **kwargs):
+        return await self._collection.insert_many(
+            [to_storage(self.collection_name, document) for document in documents], **kwargs
+        )
+
+    async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], **kwargs):
+        return await self._collection.update_one(storage_filter(filter), storage_update(update), **kwargs)
+
+    async def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], **kwargs):
+        return await self._collection.update_many(storage_filter(filter), storage_update(update), **kwargs)
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs):
+        return await self._collection.delete_one(storage_filter(filter), **kwargs)
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs):
+        return await self._collection.delete_many(storage_filter(filter), **kwargs)
+
+class VitalHistoryStore:
+    """Chooses between the legacy and the time-series form of each history collection"""
+
+    def __init__(self):
+        self.enabled = settings.vital_timeseries_enabled
+
+    def is_timeseries(self, collection_name: str) -> bool:
+        return self.enabled and collection_name in TIMESERIES_COLLECTIONS
+
+    def get_collection(self, collection_name: str):
+        """Collection to read and write ``collection_name`` through"""
+        if not self.is_timeseries(collection_name):
+            return mongodb_service.get_collection(collection_name)
+        return TimeSeriesHistoryCollection(
+            collection_name, mongodb_service.get_collection(storage_name(collection_name))
+        )
+
+    def get_analytics_collection(self, collection_name: str):
+        """As ``get_collection``, routed like other read-only analytics queries"""
+        if not self.is_timeseries(collection_name):
+            return mongodb_service.get_analytics_collection(collection_name)
+        return TimeSeriesHistoryCollection(
+            collection_name, mongodb_service.get_analytics_collection(storage_name(collection_name))
+        )
+
+    async def ensure_collection(self, collection_name: str) -> bool:
+        """Create the time-series companion of ``collection_name`` (no-op if it exists)"""
+        time_field, granularity = TIMESERIES_COLLECTIONS[collection_name]
+        database = mongodb_service.get_database("main")
+        try:
+            await database.create_collection(
+                storage_name(collection_name),
+                timeseries={"timeField": time_field, "metaField": META_FIELD, "granularity": granularity}
+            )
+            logger.info(f"⏱️ Created time-series collection {storage_name(collection_name)} ({granularity})")
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            if e.code != 48:  # NamespaceExists
+                logger.error(f"Failed to create time-series collection {storage_name(collection_name)}: {e}")
+                return False
+        await database[storage_name(collection_name)].create_index(
+            [(f"{META_FIELD}.patient_id", 1), (time_field, -1)], name="ts_patient_time_idx"
+        )
+        return True
+
+    async def ensure_collections(self):
+        """Create every time-series collection when the mode is enabled"""
+        if not self.enabled:
+            return
+        for collection_name in TIMESERIES_COLLECTIONS:
+            try:
+                await self.ensure_collection(collection_name)
+            except Exception as e:
+                logger.error(f"Failed to prepare time-series collection for {collection_name}: {e}")
+
+    async def migrate_collection(self, collection_name: str, batch_size: int = 1000, restart: bool = False) -> Dict[str, Any]:
+        """Copy a legacy collection into its time-series form, resuming after the last copied ``_id``.
+
+        Each batch is marked pending before it is inserted and committed after.
+        Time-series collections have no unique index, so a batch left pending
+        by an interrupted run is de-duplicated by ``_id`` when it is copied again.
+        """
+        if not await self.ensure_collection(collection_name):
+            raise RuntimeError(f"Time-series collection for {collection_name} is unavailable")
+        progress = mongodb_service.get_collection(MIGRATIONS_COLLECTION)
+        state = None if restart else await progress.find_one({"_id": collection_name})
+        last_id = state.get("last_id") if state else None
+        pending_id = state.get("pending_id") if state else None
+
+        source = mongodb_service.get_collection(collection_name)
+        target = mongodb_service.get_collection(storage_name(collection_name))
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        copied = state.get("copied", 0) if state else 0
+        batch: List[Dict[str, Any]] = []
+
+        async def flush():
+            nonlocal copied, batch, pending_id
+            if not batch:
+                return
+            documents = batch
+            if pending_id is not None and batch[0]["_id"] <= pending_id:
+                existing = set(await target.distinct("_id", {"_id": {"$gte": batch[0]["_id"], "$lte": batch[-1]["_id"]}}))
+                documents = [document for document in batch if document["_id"] not in existing]
+            else:
+                pending_id = None
+            await progress.update_one(
+                {"_id": collection_name},
+                {"$set": {"pending_id": batch[-1]["_id"], "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            if documents:
+                await target.insert_many([to_storage(collection_name, document) for document in documents], ordered=False)
+            copied += len(batch)
+            await progress.update_one(
+                {"_id": collection_name},
+                {
+                    "$set": {"last_id": batch[-1]["_id"], "copied": copied, "updated_at": datetime.utcnow()},
+                    "$unset": {"pending_id": ""}
+                },
+                upsert=True
+            )
+            batch = []
+
+        async for document in source.find(query).sort("_id", 1).batch_size(batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                await flush()
+        await flush()
+
+        return {
+            "collection": collection_name,
+            "target": storage_name(collection_name),
+            "copied": copied,
+            "source_count": await source.estimated_document_count(),
+            "target_count": await target.estimated_document_count()
+        }
+
+# Global vital history store instance
+vital_history_store = VitalHistoryStore()
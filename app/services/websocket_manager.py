@@ -1,12 +1,11 @@
 from typing import Dict, List, Set, Any, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
-import json
 import asyncio
 from uuid import uuid4
 from config import logger
 from app.services.cache_service import cache_service
-from app.utils.json_encoder import MongoJSONEncoder
+from app.utils.json_encoder import dumps_mongodb_str
 
 class ConnectionManager:
     """
@@ -142,7 +141,7 @@ class ConnectionManager:
         websocket = self.active_connections[connection_id]["websocket"]
         try:
             # Serialize with MongoDB encoder
-            json_data = json.dumps(data, cls=MongoJSONEncoder)
+            json_data = dumps_mongodb_str(data)
             await websocket.send_text(json_data)
         except Exception as e:
             logger.error(f"Error sending to connection {connection_id}: {e}")
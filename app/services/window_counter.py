@@ -0,0 +1,160 @@
+"""
+Sliding Window Counters
+======================
+Approximate sliding-window event counts shared by all API workers.
+
+A window of ``window_seconds`` is split into ``buckets`` equal slots. Each
+slot is one Redis hash (``field = counter key``) that expires on its own
+once it falls out of the window, so memory is bounded by the keys seen in
+one window and nothing needs cleaning up. A hit is a single pipelined
+round trip (``HINCRBY`` + ``EXPIRE`` + one ``HGET`` per slot).
+
+Without Redis (cache disabled or unreachable) the counter keeps the same
+slots in process, capped at ``max_keys`` keys (least recently used are
+evicted), so counts are per worker instead of global.
+
+``covers_window`` is only true while Redis holds every hit of the last
+window: a hit counted locally marks the worker degraded for one window and,
+once Redis answers again, restarts the shared ``:since`` stamp so no worker
+treats the Redis counts as complete until a clean window has passed.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.services.cache_service import cache_service
+from app.utils.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+KEY_PREFIX = "mfc:opera:window:"
+
+class SlidingWindowCounter:
+    """Bucketed sliding-window counter, Redis-backed with an in-process fallback"""
+
+    def __init__(self, name: str, window_seconds: int, buckets: int = 10, max_keys: int = 10000):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.bucket_seconds = max(window_seconds // buckets, 1)
+        self.max_keys = max_keys
+        self._started = time.time()
+        self._degraded_until = 0.0  # local hits missing from Redis until then
+        self._reset_since = False  # restart the shared coverage stamp on the next Redis hit
+        # key -> (slot numbers, counts), one entry per bucket position
+        self._local: "OrderedDict[str, Tuple[List[int], List[int]]]" = OrderedDict()
+
+    # =============== Slots ===============
+
+    def _slot(self, now: Optional[float] = None) -> int:
+        return int((now if now is not None else time.time()) // self.bucket_seconds)
+
+    def _slots(self) -> List[int]:
+        current = self._slot()
+        return [current - offset for offset in range(self.buckets)]
+
+    def _redis_key(self, slot: int) -> str:
+        return f"{KEY_PREFIX}{self.name}:{slot}"
+
+    def _since_key(self) -> str:
+        return f"{KEY_PREFIX}{self.name}:since"
+
+    @staticmethod
+    def _redis():
+        return cache_service.redis_client
+
+    # =============== In-process fallback ===============
+
+    def _local_hit(self, key: str, amount: int) -> int:
+        slot = self._slot()
+        entry = self._local.get(key)
+        if entry is None:
+            entry = self._local[key] = ([0] * self.buckets, [0] * self.buckets)
+            if len(self._local) > self.max_keys:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        slots, counts = entry
+        position = slot % self.buckets
+        if slots[position] != slot:
+            slots[position] = slot
+            counts[position] = 0
+        counts[position] += amount
+        return self._local_count(key)
+
+    def _local_count(self, key: str) -> int:
+        entry = self._local.get(key)
+        if entry is None:
+            return 0
+        oldest = self._slot() - self.buckets
+        slots, counts = entry
+        return sum(count for slot, count in zip(slots, counts) if slot > oldest)
+
+    # =============== Public API ===============
+
+    async def hit(self, key: str, amount: int = 1) -> int:
+        """Count an event for ``key`` and return the count within the window"""
+        client = self._redis()
+        if client is not None:
+            try:
+                slots = self._slots()
+                pipe = client.pipeline(transaction=False)
+                pipe.hincrby(self._redis_key(slots[0]), key, amount)
+                pipe.expire(self._redis_key(slots[0]), self.window_seconds + self.bucket_seconds)
+                for slot in slots[1:]:
+                    pipe.hget(self._redis_key(slot), key)
+                results = await pipe.execute()
+                if self._reset_since:
+                    await client.set(self._since_key(), time.time())
+                    self._reset_since = False
+                return int(results[0]) + sum(int(value or 0) for value in results[2:])
+            except Exception as e:
+                logger.warning(f"Window counter {self.name}: Redis unavailable, counting locally ({e})")
+        self._degraded_until = time.time() + self.window_seconds + self.bucket_seconds
+        self._reset_since = True
+        return self._local_hit(key, amount)
+
+    async def count(self, key: str) -> int:
+        """Count for ``key`` within the window"""
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for slot in self._slots():
+                    pipe.hget(self._redis_key(slot), key)
+                return sum(int(value or 0) for value in await pipe.execute())
+            except Exception as e:
+                logger.warning(f"Window counter {self.name}: Redis unavailable, counting locally ({e})")
+        return self._local_count(key)
+
+    async def totals(self) -> Dict[str, int]:
+        """Counts of every key seen within the window"""
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for slot in self._slots():
+                    pipe.hgetall(self._redis_key(slot))
+                totals: Dict[str, int] = {}
+                for bucket in await pipe.execute():
+                    for key, value in bucket.items():
+                        key = key.decode() if isinstance(key, bytes) else key
+                        totals[key] = totals.get(key, 0) + int(value)
+                return totals
+            except Exception as e:
+                logger.warning(f"Window counter {self.name}: Redis unavailable, counting locally ({e})")
+        totals = {key: self._local_count(key) for key in self._local}
+        return {key: count for key, count in totals.items() if count}
+
+    async def covers_window(self) -> bool:
+        """True once Redis has received every hit of a full window"""
+        client = self._redis()
+        if client is None or self._reset_since or time.time() < self._degraded_until:
+            return False
+        try:
+            await client.set(self._since_key(), self._started, nx=True)
+            since = float(await client.get(self._since_key()))
+        except Exception:
+            return False
+        return time.time() - since >= self.window_seconds
@@ -1,15 +1,20 @@
 import asyncio
 import json
+import os
 import smtplib
+import socket
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from enum import Enum
-import requests
 from config import logger, settings
 
+# Severity order used when merging alerts into a digest
+LEVEL_ORDER = ["low", "medium", "high", "critical"]
+
 
 class AlertLevel(Enum):
     """Alert severity levels"""
@@ -44,19 +49,62 @@ class Alert:
     resolved_by: Optional[str] = None
 
 
+@dataclass
+class OutboxEntry:
+    """An alert waiting to be delivered to one external channel"""
+    channel: AlertChannel
+    alert: Alert
+    attempts: int = 0
+    outbox_id: Any = None  # _id in the alert_outbox collection once persisted
+    settled: bool = False
+
+
 class AlertManager:
     """
     Centralized alert management system
     Handles alert creation, deduplication, and routing to appropriate channels
+    
+    Alerts for external channels (email, Slack, webhook, Telegram) are stored
+    in ``alert_outbox`` and queued in memory; ``process_event`` never waits on
+    a channel. A background dispatcher drains the queue every
+    ``ALERT_DIGEST_WINDOW_SECONDS`` (immediately for critical alerts), merges
+    alerts with the same key into one digest per channel, and sends them
+    through a pooled async HTTP client with ``ALERT_CHANNEL_CONCURRENCY``
+    concurrent sends per channel. Documents are deleted once sent.
+
+    Each stored alert is owned by the process that queued it (``owner``,
+    ``claimed_at`` refreshed by the dispatcher). Alerts released at shutdown
+    or whose owner stopped refreshing for ``ALERT_OUTBOX_LEASE_SECONDS`` (a
+    crash) are claimed one at a time with ``find_one_and_update`` and resent,
+    so two instances never deliver the same backlog.
     """
     
     def __init__(self):
         self.alerts: Dict[str, Alert] = {}
         self.alert_rules: List[Dict[str, Any]] = []
         self.channels: Dict[AlertChannel, Any] = {}
-        self.alert_history: List[Alert] = []
+        self.alert_history: deque = deque(maxlen=int(os.getenv("ALERT_HISTORY_SIZE", "1000")))
         self.rate_limits: Dict[str, datetime] = {}
         self.alert_counts: Dict[str, List[datetime]] = {}  # Track alert counts for smart rate limiting
+        
+        # Outbox / dispatcher settings
+        self.digest_window = float(os.getenv("ALERT_DIGEST_WINDOW_SECONDS", "10"))
+        self.channel_concurrency = int(os.getenv("ALERT_CHANNEL_CONCURRENCY", "2"))
+        self.max_attempts = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+        self.shutdown_timeout = float(os.getenv("ALERT_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+        self.outbox_collection = os.getenv("ALERT_OUTBOX_COLLECTION", "alert_outbox")
+        self.outbox_lease = float(os.getenv("ALERT_OUTBOX_LEASE_SECONDS", "120"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        
+        self._outbox: Dict[Tuple[AlertChannel, str], List[OutboxEntry]] = {}
+        self._inflight: Dict[Tuple[AlertChannel, str], List[OutboxEntry]] = {}
+        self._semaphores: Dict[AlertChannel, asyncio.Semaphore] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        self._http_client = None
+        self.sent_count = 0
+        self.digest_count = 0
+        self.dropped_count = 0
         self._setup_default_rules()
     
     def _setup_default_rules(self):
@@ -125,21 +173,32 @@ class AlertManager:
         self.channels[channel] = config
     
     async def process_event(self, event: Dict[str, Any]):
-        """Process an event and generate alerts if rules match"""
+        """Process an event and queue alerts if rules match"""
+        entries: List[OutboxEntry] = []
         for rule in self.alert_rules:
             try:
                 if rule["condition"](event):
-                    await self._create_alert(rule, event)
+                    entries.extend(self._create_alert(rule, event))
             except Exception as e:
                 logger.error(f"Error processing alert rule {rule['name']}: {str(e)}")
+        
+        # Stored before queueing so a crash during the digest window loses nothing
+        if entries and self._dispatcher_task is not None:
+            await self._persist(entries)
+        for entry in entries:
+            self._enqueue(entry)
+        
+        # Without a running dispatcher (scripts, startup failures) deliver inline
+        if self._dispatcher_task is None and self._outbox:
+            await self.flush()
     
-    async def _create_alert(self, rule: Dict[str, Any], event: Dict[str, Any]):
-        """Create an alert based on rule and event"""
+    def _create_alert(self, rule: Dict[str, Any], event: Dict[str, Any]) -> List[OutboxEntry]:
+        """Create an alert based on rule and event; returns its entries for external channels"""
         alert_key = f"{rule['name']}_{event.get('source', 'unknown')}"
         
         # Check rate limiting
         if self._is_rate_limited(alert_key, rule.get("rate_limit_minutes", 0)):
-            return
+            return []
         
         # Create alert
         alert = Alert(
@@ -157,9 +216,14 @@ class AlertManager:
         self.alerts[alert.id] = alert
         self.alert_history.append(alert)
         
-        # Send to configured channels
+        # Log right away; external channels go through the outbox
+        entries = []
         for channel in rule.get("channels", []):
-            await self._send_alert(alert, channel)
+            if channel == AlertChannel.LOG:
+                self._log_alert(alert)
+            elif self._channel_enabled(channel):
+                entries.append(OutboxEntry(channel=channel, alert=alert))
+        return entries
     
     def _is_rate_limited(self, alert_key: str, rate_limit_minutes: int) -> bool:
         """Check if alert is rate limited using smart rate limiting"""
@@ -220,8 +284,259 @@ class AlertManager:
         
         return base_message
     
-    async def _send_alert(self, alert: Alert, channel: AlertChannel):
-        """Send alert to specific channel"""
+    # =============== Outbox ===============
+    
+    def _channel_enabled(self, channel: AlertChannel) -> bool:
+        if channel == AlertChannel.TELEGRAM:
+            return bool(settings.telegram_bot_token and settings.telegram_chat_id)
+        return channel in self.channels
+    
+    def _enqueue(self, entry: OutboxEntry):
+        self._outbox.setdefault((entry.channel, entry.alert.id), []).append(entry)
+        if entry.alert.level == AlertLevel.CRITICAL and self._wake is not None:
+            self._wake.set()
+    
+    def _semaphore(self, channel: AlertChannel) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(channel)
+        if semaphore is None:
+            semaphore = self._semaphores[channel] = asyncio.Semaphore(self.channel_concurrency)
+        return semaphore
+    
+    def _build_digest(self, alerts: List[Alert]) -> Alert:
+        """Merge a burst of alerts with the same key into one message"""
+        if len(alerts) == 1:
+            return alerts[0]
+        first, latest = alerts[0], alerts[-1]
+        level = max((alert.level for alert in alerts), key=lambda level: LEVEL_ORDER.index(level.value))
+        return Alert(
+            id=latest.id,
+            title=f"{latest.title} (x{len(alerts)})",
+            message=(
+                f"{len(alerts)} occurrences between {first.timestamp.strftime('%H:%M:%S')} "
+                f"and {latest.timestamp.strftime('%H:%M:%S')} UTC\n\nLatest:\n{latest.message}"
+            ),
+            level=level,
+            timestamp=latest.timestamp,
+            source=latest.source,
+            details={
+                "occurrences": len(alerts),
+                "first_seen": first.timestamp.isoformat(),
+                "last_seen": latest.timestamp.isoformat(),
+                "latest": latest.details
+            },
+            tags=latest.tags
+        )
+    
+    async def _deliver(self, channel: AlertChannel, entries: List[OutboxEntry]):
+        """Send one (digest) message for a group of entries; keep them for retry on failure"""
+        alert = self._build_digest([entry.alert for entry in entries])
+        async with self._semaphore(channel):
+            sent = await self._send_alert(alert, channel)
+        
+        if sent:
+            self.sent_count += 1
+            if len(entries) > 1:
+                self.digest_count += 1
+            await self._forget([entry for entry in entries if entry.outbox_id is not None])
+        else:
+            retry = []
+            for entry in entries:
+                entry.attempts += 1
+                if entry.attempts < self.max_attempts:
+                    retry.append(entry)
+            dropped = [entry for entry in entries if entry.attempts >= self.max_attempts]
+            if dropped:
+                self.dropped_count += len(dropped)
+                logger.error(f"Dropping {len(dropped)} {channel.value} alert(s) for {alert.id} after {self.max_attempts} attempts")
+                await self._forget([entry for entry in dropped if entry.outbox_id is not None])
+            await self._record_attempts([entry for entry in retry if entry.outbox_id is not None])
+            await self._persist(retry)
+            for entry in retry:
+                self._enqueue(entry)
+        for entry in entries:
+            entry.settled = True
+    
+    async def flush(self):
+        """Deliver everything currently in the outbox"""
+        if not self._outbox:
+            return
+        self._inflight, self._outbox = self._outbox, {}
+        await asyncio.gather(*(
+            self._deliver(channel, entries) for (channel, _), entries in self._inflight.items()
+        ))
+        self._inflight = {}
+    
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.digest_window)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._renew_claims()
+                await self._load_outbox()
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Alert dispatcher error: {str(e)}")
+            # Let bursts of critical alerts accumulate into digests
+            await asyncio.sleep(1)
+    
+    # =============== Persistence ===============
+    
+    def _get_outbox_collection(self):
+        from app.services.mongo import mongodb_service
+        return mongodb_service.get_collection(self.outbox_collection)
+    
+    async def _persist(self, entries: List[OutboxEntry]):
+        """Store entries not yet in the alert_outbox collection, owned by this process"""
+        new_entries = [entry for entry in entries if entry.outbox_id is None]
+        if not new_entries:
+            return
+        documents = []
+        for entry in new_entries:
+            alert = asdict(entry.alert)
+            alert["level"] = entry.alert.level.value
+            alert["details"] = json.loads(json.dumps(entry.alert.details, default=str))
+            documents.append({
+                "channel": entry.channel.value,
+                "attempts": entry.attempts,
+                "alert": alert,
+                "owner": self.owner,
+                "claimed_at": datetime.utcnow(),
+                "created_at": datetime.utcnow()
+            })
+        try:
+            result = await self._get_outbox_collection().insert_many(documents)
+            for entry, outbox_id in zip(new_entries, result.inserted_ids):
+                entry.outbox_id = outbox_id
+        except Exception as e:
+            logger.error(f"Failed to persist {len(documents)} unsent alert(s): {str(e)}")
+    
+    async def _record_attempts(self, entries: List[OutboxEntry]):
+        try:
+            for entry in entries:
+                await self._get_outbox_collection().update_one(
+                    {"_id": entry.outbox_id}, {"$set": {"attempts": entry.attempts}}
+                )
+        except Exception as e:
+            logger.error(f"Failed to record alert delivery attempts: {str(e)}")
+    
+    async def _forget(self, entries: List[OutboxEntry]):
+        if not entries:
+            return
+        try:
+            await self._get_outbox_collection().delete_many(
+                {"_id": {"$in": [entry.outbox_id for entry in entries]}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to clear delivered alerts from outbox: {str(e)}")
+    
+    async def _renew_claims(self):
+        """Keep this process's stored alerts from being claimed by another instance"""
+        try:
+            await self._get_outbox_collection().update_many(
+                {"owner": self.owner}, {"$set": {"claimed_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to renew alert outbox claims: {str(e)}")
+    
+    async def _release_claims(self):
+        """Hand this process's stored alerts to the next instance that starts"""
+        try:
+            await self._get_outbox_collection().update_many({"owner": self.owner}, {"$set": {"owner": None}})
+        except Exception as e:
+            logger.error(f"Failed to release alert outbox claims: {str(e)}")
+    
+    async def _load_outbox(self):
+        """Claim and queue alerts released by a stopped instance or left by a crashed one"""
+        collection = self._get_outbox_collection()
+        loaded = 0
+        while True:
+            try:
+                document = await collection.find_one_and_update(
+                    {"owner": {"$ne": self.owner}, "$or": [
+                        {"owner": None},
+                        {"claimed_at": {"$lt": datetime.utcnow() - timedelta(seconds=self.outbox_lease)}}
+                    ]},
+                    {"$set": {"owner": self.owner, "claimed_at": datetime.utcnow()}},
+                    sort=[("created_at", 1)]
+                )
+            except Exception as e:
+                logger.error(f"Failed to load alert outbox: {str(e)}")
+                break
+            if document is None:
+                break
+            try:
+                alert = dict(document["alert"])
+                alert["level"] = AlertLevel(alert["level"])
+                self._enqueue(OutboxEntry(
+                    channel=AlertChannel(document["channel"]),
+                    alert=Alert(**alert),
+                    attempts=document.get("attempts", 0),
+                    outbox_id=document["_id"]
+                ))
+                loaded += 1
+            except Exception as e:
+                # Undeliverable: drop it rather than reclaim it after every lease
+                logger.error(f"Dropping malformed outbox alert {document.get('_id')}: {str(e)}")
+                try:
+                    await collection.delete_one({"_id": document["_id"]})
+                except Exception as delete_error:
+                    logger.error(f"Failed to drop malformed outbox alert: {str(delete_error)}")
+        if loaded:
+            logger.info(f"📬 Claimed {loaded} unsent alert(s) from outbox")
+    
+    # =============== Lifecycle ===============
+    
+    async def start(self):
+        """Load persisted alerts and start the background dispatcher"""
+        if self._dispatcher_task is not None:
+            return
+        self._wake = asyncio.Event()
+        await self._load_outbox()
+        self._dispatcher_task = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"✅ Alert dispatcher started (digest window {self.digest_window:.0f}s)")
+    
+    async def stop(self):
+        """Send what is queued (bounded by a timeout) and persist the rest"""
+        if self._dispatcher_task is not None:
+            self._dispatcher_task.cancel()
+            await asyncio.gather(self._dispatcher_task, return_exceptions=True)
+            self._dispatcher_task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Alert delivery timed out during shutdown; persisting unsent alerts")
+        
+        unsent = [entry for entries in self._inflight.values() for entry in entries if not entry.settled]
+        unsent += [entry for entries in self._outbox.values() for entry in entries]
+        self._inflight = {}
+        self._outbox = {}
+        await self._persist(unsent)
+        await self._release_claims()
+        
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
+    async def _get_http_client(self):
+        """Shared pooled HTTP client for Slack, webhook and Telegram sends"""
+        if self._http_client is None:
+            import httpx
+            self._http_client = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(
+                    max_connections=self.channel_concurrency * 3,
+                    max_keepalive_connections=self.channel_concurrency * 3
+                )
+            )
+        return self._http_client
+    
+    # =============== Channels ===============
+    
+    async def _send_alert(self, alert: Alert, channel: AlertChannel) -> bool:
+        """Send alert to specific channel; False if it should be retried"""
         try:
             if channel == AlertChannel.EMAIL:
                 await self._send_email_alert(alert)
@@ -233,8 +548,10 @@ class AlertManager:
                 await self._send_telegram_alert(alert)
             elif channel == AlertChannel.LOG:
                 self._log_alert(alert)
+            return True
         except Exception as e:
             logger.error(f"Failed to send alert via {channel.value}: {str(e)}")
+            return False
     
     async def _send_email_alert(self, alert: Alert):
         """Send alert via email"""
@@ -242,13 +559,12 @@ class AlertManager:
         if not email_config:
             return
         
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = email_config['from_email']
-            msg['To'] = ', '.join(email_config['to_emails'])
-            msg['Subject'] = f"[{alert.level.value.upper()}] {alert.title}"
-            
-            body = f"""
+        msg = MIMEMultipart()
+        msg['From'] = email_config['from_email']
+        msg['To'] = ', '.join(email_config['to_emails'])
+        msg['Subject'] = f"[{alert.level.value.upper()}] {alert.title}"
+        
+        body = f"""
 Alert Details:
 - Level: {alert.level.value.upper()}
 - Source: {alert.source}
@@ -257,24 +573,27 @@ Alert Details:
 {alert.message}
 
 Additional Details:
-{json.dumps(alert.details, indent=2)}
+{json.dumps(alert.details, indent=2, default=str)}
 """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'])
+        
+        msg.attach(MIMEText(body, 'plain'))
+        
+        # smtplib blocks; keep it off the event loop
+        await asyncio.to_thread(self._deliver_email, email_config, msg)
+        
+        logger.info(f"Email alert sent for {alert.id}")
+    
+    @staticmethod
+    def _deliver_email(email_config: Dict[str, Any], msg: MIMEMultipart):
+        server = smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'], timeout=10)
+        try:
             if email_config.get('use_tls'):
                 server.starttls()
             if email_config.get('username'):
                 server.login(email_config['username'], email_config['password'])
-            
             server.send_message(msg)
+        finally:
             server.quit()
-            
-            logger.info(f"Email alert sent for {alert.id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to send email alert: {str(e)}")
     
     async def _send_slack_alert(self, alert: Alert):
         """Send alert via Slack webhook"""
@@ -282,38 +601,31 @@ Additional Details:
         if not slack_config:
             return
         
-        try:
-            color_map = {
-                AlertLevel.LOW: "good",
-                AlertLevel.MEDIUM: "warning",
-                AlertLevel.HIGH: "danger",
-                AlertLevel.CRITICAL: "danger"
-            }
-            
-            payload = {
-                "text": f"🚨 {alert.title}",
-                "attachments": [{
-                    "color": color_map.get(alert.level, "warning"),
-                    "fields": [
-                        {"title": "Level", "value": alert.level.value.upper(), "short": True},
-                        {"title": "Source", "value": alert.source, "short": True},
-                        {"title": "Timestamp", "value": alert.timestamp.isoformat(), "short": True}
-                    ],
-                    "text": alert.message
-                }]
-            }
-            
-            response = requests.post(
-                slack_config['webhook_url'],
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Slack alert sent for {alert.id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to send Slack alert: {str(e)}")
+        color_map = {
+            AlertLevel.LOW: "good",
+            AlertLevel.MEDIUM: "warning",
+            AlertLevel.HIGH: "danger",
+            AlertLevel.CRITICAL: "danger"
+        }
+        
+        payload = {
+            "text": f"🚨 {alert.title}",
+            "attachments": [{
+                "color": color_map.get(alert.level, "warning"),
+                "fields": [
+                    {"title": "Level", "value": alert.level.value.upper(), "short": True},
+                    {"title": "Source", "value": alert.source, "short": True},
+                    {"title": "Timestamp", "value": alert.timestamp.isoformat(), "short": True}
+                ],
+                "text": alert.message
+            }]
+        }
+        
+        client = await self._get_http_client()
+        response = await client.post(slack_config['webhook_url'], json=payload)
+        response.raise_for_status()
+        
+        logger.info(f"Slack alert sent for {alert.id}")
     
     async def _send_webhook_alert(self, alert: Alert):
         """Send alert via webhook"""
@@ -321,33 +633,25 @@ Additional Details:
         if not webhook_config:
             return
         
-        try:
-            payload = {
-                "alert_id": alert.id,
-                "title": alert.title,
-                "message": alert.message,
-                "level": alert.level.value,
-                "timestamp": alert.timestamp.isoformat(),
-                "source": alert.source,
-                "details": alert.details,
-                "tags": alert.tags
-            }
-            
-            headers = webhook_config.get('headers', {})
-            headers['Content-Type'] = 'application/json'
-            
-            response = requests.post(
-                webhook_config['url'],
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Webhook alert sent for {alert.id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to send webhook alert: {str(e)}")
+        payload = {
+            "alert_id": alert.id,
+            "title": alert.title,
+            "message": alert.message,
+            "level": alert.level.value,
+            "timestamp": alert.timestamp.isoformat(),
+            "source": alert.source,
+            "details": json.loads(json.dumps(alert.details, default=str)),
+            "tags": alert.tags
+        }
+        
+        headers = dict(webhook_config.get('headers', {}))
+        headers['Content-Type'] = 'application/json'
+        
+        client = await self._get_http_client()
+        response = await client.post(webhook_config['url'], json=payload, headers=headers)
+        response.raise_for_status()
+        
+        logger.info(f"Webhook alert sent for {alert.id}")
     
     async def _send_telegram_alert(self, alert: Alert):
         """Send alert via Telegram bot"""
@@ -356,35 +660,34 @@ Additional Details:
         if not token or not chat_id:
             logger.warning("Telegram bot token or chat ID not configured.")
             return
-        try:
-            # Create base message
-            base_message = f"🚨 <b>{alert.title}</b>\nLevel: <b>{alert.level.value.upper()}</b>\nSource: <b>{alert.source}</b>\nTime: <b>{alert.timestamp.strftime('%Y-%m-%d %H:%M:%S')}</b>\n\n"
-            
-            # Truncate alert message if too long (Telegram limit is 4096 characters)
-            alert_message = alert.message
-            if len(alert_message) > 3000:  # Leave room for base message and formatting
-                alert_message = alert_message[:3000] + "... [truncated]"
-            
-            # Clean the message of any invalid HTML characters
-            alert_message = self._clean_telegram_message(alert_message)
-            
-            message = base_message + alert_message
-            
-            # Final length check
-            if len(message) > 4096:
-                message = message[:4090] + "... [truncated]"
-            
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            }
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
-            logger.info(f"Telegram alert sent for {alert.id}")
-        except Exception as e:
-            logger.error(f"Failed to send Telegram alert: {str(e)}")
+        
+        # Create base message
+        base_message = f"🚨 <b>{alert.title}</b>\nLevel: <b>{alert.level.value.upper()}</b>\nSource: <b>{alert.source}</b>\nTime: <b>{alert.timestamp.strftime('%Y-%m-%d %H:%M:%S')}</b>\n\n"
+        
+        # Truncate alert message if too long (Telegram limit is 4096 characters)
+        alert_message = alert.message
+        if len(alert_message) > 3000:  # Leave room for base message and formatting
+            alert_message = alert_message[:3000] + "... [truncated]"
+        
+        # Clean the message of any invalid HTML characters
+        alert_message = self._clean_telegram_message(alert_message)
+        
+        message = base_message + alert_message
+        
+        # Final length check
+        if len(message) > 4096:
+            message = message[:4090] + "... [truncated]"
+        
+        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        payload = {
+            "chat_id": chat_id,
+            "text": message,
+            "parse_mode": "HTML"
+        }
+        client = await self._get_http_client()
+        response = await client.post(url, json=payload)
+        response.raise_for_status()
+        logger.info(f"Telegram alert sent for {alert.id}")
     
     def _clean_telegram_message(self, message: str) -> str:
         """Clean message for Telegram HTML parsing"""
@@ -470,7 +773,13 @@ Additional Details:
             "last_24h": len([
                 alert for alert in self.alert_history
                 if alert.timestamp > datetime.utcnow() - timedelta(hours=24)
-            ])
+            ]),
+            "outbox": {
+                "pending": sum(len(entries) for entries in self._outbox.values()),
+                "sent": self.sent_count,
+                "digests": self.digest_count,
+                "dropped": self.dropped_count
+            }
         }
 
 
@@ -592,6 +901,12 @@ if __name__ == "__main__":
         tags=[]
     )
     
+    async def _send_test_alert():
+        try:
+            await alert_manager._send_telegram_alert(test_alert)
+        finally:
+            await alert_manager.stop()
+    
     print("Sending test Telegram alert...")
-    asyncio.run(alert_manager._send_telegram_alert(test_alert))
+    asyncio.run(_send_test_alert())
     print("Done.") 
\ No newline at end of file
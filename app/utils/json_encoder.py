@@ -16,6 +16,18 @@ import uuid
 import re
 from enum import Enum
 
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    # Optional dependency: fall back to the stdlib encoder
+    orjson = None
+
+# Datetimes are passed through to the default hook so they keep Python's
+# isoformat() rendering (and any tzinfo pymongo attaches)
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
 class MongoJSONEncoder(json.JSONEncoder):
     """
     Comprehensive JSON encoder for handling all MongoDB data types and edge cases.
@@ -96,6 +108,48 @@ class MongoJSONEncoder(json.JSONEncoder):
             # Fallback to string representation
             return str(obj)
 
+_mongo_encoder = MongoJSONEncoder()
+
+def _orjson_default(obj):
+    """orjson ``default`` hook: common types inline, the rest via MongoJSONEncoder"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return _mongo_encoder.default(obj)
+
+def dumps_mongodb(data: Any) -> bytes:
+    """
+    Serialize a MongoDB document/response to compact UTF-8 JSON in one pass.
+    
+    Uses orjson when installed. Structures orjson rejects (e.g. non-string
+    dictionary keys, integers over 64 bits) go through the recursive
+    converter and the stdlib encoder instead.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return json.dumps(
+        convert_objectids_to_strings(data),
+        cls=MongoJSONEncoder,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+def dumps_mongodb_str(data: Any) -> str:
+    """``dumps_mongodb`` as text, for WebSocket frames and Redis values"""
+    return dumps_mongodb(data).decode("utf-8")
+
+class MongoJSONResponse(JSONResponse):
+    """JSONResponse rendering MongoDB types directly with ``dumps_mongodb``"""
+    
+    def render(self, content: Any) -> bytes:
+        if content is None:
+            return b""
+        return dumps_mongodb(content)
+
 def convert_objectids_to_strings(obj: Any) -> Any:
     """
     Recursively convert all MongoDB-specific types to JSON-serializable formats.
@@ -252,6 +306,12 @@ def serialize_mongodb_response(data: Union[Dict, List, Any]) -> Union[Dict, List
     Returns:
         JSON-serializable version of the input data
     """
+    if orjson is not None:
+        # Single pass in C; anything orjson rejects takes the recursive path
+        try:
+            return orjson.loads(orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS))
+        except TypeError:
+            pass
     try:
         # Use the comprehensive converter
         return convert_objectids_to_strings(data)
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Optional, Dict, Any
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from loguru import logger
 
@@ -22,6 +22,20 @@ class Settings(BaseSettings):
     mongodb_ssl_ca_file: str = "ssl/ca-latest.pem"
     mongodb_ssl_client_file: str = "ssl/client-combined-latest.pem"
     
+    # MongoDB Connection Pool (per worker)
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 5
+    mongodb_max_idle_time_ms: int = 60000
+    mongodb_wait_queue_timeout_ms: int = 10000
+    mongodb_compressors: str = "zstd,snappy,zlib"  # codecs without their package installed are skipped
+    mongodb_analytics_read_preference: str = "secondaryPreferred"
+    mongodb_analytics_max_staleness_seconds: int = 120  # >= 90, or 0 for no bound
+    mongodb_analytics_uri: str = ""  # dedicated analytics node (used by the analytics_node route)
+    mongodb_read_routing: str = "analytics=secondary,visualization=secondary,reporting=secondary"
+    
+    # Device vital histories stored as time-series collections (run the migration first)
+    vital_timeseries_enabled: bool = False
+    
     # Database Names
     mongodb_main_db: str = "AMY"  # Main application database
     mongodb_fhir_db: str = "MFC_FHIR_R5"  # FHIR R5 resources database
@@ -40,7 +54,9 @@ class Settings(BaseSettings):
     dev_mode: bool = False
     port: int = 5054
     host: str = "0.0.0.0"
-    
+    optional_routers: str = "migration,visualization,reports,fhir_validation"  # router groups this deployment serves
+    lazy_routers: bool = True  # import optional router groups on their first request instead of at startup
+
     # SSL Configuration
     ssl_validate: bool = False
     ssl_ca_file: str = "ssl/ca-latest.pem"
@@ -69,6 +85,13 @@ class Settings(BaseSettings):
     environment: str = os.getenv("ENVIRONMENT", "production")
     node_env: str = "production"
 
+    # Data Retention (TTL indexes always; archiving to disk is opt-in)
+    retention_archiver_enabled: bool = False
+    retention_archive_dir: str = ""  # absolute path on a persistent volume; nothing is archived or deleted while unset
+    retention_interval_seconds: int = 3600
+    retention_batch_size: int = 5000
+    retention_policies: Dict[str, Dict[str, Any]] = {}  # per-collection overrides, JSON in RETENTION_POLICIES
+
     # Telegram Alert Settings
     telegram_bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     telegram_chat_id: str = os.getenv("TELEGRAM_CHAT_ID", "")
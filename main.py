@@ -23,9 +23,10 @@ from app.utils.error_definitions import create_error_response, create_validation
 from app.middleware.logging_middleware import RequestLoggingMiddleware, PerformanceLoggingMiddleware, SecurityLoggingMiddleware
 from app.middleware.rate_limit_middleware import RateLimitMiddleware
 from app.middleware.security_headers import SecurityHeadersMiddleware
+from app.middleware.lazy_routers import LazyRouterMiddleware, optional_routers
 from app.utils.structured_logging import structured_logger, get_structured_logger
 from app.utils.alert_system import alert_manager, configure_email_alerts, configure_slack_alerts
-from app.utils.json_encoder import MongoJSONEncoder
+from app.utils.json_encoder import MongoJSONEncoder, MongoJSONResponse
 from datetime import datetime
 import json
 
@@ -41,16 +42,17 @@ from app.routes.performance import router as performance_router
 from app.routes.realtime import router as realtime_router
 from app.routes.security import router as security_router
 from app.routes.analytics import router as analytics_router
-from app.routes.visualization import router as visualization_router
-from app.routes.reports import router as reports_router
 from app.routes.patient_devices import router as patient_devices_router, router_lookup as patient_devices_lookup_router
 from app.routes.fhir_r5 import router as fhir_r5_router
-from app.routes.fhir_validation import router as fhir_validation_router
 from app.routes.hash_audit import router as hash_audit_router
 from app.routes.kati_transaction import router as kati_transaction_router
 
 from app.services.rate_limiter import rate_limiter
-from app.services.scheduler import report_scheduler
+from app.services.device_ingestion_queue import device_ingestion_queue
+from app.services.pipeline_tracing import pipeline_tracer
+from app.services.reference_data import reference_data_store
+from app.services.analytics_export import analytics_export_service
+from app.services.retention import retention_manager
 from app.routes import router as auth_router
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -94,16 +96,32 @@ async def lifespan(app: FastAPI):
             await rate_limiter.load_blacklist()
             logger.info("✅ Rate limiter connected")
             
-            # Start report scheduler
-            await report_scheduler.start()
-            logger.info("✅ Report scheduler started")
+            # Start report scheduler (only with the reports router group)
+            if optional_routers.is_enabled("reports"):
+                from app.services.scheduler import report_scheduler
+                await report_scheduler.start()
+                logger.info("✅ Report scheduler started")
         else:
             logger.info("ℹ️ Cache disabled - running without Redis")
         
-        # Create TTL indexes for audit logs  
-        audit_collection = mongodb_service.get_fhir_collection("fhir_provenance")
-        await audit_collection.create_index("recorded", expireAfterSeconds=15552000)  # 180 days
-        logger.info("✅ TTL index created for FHIR audit logs")
+        # Start fast-ack device ingestion workers if enabled
+        if device_ingestion_queue.enabled:
+            await device_ingestion_queue.start()
+        
+        # Start the alert outbox dispatcher (resends alerts left over from the last run)
+        await alert_manager.start()
+        
+        # Start periodic export of pipeline trace histograms
+        await pipeline_tracer.start()
+        
+        # Load reference data (provinces, districts, master lists) into memory
+        await reference_data_store.start()
+        
+        # Retention: TTL indexes (FHIR audit logs, security alerts) and the log archiver
+        await retention_manager.start()
+        
+        # Fail analytics export jobs whose process stopped; heartbeat this process's jobs
+        await analytics_export_service.start()
         
         # Log startup event
         await alert_manager.process_event({
@@ -125,6 +143,7 @@ async def lifespan(app: FastAPI):
             "timestamp": datetime.utcnow().isoformat(),
             "source": "application"
         })
+        await alert_manager.stop()
         raise
     
     yield
@@ -133,6 +152,12 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 Shutting down My FirstCare Opera Panel...")
     
     # Disconnect services
+    await device_ingestion_queue.stop()
+    await pipeline_tracer.stop()
+    await reference_data_store.stop()
+    await retention_manager.stop()
+    await analytics_export_service.stop()
+    await alert_manager.stop()
     await mongodb_service.disconnect()
     if settings.enable_cache:
         await cache_service.disconnect()
@@ -390,20 +415,7 @@ from fastapi.responses import JSONResponse
 # Override the default JSON encoder for all JSONResponse instances
 original_render = JSONResponse.render
 
-def mongodb_compatible_render(self, content):
-    """Custom render method that uses MongoDB-compatible JSON encoding"""
-    if content is None:
-        return b""
-    return json.dumps(
-        content,
-        cls=MongoJSONEncoder,
-        ensure_ascii=False,
-        allow_nan=False,
-        indent=None,
-        separators=(",", ":"),
-    ).encode("utf-8")
-
-JSONResponse.render = mongodb_compatible_render
+JSONResponse.render = MongoJSONResponse.render
 
 # Add security middleware (order matters - first added is outermost)
 app.add_middleware(SecurityHeadersMiddleware)
@@ -475,8 +487,6 @@ app.include_router(performance_router, tags=["performance"])       # has prefix
 app.include_router(realtime_router, tags=["realtime"])             # has prefix /realtime
 app.include_router(security_router, tags=["security"])             # has prefix /admin/security
 app.include_router(analytics_router, tags=["analytics"])             # has prefix /admin/analytics
-app.include_router(visualization_router, tags=["visualization"])       # has prefix /admin/visualization
-app.include_router(reports_router, tags=["reports"])             # has prefix /admin/reports
 app.include_router(hash_audit_router, tags=["hash-audit"])      # has prefix /api/v1/audit/hash
 app.include_router(kati_transaction_router, tags=["kati-transaction"]) # has prefix /api/kati/transactions
 
@@ -490,15 +500,13 @@ except Exception as e:
     import traceback
     logger.error(traceback.format_exc())
 
-# Add FHIR validation router
-try:
-    logger.info(f"🔍 Adding FHIR validation router with {len(fhir_validation_router.routes)} routes...")
-    app.include_router(fhir_validation_router, tags=["fhir-validation"])  # has prefix /fhir/validation
-    logger.info("✅ FHIR validation router successfully included")
-except Exception as e:
-    logger.error(f"❌ Failed to include FHIR validation router: {e}")
-    import traceback
-    logger.error(traceback.format_exc())
+# Optional router groups (migration, visualization, reports, FHIR validation):
+# mounted on first use with LAZY_ROUTERS, otherwise right away
+if settings.lazy_routers:
+    app.add_middleware(LazyRouterMiddleware, routers=optional_routers)
+    logger.info(f"💤 Optional router groups mounted on first use: {', '.join(optional_routers.enabled) or 'none'}")
+else:
+    optional_routers.mount_all(app)
 
 logger.info(f"📊 Total app routes after including all routers: {len(app.routes)}")
 
@@ -22,6 +22,8 @@ from data_processor import DataProcessor
 from data_flow_emitter import data_flow_emitter
 from fhir_validator import fhir_validator
 from event_logger import EventLogger
+from pipeline_tracing import pipeline_tracer
+from connections import http_session
 
 # Configure logging
 logging.basicConfig(
@@ -75,7 +77,7 @@ class AVA4MQTTListener:
             url = f"{self.web_panel_url}/api/data-flow/emit"
             payload = {"event": event_data}
             
-            response = requests.post(
+            response = http_session().post(
                 url,
                 json=payload,
                 timeout=self.web_panel_timeout,
@@ -118,7 +120,7 @@ class AVA4MQTTListener:
             url = f"{self.web_panel_url}/api/medical-data/broadcast"
             payload = {"medical_data": serializable_medical_data}
             
-            response = requests.post(
+            response = http_session().post(
                 url,
                 json=payload,
                 timeout=self.web_panel_timeout,
@@ -188,6 +190,11 @@ class AVA4MQTTListener:
             return None
     
     def process_message(self, topic: str, payload: str):
+        """Process incoming MQTT message inside a pipeline trace"""
+        with pipeline_tracer.trace("AVA4", topic):
+            self._process_message(topic, payload)
+    
+    def _process_message(self, topic: str, payload: str):
         """Process incoming MQTT message"""
         try:
             # Step 1: MQTT Message Received
@@ -212,7 +219,8 @@ class AVA4MQTTListener:
             )
             
             # Parse JSON payload
-            data = json.loads(payload)
+            with pipeline_tracer.span("parse"):
+                data = json.loads(payload)
             logger.info(f"Processing {topic} message: {data.get('type', 'unknown')}")
             
             # Step 2: Payload Parsed
@@ -453,7 +461,8 @@ class AVA4MQTTListener:
             # Step 2.5: FHIR Data Format Validation (NEW)
             validated_data = None
             try:
-                validation_result = fhir_validator.validate_ava4_data_format(data, "dusun_pub")
+                with pipeline_tracer.span("validate"):
+                    validation_result = fhir_validator.validate_ava4_data_format(data, "dusun_pub")
                 
                 if not validation_result["valid"]:
                     logger.warning(f"⚠️ AVA4 Data validation failed: {validation_result['errors']}")
@@ -495,7 +504,8 @@ class AVA4MQTTListener:
             
             # Method 1: Try to find by AVA4 MAC (main device) - for logging only
             logger.debug(f"🔍 Method 1: Looking for patient by AVA4 MAC: {ava4_mac}")
-            ava4_gateway_patient = self.device_mapper.find_patient_by_ava4_mac(ava4_mac)
+            with pipeline_tracer.span("patient_lookup"):
+                ava4_gateway_patient = self.device_mapper.find_patient_by_ava4_mac(ava4_mac)
             if ava4_gateway_patient:
                 ava4_gateway_name = f"{ava4_gateway_patient.get('first_name', '')} {ava4_gateway_patient.get('last_name', '')}".strip()
                 logger.info(f"🏠 AVA4 GATEWAY OWNER: {ava4_gateway_patient['_id']} ({ava4_gateway_name})")
@@ -503,11 +513,13 @@ class AVA4MQTTListener:
             # Method 2: Try by sub-device BLE MAC in amy_devices (PRIORITY)
             if sub_device_mac:
                 logger.info(f"🔍 Method 2: Looking for patient by sub-device BLE MAC: {sub_device_mac}")
-                device_info = self.device_mapper.get_device_info(sub_device_mac)
+                with pipeline_tracer.span("patient_lookup"):
+                    device_info = self.device_mapper.get_device_info(sub_device_mac)
                 if device_info:
                     logger.info(f"📱 Found device in amy_devices: {device_info}")
                     if device_info.get('patient_id'):
-                        patient = self.device_mapper.db.patients.find_one({"_id": device_info['patient_id']})
+                        with pipeline_tracer.span("patient_lookup"):
+                            patient = self.device_mapper.db.patients.find_one({"_id": device_info['patient_id']})
                         if patient:
                             device_patient_name = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
                             logger.info(f"📱 MEDICAL DEVICE OWNER (amy_devices): {patient['_id']} ({device_patient_name}) - Device: {sub_device_mac}")
@@ -538,7 +550,8 @@ class AVA4MQTTListener:
                 mapped_device_type = device_type_mapping.get(attribute)
                 if mapped_device_type:
                     logger.info(f"📱 Looking for device type: {mapped_device_type}")
-                    patient = self.device_mapper.find_patient_by_device_mac(sub_device_mac, mapped_device_type)
+                    with pipeline_tracer.span("patient_lookup"):
+                        patient = self.device_mapper.find_patient_by_device_mac(sub_device_mac, mapped_device_type)
                     if patient:
                         device_patient_name = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
                         logger.info(f"📱 MEDICAL DEVICE OWNER (patient fields): {patient['_id']} ({device_patient_name}) - Device: {sub_device_mac} - Type: {mapped_device_type}")
@@ -596,25 +609,27 @@ class AVA4MQTTListener:
                 data_to_process = validated_data.get('data', {}).get('value', value)
             
             if patient:
-                success = self.data_processor.process_ava4_data(
-                    patient['_id'], 
-                    ava4_mac,  # AVA4 gateway MAC
-                    attribute, 
-                    data_to_process,  # Use safely extracted data
-                    sub_device_mac,
-                    latest_device_name  # Pass the latest device name from status collection
-                )
+                with pipeline_tracer.span("history_store"):
+                    success = self.data_processor.process_ava4_data(
+                        patient['_id'], 
+                        ava4_mac,  # AVA4 gateway MAC
+                        attribute, 
+                        data_to_process,  # Use safely extracted data
+                        sub_device_mac,
+                        latest_device_name  # Pass the latest device name from status collection
+                    )
             else:
                 logger.info(f"📱 Patient not found, but storing data in database for display purposes")
                 # Store data in database even when patient mapping fails for display purposes
-                success = self.data_processor.process_ava4_data(
-                    "unknown",  # Use "unknown" as patient ID
-                    ava4_mac,  # AVA4 gateway MAC
-                    attribute, 
-                    data_to_process,  # Use safely extracted data
-                    sub_device_mac,
-                    latest_device_name  # Pass the latest device name from status collection
-                )
+                with pipeline_tracer.span("history_store"):
+                    success = self.data_processor.process_ava4_data(
+                        "unknown",  # Use "unknown" as patient ID
+                        ava4_mac,  # AVA4 gateway MAC
+                        attribute, 
+                        data_to_process,  # Use safely extracted data
+                        sub_device_mac,
+                        latest_device_name  # Pass the latest device name from status collection
+                    )
             
             # Create medical data event for data flow emitter
             medical_data_event = {
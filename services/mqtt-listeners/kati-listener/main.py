@@ -11,12 +11,16 @@ Updated to handle all Kati Watch payload formats:
 - iMEDE_watch/sleepdata (sleep tracking data)
 - iMEDE_watch/sos (SOS emergency)
 - iMEDE_watch/fallDown (fall detection)
+
+SOS and fall-down messages take the emergency fast lane
+(shared/emergency_lane.py) unless EMERGENCY_FAST_LANE_ENABLED=false.
 """
 
 import os
 import json
 import logging
 import asyncio
+import time
 from datetime import datetime
 from typing import Dict, Any, Optional
 import sys
@@ -29,7 +33,11 @@ from device_mapper import DeviceMapper
 from data_processor import DataProcessor
 from data_flow_emitter import data_flow_emitter
 from fhir_validator import fhir_validator
-import requests
+from pipeline_tracing import pipeline_tracer
+from connections import http_session
+from emergency_lane import (
+    EMERGENCY_ALERT_TYPES, EMERGENCY_PRIORITIES, MessageLane, emergency_alert, emergency_dispatcher, fast_lane_enabled
+)
 
 # Configure logging
 logging.basicConfig(
@@ -69,6 +77,13 @@ class KatiMQTTListener:
         self.web_panel_url = os.getenv('WEB_PANEL_URL', 'http://mqtt-panel:8098')
         self.web_panel_timeout = int(os.getenv('WEB_PANEL_TIMEOUT', 30))
         
+        # Emergency fast lane: SOS / fall-down skip the routine backlog
+        self.fast_lane = fast_lane_enabled()
+        self.routine_lane = MessageLane(
+            'kati-routine', self.process_message, max_depth=int(os.getenv('ROUTINE_LANE_MAX_DEPTH', 10000))
+        )
+        self.emergency_lane = MessageLane('kati-emergency', self.process_emergency)
+        
     def connect_mqtt(self) -> mqtt_client.Client:
         """Connect to MQTT broker"""
         def on_connect(client, userdata, flags, rc):
@@ -97,7 +112,7 @@ class KatiMQTTListener:
                     # If UTF-8 fails, try to decode as binary and convert to hex
                     payload = msg.payload.hex()
                     logger.warning(f"⚠️ Non-UTF-8 message received on topic {msg.topic}, converted to hex")
-                self.process_message(msg.topic, payload)
+                self.dispatch_message(msg.topic, payload)
             except Exception as e:
                 logger.error(f"Error processing message: {e}")
         
@@ -117,7 +132,66 @@ class KatiMQTTListener:
             logger.error(f"Failed to connect to MQTT broker: {e}")
             return None
     
+    def start_lanes(self):
+        if self.fast_lane:
+            self.emergency_lane.start()
+            self.routine_lane.start()
+            logger.info("🚑 Emergency fast lane enabled for SOS / fall-down topics")
+    
+    def stop_lanes(self):
+        if self.fast_lane:
+            self.emergency_lane.stop()
+            self.routine_lane.stop()
+        emergency_dispatcher.close()
+    
+    def dispatch_message(self, topic: str, payload: str, received_at: Optional[float] = None):
+        """Route a received message: emergencies to the priority lane, the rest to the routine lane"""
+        if not self.fast_lane:
+            self.process_message(topic, payload)
+            return
+        received_at = received_at or time.time()
+        alert_type = EMERGENCY_ALERT_TYPES.get(topic)
+        if alert_type:
+            self.emergency_lane.submit((topic, payload, received_at), priority=EMERGENCY_PRIORITIES[alert_type])
+        else:
+            self.routine_lane.submit((topic, payload), priority=1)
+    
+    def process_emergency(self, topic: str, payload: str, received_at: float):
+        """Store, publish and notify an SOS / fall-down alarm; the full pipeline follows on the routine lane"""
+        try:
+            data = json.loads(payload)
+            imei = data.get('IMEI')
+            
+            patient = None
+            if imei:
+                try:
+                    patient = self.device_mapper.find_patient_by_kati_imei(imei)
+                except Exception as e:
+                    logger.error(f"❌ Patient lookup failed for emergency from IMEI {imei}: {e}")
+            
+            patient_name = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip() if patient else None
+            alarm_id = self.data_processor.store_emergency_alarm(
+                topic, data, patient['_id'] if patient else None, patient_name, received_at
+            )
+            
+            alert = emergency_alert(alarm_id, topic, data, patient)
+            emergency_dispatcher.publish(alert)
+            emergency_dispatcher.notify(alert)
+            latency_ms = emergency_dispatcher.observe_latency("Kati", alert["alert_type"], received_at)
+            logger.warning(f"🚨 {alert['alert_type'].upper()} alarm {alarm_id} dispatched in {latency_ms:.0f}ms (IMEI {imei})")
+            
+        except Exception as e:
+            logger.error(f"❌ Error in emergency fast lane for {topic}: {e}")
+        
+        # Validation, web panel events, monitoring storage: ahead of queued routine messages (never dropped)
+        self.routine_lane.submit((topic, payload), priority=0, force=True)
+    
     def process_message(self, topic: str, payload: str):
+        """Process incoming MQTT message inside a pipeline trace"""
+        with pipeline_tracer.trace("Kati", topic):
+            self._process_message(topic, payload)
+    
+    def _process_message(self, topic: str, payload: str):
         """Process incoming MQTT message"""
         try:
             # Step 1: MQTT Message Received
@@ -133,7 +207,8 @@ class KatiMQTTListener:
             self.post_event_to_web_panel(event_data_1)
             
             # Parse JSON payload
-            data = json.loads(payload)
+            with pipeline_tracer.span("parse"):
+                data = json.loads(payload)
             logger.info(f"Processing {topic} message")
             
             # Step 2: Payload Parsed
@@ -150,7 +225,8 @@ class KatiMQTTListener:
             
             # Step 2.5: FHIR Data Format Validation (NEW)
             try:
-                validation_result = fhir_validator.validate_kati_data_format(data, topic)
+                with pipeline_tracer.span("validate"):
+                    validation_result = fhir_validator.validate_kati_data_format(data, topic)
                 
                 if not validation_result["valid"]:
                     logger.error(f"❌ Kati Data validation failed: {validation_result['errors']}")
@@ -180,7 +256,8 @@ class KatiMQTTListener:
                 return
             
             # Find patient by Kati IMEI
-            patient = self.device_mapper.find_patient_by_kati_imei(imei)
+            with pipeline_tracer.span("patient_lookup"):
+                patient = self.device_mapper.find_patient_by_kati_imei(imei)
             
             # Step 3: Patient Lookup
             patient_info = None
@@ -215,7 +292,8 @@ class KatiMQTTListener:
                         logger.info(f"💾 Storing {topic} data in FHIR R5 for patient {patient_info.get('patient_id')}")
                         
                         # Process FHIR R5 data
-                        fhir_success = self._process_fhir_r5_data(topic, data, patient_info)
+                        with pipeline_tracer.span("fhir_store"):
+                            fhir_success = self._process_fhir_r5_data(topic, data, patient_info)
                         
                         if fhir_success:
                             data_flow_emitter.emit_fhir_storage("Kati", topic, data, patient_info)
@@ -415,7 +493,8 @@ class KatiMQTTListener:
                     logger.info(f"[DEBUG] FALL DETECTION: Status={medical_data['status']}, GPS={gps_data.get('latitude')}/{gps_data.get('longitude')}, LBS={lbs_data.get('MCC')}-{lbs_data.get('MNC')}")
                 
                 # Store in medical collection
-                result = self.data_processor.store_medical_data(medical_data)
+                with pipeline_tracer.span("history_store"):
+                    result = self.data_processor.store_medical_data(medical_data)
                 if result:
                     logger.info(f"✅ Medical data stored for {topic}")
                     data_flow_emitter.emit_medical_stored("Kati", topic, data, patient_info, medical_data)
@@ -440,7 +519,7 @@ class KatiMQTTListener:
             # Wrap event data in 'event' key as expected by web panel
             wrapped_data = {"event": event_data}
             
-            response = requests.post(
+            response = http_session().post(
                 f"{self.web_panel_url}/api/data-flow/emit",
                 json=wrapped_data,
                 timeout=self.web_panel_timeout
@@ -482,10 +561,11 @@ class KatiMQTTListener:
                 'Authorization': f'Bearer {api_token}',
                 'Content-Type': 'application/json'
             }
+            headers.update(pipeline_tracer.headers())
             # If AP55, observation_data is a list - use batch endpoint
             if isinstance(observation_data, list):
                 # Use batch endpoint for multiple observations
-                response = requests.post(f"{api_base_url}/fhir/R5/Observation/batch", 
+                response = http_session().post(f"{api_base_url}/fhir/R5/Observation/batch", 
                                        json=observation_data, headers=headers, timeout=30)
                 if response.status_code in (200, 201):
                     result = response.json()
@@ -497,7 +577,7 @@ class KatiMQTTListener:
                     logger.error(f"FHIR R5 Batch API error (AP55): {response.status_code} - {response.text}")
                     return False
             else:
-                response = requests.post(f"{api_base_url}/fhir/R5/Observation", json=observation_data, headers=headers, timeout=10)
+                response = http_session().post(f"{api_base_url}/fhir/R5/Observation", json=observation_data, headers=headers, timeout=10)
                 if response.status_code in (200, 201):
                     logger.info(f"✅ FHIR R5 Observation created for patient {patient_info.get('patient_id')}")
                     return True
@@ -975,6 +1055,7 @@ class KatiMQTTListener:
         if not self.client:
             logger.error("Failed to connect to MQTT broker")
             return
+        self.start_lanes()
         
         try:
             # Keep the service running
@@ -993,6 +1074,7 @@ class KatiMQTTListener:
             if self.client:
                 self.client.loop_stop()
                 self.client.disconnect()
+            self.stop_lanes()
             
             # Close database connections
             self.device_mapper.close()
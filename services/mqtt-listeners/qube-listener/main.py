@@ -23,6 +23,8 @@ from device_mapper import DeviceMapper
 from data_processor import DataProcessor
 from data_flow_emitter import data_flow_emitter
 from fhir_validator import fhir_validator
+from pipeline_tracing import pipeline_tracer
+from connections import http_session
 
 # Configure logging
 logging.basicConfig(
@@ -280,7 +282,7 @@ class RobustQubeMQTTListener:
         try:
             url = f"{self.web_panel_url}/api/data-flow/emit"
             payload = {"event": event_data}
-            response = requests.post(
+            response = http_session().post(
                 url,
                 json=payload,
                 timeout=self.web_panel_timeout,
@@ -300,6 +302,11 @@ class RobustQubeMQTTListener:
             return False
     
     def process_message(self, topic: str, payload: str):
+        """Process incoming MQTT message inside a pipeline trace"""
+        with pipeline_tracer.trace("Qube-Vital", topic):
+            self._process_message(topic, payload)
+    
+    def _process_message(self, topic: str, payload: str):
         """Process incoming MQTT message"""
         try:
             # Step 1: MQTT Message Received
@@ -315,7 +322,8 @@ class RobustQubeMQTTListener:
             self.post_event_to_web_panel(event_data_1)
             
             # Parse JSON payload
-            data = json.loads(payload)
+            with pipeline_tracer.span("parse"):
+                data = json.loads(payload)
             logger.info(f"Processing {topic} message: {data.get('type', 'unknown')}")
             
             # Step 2: Payload Parsed
@@ -394,7 +402,8 @@ class RobustQubeMQTTListener:
             
             # Step 2.5: FHIR Data Format Validation (NEW)
             try:
-                validation_result = fhir_validator.validate_qube_data_format(data, "CM4_BLE_GW_TX")
+                with pipeline_tracer.span("validate"):
+                    validation_result = fhir_validator.validate_qube_data_format(data, "CM4_BLE_GW_TX")
                 
                 if not validation_result["valid"]:
                     logger.error(f"❌ Qube-Vital Data validation failed: {validation_result['errors']}")
@@ -417,18 +426,20 @@ class RobustQubeMQTTListener:
                 return
             
             # Find patient by citizen ID
-            patient = self.device_mapper.find_patient_by_citiz(citiz)
+            with pipeline_tracer.span("patient_lookup"):
+                patient = self.device_mapper.find_patient_by_citiz(citiz)
             
             # If patient not found, create unregistered patient
             if not patient:
                 logger.info(f"👤 Creating unregistered patient for citizen ID: {citiz}")
-                patient = self.device_mapper.create_unregistered_patient(
-                    citiz=citiz,
-                    name_th=data.get('nameTH', ''),
-                    name_en=data.get('nameEN', ''),
-                    birth_date=data.get('brith', ''),
-                    gender=data.get('gender', '')
-                )
+                with pipeline_tracer.span("patient_lookup"):
+                    patient = self.device_mapper.create_unregistered_patient(
+                        citiz=citiz,
+                        name_th=data.get('nameTH', ''),
+                        name_en=data.get('nameEN', ''),
+                        birth_date=data.get('brith', ''),
+                        gender=data.get('gender', '')
+                    )
                 
                 if not patient:
                     logger.error(f"❌ Failed to create unregistered patient for citizen ID: {citiz}")
@@ -447,11 +458,12 @@ class RobustQubeMQTTListener:
             logger.info(f"💊 Processing {attribute} data for patient {patient['_id']}")
             
             # Process the medical data using validated data
-            success = self.data_processor.process_qube_data(
-                patient['_id'], 
-                attribute, 
-                validated_data.get('data', {}).get('value', value)
-            )
+            with pipeline_tracer.span("history_store"):
+                success = self.data_processor.process_qube_data(
+                    patient['_id'], 
+                    attribute, 
+                    validated_data.get('data', {}).get('value', value)
+                )
             
             # Step 4: Patient Updated
             medical_data = {
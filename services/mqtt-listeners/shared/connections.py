@@ -0,0 +1,244 @@
+"""
+Shared connection factory for the MQTT listeners
+
+One MongoClient per process (per URI) for DeviceMapper, DataProcessor and
+anything else in the listener, instead of a client (TLS handshake + ping)
+per helper object, and one keep-alive ``requests.Session`` for every
+outgoing HTTP call (FHIR API, web panel events, event log, trace export).
+
+Pool sizing and wire compression come from the environment:
+
+- ``MONGODB_MAX_POOL_SIZE`` (default 20), ``MONGODB_MIN_POOL_SIZE`` (2),
+  ``MONGODB_MAX_IDLE_TIME_MS`` (60000)
+- ``MONGODB_COMPRESSORS`` (default ``zstd,snappy,zlib``; codecs whose
+  Python package is not installed are skipped by pymongo)
+- ``HTTP_POOL_MAXSIZE`` (default 10) connections kept alive per host
+
+``pool_metrics()`` reports pool utilization (connections open / checked
+out, checkout waits and failures, HTTP requests) plus any source added
+with ``register_metrics`` (e.g. message lane depths); it is logged every
+``POOL_METRICS_LOG_INTERVAL`` seconds (0 disables).
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+logger = logging.getLogger(__name__)
+
+SSL_CA_FILE = "/app/ssl/ca-latest.pem"
+SSL_CLIENT_FILE = "/app/ssl/client-combined-latest.pem"
+
+class PoolMetrics(ConnectionPoolListener):
+    """Connection pool counters fed by pymongo's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+        self.pools_cleared = 0
+        self._checkout_started = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(self.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._checkout_started, 'value', None)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            if started is not None:
+                self.checkout_wait_ms += (time.perf_counter() - started) * 1000
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": round(self.checkout_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "pools_cleared": self.pools_cleared
+            }
+
+class PooledSession(requests.Session):
+    """Keep-alive session that counts requests and failures"""
+
+    def __init__(self, pool_maxsize: int):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.request_count = 0
+        self.error_count = 0
+
+    def request(self, *args, **kwargs):
+        self.request_count += 1
+        try:
+            return super().request(*args, **kwargs)
+        except Exception:
+            self.error_count += 1
+            raise
+
+pool_metrics_listener = PoolMetrics()
+
+_lock = threading.Lock()
+_mongo_clients: Dict[str, MongoClient] = {}
+_http_session: Optional[PooledSession] = None
+_metrics_logger: Optional[threading.Thread] = None
+_metrics_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def mongo_pool_options() -> Dict[str, Any]:
+    """Pool sizing and compression settings for MongoClient"""
+    return {
+        "maxPoolSize": int(os.getenv('MONGODB_MAX_POOL_SIZE', 20)),
+        "minPoolSize": int(os.getenv('MONGODB_MIN_POOL_SIZE', 2)),
+        "maxIdleTimeMS": int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 60000)),
+        "compressors": os.getenv('MONGODB_COMPRESSORS', 'zstd,snappy,zlib'),
+        "event_listeners": [pool_metrics_listener]
+    }
+
+def _tls_options() -> Dict[str, Any]:
+    options = {
+        "tls": True,
+        "tlsAllowInvalidCertificates": True,
+        "tlsAllowInvalidHostnames": True,
+        "serverSelectionTimeoutMS": 20000,
+        "connectTimeoutMS": 20000
+    }
+    if os.path.exists(SSL_CA_FILE):
+        options["tlsCAFile"] = SSL_CA_FILE
+        logger.info(f"✅ Using SSL CA file: {SSL_CA_FILE}")
+    else:
+        logger.warning(f"⚠️ SSL CA file not found: {SSL_CA_FILE}, proceeding without it")
+    if os.path.exists(SSL_CLIENT_FILE):
+        options["tlsCertificateKeyFile"] = SSL_CLIENT_FILE
+        logger.info(f"✅ Using SSL client file: {SSL_CLIENT_FILE}")
+    else:
+        logger.warning(f"⚠️ SSL client file not found: {SSL_CLIENT_FILE}, proceeding without it")
+    return options
+
+def _connect(mongodb_uri: str) -> MongoClient:
+    if not mongodb_uri.startswith("mongodb://"):
+        # mongodb+srv:// and other formats carry their own TLS settings
+        return MongoClient(mongodb_uri, **mongo_pool_options())
+    try:
+        client = MongoClient(mongodb_uri, **_tls_options(), **mongo_pool_options())
+        client.admin.command('ping')
+        logger.info("✅ Connected to MongoDB with SSL certificates")
+        return client
+    except Exception as e:
+        logger.error(f"❌ MongoDB connection with SSL failed: {e}")
+        logger.warning("⚠️ Falling back to simple MongoDB connection")
+        return MongoClient(mongodb_uri, **mongo_pool_options())
+
+def get_mongo_client(mongodb_uri: str) -> MongoClient:
+    """Process-wide MongoClient for ``mongodb_uri``"""
+    client = _mongo_clients.get(mongodb_uri)
+    if client is None:
+        with _lock:
+            client = _mongo_clients.get(mongodb_uri)
+            if client is None:
+                client = _mongo_clients[mongodb_uri] = _connect(mongodb_uri)
+                _start_metrics_logger()
+    return client
+
+def http_session() -> PooledSession:
+    """Process-wide keep-alive HTTP session"""
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                _http_session = PooledSession(int(os.getenv('HTTP_POOL_MAXSIZE', 10)))
+    return _http_session
+
+def register_metrics(name: str, snapshot: Callable[[], Dict[str, Any]]):
+    """Include ``snapshot()`` under ``name`` in ``pool_metrics()``"""
+    _metrics_sources[name] = snapshot
+
+def pool_metrics() -> Dict[str, Any]:
+    """Mongo pool and HTTP session utilization, plus registered sources"""
+    session = _http_session
+    mongo = pool_metrics_listener.snapshot()
+    mongo["clients"] = len(_mongo_clients)
+    mongo["max_pool_size"] = int(os.getenv('MONGODB_MAX_POOL_SIZE', 20))
+    metrics = {
+        "mongo": mongo,
+        "http": {
+            "requests": session.request_count if session else 0,
+            "errors": session.error_count if session else 0
+        }
+    }
+    for name, snapshot in list(_metrics_sources.items()):
+        metrics[name] = snapshot()
+    return metrics
+
+def _start_metrics_logger():
+    global _metrics_logger
+    interval = float(os.getenv('POOL_METRICS_LOG_INTERVAL', 300))
+    if _metrics_logger is not None or interval <= 0:
+        return
+
+    def _log_loop():
+        while True:
+            time.sleep(interval)
+            logger.info(f"📊 Listener metrics: {pool_metrics()}")
+
+    _metrics_logger = threading.Thread(target=_log_loop, name='pool-metrics', daemon=True)
+    _metrics_logger.start()
+
+def close_all():
+    """Close the shared clients (listener shutdown)"""
+    global _http_session
+    with _lock:
+        for client in _mongo_clients.values():
+            client.close()
+        _mongo_clients.clear()
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
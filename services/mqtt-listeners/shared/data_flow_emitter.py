@@ -6,7 +6,7 @@ Handles emission of step-by-step data flow events for real-time monitoring
 import os
 import json
 import logging
-import requests
+from connections import http_session
 from datetime import datetime
 from typing import Optional, Dict, Any
 from bson import ObjectId
@@ -56,7 +56,7 @@ class DataFlowEmitter:
             }
             
             # Send to web panel via HTTP endpoint
-            response = requests.post(
+            response = http_session().post(
                 f"{self.web_panel_url}/api/data-flow/emit",
                 json={"event": event_data},
                 timeout=30
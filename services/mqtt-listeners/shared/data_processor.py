@@ -3,11 +3,12 @@ Data Processing Utility
 Handles storage of medical data to patient records and history collections
 """
 
-import os
 import logging
 from typing import Optional, Dict, Any, List
 from datetime import datetime
-from pymongo import MongoClient
+from connections import get_mongo_client
+from timeseries import insert_vital
+from emergency_lane import EMERGENCY_ALERT_TYPES
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
@@ -16,63 +17,11 @@ class DataProcessor:
     """Processes and stores medical data"""
     
     def __init__(self, mongodb_uri: str, database_name: str = "AMY"):
-        # Parse MongoDB URI to extract components
-        if mongodb_uri.startswith("mongodb://"):
-            # Handle mongodb:// format
-            self._setup_mongodb_connection(mongodb_uri, database_name)
-        else:
-            # Handle mongodb+srv:// format or other formats
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client[database_name]
+        # One pooled client per process, shared by DeviceMapper and DataProcessor
+        self.client = get_mongo_client(mongodb_uri)
+        self.db = self.client[database_name]
         
         logger.info(f"DataProcessor initialized for database: {database_name}")
-    
-    def _setup_mongodb_connection(self, mongodb_uri: str, database_name: str):
-        """Setup MongoDB connection with SSL certificates"""
-        try:
-            # Check if SSL certificate files exist
-            ssl_ca_file = "/app/ssl/ca-latest.pem"
-            ssl_client_file = "/app/ssl/client-combined-latest.pem"
-            
-            ssl_ca_exists = os.path.exists(ssl_ca_file)
-            ssl_client_exists = os.path.exists(ssl_client_file)
-            
-            # MongoDB configuration
-            mongodb_config = {
-                "tls": True,
-                "tlsAllowInvalidCertificates": True,
-                "tlsAllowInvalidHostnames": True,
-                "serverSelectionTimeoutMS": 20000,
-                "connectTimeoutMS": 20000
-            }
-            
-            # Only add SSL certificate files if they exist
-            if ssl_ca_exists:
-                mongodb_config["tlsCAFile"] = ssl_ca_file
-                logger.info(f"✅ Using SSL CA file: {ssl_ca_file}")
-            else:
-                logger.warning(f"⚠️ SSL CA file not found: {ssl_ca_file}, proceeding without it")
-                
-            if ssl_client_exists:
-                mongodb_config["tlsCertificateKeyFile"] = ssl_client_file
-                logger.info(f"✅ Using SSL client file: {ssl_client_file}")
-            else:
-                logger.warning(f"⚠️ SSL client file not found: {ssl_client_file}, proceeding without it")
-            
-            # Create client with SSL configuration
-            self.client = MongoClient(mongodb_uri, **mongodb_config)
-            self.db = self.client[database_name]
-            
-            # Test connection
-            self.client.admin.command('ping')
-            logger.info("✅ Connected to MongoDB with SSL certificates")
-            
-        except Exception as e:
-            logger.error(f"❌ MongoDB connection with SSL failed: {e}")
-            # Fallback to simple connection
-            logger.warning("⚠️ Falling back to simple MongoDB connection")
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client[database_name]
         
     def update_patient_last_data(self, patient_id: ObjectId, data_type: str, 
                                 data: Dict[str, Any], source: str = "device", 
@@ -180,7 +129,7 @@ class DataProcessor:
             
             logger.debug(f"💾 History document prepared: {history_doc}")
             
-            result = self.db[collection_name].insert_one(history_doc)
+            result = insert_vital(self.db, collection_name, history_doc)
             
             patient_display = f"{patient_id} ({patient_name})" if patient_name else str(patient_id)
             if result.inserted_id:
@@ -198,7 +147,7 @@ class DataProcessor:
     def store_medical_data(self, data: dict) -> bool:
         """Store generic medical data in the 'medical_data' collection."""
         try:
-            result = self.db['medical_data'].insert_one(data)
+            result = insert_vital(self.db, 'medical_data', data)
             if result.inserted_id:
                 logger.info(f"✅ Successfully stored generic medical data (ID: {result.inserted_id}) in 'medical_data' collection.")
                 return True
@@ -550,7 +499,7 @@ class DataProcessor:
             }
             
             logger.info(f"💾 STORING BATCH DATA - Collection: medical_data, Count: {len(data_list)}")
-            batch_result = self.db.medical_data.insert_one(batch_doc)
+            batch_result = insert_vital(self.db, 'medical_data', batch_doc)
             if batch_result.inserted_id:
                 logger.info(f"✅ BATCH DATA STORED SUCCESSFULLY - ID: {batch_result.inserted_id}")
             else:
@@ -654,65 +603,62 @@ class DataProcessor:
     def _process_kati_emergency(self, patient_id: ObjectId, topic: str, payload: Dict[str, Any], 
                                patient_name: Optional[str] = None) -> bool:
         """Process Kati emergency alerts"""
+        logger.info(f"🚨 Processing Kati emergency alert - Patient: {patient_id}, Topic: {topic}")
+        logger.info(f"📊 Emergency payload keys: {list(payload.keys())}")
+        return self.store_emergency_alarm(topic, payload, patient_id, patient_name) is not None
+    
+    def store_emergency_alarm(self, topic: str, payload: Dict[str, Any], patient_id: Optional[ObjectId] = None,
+                              patient_name: Optional[str] = None, received_at: Optional[float] = None) -> Optional[ObjectId]:
+        """Store a Kati SOS / fall-down alert in AMY.emergency_alarm; returns the alarm id"""
         try:
-            logger.info(f"🚨 Processing Kati emergency alert - Patient: {patient_id}, Topic: {topic}")
-            logger.info(f"📊 Emergency payload keys: {list(payload.keys())}")
-            logger.info(f"📊 Emergency payload data: {payload}")
-            
-            # Determine alert type based on topic
-            if topic == "iMEDE_watch/sos":
-                alert_type = "sos"
+            alert_type = EMERGENCY_ALERT_TYPES.get(topic, "unknown")
+            if alert_type == "sos":
                 logger.warning(f"🚨 SOS EMERGENCY ALERT DETECTED!")
-            elif topic == "iMEDE_watch/fallDown":
-                alert_type = "fall_down"
+            elif alert_type == "fall_down":
                 logger.warning(f"⚠️ FALL DETECTION ALERT DETECTED!")
             else:
-                alert_type = "unknown"
                 logger.warning(f"❓ UNKNOWN EMERGENCY ALERT TYPE: {topic}")
             
-            # Prepare alert data
+            now = datetime.utcnow()
+            priority = "CRITICAL" if alert_type == "sos" else "HIGH"
             alert_data = {
                 "type": alert_type,
                 "status": payload.get("status", "ACTIVE"),
                 "location": payload.get("location"),
                 "imei": payload.get("IMEI"),
-                "timestamp": datetime.utcnow(),
+                "timestamp": now,
                 "source": "Kati",
-                "priority": "CRITICAL" if alert_type == "sos" else "HIGH"
+                "priority": priority
             }
             
-            # Store emergency alert in AMY.emergency_alarm collection
             emergency_doc = {
                 "patient_id": patient_id,
-                "patient_name": patient_name,
+                "patient_name": patient_name or f"Unmapped Device ({payload.get('IMEI')})",
                 "alert_type": alert_type,
                 "alert_data": alert_data,
-                "timestamp": datetime.utcnow(),
+                "priority": priority,
+                "imei": payload.get("IMEI"),
+                "timestamp": now,
                 "source": "Kati",
                 "device_type": "Kati_Watch",
                 "topic": topic,
                 "status": "ACTIVE",
-                "created_at": datetime.utcnow(),
+                "created_at": now,
                 "processed": False
             }
-            
-            logger.info(f"🚨 STORING EMERGENCY ALERT - Collection: emergency_alarm, Type: {alert_type}")
-            logger.info(f"📊 Emergency document: {emergency_doc}")
+            if received_at is not None:
+                emergency_doc["received_at"] = datetime.utcfromtimestamp(received_at)
             
             result = self.db.emergency_alarm.insert_one(emergency_doc)
             
-            if result.inserted_id:
-                logger.warning(f"🚨 EMERGENCY ALERT STORED SUCCESSFULLY - ID: {result.inserted_id}")
-                logger.warning(f"🚨 {alert_type.upper()} ALERT for patient {patient_id} ({patient_name})")
-                logger.warning(f"🚨 Collection: emergency_alarm, Priority: {alert_data['priority']}")
-                return True
-            else:
-                logger.error(f"❌ FAILED TO STORE EMERGENCY ALERT - Type: {alert_type}")
-                return False
+            logger.warning(f"🚨 EMERGENCY ALERT STORED SUCCESSFULLY - ID: {result.inserted_id}")
+            logger.warning(f"🚨 {alert_type.upper()} ALERT for patient {patient_id} ({emergency_doc['patient_name']})")
+            logger.warning(f"🚨 Collection: emergency_alarm, Priority: {priority}")
+            return result.inserted_id
             
         except Exception as e:
-            logger.error(f"❌ Error processing Kati emergency: {e}")
-            return False
+            logger.error(f"❌ Error storing Kati emergency alarm: {e}")
+            return None
     
     def process_qube_data(self, patient_id: ObjectId, attribute: str, value: Dict[str, Any]) -> bool:
         """Process Qube-Vital data"""
@@ -3,11 +3,10 @@ Device-Patient Mapping Utility
 Handles mapping between device identifiers and patient records
 """
 
-import os
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
-from pymongo import MongoClient
+from connections import get_mongo_client
 from bson import ObjectId
 
 logger = logging.getLogger(__name__)
@@ -16,63 +15,11 @@ class DeviceMapper:
     """Maps device identifiers to patient records"""
     
     def __init__(self, mongodb_uri: str, database_name: str = "AMY"):
-        # Parse MongoDB URI to extract components
-        if mongodb_uri.startswith("mongodb://"):
-            # Handle mongodb:// format
-            self._setup_mongodb_connection(mongodb_uri, database_name)
-        else:
-            # Handle mongodb+srv:// format or other formats
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client[database_name]
+        # One pooled client per process, shared by DeviceMapper and DataProcessor
+        self.client = get_mongo_client(mongodb_uri)
+        self.db = self.client[database_name]
         
         logger.info(f"DeviceMapper initialized for database: {database_name}")
-    
-    def _setup_mongodb_connection(self, mongodb_uri: str, database_name: str):
-        """Setup MongoDB connection with SSL certificates"""
-        try:
-            # Check if SSL certificate files exist
-            ssl_ca_file = "/app/ssl/ca-latest.pem"
-            ssl_client_file = "/app/ssl/client-combined-latest.pem"
-            
-            ssl_ca_exists = os.path.exists(ssl_ca_file)
-            ssl_client_exists = os.path.exists(ssl_client_file)
-            
-            # MongoDB configuration
-            mongodb_config = {
-                "tls": True,
-                "tlsAllowInvalidCertificates": True,
-                "tlsAllowInvalidHostnames": True,
-                "serverSelectionTimeoutMS": 20000,
-                "connectTimeoutMS": 20000
-            }
-            
-            # Only add SSL certificate files if they exist
-            if ssl_ca_exists:
-                mongodb_config["tlsCAFile"] = ssl_ca_file
-                logger.info(f"✅ Using SSL CA file: {ssl_ca_file}")
-            else:
-                logger.warning(f"⚠️ SSL CA file not found: {ssl_ca_file}, proceeding without it")
-                
-            if ssl_client_exists:
-                mongodb_config["tlsCertificateKeyFile"] = ssl_client_file
-                logger.info(f"✅ Using SSL client file: {ssl_client_file}")
-            else:
-                logger.warning(f"⚠️ SSL client file not found: {ssl_client_file}, proceeding without it")
-            
-            # Create client with SSL configuration
-            self.client = MongoClient(mongodb_uri, **mongodb_config)
-            self.db = self.client[database_name]
-            
-            # Test connection
-            self.client.admin.command('ping')
-            logger.info("✅ Connected to MongoDB with SSL certificates")
-            
-        except Exception as e:
-            logger.error(f"❌ MongoDB connection with SSL failed: {e}")
-            # Fallback to simple connection
-            logger.warning("⚠️ Falling back to simple MongoDB connection")
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client[database_name]
         
     def find_patient_by_ava4_mac(self, mac_address: str) -> Optional[Dict[str, Any]]:
         """Find patient by AVA4 box MAC address"""
@@ -0,0 +1,282 @@
+"""
+Priority fast lane for emergency MQTT messages
+
+paho delivers every message on its network thread, so a listener that
+processes messages inline makes an SOS wait behind every heartbeat and
+AP55 batch that arrived before it (web panel posts, validation, patient
+lookup, FHIR calls). With the fast lane, ``on_message`` only enqueues:
+
+- routine topics go to a ``MessageLane`` worked in arrival order; it holds
+  at most ``ROUTINE_LANE_MAX_DEPTH`` messages (default 10000) and drops
+  (and counts) routine messages beyond that rather than grow without
+  bound or block paho's network thread
+- emergency topics (``EMERGENCY_ALERT_TYPES``) go to a separate priority
+  lane (SOS before fall-down) whose worker only does what the alarm needs:
+  store it in ``emergency_alarm``, publish it on Redis and hand it to the
+  notifiers; validation, web panel events, monitoring storage and FHIR
+  follow through the routine lane, ahead of queued routine messages
+
+Redis channels (``REDIS_URL``; skipped when unset or unreachable):
+
+- ``realtime:patient.alert``: picked up by the API's realtime event handler
+  and pushed to the patient's alert WebSocket room (mapped devices only)
+- ``EMERGENCY_CHANNEL`` (default ``emergency:alerts``): every alarm
+
+Notifications run on a small thread pool so a slow provider never holds
+up the next alarm: Telegram when ``TELEGRAM_BOT_TOKEN`` and
+``TELEGRAM_CHAT_ID`` are set, and a JSON POST to ``EMERGENCY_WEBHOOK_URL``.
+
+Lane depth and processed / failed / dropped counts are part of the
+listener metrics logged every ``POOL_METRICS_LOG_INTERVAL`` seconds.
+
+End-to-end latency (MQTT receipt -> alarm published and notifications
+queued) is recorded per alert type as pipeline trace stage
+``emergency_<type>`` and logged when above ``EMERGENCY_LATENCY_WARN_MS``.
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+
+from connections import http_session, register_metrics
+from pipeline_tracing import pipeline_tracer, StageHistogram
+
+logger = logging.getLogger(__name__)
+
+# Emergency topic -> alert type
+EMERGENCY_ALERT_TYPES = {
+    "iMEDE_watch/sos": "sos",
+    "iMEDE_watch/SOS": "sos",
+    "iMEDE_watch/fallDown": "fall_down",
+    "iMEDE_watch/FALLDOWN": "fall_down"
+}
+
+# Queue priority per alert type (lower is served first)
+EMERGENCY_PRIORITIES = {"sos": 0, "fall_down": 1}
+
+REALTIME_ALERT_CHANNEL = "realtime:patient.alert"
+
+def fast_lane_enabled() -> bool:
+    return os.getenv('EMERGENCY_FAST_LANE_ENABLED', 'true').lower() == 'true'
+
+class MessageLane:
+    """Worker thread(s) fed by a priority queue (FIFO within a priority)"""
+
+    _STOP = float('inf')
+
+    def __init__(self, name: str, handler: Callable[..., Any], workers: int = 1, max_depth: int = 0):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth  # 0 = unbounded
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+
+    def submit(self, args: tuple, priority: float = 0, force: bool = False) -> bool:
+        """Queue ``handler(*args)``; False (counted as dropped) when the lane is full, unless ``force``"""
+        if self.max_depth and not force and self._queue.qsize() >= self.max_depth:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"⚠️ {self.name} lane full ({self.max_depth} queued), {self.dropped} messages dropped")
+            return False
+        self._queue.put((priority, next(self._sequence), args))
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
+
+    def start(self):
+        register_metrics(f"lane_{self.name}", self.metrics)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Let the workers finish what is queued (up to ``timeout`` seconds), then end them"""
+        for _ in self._threads:
+            self._queue.put((self._STOP, next(self._sequence), None))
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        alive = sum(thread.is_alive() for thread in self._threads)
+        if alive:
+            remaining = max(self.depth() - alive, 0)  # minus the unread stop markers
+            logger.warning(f"⚠️ {self.name} lane stopped after {timeout:g}s with {remaining} messages still queued")
+        self._threads = []
+
+    def _run(self):
+        while True:
+            _, _, args = self._queue.get()
+            if args is None:
+                return
+            try:
+                self.handler(*args)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ {self.name} handler failed: {e}")
+
+class EmergencyDispatcher:
+    """Publishes emergency alarms on Redis, notifies and records their latency"""
+
+    def __init__(self):
+        self.redis_url = os.getenv('REDIS_URL', '')
+        self.channel = os.getenv('EMERGENCY_CHANNEL', 'emergency:alerts')
+        self.telegram_token = os.getenv('TELEGRAM_BOT_TOKEN', '')
+        self.telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID', '')
+        self.webhook_url = os.getenv('EMERGENCY_WEBHOOK_URL', '')
+        self.latency_warn_ms = float(os.getenv('EMERGENCY_LATENCY_WARN_MS', 1000))
+
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self._lock = threading.Lock()
+        self._latency: Dict[str, StageHistogram] = {}
+        self._notifier = ThreadPoolExecutor(
+            max_workers=int(os.getenv('EMERGENCY_NOTIFY_WORKERS', 2)), thread_name_prefix='emergency-notify'
+        )
+
+    # =============== Publish ===============
+
+    def _redis_client(self):
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=2, socket_connect_timeout=2)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis unavailable for emergency alerts: {e}")
+                self._redis_retry_at = time.monotonic() + 30
+        return self._redis
+
+    def publish(self, alert: Dict[str, Any]) -> int:
+        """Publish ``alert`` on the emergency and realtime channels; returns channels published"""
+        client = self._redis_client()
+        if client is None:
+            return 0
+        messages = [(self.channel, alert)]
+        if alert.get("patient_id"):
+            messages.append((REALTIME_ALERT_CHANNEL, {
+                "patient_id": alert["patient_id"],
+                "alert_type": alert["alert_type"],
+                "severity": alert["priority"],
+                "message": f"{alert['alert_type'].upper()} from {alert['patient_name']}",
+                "data": alert,
+                "created_at": alert["timestamp"]
+            }))
+        published = 0
+        try:
+            for channel, message in messages:
+                client.publish(channel, json.dumps(message, default=str))
+                published += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to publish emergency alert: {e}")
+            self._redis = None
+            self._redis_retry_at = time.monotonic() + 30
+        return published
+
+    # =============== Notify ===============
+
+    def notify(self, alert: Dict[str, Any]):
+        """Queue notifications for ``alert`` (returns immediately)"""
+        if self.telegram_token and self.telegram_chat_id:
+            self._notifier.submit(self._send_telegram, alert)
+        if self.webhook_url:
+            self._notifier.submit(self._send_webhook, alert)
+
+    def _send_telegram(self, alert: Dict[str, Any]):
+        location = (alert.get("location") or {}).get("GPS") or {}
+        text = (
+            f"🚨 <b>{alert['alert_type'].upper()}</b> ({alert['priority']})\n"
+            f"Patient: {alert['patient_name']}\n"
+            f"Device: Kati {alert.get('imei')}\n"
+            f"Time: {alert['timestamp']}"
+        )
+        if location.get("latitude") and location.get("longitude"):
+            text += f"\nLocation: https://maps.google.com/?q={location['latitude']},{location['longitude']}"
+        try:
+            response = http_session().post(
+                f"https://api.telegram.org/bot{self.telegram_token}/sendMessage",
+                data={"chat_id": self.telegram_chat_id, "text": text, "parse_mode": "HTML"},
+                timeout=10
+            )
+            if response.status_code != 200:
+                logger.warning(f"⚠️ Telegram emergency notification rejected: {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Telegram emergency notification failed: {e}")
+
+    def _send_webhook(self, alert: Dict[str, Any]):
+        try:
+            response = http_session().post(self.webhook_url, json=alert, timeout=10)
+            if response.status_code >= 300:
+                logger.warning(f"⚠️ Emergency webhook rejected: {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Emergency webhook failed: {e}")
+
+    # =============== Latency ===============
+
+    def observe_latency(self, source: str, alert_type: str, received_at: float) -> float:
+        """Record MQTT receipt -> dispatched latency; returns it in ms"""
+        latency_ms = (time.time() - received_at) * 1000
+        with self._lock:
+            histogram = self._latency.get(alert_type)
+            if histogram is None:
+                histogram = self._latency[alert_type] = StageHistogram()
+            histogram.observe(latency_ms)
+        pipeline_tracer.observe(source, f"emergency_{alert_type}", latency_ms)
+        if latency_ms >= self.latency_warn_ms:
+            logger.warning(f"🐢 {alert_type.upper()} alarm dispatched {latency_ms:.0f}ms after receipt")
+        return latency_ms
+
+    def latency_snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {alert_type: histogram.to_dict() for alert_type, histogram in self._latency.items()}
+
+    def close(self):
+        self._notifier.shutdown(wait=False)
+
+def emergency_alert(alarm_id, topic: str, data: Dict[str, Any], patient: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """JSON-ready alert published and sent to the notifiers"""
+    alert_type = EMERGENCY_ALERT_TYPES.get(topic, "unknown")
+    if patient:
+        patient_name = f"{patient.get('first_name', '')} {patient.get('last_name', '')}".strip()
+    else:
+        patient_name = f"Unmapped Device ({data.get('IMEI')})"
+    return {
+        "alarm_id": str(alarm_id) if alarm_id else None,
+        "alert_type": alert_type,
+        "priority": "CRITICAL" if alert_type == "sos" else "HIGH",
+        "status": data.get("status", "ACTIVE"),
+        "patient_id": str(patient["_id"]) if patient else None,
+        "patient_name": patient_name,
+        "imei": data.get("IMEI"),
+        "location": data.get("location"),
+        "topic": topic,
+        "source": "Kati",
+        "device_type": "Kati_Watch",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Global emergency dispatcher instance
+emergency_dispatcher = EmergencyDispatcher()
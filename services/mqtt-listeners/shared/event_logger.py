@@ -8,6 +8,7 @@ import os
 import json
 import logging
 import requests
+from connections import http_session
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 from urllib.parse import urljoin
@@ -83,7 +84,7 @@ class EventLogger:
                 event_data['details'] = {}
             
             # Send to API
-            response = requests.post(
+            response = http_session().post(
                 self.event_log_url,
                 json=event_data,
                 headers={'Content-Type': 'application/json'},
@@ -2,371 +2,686 @@
 """
 Standalone FHIR Data Validation Module
 For use by MQTT listeners without importing the main app module
+
+Payload rules are declared per topic / message type / device attribute as
+plain field specs (type, required, range, choices, coercion) and built
+once at import time into nested closures holding only the rules each spec
+uses, so the per-message path is a handful of dict lookups and isinstance
+checks. Error and warning texts are kept as ``ValidationIssue`` templates
+and only formatted when a listener actually logs or emits them.
+
+Field spec keys:
+
+- ``key``: field name in the parent object (omitted for array items)
+- ``type``: ``number``, ``string``, ``object``, ``array`` or ``any``
+- ``missing`` / ``missing_level``: issue when the field is absent
+  (no issue when ``missing`` is not set); ``default`` validates a default
+  value instead of reporting the field as missing
+- ``invalid`` / ``invalid_level``: issue when the value has the wrong type
+  (``non_empty`` arrays reuse it when empty)
+- ``empty``: warning for ``None``/``""``/``"null"`` values, which are skipped
+- ``coerce`` / ``coerce_invalid`` / ``write_back``: convert numeric strings
+  with ``float`` (optionally storing the result in the payload)
+- ``range`` / ``out_of_range``: inclusive ``(low, high)`` bounds, either may be None
+- ``choices`` / ``unknown``: allowed values
+- ``fields``: child field specs of an object
+- ``items`` / ``first_item``: spec for every / only the first array element
+- ``select``: ``{"key": name, "cases": {value: spec}, "unknown": template}``
+  picks a nested spec by a field of the object (message type, device
+  attribute); ``"by": callable`` computes the case instead
+- ``required`` / ``stop_on_missing`` (top level only): fields reported as
+  "Missing required field", optionally skipping all other rules
+- ``check``: ``callable(value, issues, context)`` for rules that span fields
 """
 
 import json
 import logging
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Callable, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+ERROR = 0
+WARNING = 1
+
+_TYPES = {
+    'number': (int, float),
+    'string': str,
+    'object': dict,
+    'array': list,
+    'any': object
+}
+_EMPTY_VALUES = (None, "", "null")
+_NO_CONTEXT: Dict[str, Any] = {}
+_MISSING = object()
+
+class ValidationIssue:
+    """Validation error or warning whose text is formatted on first use"""
+
+    __slots__ = ('template', 'params', '_text')
+
+    def __init__(self, template: str, params: Optional[Dict[str, Any]] = None):
+        self.template = template
+        self.params = params
+        self._text = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self.template.format(**self.params) if self.params else self.template
+        return self._text
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __eq__(self, other) -> bool:
+        return str(self) == str(other)
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+def _report(issues: Tuple[List, List], level: int, template: str, context: Dict[str, Any], **params):
+    if params:
+        params = {**context, **params}
+    else:
+        params = context
+    issues[level].append(ValidationIssue(template, params))
+
+def _issue(level: int, template: Optional[str], param: Optional[str] = None) -> Callable:
+    """Return ``add(issues, ctx, value)`` appending ``template`` at ``level``; a no-op without a template"""
+    if not template:
+        return lambda issues, ctx, value: None
+    if param is None:
+        def add(issues, ctx, value):
+            issues[level].append(ValidationIssue(template, ctx))
+    else:
+        def add(issues, ctx, value):
+            issues[level].append(ValidationIssue(template, {**ctx, param: value}))
+    return add
+
+def _bounds(spec: Dict[str, Any]) -> Tuple[Any, Any, Optional[Callable]]:
+    """``(low, high, add)`` of a range rule; all None when the spec has none"""
+    low, high = spec.get('range', (None, None))
+    if not spec.get('out_of_range') or (low is None and high is None):
+        return None, None, None
+    return low, high, _issue(spec.get('range_level', WARNING), spec['out_of_range'], 'value')
+
+def _rules(spec: Dict[str, Any]) -> Tuple[Callable, ...]:
+    """``rule(value, issues, ctx)`` callables for a value that passed its type check, in spec order"""
+    rules = []
+    low, high, add_out_of_range = _bounds(spec)
+    if add_out_of_range:
+        def check_range(value, issues, ctx):
+            if (low is not None and value < low) or (high is not None and value > high):
+                add_out_of_range(issues, ctx, value)
+        rules.append(check_range)
+
+    if 'choices' in spec:
+        choices = frozenset(spec['choices'])
+        add_unknown = _issue(WARNING, spec.get('unknown'), 'value')
+
+        def check_choices(value, issues, ctx):
+            if value not in choices:
+                add_unknown(issues, ctx, value)
+        rules.append(check_choices)
+
+    rules.extend(_field_rule(child) for child in spec.get('fields', ()))
+
+    if 'items' in spec:
+        validate_item = _value_validator(spec['items'])
+
+        def check_items(value, issues, ctx):
+            for index, item in enumerate(value):
+                validate_item(item, issues, {**ctx, 'index': index})
+        rules.append(check_items)
+    elif 'first_item' in spec:
+        validate_first = _value_validator(spec['first_item'])
+
+        def check_first_item(value, issues, ctx):
+            validate_first(value[0], issues, ctx)
+        rules.append(check_first_item)
+
+    if 'check' in spec:
+        rules.append(spec['check'])
+    if spec.get('select'):
+        rules.append(_select_rule(spec['select']))
+    return tuple(rules)
+
+def _select_rule(select: Dict[str, Any]) -> Callable:
+    """Rule validating a value against the spec of its case"""
+    cases = {value: _value_validator(case_spec) for value, case_spec in select['cases'].items()}
+    add_unknown = _issue(WARNING, select.get('unknown'), 'case')
+    key, default, pick = select.get('key'), select.get('default'), select.get('by')
+
+    def check_select(value, issues, ctx):
+        case = value.get(key, default) if pick is None else pick(value)
+        try:
+            validate = cases.get(case)
+        except TypeError:  # unhashable values match no case
+            validate = None
+        if validate is None:
+            add_unknown(issues, ctx, case)
+        else:
+            validate(value, issues, ctx)
+    return check_select
+
+def _run_rules(rules: Tuple[Callable, ...]) -> Callable:
+    """Combine rules into one ``rule(value, issues, ctx)``"""
+    if len(rules) == 1:
+        return rules[0]
+
+    def run_rules(value, issues, ctx):
+        for rule in rules:
+            rule(value, issues, ctx)
+    return run_rules
+
+class _Guards:
+    """Checks that stop validation of a value: empty values, numeric coercion and type"""
+
+    __slots__ = ('empty', 'add_empty', 'coerce', 'add_not_numeric', 'expected', 'non_empty', 'add_invalid')
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.empty = 'empty' in spec
+        self.add_empty = _issue(WARNING, spec.get('empty'), 'value')
+        self.coerce = bool(spec.get('coerce'))
+        self.add_not_numeric = _issue(spec.get('coerce_level', ERROR), spec.get('coerce_invalid'), 'value')
+        expected = _TYPES[spec.get('type', 'any')]
+        self.expected = None if expected is object else expected
+        self.non_empty = self.expected is not None and bool(spec.get('non_empty'))
+        self.add_invalid = _issue(spec.get('invalid_level', ERROR), spec.get('invalid'), 'value')
+
+def _value_validator(spec: Dict[str, Any]) -> Callable:
+    """Build ``validate(value, issues, ctx)`` for a spec without a key (top level, array items, select cases)"""
+    rules = _rules(spec)
+    guards = _Guards(spec)
+    if guards.empty or guards.coerce:
+        validate = _guarded(rules, guards)
+        return lambda value, issues, ctx: validate(value, issues, ctx, None)
+
+    expected, non_empty, add_invalid = guards.expected, guards.non_empty, guards.add_invalid
+    if expected is None:
+        return _run_rules(rules) if rules else (lambda value, issues, ctx: None)
+
+    def validate(value, issues, ctx):
+        if not isinstance(value, expected) or (non_empty and not value):
+            add_invalid(issues, ctx, value)
+        else:
+            for rule in rules:
+                rule(value, issues, ctx)
+    return validate
+
+def _guarded(rules: Tuple[Callable, ...], guards: _Guards, key: Any = _MISSING) -> Callable:
+    """``validate(value, issues, ctx, parent)`` running every guard; coerced values are stored under ``key`` of ``parent``"""
+    empty, add_empty = guards.empty, guards.add_empty
+    coerce, add_not_numeric = guards.coerce, guards.add_not_numeric
+    expected, non_empty, add_invalid = guards.expected, guards.non_empty, guards.add_invalid
+    write_back = key is not _MISSING
+
+    def validate(value, issues, ctx, parent):
+        if empty and (value is None or value == '' or value == 'null'):
+            add_empty(issues, ctx, value)
+            return
+        if coerce and value.__class__ is str:
+            try:
+                number = float(value)
+            except ValueError:
+                add_not_numeric(issues, ctx, value)
+                return
+            if write_back:
+                parent[key] = number
+            value = number
+        if expected is not None and (not isinstance(value, expected) or (non_empty and not value)):
+            add_invalid(issues, ctx, value)
+            return
+        for rule in rules:
+            rule(value, issues, ctx)
+    return validate
+
+def _field_rule(spec: Dict[str, Any]) -> Callable:
+    """Rule validating field ``spec['key']`` of an object.
+
+    The lookup, missing check and guards run in the rule itself; typed
+    fields whose only other rule is a range (most device readings) are
+    checked entirely inline.
+    """
+    key = spec['key']
+    default = spec.get('default', _MISSING)
+    add_missing = _issue(spec.get('missing_level', ERROR), spec.get('missing'))
+    rules = _rules(spec)
+    guards = _Guards(spec)
+
+    if guards.empty or guards.coerce:
+        validate = _guarded(rules, guards, key if spec.get('write_back') else _MISSING)
+
+        def check_guarded_field(parent, issues, ctx):
+            value = parent.get(key, default)
+            if value is _MISSING:
+                add_missing(issues, ctx, None)
+            else:
+                validate(value, issues, ctx, parent)
+        return check_guarded_field
+
+    expected, non_empty, add_invalid = guards.expected or object, guards.non_empty, guards.add_invalid
+    low, high, add_out_of_range = _bounds(spec)
+    if add_out_of_range and len(rules) == 1 and not non_empty:
+        def check_ranged_field(parent, issues, ctx):
+            value = parent.get(key, default)
+            if value is _MISSING:
+                add_missing(issues, ctx, None)
+            elif not isinstance(value, expected):
+                add_invalid(issues, ctx, value)
+            elif (low is not None and value < low) or (high is not None and value > high):
+                add_out_of_range(issues, ctx, value)
+        return check_ranged_field
+
+    def check_field(parent, issues, ctx):
+        value = parent.get(key, default)
+        if value is _MISSING:
+            add_missing(issues, ctx, None)
+        elif not isinstance(value, expected) or (non_empty and not value):
+            add_invalid(issues, ctx, value)
+        else:
+            for rule in rules:
+                rule(value, issues, ctx)
+    return check_field
+
+def _compile_schema(name: str, schema: Dict[str, Any]) -> Callable:
+    """Return ``validate(record, issues, context)`` for a top-level object schema"""
+    spec = {k: v for k, v in schema.items() if k != 'transform'}
+    required = tuple((field, {'field': field}) for field in spec.get('required', ()))
+    stop_on_missing = bool(required and spec.get('stop_on_missing'))
+    rules = _rules(spec)
+
+    def validate(record, issues, ctx):
+        errors = issues[0]
+        for field, params in required:
+            if field not in record:
+                errors.append(ValidationIssue("Missing required field: {field}", params))
+        if stop_on_missing and errors:
+            return
+        for rule in rules:
+            rule(record, issues, ctx)
+    validate.__name__ = validate.__qualname__ = name
+    return validate
+
+def _number(key: str, low=None, high=None, out_of_range: str = None, **spec) -> Dict[str, Any]:
+    """Spec for a numeric field; ``invalid`` defaults to "'<key>' field must be numeric" """
+    spec.setdefault('invalid', f"'{key}' field must be numeric")
+    return {'key': key, 'type': 'number', 'range': (low, high), 'out_of_range': out_of_range, **spec}
+
+def _measurement(key: str, label: str, low=None, high=None, out_of_range: str = None, level: int = ERROR) -> Dict[str, Any]:
+    """Spec for a device reading reported as "Missing or invalid <label>" """
+    message = f"Missing or invalid {label}"
+    return _number(
+        key, low, high, out_of_range,
+        missing=message, missing_level=level, invalid=message, invalid_level=level
+    )
+
+def _lab_value(key: str, label: str, low, high, name: str = None) -> Dict[str, Any]:
+    """Spec for a reading that devices send as a number or a numeric string"""
+    name = name or key
+    return _number(
+        key, low, high, f"{label} {{value}} may be outside normal range",
+        missing=f"Missing {key}",
+        invalid=f"{label} must be numeric",
+        coerce=True,
+        coerce_invalid=f"Invalid {name} value (cannot convert to number)"
+    )
+
+def _present(key: str, message: str) -> Dict[str, Any]:
+    """Spec that only warns when ``key`` is absent"""
+    return {'key': key, 'missing': message, 'missing_level': WARNING}
+
+def _require_msg(message: str) -> Callable:
+    def check(record, issues, context):
+        section = record.get('data', {})
+        if 'msg' not in section:
+            _report(issues, ERROR, message, context)
+    return check
+
+def _range_message(label: str) -> str:
+    return f"{label} {{value}} may be outside normal range"
+
+# ---------------------------------------------------------------------------
+# Kati Watch
+# ---------------------------------------------------------------------------
+
+def _kati_vital(key: str, low, high, out_of_range: str) -> Dict[str, Any]:
+    return _number(key, low, high, out_of_range, missing=f"Missing vital sign field: {key}", missing_level=WARNING)
+
+_KATI_BATTERY = _number('battery', 0, 100, "Battery level outside valid range (0-100%)")
+_KATI_HEARTBEAT_FIELDS = [
+    _number('step', 0, None, "Step count cannot be negative", missing="Missing 'step' field", missing_level=WARNING),
+    _KATI_BATTERY,
+    _number('signalGSM', 0, 100, "GSM signal outside valid range (0-100%)"),
+    {
+        'key': 'workingMode', 'type': 'number', 'invalid': "'workingMode' field must be numeric",
+        'choices': (1, 2, 3, 8), 'unknown': "Unknown working mode: {value}"
+    }
+]
+
+_SLEEP_STAGES = frozenset('012')
+
+def _check_sleep(sleep, issues, context):
+    """Rules spanning several sleep fields"""
+    time_stamps = sleep.get('timeStamps')
+    if isinstance(time_stamps, str):
+        try:
+            datetime.strptime(time_stamps, "%d/%m/%Y %H:%M:%S")
+        except ValueError:
+            _report(issues, WARNING, "Sleep timeStamps format should be DD/MM/YYYY HH:MM:SS", context)
+
+    sleep_time = sleep.get('time')
+    if isinstance(sleep_time, str) and '@' not in sleep_time:
+        _report(issues, WARNING, "Sleep time format should be HHMM@HHMM (e.g., 2200@0700)", context)
+
+    sleep_num = sleep.get('num')
+    if isinstance(sleep_num, (int, float)) and sleep_num <= 0:
+        _report(issues, WARNING, "Sleep num should be positive", context)
+
+    sleep_data = sleep.get('data')
+    if isinstance(sleep_data, str):
+        if not _SLEEP_STAGES.issuperset(sleep_data):
+            _report(issues, ERROR, "Sleep data must contain only 0 (awake), 1 (light sleep), 2 (deep sleep)", context)
+        if sleep_data:
+            # Each digit represents 5 minutes
+            logger.debug("Sleep tracking period: %s minutes (%s data points)", len(sleep_data) * 5, len(sleep_data))
+        if 'num' in sleep and sleep['num'] != len(sleep_data):
+            _report(
+                issues, WARNING, "Sleep num ({num}) doesn't match data length ({expected})", context,
+                num=sleep['num'], expected=len(sleep_data)
+            )
+
+def _warn_heartbeat_sleep(record, issues, context):
+    logger.warning("Sleep data received with heartbeat-like structure instead of proper sleep format")
+
+_KATI_SLEEP = {
+    'fields': [{
+        'key': 'sleep', 'type': 'object', 'invalid': "'sleep' field must be an object",
+        'fields': [
+            {'key': 'timeStamps', 'type': 'string', 'missing': "Missing 'sleep.timeStamps' field", 'invalid': "Sleep timeStamps must be a string"},
+            {'key': 'time', 'type': 'string', 'missing': "Missing 'sleep.time' field", 'invalid': "Sleep time must be a string"},
+            {'key': 'data', 'type': 'string', 'missing': "Missing 'sleep.data' field", 'invalid': "Sleep data must be a string"},
+            {'key': 'num', 'type': 'number', 'missing': "Missing 'sleep.num' field", 'invalid': "Sleep num must be numeric"}
+        ],
+        'check': _check_sleep
+    }]
+}
+
+KATI_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    'iMEDE_watch/VitalSign': {
+        'fields': [
+            _kati_vital('heartRate', 30, 250, "Heart rate {value} outside normal range (30-250 bpm)"),
+            {
+                'key': 'bloodPressure', 'type': 'object',
+                'missing': "Missing vital sign field: bloodPressure", 'missing_level': WARNING,
+                'invalid': "'bloodPressure' field must be an object",
+                'fields': [
+                    _number('bp_sys', 70, 200, "Systolic BP {value} outside normal range"),
+                    _number('bp_dia', 40, 130, "Diastolic BP {value} outside normal range")
+                ]
+            },
+            _kati_vital('bodyTemperature', 30, 45, "Temperature {value} outside normal range"),
+            _kati_vital('spO2', 70, 100, "SpO2 {value} outside normal range"),
+            _KATI_BATTERY
+        ],
+        'transform': {'resource_type': 'Observation', 'code': 'vital-signs-panel', 'unit': 'mixed', 'category': 'vital-signs'}
+    },
+    'iMEDE_watch/AP55': {
+        'fields': [{
+            'key': 'data', 'type': 'array',
+            'missing': "Missing 'data' field for AP55 dataset",
+            'invalid': "'data' field must be an array",
+            'items': {
+                'type': 'object', 'invalid': "Data point {index} must be an object",
+                'fields': [
+                    {'key': 'heartRate', 'type': 'number', 'invalid': "Data point {index} heartRate must be numeric"},
+                    {'key': 'bloodPressure', 'type': 'object', 'invalid': "Data point {index} bloodPressure must be an object"},
+                    {'key': 'spO2', 'type': 'number', 'invalid': "Data point {index} spO2 must be numeric"},
+                    {'key': 'bodyTemperature', 'type': 'number', 'invalid': "Data point {index} bodyTemperature must be numeric"}
+                ]
+            }
+        }],
+        'transform': {'resource_type': 'Observation', 'code': 'vital-signs-panel', 'unit': 'mixed', 'category': 'vital-signs'}
+    },
+    'iMEDE_watch/location': {
+        'fields': [{
+            'key': 'location', 'type': 'object',
+            'missing': "Missing 'location' field",
+            'invalid': "'location' field must be an object",
+            'fields': [{
+                'key': 'GPS', 'type': 'object', 'invalid': "'GPS' field must be an object",
+                'fields': [
+                    {
+                        'key': coord, 'type': 'number', 'range': bounds,
+                        'empty': f"GPS {coord} is empty or null, skipping validation",
+                        'coerce': True, 'write_back': True, 'coerce_level': WARNING,
+                        'coerce_invalid': f"GPS {coord} '{{value}}' could not be converted to numeric, skipping",
+                        'invalid': f"GPS {coord} is not numeric, skipping validation", 'invalid_level': WARNING,
+                        'out_of_range': f"{coord.capitalize()} must be between {bounds[0]} and {bounds[1]}"
+                    }
+                    for coord, bounds in (('latitude', (-90, 90)), ('longitude', (-180, 180)))
+                ]
+            }]
+        }],
+        'transform': {'resource_type': 'Observation', 'code': '86711-2', 'unit': 'degrees', 'category': 'survey'}
+    },
+    'iMEDE_watch/sleepdata': {
+        'select': {
+            'by': lambda record: 'sleep' in record,
+            'cases': {
+                True: _KATI_SLEEP,
+                False: {'fields': _KATI_HEARTBEAT_FIELDS, 'check': _warn_heartbeat_sleep}
+            }
+        },
+        'transform': {'resource_type': 'Observation', 'code': '93832-4', 'unit': 'unknown', 'category': 'survey'}
+    },
+    'iMEDE_watch/hb': {
+        'fields': _KATI_HEARTBEAT_FIELDS,
+        'transform': {'resource_type': 'Observation', 'code': '55423-8', 'unit': 'steps', 'category': 'vital-signs'}
+    },
+    'iMEDE_watch/sos': {
+        'fields': [{
+            'key': 'status', 'type': 'string', 'missing': "Missing 'status' field",
+            'invalid': "'status' field must be a string",
+            'choices': ('SOS', 'FALL DOWN'), 'unknown': "Unknown status: {value}"
+        }],
+        'transform': {'resource_type': 'Observation', 'code': 'emergency-alert', 'unit': 'unknown', 'category': 'survey'}
+    },
+    'iMEDE_watch/onlineTrigger': {
+        'fields': [{
+            'key': 'status', 'type': 'string', 'missing': "Missing 'status' field",
+            'invalid': "'status' field must be a string",
+            'choices': ('online', 'offline'), 'unknown': "Unknown status: {value}"
+        }],
+        'transform': {'resource_type': 'Observation', 'code': 'device-status', 'unit': 'unknown', 'category': 'survey'}
+    }
+}
+KATI_SCHEMAS['iMEDE_watch/fallDown'] = KATI_SCHEMAS['iMEDE_watch/sos']
+
+KATI_REQUIRED_FIELDS = ('IMEI',)
+KATI_UNKNOWN_TRANSFORM = {'resource_type': 'Observation', 'code': 'unknown', 'unit': 'unknown', 'category': 'unknown'}
+
+# ---------------------------------------------------------------------------
+# AVA4 gateway
+# ---------------------------------------------------------------------------
+
+def _ava4_attribute(label: str, fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """reportAttribute spec: readings are in data.value.device_list[0]"""
+    return {'fields': [{
+        'key': 'value', 'type': 'object', 'default': {},
+        'invalid': f"{label} value must be an object",
+        'fields': [{
+            'key': 'device_list', 'type': 'array', 'default': [], 'non_empty': True,
+            'invalid': f"{label} device_list must be a non-empty array",
+            'first_item': {'type': 'object', 'invalid': f"{label} device_list entries must be objects", 'fields': fields}
+        }]
+    }]}
+
+_AVA4_BLOOD_PRESSURE = _ava4_attribute("Blood pressure", [
+    _measurement('bp_high', "bp_high (systolic)", 70, 250, _range_message("Systolic pressure")),
+    _measurement('bp_low', "bp_low (diastolic)", 40, 150, _range_message("Diastolic pressure")),
+    _measurement('PR', "PR (pulse rate)", 40, 200, _range_message("Pulse rate"))
+])
+_AVA4_GLUCOSE = _ava4_attribute("Blood glucose", [
+    _lab_value('blood_glucose', "Blood glucose", 20, 600),
+    _present('marker', "Missing meal marker (Before Meal/After Meal)")
+])
+
+AVA4_ATTRIBUTES: Dict[str, Dict[str, Any]] = {
+    'BP_BIOLIGTH': _AVA4_BLOOD_PRESSURE,
+    'BLE_BPG': _AVA4_BLOOD_PRESSURE,
+    'Oximeter JUMPER': _ava4_attribute("SpO2", [
+        _measurement('spo2', "spo2", 70, 100, _range_message("SpO2")),
+        _measurement('pulse', "pulse rate", 40, 200, _range_message("Pulse rate")),
+        _measurement('pi', "perfusion index", level=WARNING)
+    ]),
+    'Contour_Elite': _AVA4_GLUCOSE,
+    'AccuChek_Instant': _AVA4_GLUCOSE,
+    'IR_TEMO_JUMPER': _ava4_attribute("Temperature", [
+        _measurement('temp', "temperature", 30, 45, _range_message("Temperature")),
+        _present('mode', "Missing temperature measurement mode")
+    ]),
+    'BodyScale_JUMPER': _ava4_attribute("Weight scale", [
+        _measurement('weight', "weight", 10, 300, _range_message("Weight")),
+        _measurement('resistance', "body resistance", level=WARNING)
+    ]),
+    'MGSS_REF_UA': _ava4_attribute("Uric acid", [
+        _lab_value('uric_acid', "Uric acid", 1, 1000)
+    ]),
+    'MGSS_REF_CHOL': _ava4_attribute("Cholesterol", [
+        _lab_value('cholesterol', "Cholesterol", 1, 20)
+    ])
+}
+
+def _report_attribute(attributes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """reportAttribute message spec dispatching on data.attribute"""
+    return {'fields': [{
+        'key': 'data', 'type': 'object',
+        'missing': "Missing data field for reportAttribute",
+        'invalid': "'data' field must be an object",
+        'select': {
+            'key': 'attribute', 'default': '',
+            'cases': attributes,
+            'unknown': "Unknown device attribute: {case}"
+        }
+    }]}
+
+AVA4_SCHEMA: Dict[str, Any] = {
+    'required': ('from', 'to', 'time', 'type'),
+    'stop_on_missing': True,
+    'select': {
+        'key': 'type',
+        'cases': {
+            'HB_Msg': {'check': _require_msg("Missing heartbeat message data")},
+            'reportMsg': {'check': _require_msg("Missing report message data")},
+            'reportAttribute': _report_attribute(AVA4_ATTRIBUTES)
+        },
+        'unknown': "Unknown message type: {case}"
+    }
+}
+AVA4_DEVICE_FIELDS = (('deviceCode', 'device_code'), ('mac', 'device_mac'), ('IMEI', 'device_imei'), ('name', 'device_name'))
+
+# ---------------------------------------------------------------------------
+# Qube-Vital
+# ---------------------------------------------------------------------------
+
+def _qube_attribute(label: str, fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """reportAttribute spec: readings are directly in data.value"""
+    return {'fields': [{
+        'key': 'value', 'type': 'object', 'default': {},
+        'invalid': f"{label} value must be an object",
+        'fields': fields
+    }]}
+
+QUBE_ATTRIBUTES: Dict[str, Dict[str, Any]] = {
+    'WBP_JUMPER': _qube_attribute("Blood pressure", [
+        _measurement('bp_high', "bp_high (systolic)", 70, 250, _range_message("Systolic pressure")),
+        _measurement('bp_low', "bp_low (diastolic)", 40, 150, _range_message("Diastolic pressure")),
+        _measurement('pr', "pr (pulse rate)", 40, 200, _range_message("Pulse rate"))
+    ]),
+    'CONTOUR': _qube_attribute("Blood glucose", [
+        _measurement('blood_glucose', "blood_glucose", 20, 600, _range_message("Blood glucose")),
+        _present('marker', "Missing meal marker (Before Meal/After Meal)")
+    ]),
+    'BodyScale_JUMPER': _qube_attribute("Weight scale", [
+        _measurement('weight', "weight", 10, 300, _range_message("Weight")),
+        _measurement('Resistance', "body resistance", level=WARNING)
+    ]),
+    'TEMO_Jumper': _qube_attribute("Temperature", [
+        _measurement('Temp', "temperature", 30, 45, _range_message("Temperature")),
+        _present('mode', "Missing temperature measurement mode")
+    ]),
+    'Oximeter_JUMPER': _qube_attribute("SpO2", [
+        _measurement('spo2', "SpO2", 70, 100, _range_message("SpO2")),
+        _measurement('pulse', "pulse rate", 40, 200, _range_message("Pulse rate")),
+        _measurement('pi', "perfusion index", level=WARNING)
+    ])
+}
+
+QUBE_SCHEMA: Dict[str, Any] = {
+    'required': ('from', 'to', 'time', 'mac', 'type'),
+    'stop_on_missing': True,
+    'select': {
+        'key': 'type',
+        'cases': {
+            'HB_Msg': {'check': _require_msg("Missing heartbeat message data")},
+            'reportAttribute': _report_attribute(QUBE_ATTRIBUTES)
+        },
+        'unknown': "Unknown message type: {case}"
+    }
+}
+QUBE_PATIENT_FIELDS = (
+    ('citiz', 'patient_id'), ('nameTH', 'patient_name_th'), ('nameEN', 'patient_name_en'),
+    ('brith', 'patient_birth'), ('gender', 'patient_gender')
+)
+
 class FHIRDataValidator:
     """Standalone FHIR data validation for MQTT listeners"""
-    
+
+    # Built once at import; per message only the bound closures run
+    _kati_validators = {
+        topic: (
+            _compile_schema('validate_' + topic.split('/')[-1].lower(), {'required': KATI_REQUIRED_FIELDS, **schema}),
+            schema['transform']
+        )
+        for topic, schema in KATI_SCHEMAS.items()
+    }
+    _kati_unknown_validator = _compile_schema('validate_unknown', {'required': KATI_REQUIRED_FIELDS})
+    _ava4_validator = _compile_schema('validate_ava4', AVA4_SCHEMA)
+    _qube_validator = _compile_schema('validate_qube', QUBE_SCHEMA)
+
     @staticmethod
     def validate_kati_data_format(data: Dict[str, Any], topic: str) -> Dict[str, Any]:
         """Validate Kati Watch data format and transform to FHIR-compatible format"""
         errors = []
         warnings = []
-        transformed_data = data.copy()
-        
+        issues = (errors, warnings)
+
         try:
-            # Required fields for all Kati messages
-            required_fields = ['IMEI']
-            for field in required_fields:
-                if field not in data:
-                    errors.append(f"Missing required field: {field}")
-            
-            # Topic-specific validation
-            if topic == 'iMEDE_watch/VitalSign':
-                # Vital signs data
-                vital_fields = ['heartRate', 'bloodPressure', 'bodyTemperature', 'spO2']
-                for field in vital_fields:
-                    if field not in data:
-                        warnings.append(f"Missing vital sign field: {field}")
-                    else:
-                        value = data[field]
-                        if field == 'heartRate':
-                            if not isinstance(value, (int, float)):
-                                errors.append("'heartRate' field must be numeric")
-                            elif not (30 <= value <= 250):
-                                warnings.append(f"Heart rate {value} outside normal range (30-250 bpm)")
-                        elif field == 'bloodPressure':
-                            if not isinstance(value, dict):
-                                errors.append("'bloodPressure' field must be an object")
-                            else:
-                                if 'bp_sys' in value:
-                                    bp_sys = value['bp_sys']
-                                    if not isinstance(bp_sys, (int, float)):
-                                        errors.append("'bp_sys' field must be numeric")
-                                    elif not (70 <= bp_sys <= 200):
-                                        warnings.append(f"Systolic BP {bp_sys} outside normal range")
-                                if 'bp_dia' in value:
-                                    bp_dia = value['bp_dia']
-                                    if not isinstance(bp_dia, (int, float)):
-                                        errors.append("'bp_dia' field must be numeric")
-                                    elif not (40 <= bp_dia <= 130):
-                                        warnings.append(f"Diastolic BP {bp_dia} outside normal range")
-                        elif field == 'bodyTemperature':
-                            if not isinstance(value, (int, float)):
-                                errors.append("'bodyTemperature' field must be numeric")
-                            elif not (30 <= value <= 45):
-                                warnings.append(f"Temperature {value} outside normal range")
-                        elif field == 'spO2':
-                            if not isinstance(value, (int, float)):
-                                errors.append("'spO2' field must be numeric")
-                            elif not (70 <= value <= 100):
-                                warnings.append(f"SpO2 {value} outside normal range")
-                
-                # Optional fields
-                if 'battery' in data:
-                    battery = data['battery']
-                    if not isinstance(battery, (int, float)):
-                        errors.append("'battery' field must be numeric")
-                    elif not (0 <= battery <= 100):
-                        warnings.append("Battery level outside valid range (0-100%)")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = 'vital-signs-panel'  # Multiple vital signs
-                transformed_data['unit'] = 'mixed'
-                transformed_data['category'] = 'vital-signs'
-                
-            elif topic == 'iMEDE_watch/AP55':
-                # Vital signs dataset (hourly upload)
-                if 'data' not in data:
-                    errors.append("Missing 'data' field for AP55 dataset")
-                else:
-                    data_list = data['data']
-                    if not isinstance(data_list, list):
-                        errors.append("'data' field must be an array")
-                    else:
-                        for i, data_point in enumerate(data_list):
-                            if not isinstance(data_point, dict):
-                                errors.append(f"Data point {i} must be an object")
-                            else:
-                                # Validate each data point
-                                for field in ['heartRate', 'bloodPressure', 'spO2', 'bodyTemperature']:
-                                    if field in data_point:
-                                        value = data_point[field]
-                                        if field == 'heartRate' and not isinstance(value, (int, float)):
-                                            errors.append(f"Data point {i} heartRate must be numeric")
-                                        elif field == 'bloodPressure' and not isinstance(value, dict):
-                                            errors.append(f"Data point {i} bloodPressure must be an object")
-                                        elif field == 'spO2' and not isinstance(value, (int, float)):
-                                            errors.append(f"Data point {i} spO2 must be numeric")
-                                        elif field == 'bodyTemperature' and not isinstance(value, (int, float)):
-                                            errors.append(f"Data point {i} bodyTemperature must be numeric")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = 'vital-signs-panel'  # Multiple vital signs
-                transformed_data['unit'] = 'mixed'
-                transformed_data['category'] = 'vital-signs'
-                
-            elif topic == 'iMEDE_watch/location':
-                # Location data
-                if 'location' not in data:
-                    errors.append("Missing 'location' field")
-                else:
-                    location = data['location']
-                    if not isinstance(location, dict):
-                        errors.append("'location' field must be an object")
-                    else:
-                        if 'GPS' in location:
-                            gps = location['GPS']
-                            if not isinstance(gps, dict):
-                                errors.append("'GPS' field must be an object")
-                            else:
-                                for coord in ['latitude', 'longitude']:
-                                    if coord in gps:
-                                        value = gps[coord]
-                                        # Handle empty string or None values
-                                        if value is None or value == "" or value == "null":
-                                            warnings.append(f"GPS {coord} is empty or null, skipping validation")
-                                            continue
-                                        
-                                        # Handle string coordinates by converting to float
-                                        if isinstance(value, str):
-                                            try:
-                                                # Try to parse as float, handle various string formats
-                                                value = float(value.strip())
-                                                gps[coord] = value  # Update the value in the data
-                                            except (ValueError, AttributeError):
-                                                warnings.append(f"GPS {coord} '{value}' could not be converted to numeric, skipping")
-                                                continue
-                                        
-                                        if not isinstance(value, (int, float)):
-                                            warnings.append(f"GPS {coord} is not numeric, skipping validation")
-                                            continue
-                                        elif coord == 'latitude' and not (-90 <= value <= 90):
-                                            warnings.append("Latitude must be between -90 and 90")
-                                        elif coord == 'longitude' and not (-180 <= value <= 180):
-                                            warnings.append("Longitude must be between -180 and 180")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = '86711-2'  # Location LOINC code
-                transformed_data['unit'] = 'degrees'
-                transformed_data['category'] = 'survey'
-                
-            elif topic == 'iMEDE_watch/sleepdata':
-                # Sleep data validation
-                if 'sleep' in data:
-                    # Proper sleep data structure
-                    sleep = data['sleep']
-                    if not isinstance(sleep, dict):
-                        errors.append("'sleep' field must be an object")
-                    else:
-                        # Validate sleep.timeStamps
-                        if 'timeStamps' in sleep:
-                            time_stamps = sleep['timeStamps']
-                            if not isinstance(time_stamps, str):
-                                errors.append("Sleep timeStamps must be a string")
-                            # Validate format: "DD/MM/YYYY HH:MM:SS"
-                            try:
-                                datetime.strptime(time_stamps, "%d/%m/%Y %H:%M:%S")
-                            except ValueError:
-                                warnings.append("Sleep timeStamps format should be DD/MM/YYYY HH:MM:SS")
-                        else:
-                            errors.append("Missing 'sleep.timeStamps' field")
-                        
-                        # Validate sleep.time (sleep period)
-                        if 'time' in sleep:
-                            sleep_time = sleep['time']
-                            if not isinstance(sleep_time, str):
-                                errors.append("Sleep time must be a string")
-                            # Validate format: "HHMM@HHMM" (e.g., "2200@0700")
-                            elif '@' not in sleep_time:
-                                warnings.append("Sleep time format should be HHMM@HHMM (e.g., 2200@0700)")
-                        else:
-                            errors.append("Missing 'sleep.time' field")
-                        
-                        # Validate sleep.data (sleep pattern)
-                        if 'data' in sleep:
-                            sleep_data = sleep['data']
-                            if not isinstance(sleep_data, str):
-                                errors.append("Sleep data must be a string")
-                            else:
-                                # Validate sleep data contains only 0, 1, 2
-                                valid_chars = {'0', '1', '2'}
-                                if not all(char in valid_chars for char in sleep_data):
-                                    errors.append("Sleep data must contain only 0 (awake), 1 (light sleep), 2 (deep sleep)")
-                                # Each digit represents 5 minutes
-                                if len(sleep_data) > 0:
-                                    total_minutes = len(sleep_data) * 5
-                                    logger.info(f"Sleep tracking period: {total_minutes} minutes ({len(sleep_data)} data points)")
-                        else:
-                            errors.append("Missing 'sleep.data' field")
-                        
-                        # Validate sleep.num (total monitoring slots)
-                        if 'num' in sleep:
-                            sleep_num = sleep['num']
-                            if not isinstance(sleep_num, (int, float)):
-                                errors.append("Sleep num must be numeric")
-                            elif sleep_num <= 0:
-                                warnings.append("Sleep num should be positive")
-                            # Validate that num matches data length
-                            if 'data' in sleep and isinstance(sleep['data'], str):
-                                expected_length = len(sleep['data'])
-                                if sleep_num != expected_length:
-                                    warnings.append(f"Sleep num ({sleep_num}) doesn't match data length ({expected_length})")
-                        else:
-                            errors.append("Missing 'sleep.num' field")
-                    
-                    # Transform for FHIR
-                    transformed_data['resource_type'] = 'Observation'
-                    transformed_data['code'] = 'sleep-study'  # Sleep study LOINC code
-                    transformed_data['unit'] = 'sleep-stages'
-                    transformed_data['category'] = 'sleep'
-                    
-                else:
-                    # Handle sleep data with heartbeat-like structure (fallback)
-                    logger.warning("Sleep data received with heartbeat-like structure instead of proper sleep format")
-                    if 'step' not in data:
-                        warnings.append("Missing 'step' field")
-                    else:
-                        step = data['step']
-                        if not isinstance(step, (int, float)):
-                            errors.append("'step' field must be numeric")
-                        elif step < 0:
-                            warnings.append("Step count cannot be negative")
-                    
-                    if 'battery' in data:
-                        battery = data['battery']
-                        if not isinstance(battery, (int, float)):
-                            errors.append("'battery' field must be numeric")
-                        elif not (0 <= battery <= 100):
-                            warnings.append("Battery level outside valid range (0-100%)")
-                    
-                    if 'signalGSM' in data:
-                        signal = data['signalGSM']
-                        if not isinstance(signal, (int, float)):
-                            errors.append("'signalGSM' field must be numeric")
-                        elif not (0 <= signal <= 100):
-                            warnings.append("GSM signal outside valid range (0-100%)")
-                    
-                    # Transform for FHIR (as activity data)
-                    transformed_data['resource_type'] = 'Observation'
-                    transformed_data['code'] = 'activity-steps'  # Step count LOINC code
-                    transformed_data['unit'] = 'steps'
-                    transformed_data['category'] = 'activity'
-                    
-                    if 'workingMode' in data:
-                        mode = data['workingMode']
-                        if not isinstance(mode, (int, float)):
-                            errors.append("'workingMode' field must be numeric")
-                        elif mode not in [1, 2, 3, 8]:
-                            warnings.append(f"Unknown working mode: {mode}")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = '93832-4'  # Sleep study LOINC code
-                transformed_data['unit'] = 'unknown'
-                transformed_data['category'] = 'survey'
-                
-            elif topic == 'iMEDE_watch/hb':
-                # Heartbeat with step count, battery, signal
-                if 'step' not in data:
-                    warnings.append("Missing 'step' field")
-                else:
-                    step = data['step']
-                    if not isinstance(step, (int, float)):
-                        errors.append("'step' field must be numeric")
-                    elif step < 0:
-                        warnings.append("Step count cannot be negative")
-                
-                if 'battery' in data:
-                    battery = data['battery']
-                    if not isinstance(battery, (int, float)):
-                        errors.append("'battery' field must be numeric")
-                    elif not (0 <= battery <= 100):
-                        warnings.append("Battery level outside valid range (0-100%)")
-                
-                if 'signalGSM' in data:
-                    signal = data['signalGSM']
-                    if not isinstance(signal, (int, float)):
-                        errors.append("'signalGSM' field must be numeric")
-                    elif not (0 <= signal <= 100):
-                        warnings.append("GSM signal outside valid range (0-100%)")
-                
-                if 'workingMode' in data:
-                    mode = data['workingMode']
-                    if not isinstance(mode, (int, float)):
-                        errors.append("'workingMode' field must be numeric")
-                    elif mode not in [1, 2, 3, 8]:
-                        warnings.append(f"Unknown working mode: {mode}")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = '55423-8'  # Step count LOINC code
-                transformed_data['unit'] = 'steps'
-                transformed_data['category'] = 'vital-signs'
-                
-            elif topic in ['iMEDE_watch/sos', 'iMEDE_watch/fallDown']:
-                # Emergency alerts
-                if 'status' not in data:
-                    errors.append("Missing 'status' field")
-                else:
-                    status = data['status']
-                    if not isinstance(status, str):
-                        errors.append("'status' field must be a string")
-                    elif status not in ['SOS', 'FALL DOWN']:
-                        warnings.append(f"Unknown status: {status}")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = 'emergency-alert'
-                transformed_data['unit'] = 'unknown'
-                transformed_data['category'] = 'survey'
-                
-            elif topic == 'iMEDE_watch/onlineTrigger':
-                # Online/offline status
-                if 'status' not in data:
-                    errors.append("Missing 'status' field")
-                else:
-                    status = data['status']
-                    if not isinstance(status, str):
-                        errors.append("'status' field must be a string")
-                    elif status not in ['online', 'offline']:
-                        warnings.append(f"Unknown status: {status}")
-                
-                # Transform for FHIR
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = 'device-status'
-                transformed_data['unit'] = 'unknown'
-                transformed_data['category'] = 'survey'
-                
+            # Required fields and topic-specific rules
+            compiled = FHIRDataValidator._kati_validators.get(topic)
+            if compiled is None:
+                FHIRDataValidator._kati_unknown_validator(data, issues, _NO_CONTEXT)
+                warnings.append(ValidationIssue("Unknown topic: {topic}", {'topic': topic}))
+                fhir_fields = KATI_UNKNOWN_TRANSFORM
             else:
-                # Unknown topic
-                warnings.append(f"Unknown topic: {topic}")
-                transformed_data['resource_type'] = 'Observation'
-                transformed_data['code'] = 'unknown'
-                transformed_data['unit'] = 'unknown'
-                transformed_data['category'] = 'unknown'
-            
+                validate, fhir_fields = compiled
+                validate(data, issues, _NO_CONTEXT)
+
+            # Transform for FHIR
+            transformed_data = {**data, **fhir_fields}
+
             # Add timestamp if not present
             if 'timestamp' not in transformed_data:
                 transformed_data['timestamp'] = datetime.now().isoformat()
-            
+
             return {
-                "valid": len(errors) == 0,
+                "valid": not errors,
                 "errors": errors,
                 "warnings": warnings,
                 "transformed_data": transformed_data
             }
-            
+
         except Exception as e:
             errors.append(f"Validation error: {str(e)}")
             return {
@@ -375,430 +690,63 @@ class FHIRDataValidator:
                 "warnings": warnings,
                 "transformed_data": data
             }
-    
+
     @staticmethod
-    def validate_ava4_data_format(data: Dict[str, Any], topic: str) -> Dict[str, Any]:
-        """Validate AVA4 data format and transform to FHIR-compatible format"""
+    def _validate_gateway_message(
+        data: Dict[str, Any],
+        validate: Callable,
+        extra_fields: Tuple[Tuple[str, str], ...]
+    ) -> Dict[str, Any]:
+        """Shared flow for AVA4 and Qube-Vital gateway messages"""
         errors = []
         warnings = []
-        transformed_data = data.copy()
-        
+        validate(data, (errors, warnings), _NO_CONTEXT)
+
+        transformed_data = None
+        if not errors:
+            transformed_data = dict(data)
+            for source, target in extra_fields:
+                if source in data:
+                    transformed_data[target] = data[source]
+
+        return {
+            'valid': not errors,
+            'errors': errors,
+            'warnings': warnings,
+            'transformed_data': transformed_data
+        }
+
+    @staticmethod
+    def validate_ava4_data_format(data: Dict[str, Any], topic: str) -> Dict[str, Any]:
+        """Validate AVA4 data format and transform to FHIR-compatible format"""
         try:
-            # Required fields for all AVA4 messages
-            required_fields = ['from', 'to', 'time', 'type']
-            for field in required_fields:
-                if field not in data:
-                    errors.append(f"Missing required field: {field}")
-            
-            if errors:
-                return {
-                    'valid': False,
-                    'errors': errors,
-                    'warnings': warnings,
-                    'transformed_data': None
-                }
-            
-            # Validate based on message type
-            msg_type = data.get('type')
-            
-            if msg_type == 'HB_Msg':
-                # Heartbeat message - basic validation
-                if 'data' not in data or 'msg' not in data.get('data', {}):
-                    errors.append("Missing heartbeat message data")
-                
-            elif msg_type == 'reportMsg':
-                # Online trigger message - basic validation
-                if 'data' not in data or 'msg' not in data.get('data', {}):
-                    errors.append("Missing report message data")
-                
-            elif msg_type == 'reportAttribute':
-                # Vital signs data - comprehensive validation
-                if 'data' not in data:
-                    errors.append("Missing data field for reportAttribute")
-                    return {
-                        'valid': False,
-                        'errors': errors,
-                        'warnings': warnings,
-                        'transformed_data': None
-                    }
-                
-                data_section = data['data']
-                attribute = data_section.get('attribute', '')
-                device = data.get('device', '')
-                
-                # Validate based on device type
-                if attribute in ['BP_BIOLIGTH', 'BLE_BPG']:  # Blood Pressure
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Blood pressure value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Blood pressure device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'bp_high' not in device_data or not isinstance(device_data['bp_high'], (int, float)):
-                                errors.append("Missing or invalid bp_high (systolic)")
-                            if 'bp_low' not in device_data or not isinstance(device_data['bp_low'], (int, float)):
-                                errors.append("Missing or invalid bp_low (diastolic)")
-                            if 'PR' not in device_data or not isinstance(device_data['PR'], (int, float)):
-                                errors.append("Missing or invalid PR (pulse rate)")
-                            
-                            # Validate ranges
-                            if 'bp_high' in device_data and isinstance(device_data['bp_high'], (int, float)):
-                                if not (70 <= device_data['bp_high'] <= 250):
-                                    warnings.append(f"Systolic pressure {device_data['bp_high']} may be outside normal range")
-                            if 'bp_low' in device_data and isinstance(device_data['bp_low'], (int, float)):
-                                if not (40 <= device_data['bp_low'] <= 150):
-                                    warnings.append(f"Diastolic pressure {device_data['bp_low']} may be outside normal range")
-                            if 'PR' in device_data and isinstance(device_data['PR'], (int, float)):
-                                if not (40 <= device_data['PR'] <= 200):
-                                    warnings.append(f"Pulse rate {device_data['PR']} may be outside normal range")
-                
-                elif attribute == 'Oximeter JUMPER':  # SpO2
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("SpO2 value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("SpO2 device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'spo2' not in device_data or not isinstance(device_data['spo2'], (int, float)):
-                                errors.append("Missing or invalid spo2")
-                            if 'pulse' not in device_data or not isinstance(device_data['pulse'], (int, float)):
-                                errors.append("Missing or invalid pulse rate")
-                            if 'pi' not in device_data or not isinstance(device_data['pi'], (int, float)):
-                                warnings.append("Missing or invalid perfusion index")
-                            
-                            # Validate ranges
-                            if 'spo2' in device_data and isinstance(device_data['spo2'], (int, float)):
-                                if not (70 <= device_data['spo2'] <= 100):
-                                    warnings.append(f"SpO2 {device_data['spo2']} may be outside normal range")
-                            if 'pulse' in device_data and isinstance(device_data['pulse'], (int, float)):
-                                if not (40 <= device_data['pulse'] <= 200):
-                                    warnings.append(f"Pulse rate {device_data['pulse']} may be outside normal range")
-                
-                elif attribute in ['Contour_Elite', 'AccuChek_Instant']:  # Blood Glucose
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Blood glucose value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Blood glucose device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'blood_glucose' not in device_data:
-                                errors.append("Missing blood_glucose")
-                            else:
-                                # Handle string or numeric blood glucose values
-                                bg_value = device_data['blood_glucose']
-                                if isinstance(bg_value, str):
-                                    try:
-                                        bg_value = float(bg_value)
-                                    except ValueError:
-                                        errors.append("Invalid blood_glucose value (cannot convert to number)")
-                                elif not isinstance(bg_value, (int, float)):
-                                    errors.append("Blood glucose must be numeric")
-                                
-                                if isinstance(bg_value, (int, float)) and not (20 <= bg_value <= 600):
-                                    warnings.append(f"Blood glucose {bg_value} may be outside normal range")
-                            
-                            if 'marker' not in device_data:
-                                warnings.append("Missing meal marker (Before Meal/After Meal)")
-                
-                elif attribute == 'IR_TEMO_JUMPER':  # Body Temperature
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Temperature value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Temperature device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'temp' not in device_data or not isinstance(device_data['temp'], (int, float)):
-                                errors.append("Missing or invalid temperature")
-                            if 'mode' not in device_data:
-                                warnings.append("Missing temperature measurement mode")
-                            
-                            # Validate ranges
-                            if 'temp' in device_data and isinstance(device_data['temp'], (int, float)):
-                                if not (30 <= device_data['temp'] <= 45):
-                                    warnings.append(f"Temperature {device_data['temp']} may be outside normal range")
-                
-                elif attribute == 'BodyScale_JUMPER':  # Weight Scale
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Weight scale value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Weight scale device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'weight' not in device_data or not isinstance(device_data['weight'], (int, float)):
-                                errors.append("Missing or invalid weight")
-                            if 'resistance' not in device_data or not isinstance(device_data['resistance'], (int, float)):
-                                warnings.append("Missing or invalid body resistance")
-                            
-                            # Validate ranges
-                            if 'weight' in device_data and isinstance(device_data['weight'], (int, float)):
-                                if not (10 <= device_data['weight'] <= 300):
-                                    warnings.append(f"Weight {device_data['weight']} may be outside normal range")
-                
-                elif attribute == 'MGSS_REF_UA':  # Uric Acid
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Uric acid value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Uric acid device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'uric_acid' not in device_data:
-                                errors.append("Missing uric_acid")
-                            else:
-                                # Handle string or numeric uric acid values
-                                ua_value = device_data['uric_acid']
-                                if isinstance(ua_value, str):
-                                    try:
-                                        ua_value = float(ua_value)
-                                    except ValueError:
-                                        errors.append("Invalid uric_acid value (cannot convert to number)")
-                                elif not isinstance(ua_value, (int, float)):
-                                    errors.append("Uric acid must be numeric")
-                                
-                                if isinstance(ua_value, (int, float)) and not (1 <= ua_value <= 1000):
-                                    warnings.append(f"Uric acid {ua_value} may be outside normal range")
-                
-                elif attribute == 'MGSS_REF_CHOL':  # Cholesterol
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Cholesterol value must be an object")
-                    else:
-                        device_list = value.get('device_list', [])
-                        if not isinstance(device_list, list) or len(device_list) == 0:
-                            errors.append("Cholesterol device_list must be a non-empty array")
-                        else:
-                            device_data = device_list[0]
-                            if 'cholesterol' not in device_data:
-                                errors.append("Missing cholesterol")
-                            else:
-                                # Handle string or numeric cholesterol values
-                                chol_value = device_data['cholesterol']
-                                if isinstance(chol_value, str):
-                                    try:
-                                        chol_value = float(chol_value)
-                                    except ValueError:
-                                        errors.append("Invalid cholesterol value (cannot convert to number)")
-                                elif not isinstance(chol_value, (int, float)):
-                                    errors.append("Cholesterol must be numeric")
-                                
-                                if isinstance(chol_value, (int, float)) and not (1 <= chol_value <= 20):
-                                    warnings.append(f"Cholesterol {chol_value} may be outside normal range")
-                
-                else:
-                    warnings.append(f"Unknown device attribute: {attribute}")
-            
-            else:
-                warnings.append(f"Unknown message type: {msg_type}")
-            
-            # Add device information
-            if 'deviceCode' in data:
-                transformed_data['device_code'] = data['deviceCode']
-            if 'mac' in data:
-                transformed_data['device_mac'] = data['mac']
-            if 'IMEI' in data:
-                transformed_data['device_imei'] = data['IMEI']
-            if 'name' in data:
-                transformed_data['device_name'] = data['name']
-            
-            return {
-                'valid': len(errors) == 0,
-                'errors': errors,
-                'warnings': warnings,
-                'transformed_data': transformed_data if len(errors) == 0 else None
-            }
-            
+            return FHIRDataValidator._validate_gateway_message(
+                data, FHIRDataValidator._ava4_validator, AVA4_DEVICE_FIELDS
+            )
         except Exception as e:
             logger.error(f"Error in AVA4 data validation: {str(e)}")
             return {
                 'valid': False,
                 'errors': [f"Validation error: {str(e)}"],
-                'warnings': warnings,
+                'warnings': [],
                 'transformed_data': None
             }
-    
+
     @staticmethod
     def validate_qube_data_format(data: Dict[str, Any], topic: str) -> Dict[str, Any]:
         """Validate Qube-Vital data format and transform to FHIR-compatible format"""
-        errors = []
-        warnings = []
-        transformed_data = data.copy()
-        
         try:
-            # Required fields for all Qube messages
-            required_fields = ['from', 'to', 'time', 'mac', 'type']
-            for field in required_fields:
-                if field not in data:
-                    errors.append(f"Missing required field: {field}")
-            
-            if errors:
-                return {
-                    'valid': False,
-                    'errors': errors,
-                    'warnings': warnings,
-                    'transformed_data': None
-                }
-            
-            # Validate based on message type
-            msg_type = data.get('type')
-            
-            if msg_type == 'HB_Msg':
-                # Heartbeat message - basic validation
-                if 'data' not in data or 'msg' not in data.get('data', {}):
-                    errors.append("Missing heartbeat message data")
-                
-            elif msg_type == 'reportAttribute':
-                # Vital signs data - comprehensive validation
-                if 'data' not in data:
-                    errors.append("Missing data field for reportAttribute")
-                    return {
-                        'valid': False,
-                        'errors': errors,
-                        'warnings': warnings,
-                        'transformed_data': None
-                    }
-                
-                data_section = data['data']
-                attribute = data_section.get('attribute', '')
-                
-                # Validate based on device type
-                if attribute == 'WBP_JUMPER':  # Blood Pressure
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Blood pressure value must be an object")
-                    else:
-                        if 'bp_high' not in value or not isinstance(value['bp_high'], (int, float)):
-                            errors.append("Missing or invalid bp_high (systolic)")
-                        if 'bp_low' not in value or not isinstance(value['bp_low'], (int, float)):
-                            errors.append("Missing or invalid bp_low (diastolic)")
-                        if 'pr' not in value or not isinstance(value['pr'], (int, float)):
-                            errors.append("Missing or invalid pr (pulse rate)")
-                        
-                        # Validate ranges
-                        if 'bp_high' in value and isinstance(value['bp_high'], (int, float)):
-                            if not (70 <= value['bp_high'] <= 250):
-                                warnings.append(f"Systolic pressure {value['bp_high']} may be outside normal range")
-                        if 'bp_low' in value and isinstance(value['bp_low'], (int, float)):
-                            if not (40 <= value['bp_low'] <= 150):
-                                warnings.append(f"Diastolic pressure {value['bp_low']} may be outside normal range")
-                        if 'pr' in value and isinstance(value['pr'], (int, float)):
-                            if not (40 <= value['pr'] <= 200):
-                                warnings.append(f"Pulse rate {value['pr']} may be outside normal range")
-                
-                elif attribute == 'CONTOUR':  # Blood Glucose
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Blood glucose value must be an object")
-                    else:
-                        if 'blood_glucose' not in value or not isinstance(value['blood_glucose'], (int, float)):
-                            errors.append("Missing or invalid blood_glucose")
-                        if 'marker' not in value:
-                            warnings.append("Missing meal marker (Before Meal/After Meal)")
-                        
-                        # Validate ranges
-                        if 'blood_glucose' in value and isinstance(value['blood_glucose'], (int, float)):
-                            if not (20 <= value['blood_glucose'] <= 600):
-                                warnings.append(f"Blood glucose {value['blood_glucose']} may be outside normal range")
-                
-                elif attribute == 'BodyScale_JUMPER':  # Weight Scale
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Weight scale value must be an object")
-                    else:
-                        if 'weight' not in value or not isinstance(value['weight'], (int, float)):
-                            errors.append("Missing or invalid weight")
-                        if 'Resistance' not in value or not isinstance(value['Resistance'], (int, float)):
-                            warnings.append("Missing or invalid body resistance")
-                        
-                        # Validate ranges
-                        if 'weight' in value and isinstance(value['weight'], (int, float)):
-                            if not (10 <= value['weight'] <= 300):
-                                warnings.append(f"Weight {value['weight']} may be outside normal range")
-                
-                elif attribute == 'TEMO_Jumper':  # Body Temperature
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("Temperature value must be an object")
-                    else:
-                        if 'Temp' not in value or not isinstance(value['Temp'], (int, float)):
-                            errors.append("Missing or invalid temperature")
-                        if 'mode' not in value:
-                            warnings.append("Missing temperature measurement mode")
-                        
-                        # Validate ranges
-                        if 'Temp' in value and isinstance(value['Temp'], (int, float)):
-                            if not (30 <= value['Temp'] <= 45):
-                                warnings.append(f"Temperature {value['Temp']} may be outside normal range")
-                
-                elif attribute == 'Oximeter_JUMPER':  # SpO2
-                    value = data_section.get('value', {})
-                    if not isinstance(value, dict):
-                        errors.append("SpO2 value must be an object")
-                    else:
-                        if 'spo2' not in value or not isinstance(value['spo2'], (int, float)):
-                            errors.append("Missing or invalid SpO2")
-                        if 'pulse' not in value or not isinstance(value['pulse'], (int, float)):
-                            errors.append("Missing or invalid pulse rate")
-                        if 'pi' not in value or not isinstance(value['pi'], (int, float)):
-                            warnings.append("Missing or invalid perfusion index")
-                        
-                        # Validate ranges
-                        if 'spo2' in value and isinstance(value['spo2'], (int, float)):
-                            if not (70 <= value['spo2'] <= 100):
-                                warnings.append(f"SpO2 {value['spo2']} may be outside normal range")
-                        if 'pulse' in value and isinstance(value['pulse'], (int, float)):
-                            if not (40 <= value['pulse'] <= 200):
-                                warnings.append(f"Pulse rate {value['pulse']} may be outside normal range")
-                
-                else:
-                    warnings.append(f"Unknown device attribute: {attribute}")
-            
-            else:
-                warnings.append(f"Unknown message type: {msg_type}")
-            
-            # Add patient information if available
-            if 'citiz' in data:
-                transformed_data['patient_id'] = data['citiz']
-            if 'nameTH' in data:
-                transformed_data['patient_name_th'] = data['nameTH']
-            if 'nameEN' in data:
-                transformed_data['patient_name_en'] = data['nameEN']
-            if 'brith' in data:
-                transformed_data['patient_birth'] = data['brith']
-            if 'gender' in data:
-                transformed_data['patient_gender'] = data['gender']
-            
-            return {
-                'valid': len(errors) == 0,
-                'errors': errors,
-                'warnings': warnings,
-                'transformed_data': transformed_data if len(errors) == 0 else None
-            }
-            
+            return FHIRDataValidator._validate_gateway_message(
+                data, FHIRDataValidator._qube_validator, QUBE_PATIENT_FIELDS
+            )
         except Exception as e:
             logger.error(f"Error in Qube-Vital data validation: {str(e)}")
             return {
                 'valid': False,
                 'errors': [f"Validation error: {str(e)}"],
-                'warnings': warnings,
+                'warnings': [],
                 'transformed_data': None
             }
 
 # Create a singleton instance
-fhir_validator = FHIRDataValidator() 
\ No newline at end of file
+fhir_validator = FHIRDataValidator()
@@ -0,0 +1,225 @@
+"""
+Pipeline span tracing for the MQTT listeners
+
+Times each stage of a message in-process (parse, validate, patient lookup,
+FHIR store, history store) without any network call per step. Stage
+durations are folded into fixed-bucket histograms per (source, stage) and a
+background thread posts the histograms in one batch every
+PIPELINE_TRACE_EXPORT_INTERVAL seconds to the Stardust API, which merges
+them with its own spans for /fhir/R5/Observation.
+
+The trace context travels to the API in two headers:
+
+- ``traceparent``: W3C trace context (``00-<trace id>-<span id>-01``)
+- ``X-Trace-Received-At``: epoch seconds at which the MQTT message arrived,
+  so the API can record the end-to-end received → FHIR stored latency
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+from connections import http_session
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+TRACEPARENT_HEADER = "traceparent"
+RECEIVED_AT_HEADER = "X-Trace-Received-At"
+SOURCE_HEADER = "X-Trace-Source"
+
+class StageHistogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ("buckets", "count", "sum_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        index = 0
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if duration_ms <= bound:
+                break
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": list(self.buckets)
+        }
+
+class PipelineTrace:
+    """Stage timings of one MQTT message"""
+
+    __slots__ = ("trace_id", "span_id", "source", "topic", "received_at", "started", "stages")
+
+    def __init__(self, source: str, topic: str):
+        self.trace_id = uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.source = source
+        self.topic = topic
+        self.received_at = time.time()
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, duration_ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration_ms
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            TRACEPARENT_HEADER: f"00-{self.trace_id}-{self.span_id}-01",
+            RECEIVED_AT_HEADER: f"{self.received_at:.6f}",
+            SOURCE_HEADER: self.source
+        }
+
+class PipelineTracer:
+    """Per-thread trace context plus aggregated stage histograms"""
+
+    def __init__(self):
+        self.enabled = os.getenv('PIPELINE_TRACING_ENABLED', 'true').lower() == 'true'
+        api_base_url = os.getenv('STARDUST_API_URL', 'http://stardust-api:5054')
+        self.export_url = os.getenv('PIPELINE_TRACE_EXPORT_URL', f"{api_base_url}/admin/performance/pipeline-traces")
+        self.export_interval = float(os.getenv('PIPELINE_TRACE_EXPORT_INTERVAL', 30))
+        self.slow_trace_ms = float(os.getenv('PIPELINE_TRACE_SLOW_MS', 2000))
+        self.api_token = os.getenv('STARDUST_API_TOKEN', 'test-token')
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], StageHistogram] = {}
+        self._interval_start = time.time()
+        self._exporter: Optional[threading.Thread] = None
+
+    # =============== Trace context ===============
+
+    def current(self) -> Optional[PipelineTrace]:
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def trace(self, source: str, topic: str):
+        """Open a trace for one message; stages recorded inside are attached to it"""
+        if not self.enabled:
+            yield None
+            return
+        self._ensure_exporter()
+        trace = PipelineTrace(source, topic)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = None
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a stage of the current trace (no-op outside a trace)"""
+        trace = self.current()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add(stage, (time.perf_counter() - started) * 1000)
+
+    def headers(self) -> Dict[str, str]:
+        """Trace propagation headers for outgoing API calls"""
+        trace = self.current()
+        return trace.headers() if trace is not None else {}
+
+    def _finish(self, trace: PipelineTrace):
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        attributed_ms = sum(trace.stages.values())
+        with self._lock:
+            for stage, duration_ms in trace.stages.items():
+                self._observe(trace.source, stage, duration_ms)
+            # Time outside the named stages is mostly the web panel event posts
+            self._observe(trace.source, 'other', max(total_ms - attributed_ms, 0.0))
+            self._observe(trace.source, 'total', total_ms)
+        if total_ms >= self.slow_trace_ms:
+            breakdown = ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in trace.stages.items())
+            logger.warning(
+                f"🐢 Slow {trace.source} message {trace.topic} ({total_ms:.1f}ms, trace {trace.trace_id}): {breakdown}"
+            )
+
+    def observe(self, source: str, stage: str, duration_ms: float):
+        """Record a duration measured outside a trace (e.g. end-to-end emergency latency)"""
+        if not self.enabled:
+            return
+        self._ensure_exporter()
+        with self._lock:
+            self._observe(source, stage, duration_ms)
+
+    def _observe(self, source: str, stage: str, duration_ms: float):
+        histogram = self._histograms.get((source, stage))
+        if histogram is None:
+            histogram = self._histograms[(source, stage)] = StageHistogram()
+        histogram.observe(duration_ms)
+
+    # =============== Batch export ===============
+
+    def drain(self) -> Dict[str, Any]:
+        """Return the histograms collected since the last drain and reset them"""
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            interval_start, self._interval_start = self._interval_start, time.time()
+        return {
+            "interval_start": interval_start,
+            "interval_end": self._interval_start,
+            "buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+            "stages": [
+                dict(histogram.to_dict(), source=source, stage=stage)
+                for (source, stage), histogram in histograms.items()
+            ]
+        }
+
+    def export(self) -> bool:
+        """Post one batch of histograms; the batch is dropped if the API is unreachable"""
+        batch = self.drain()
+        if not batch["stages"]:
+            return True
+        try:
+            response = http_session().post(
+                self.export_url,
+                json=batch,
+                headers={'Authorization': f'Bearer {self.api_token}'},
+                timeout=10
+            )
+            if response.status_code in (200, 201, 202):
+                return True
+            logger.warning(f"⚠️ Pipeline trace export rejected: {response.status_code}")
+        except Exception as e:
+            logger.warning(f"⚠️ Pipeline trace export failed: {e}")
+        return False
+
+    def _ensure_exporter(self):
+        if self._exporter is None and self.export_url:
+            with self._lock:
+                if self._exporter is None:
+                    self._exporter = threading.Thread(target=self._export_loop, name='pipeline-trace-export', daemon=True)
+                    self._exporter.start()
+
+    def _export_loop(self):
+        while True:
+            time.sleep(self.export_interval)
+            self.export()
+
+# Global pipeline tracer instance
+pipeline_tracer = PipelineTracer()
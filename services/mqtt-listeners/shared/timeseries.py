@@ -0,0 +1,84 @@
+"""
+Time-series storage for device vital histories (listener side)
+
+When ``VITAL_TIMESERIES_ENABLED`` is true the listeners write the vital
+history collections and ``medical_data`` into their ``<name>_ts``
+time-series companions instead, with the patient / device / type fields
+grouped under the ``meta`` metaField. The layout matches the API's
+``app/services/vital_timeseries.py``, which also reads them back and
+migrates existing data.
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Tuple
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_SUFFIX = "_ts"
+META_FIELD = "meta"
+META_FIELDS = ("patient_id", "hospital_id", "device_id", "device_type", "source", "data_type", "attribute")
+
+# Legacy collection -> (timeField, granularity)
+TIMESERIES_COLLECTIONS: Dict[str, Tuple[str, str]] = {
+    "blood_pressure_histories": ("created_at", "hours"),
+    "blood_sugar_histories": ("created_at", "hours"),
+    "body_data_histories": ("created_at", "hours"),
+    "uric_acid_histories": ("created_at", "hours"),
+    "cholesterol_histories": ("created_at", "hours"),
+    "creatinine_histories": ("created_at", "hours"),
+    "lipid_histories": ("created_at", "hours"),
+    "sleep_data_histories": ("created_at", "hours"),
+    "step_histories": ("created_at", "hours"),
+    "spo2_histories": ("created_at", "minutes"),
+    "heart_rate_histories": ("created_at", "minutes"),
+    "temprature_data_histories": ("created_at", "minutes"),
+    "medical_data": ("timestamp", "minutes")
+}
+
+_ready = set()
+_lock = threading.Lock()
+
+def timeseries_enabled() -> bool:
+    return os.getenv('VITAL_TIMESERIES_ENABLED', 'false').lower() == 'true'
+
+def to_timeseries(collection_name: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    """Time-series form of a history document (meta fields grouped, time field set)"""
+    time_field = TIMESERIES_COLLECTIONS[collection_name][0]
+    stored = {key: value for key, value in document.items() if key not in META_FIELDS}
+    stored[META_FIELD] = {key: document[key] for key in META_FIELDS if key in document}
+    if not isinstance(stored.get(time_field), datetime):
+        fallback = document.get("created_at") or document.get("timestamp")
+        stored[time_field] = fallback if isinstance(fallback, datetime) else datetime.utcnow()
+    return stored
+
+def _ensure_collection(db, collection_name: str):
+    name = collection_name + TIMESERIES_SUFFIX
+    if name in _ready:
+        return
+    with _lock:
+        if name in _ready:
+            return
+        time_field, granularity = TIMESERIES_COLLECTIONS[collection_name]
+        try:
+            db.create_collection(
+                name, timeseries={"timeField": time_field, "metaField": META_FIELD, "granularity": granularity}
+            )
+            logger.info(f"⏱️ Created time-series collection {name} ({granularity})")
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            if e.code != 48:  # NamespaceExists
+                raise
+        _ready.add(name)
+
+def insert_vital(db, collection_name: str, document: Dict[str, Any]):
+    """Insert into ``collection_name``, or its time-series companion when enabled"""
+    if timeseries_enabled() and collection_name in TIMESERIES_COLLECTIONS:
+        _ensure_collection(db, collection_name)
+        return db[collection_name + TIMESERIES_SUFFIX].insert_one(to_timeseries(collection_name, document))
+    return db[collection_name].insert_one(document)
@@ -13,7 +13,7 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional
 from paho.mqtt import client as mqtt_client
 import threading
-from collections import deque
+from collections import Counter, deque
 from flask import Flask, jsonify
 import pymongo
 from pymongo import MongoClient
@@ -120,6 +120,72 @@ class TelegramAlert:
             logger.error(f"❌ Failed to send Telegram alert: {e}")
             return False
 
+class MessageRateRing:
+    """Fixed-size ring of per-second message counts by device type and topic.
+
+    Memory is bounded by the window length (one bucket per second) no matter
+    how many messages arrive, and rate queries only touch the buckets inside
+    the requested window instead of rescanning every message ever received.
+    """
+
+    def __init__(self, window_seconds: int = 3600):
+        self.window_seconds = window_seconds
+        # Each slot: [epoch_second, total, Counter(device_type), Counter(topic)]
+        self.buckets = [[-1, 0, Counter(), Counter()] for _ in range(window_seconds)]
+        self.lock = threading.Lock()
+
+    def record(self, device_type: str, topic: str, timestamp: float = None):
+        """Count one message in the bucket for its second"""
+        second = int(timestamp if timestamp is not None else time.time())
+        with self.lock:
+            bucket = self.buckets[second % self.window_seconds]
+            if bucket[0] > second:
+                # Older than the window (clock stepped back): nothing to count into
+                return
+            if bucket[0] != second:
+                # Slot still holds a second that fell out of the window: recycle it
+                bucket[0] = second
+                bucket[1] = 0
+                bucket[2].clear()
+                bucket[3].clear()
+            bucket[1] += 1
+            bucket[2][device_type] += 1
+            bucket[3][topic] += 1
+
+    def _live_buckets(self, seconds: int, skip_seconds: int = 0):
+        now = int(time.time())
+        newest = now - skip_seconds
+        oldest = now - min(seconds, self.window_seconds) + 1
+        for bucket in self.buckets:
+            if oldest <= bucket[0] <= newest:
+                yield bucket
+
+    def count(self, seconds: int, skip_seconds: int = 0) -> int:
+        """Messages received in the last ``seconds``, ignoring the newest ``skip_seconds``"""
+        with self.lock:
+            return sum(bucket[1] for bucket in self._live_buckets(seconds, skip_seconds))
+
+    def count_by_device_type(self, seconds: int) -> Dict[str, int]:
+        """Per device type message counts for the last ``seconds``"""
+        totals = Counter()
+        with self.lock:
+            for bucket in self._live_buckets(seconds):
+                totals.update(bucket[2])
+        return dict(totals)
+
+    def count_by_topic(self, seconds: int) -> Dict[str, int]:
+        """Per topic message counts for the last ``seconds``"""
+        totals = Counter()
+        with self.lock:
+            for bucket in self._live_buckets(seconds):
+                totals.update(bucket[3])
+        return dict(totals)
+
+    def rate_per_minute(self, seconds: int = 60) -> float:
+        """Average messages per minute over the last ``seconds``"""
+        seconds = min(seconds, self.window_seconds)
+        return self.count(seconds) * 60.0 / seconds
+
 class MedicalDataMonitor:
     """Monitor complete data flow from MQTT to database storage"""
 
@@ -142,8 +208,9 @@ class MedicalDataMonitor:
         self.start_time = get_local_time()
         self.running = False
 
-        # Data Storage
-        self.message_history = []
+        # Data Storage: per-second counters instead of a list of every message
+        self.message_rates = MessageRateRing(int(os.getenv('MESSAGE_RATE_WINDOW', '3600')))
+        self.recent_messages = deque(maxlen=int(os.getenv('RECENT_MESSAGE_BUFFER', '100')))
         self.failures = []
         self.total_messages = 0
 
@@ -235,7 +302,8 @@ class MedicalDataMonitor:
                 }
 
                 # Store message
-                self.message_history.append(message_record)
+                self.message_rates.record(device_type, topic)
+                self.recent_messages.append(message_record)
                 self.total_messages += 1
 
                 # Display complete data flow
@@ -345,11 +413,12 @@ class MedicalDataMonitor:
 
         self.failures.append(failure_record)
 
-        # Check if we should send an alert
+        # Check if we should send an alert; failures outside the window are dropped
         recent_failures = [
             f for f in self.failures
             if (get_local_time() - f['timestamp']).total_seconds() < (self.failure_window * 60)
         ]
+        self.failures = recent_failures
 
         if len(recent_failures) >= self.failure_threshold:
             # Send critical alert
@@ -585,20 +654,12 @@ class MedicalDataMonitor:
                 db_result = self.db_checker.check_recent_storage(minutes=5)
 
                 # Calculate success rate based on actual storage vs messages received
-                recent_messages = [
-                    msg for msg in self.message_history
-                    if (get_local_time() - msg['timestamp']).total_seconds() < 300  # 5 minutes
-                ]
+                received_count = self.message_rates.count(300)  # 5 minutes
 
-                if recent_messages and db_result['success']:
+                if received_count and db_result['success']:
                     # Real success rate: stored records / received messages
                     stored_count = db_result['count']
-                    received_count = len(recent_messages)
-
-                    if received_count > 0:
-                        success_rate = (stored_count / received_count) * 100
-                    else:
-                        success_rate = 0.0
+                    success_rate = (stored_count / received_count) * 100
 
                     # Update health data
                     self.health_data["database_connected"] = True
@@ -606,14 +667,10 @@ class MedicalDataMonitor:
 
                 else:
                     # Fallback to time-based calculation if database check fails
-                    if recent_messages:
-                        processed_count = 0
-                        for msg in recent_messages:
-                            time_diff = (get_local_time() - msg['timestamp']).total_seconds()
-                            if time_diff > 5:  # Messages older than 5 seconds should be processed
-                                processed_count += 1
-
-                        success_rate = (processed_count / len(recent_messages)) * 100
+                    if received_count:
+                        # Messages older than 5 seconds should be processed
+                        processed_count = self.message_rates.count(300, skip_seconds=5)
+                        success_rate = (processed_count / received_count) * 100
                     else:
                         success_rate = 0.0
 
@@ -624,11 +681,15 @@ class MedicalDataMonitor:
                 self.health_data["uptime"] = int(uptime)
                 self.health_data["total_messages"] = self.total_messages
                 self.health_data["success_rate"] = round(success_rate, 2)
+                self.health_data["messages_per_minute"] = round(self.message_rates.rate_per_minute(300), 2)
+                self.health_data["recent_messages_by_device"] = self.message_rates.count_by_device_type(300)
 
                 logger.info(f"📊 **Monitor Statistics**")
                 logger.info(f"   ⏱️  Uptime: {int(uptime)}s")
                 logger.info(f"   📨 Total Messages: {self.total_messages}")
-                logger.info(f"   📊 Recent Messages (5min): {len(recent_messages)}")
+                logger.info(f"   📊 Recent Messages (5min): {received_count}")
+                if self.health_data["recent_messages_by_device"]:
+                    logger.info(f"   📟 By Device: {', '.join([f'{k}:{v}' for k,v in self.health_data['recent_messages_by_device'].items()])}")
 
                 if db_result['success']:
                     logger.info(f"   💾 Database Storage: ✅ {db_result['count']} records")
@@ -752,29 +813,12 @@ class DatabaseChecker:
             for collection_name in collections_to_check:
                 try:
                     collection = self.db[collection_name]
-                    # Look for records created in the last X minutes
-                    recent_count = collection.count_documents({
-                        'created_at': {
-                            '$gte': start_time,
-                            '$lte': end_time
-                        }
-                    })
-
-                    # Also check for records with timestamp field
-                    timestamp_count = collection.count_documents({
-                        'timestamp': {
-                            '$gte': start_time,
-                            '$lte': end_time
-                        }
-                    })
-
-                    # Also check for records with updated_at field
-                    updated_count = collection.count_documents({
-                        'updated_at': {
-                            '$gte': start_time,
-                            '$lte': end_time
-                        }
-                    })
+                    # One aggregation per collection counts records created,
+                    # timestamped or updated in the last X minutes
+                    counts = self._count_recent(collection, start_time, end_time)
+                    recent_count = counts.get('created', 0)
+                    timestamp_count = counts.get('timestamp', 0)
+                    updated_count = counts.get('updated', 0)
 
                     collection_total = recent_count + timestamp_count + updated_count
                     collection_counts[collection_name] = collection_total
@@ -799,6 +843,29 @@ class DatabaseChecker:
             logger.error(f"❌ Error checking database: {e}")
             return {'success': False, 'count': 0, 'error': str(e)}
 
+    @staticmethod
+    def _count_recent(collection, start_time, end_time) -> Dict[str, int]:
+        """Count created_at/timestamp/updated_at hits in one pass over the collection"""
+        fields = {'created': 'created_at', 'timestamp': 'timestamp', 'updated': 'updated_at'}
+
+        def in_range(field):
+            return {'$and': [{'$gte': [f'${field}', start_time]}, {'$lte': [f'${field}', end_time]}]}
+
+        pipeline = [
+            {'$match': {'$or': [
+                {field: {'$gte': start_time, '$lte': end_time}} for field in fields.values()
+            ]}},
+            {'$project': {
+                name: {'$cond': [in_range(field), 1, 0]} for name, field in fields.items()
+            }},
+            {'$group': {
+                '_id': None,
+                **{name: {'$sum': f'${name}'} for name in fields}
+            }}
+        ]
+        result = list(collection.aggregate(pipeline))
+        return result[0] if result else {}
+
     def close(self):
         """Close database connection"""
         if self.client:
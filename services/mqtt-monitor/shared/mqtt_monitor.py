@@ -9,17 +9,40 @@ import logging
 import ssl
 from datetime import datetime
 from typing import Dict, Any, Optional, List
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference
+from pymongo.read_preferences import Nearest, Secondary, SecondaryPreferred
 from bson import ObjectId
 
+from timeseries import vital_collection
+
 logger = logging.getLogger(__name__)
 
+DASHBOARD_READ_PREFERENCES = {
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def dashboard_read_preference():
+    """Read preference for dashboard statistics (defaults to secondaryPreferred)
+
+    Uses the API's MONGODB_ANALYTICS_READ_PREFERENCE and
+    MONGODB_ANALYTICS_MAX_STALENESS_SECONDS; secondaryPreferred falls back to
+    the primary when no secondary is within the staleness bound.
+    """
+    mode = os.getenv('MONGODB_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+    if mode == "primary":
+        return ReadPreference.PRIMARY
+    staleness = int(os.getenv('MONGODB_ANALYTICS_MAX_STALENESS_SECONDS', 120))
+    return DASHBOARD_READ_PREFERENCES.get(mode, SecondaryPreferred)(max_staleness=staleness if staleness > 0 else -1)
+
 class MQTTMonitor:
     """MQTT Message Monitor and Patient Mapper"""
     
     def __init__(self, mongodb_uri: str, database_name: str = "AMY"):
         self.client = None
         self.db = None
+        self.dashboard_db = None
         self.connect_to_mongodb(mongodb_uri, database_name)
         
     def connect_to_mongodb(self, mongodb_uri: str, database_name: str):
@@ -68,6 +91,7 @@ class MQTTMonitor:
             
             # Set database
             self.db = self.client[database_name]
+            self.dashboard_db = self.client.get_database(database_name, read_preference=dashboard_read_preference())
             logger.info(f"📊 Connected to database: {database_name}")
             
         except Exception as e:
@@ -76,7 +100,16 @@ class MQTTMonitor:
             logger.warning(f"⚠️ Patient mapping features will not work")
             self.client = None
             self.db = None
+            self.dashboard_db = None
         
+    def vital_collection(self, name: str):
+        """Handle for reading a vital history collection or ``medical_data``, time-series aware"""
+        return vital_collection(self.db, name)
+
+    def dashboard_collection(self, name: str):
+        """Collection handle for read-only dashboard statistics, kept off the primary"""
+        return vital_collection(self.dashboard_db, name)
+
     def process_ava4_message(self, topic: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Process AVA4 MQTT message and map to patient"""
         try:
@@ -0,0 +1,99 @@
+"""
+Time-series storage for device vital histories (monitor side, read only)
+
+When ``VITAL_TIMESERIES_ENABLED`` is true the listeners write the vital
+history collections and ``medical_data`` into their ``<name>_ts``
+time-series companions, with the patient / device / type fields grouped
+under the ``meta`` metaField (see ``services/mqtt-listeners/shared/timeseries.py``).
+``vital_collection`` reads them back in their original shape, like the
+API's ``app/services/vital_timeseries.py``.
+"""
+
+import os
+from typing import Dict, Any, Optional
+
+TIMESERIES_SUFFIX = "_ts"
+META_FIELD = "meta"
+META_FIELDS = ("patient_id", "hospital_id", "device_id", "device_type", "source", "data_type", "attribute")
+
+TIMESERIES_COLLECTIONS = (
+    "blood_pressure_histories", "blood_sugar_histories", "body_data_histories", "uric_acid_histories",
+    "cholesterol_histories", "creatinine_histories", "lipid_histories", "sleep_data_histories",
+    "step_histories", "spo2_histories", "heart_rate_histories", "temprature_data_histories",
+    "medical_data"
+)
+
+def timeseries_enabled() -> bool:
+    return os.getenv('VITAL_TIMESERIES_ENABLED', 'false').lower() == 'true'
+
+def from_timeseries(document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Original document shape from its time-series form"""
+    if not document or META_FIELD not in document:
+        return document
+    meta = document.pop(META_FIELD) or {}
+    document.update(meta)
+    return document
+
+def _field(key: str) -> str:
+    return f"{META_FIELD}.{key}" if key.split(".", 1)[0] in META_FIELDS else key
+
+def timeseries_filter(query: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Rewrite meta field names in a query filter"""
+    translated = {}
+    for key, value in (query or {}).items():
+        if key in ("$and", "$or", "$nor"):
+            translated[key] = [timeseries_filter(clause) for clause in value]
+        else:
+            translated[_field(key)] = value
+    return translated
+
+class TimeSeriesCursor:
+    """pymongo cursor wrapper that yields documents in their original shape"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self._cursor = self._cursor.sort(_field(key_or_list), direction if direction is not None else 1)
+        else:
+            self._cursor = self._cursor.sort([(_field(key), order) for key, order in key_or_list])
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def __iter__(self):
+        for document in self._cursor:
+            yield from_timeseries(document)
+
+class TimeSeriesReadCollection:
+    """The read calls the web panel makes, on a time-series collection"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        if projection:
+            projection = {_field(key): value for key, value in projection.items()}
+        return TimeSeriesCursor(self._collection.find(timeseries_filter(filter), projection))
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None):
+        return from_timeseries(self._collection.find_one(timeseries_filter(filter)))
+
+    def count_documents(self, filter: Dict[str, Any]) -> int:
+        return self._collection.count_documents(timeseries_filter(filter))
+
+    def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None):
+        return self._collection.distinct(_field(key), timeseries_filter(filter))
+
+def vital_collection(db, collection_name: str):
+    """Collection to read ``collection_name`` from, or its time-series companion when enabled"""
+    if timeseries_enabled() and collection_name in TIMESERIES_COLLECTIONS:
+        return TimeSeriesReadCollection(db[collection_name + TIMESERIES_SUFFIX])
+    return db[collection_name]
@@ -585,7 +585,7 @@ def handle_get_streaming_events():
 def handle_get_streaming_stats():
     """Handle streaming statistics request"""
     try:
-        collection = mqtt_monitor.db[EVENT_LOG_COLLECTION]
+        collection = mqtt_monitor.dashboard_collection(EVENT_LOG_COLLECTION)
         
         # Get stats for last hour
         one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
@@ -997,7 +997,7 @@ def get_emergency_alerts():
 def get_emergency_stats():
     """Get emergency alert statistics"""
     try:
-        collection = mqtt_monitor.db['emergency_alarm']
+        collection = mqtt_monitor.dashboard_collection('emergency_alarm')
         
         # Get stats for last 24 hours
         yesterday = datetime.now(timezone.utc) - timedelta(hours=24)
@@ -1236,7 +1236,7 @@ def get_events():
 def get_event_stats():
     """Get event statistics"""
     try:
-        collection = mqtt_monitor.db[EVENT_LOG_COLLECTION]
+        collection = mqtt_monitor.dashboard_collection(EVENT_LOG_COLLECTION)
         
         # Get stats for last 24 hours
         yesterday = datetime.now(timezone.utc) - timedelta(days=1)
@@ -1431,7 +1431,7 @@ def get_streaming_events():
 def get_streaming_stats():
     """Get real-time statistics for streaming dashboard"""
     try:
-        collection = mqtt_monitor.db[EVENT_LOG_COLLECTION]
+        collection = mqtt_monitor.dashboard_collection(EVENT_LOG_COLLECTION)
         
         # Get stats for different time periods
         now = datetime.now(timezone.utc)
@@ -1575,7 +1575,7 @@ def get_streaming_stats():
 def get_event_correlation():
     """Get event correlation data for visualization"""
     try:
-        collection = mqtt_monitor.db[EVENT_LOG_COLLECTION]
+        collection = mqtt_monitor.dashboard_collection(EVENT_LOG_COLLECTION)
         
         # Get events from last hour for correlation analysis
         one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
@@ -1928,7 +1928,7 @@ def get_recent_medical_data():
         seven_days_ago_naive = datetime.now() - timedelta(days=7)
         
         # Query the medical_data collection directly
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.dashboard_collection('medical_data')
         
         # Get recent medical data, sorted by timestamp (newest first)
         # Temporarily remove timestamp filter to include all AVA4 data
@@ -1954,7 +1954,7 @@ def get_recent_medical_data():
         print(f"🔍 DEBUG: Combined data has {len(recent_medical_data)} records")
         
         # Get emergency alarms (SOS, Fall Detection) from emergency_alarm collection
-        emergency_alarm_collection = mqtt_monitor.db['emergency_alarm']
+        emergency_alarm_collection = mqtt_monitor.dashboard_collection('emergency_alarm')
         emergency_alarms = list(emergency_alarm_collection.find({}).sort('timestamp', -1).limit(20))
         print(f"🔍 DEBUG: Emergency alarms query returned {len(emergency_alarms)} records")
         
@@ -2687,7 +2687,7 @@ def handle_get_medical_data():
                 # Check if MQTT monitor and database are properly initialized
                 if mqtt_monitor is not None and hasattr(mqtt_monitor, 'db') and mqtt_monitor.db is not None:
                     one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
-                    medical_data_collection = mqtt_monitor.db['medical_data']
+                    medical_data_collection = mqtt_monitor.vital_collection('medical_data')
                     
                     recent_medical_data = list(medical_data_collection.find({
                         '$or': [
@@ -2847,7 +2847,7 @@ def get_kati_transactions():
         one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
         
         # Query the medical_data collection for Kati Watch data
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.dashboard_collection('medical_data')
         
         # Build query based on filter
         if data_filter == 'patient_only':
@@ -2865,7 +2865,7 @@ def get_kati_transactions():
             }).sort('timestamp', -1).skip(skip).limit(per_page))
         
         # Also get emergency alarms for Kati devices
-        emergency_collection = mqtt_monitor.db['emergency_alarm']
+        emergency_collection = mqtt_monitor.dashboard_collection('emergency_alarm')
         emergency_alarms = list(emergency_collection.find({
             'timestamp': {'$gte': one_day_ago},
             'device_type': 'Kati_Watch'
@@ -3086,7 +3086,7 @@ def get_all_kati_devices():
         one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
         
         # Query the medical_data collection for ALL Kati Watch data
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.dashboard_collection('medical_data')
         
         # Get all Kati Watch transactions (including unmapped)
         kati_transactions = list(medical_data_collection.find({
@@ -3095,7 +3095,7 @@ def get_all_kati_devices():
         }).sort('timestamp', -1).limit(1000))  # Increased limit for all devices
         
         # Also get emergency alarms for Kati devices
-        emergency_collection = mqtt_monitor.db['emergency_alarm']
+        emergency_collection = mqtt_monitor.dashboard_collection('emergency_alarm')
         emergency_alarms = list(emergency_collection.find({
             'timestamp': {'$gte': one_day_ago},
             'device_type': 'Kati_Watch'
@@ -3313,8 +3313,8 @@ def get_kati_transaction_stats():
         one_day_ago = now - timedelta(days=1)
         one_week_ago = now - timedelta(days=7)
         
-        medical_data_collection = mqtt_monitor.db['medical_data']
-        emergency_collection = mqtt_monitor.db['emergency_alarm']
+        medical_data_collection = mqtt_monitor.dashboard_collection('medical_data')
+        emergency_collection = mqtt_monitor.dashboard_collection('emergency_alarm')
         
         # Get transaction counts for different periods
         stats = {
@@ -3375,7 +3375,7 @@ def handle_get_kati_transactions():
         # Get recent Kati transactions
         if mqtt_monitor.db is not None:
             one_day_ago = datetime.now(timezone.utc) - timedelta(days=1)
-            medical_data_collection = mqtt_monitor.db['medical_data']
+            medical_data_collection = mqtt_monitor.vital_collection('medical_data')
             
             recent_transactions = list(medical_data_collection.find({
                 'device_type': 'Kati_Watch',
@@ -3479,7 +3479,7 @@ def get_location_details(transaction_id):
             }), 503
 
         # Get the transaction
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.vital_collection('medical_data')
         transaction = medical_data_collection.find_one({'_id': ObjectId(transaction_id)})
         
         if not transaction:
@@ -3679,7 +3679,7 @@ def get_batch_vital_signs_details(transaction_id):
             }), 503
 
         # Get the transaction
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.vital_collection('medical_data')
         transaction = medical_data_collection.find_one({'_id': ObjectId(transaction_id)})
         
         if not transaction:
@@ -3833,7 +3833,7 @@ def get_sleep_details(transaction_id):
             }), 503
 
         # Get the transaction
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.vital_collection('medical_data')
         transaction = medical_data_collection.find_one({'_id': ObjectId(transaction_id)})
         
         if not transaction:
@@ -3950,7 +3950,7 @@ def get_weekly_sleep_data(transaction_id):
             }), 503
 
         # Get the transaction to find the patient
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.vital_collection('medical_data')
         transaction = medical_data_collection.find_one({'_id': ObjectId(transaction_id)})
         
         if not transaction:
@@ -4093,7 +4093,7 @@ def get_vital_signs_details(transaction_id):
             }), 503
 
         # Get the transaction from medical_data collection
-        medical_data_collection = mqtt_monitor.db['medical_data']
+        medical_data_collection = mqtt_monitor.vital_collection('medical_data')
         transaction = medical_data_collection.find_one({'_id': ObjectId(transaction_id)})
         
         if not transaction:
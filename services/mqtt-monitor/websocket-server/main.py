@@ -2,14 +2,23 @@
 """
 MQTT Monitor WebSocket Server
 Provides real-time MQTT message updates to web clients
+
+Messages received on the paho network thread are handed to the asyncio loop
+with ``call_soon_threadsafe`` and fanned out by a dispatcher task. Every
+client has its own bounded queue and sender task, so a slow browser only
+drops its own oldest messages instead of delaying everyone else. Clients can
+subscribe to a subset of messages (device type, topic, patient) and opt in
+to receiving bursts as a single ``batch`` frame.
 """
 
 import os
 import json
 import logging
 import asyncio
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, Set
+from typing import Dict, Any, Set, List, Optional
+from urllib.parse import urlparse, parse_qs
 import sys
 import aiohttp
 
@@ -27,6 +36,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class ClientSession:
+    """A connected WebSocket client with its subscription filter and send queue"""
+    
+    def __init__(self, websocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.device_types: Set[str] = set()
+        self.topics: List[str] = []
+        self.patient_ids: Set[str] = set()
+        self.batching = False
+        self.dropped = 0
+        self.sender_task: Optional[asyncio.Task] = None
+    
+    def set_filters(self, device_types=None, topics=None, patients=None, batch=None):
+        """Replace the subscription filter; empty values mean 'everything'"""
+        self.device_types = {value.lower() for value in (device_types or [])}
+        self.topics = list(topics or [])
+        self.patient_ids = set(patients or [])
+        if batch is not None:
+            self.batching = bool(batch)
+    
+    def filters(self) -> Dict[str, Any]:
+        return {
+            "device_types": sorted(self.device_types),
+            "topics": self.topics,
+            "patients": sorted(self.patient_ids),
+            "batch": self.batching
+        }
+    
+    def wants(self, message: Dict[str, Any]) -> bool:
+        """Evaluate the subscription filter against a broadcast message"""
+        if message.get("type") != "mqtt_message":
+            return True
+        data = message.get("data") or {}
+        if self.device_types and str(data.get("device_type", "")).lower() not in self.device_types:
+            return False
+        if self.topics:
+            topic = data.get("topic", "")
+            if not any(topic == pattern or (pattern.endswith("#") and topic.startswith(pattern[:-1]))
+                       for pattern in self.topics):
+                return False
+        if self.patient_ids:
+            mapping = data.get("patient_mapping") or {}
+            if mapping.get("patient_id") not in self.patient_ids:
+                return False
+        return True
+    
+    def offer(self, message_json: str):
+        """Queue a serialized message, dropping the oldest one when full"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message_json)
+
 class MQTTWebSocketServer:
     """WebSocket server for real-time MQTT monitoring"""
     
@@ -61,18 +127,24 @@ class MQTTWebSocketServer:
         self.mqtt_connected = False
         
         # WebSocket clients
-        self.websocket_clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.clients: Dict[Any, ClientSession] = {}
+        self.client_queue_size = int(os.getenv('WS_CLIENT_QUEUE_SIZE', 500))
+        self.max_batch_size = int(os.getenv('WS_MAX_BATCH_SIZE', 100))
+        self.send_timeout = float(os.getenv('WS_SEND_TIMEOUT', 10))
         
         # Message history (last 1000 messages)
-        self.message_history: list = []
         self.max_history = 1000
+        self.message_history: deque = deque(maxlen=self.max_history)
         
-        # Pending messages for async broadcast
-        self.pending_messages: list = []
+        # Thread -> loop bridge for broadcasts (created in run())
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.broadcast_queue: Optional[asyncio.Queue] = None
+        self.broadcast_queue_size = int(os.getenv('WS_BROADCAST_QUEUE_SIZE', 10000))
+        self.dropped_broadcasts = 0
         
         # Data flow events history
-        self.data_flow_history: list = []
         self.max_data_flow_history = 100
+        self.data_flow_history: deque = deque(maxlen=self.max_data_flow_history)
         
     def connect_mqtt(self) -> mqtt_client.Client:
         """Connect to MQTT broker"""
@@ -113,19 +185,14 @@ class MQTTWebSocketServer:
                         "status": "unknown_topic"
                     }
                 
-                # Add to history
-                self.message_history.append(processed_message)
-                if len(self.message_history) > self.max_history:
-                    self.message_history.pop(0)
-                
-                # Broadcast to WebSocket clients (will be handled in async context)
-                # Store message for async broadcast with proper type
+                # Hand over to the asyncio loop; history and broadcast are loop-owned
                 broadcast_message = {
                     "type": "mqtt_message",
                     "data": processed_message,
                     "timestamp": datetime.utcnow()
                 }
-                self.pending_messages.append(broadcast_message)
+                if self.loop is not None:
+                    self.loop.call_soon_threadsafe(self._on_mqtt_message, broadcast_message)
                 
             except Exception as e:
                 logger.error(f"Error processing MQTT message: {e}")
@@ -146,27 +213,74 @@ class MQTTWebSocketServer:
             logger.error(f"Failed to connect to MQTT broker: {e}")
             return None
     
+    def _on_mqtt_message(self, broadcast_message: Dict[str, Any]):
+        """Runs on the event loop: record history and queue the broadcast"""
+        self.message_history.append(broadcast_message["data"])
+        self._enqueue_broadcast(broadcast_message)
+    
+    def _enqueue_broadcast(self, message: Dict[str, Any]):
+        if self.broadcast_queue is None:
+            return
+        if self.broadcast_queue.full():
+            try:
+                self.broadcast_queue.get_nowait()
+                self.dropped_broadcasts += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.broadcast_queue.put_nowait(message)
+    
     async def broadcast_message(self, message: Dict[str, Any]):
         """Broadcast message to all connected WebSocket clients"""
-        if not self.websocket_clients:
-            return
-        
-        message_json = json.dumps(message, default=str)
-        disconnected_clients = set()
-        
-        for client in self.websocket_clients:
+        self._enqueue_broadcast(message)
+    
+    async def dispatch_broadcasts(self):
+        """Fan queued messages out to the matching clients' send queues"""
+        while True:
             try:
-                await client.send(message_json)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected_clients.add(client)
+                messages = [await self.broadcast_queue.get()]
+                while len(messages) < self.max_batch_size and not self.broadcast_queue.empty():
+                    messages.append(self.broadcast_queue.get_nowait())
+                
+                if not self.clients:
+                    continue
+                
+                # Serialize each message once, whatever the number of clients
+                serialized = [(message, json.dumps(message, default=str)) for message in messages]
+                for session in list(self.clients.values()):
+                    for message, message_json in serialized:
+                        if session.wants(message):
+                            session.offer(message_json)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error sending message to WebSocket client: {e}")
-                disconnected_clients.add(client)
-        
-        # Remove disconnected clients
-        self.websocket_clients -= disconnected_clients
-        if disconnected_clients:
-            logger.info(f"Removed {len(disconnected_clients)} disconnected WebSocket clients")
+                logger.error(f"Error dispatching broadcasts: {e}")
+    
+    async def client_sender(self, session: ClientSession):
+        """Drain one client's queue, sending bursts as a single batch frame"""
+        websocket = session.websocket
+        try:
+            while True:
+                batch = [await session.queue.get()]
+                while session.batching and len(batch) < self.max_batch_size and not session.queue.empty():
+                    batch.append(session.queue.get_nowait())
+                
+                if len(batch) == 1:
+                    frame = batch[0]
+                else:
+                    frame = '{"type": "batch", "count": %d, "messages": [%s]}' % (len(batch), ", ".join(batch))
+                
+                await asyncio.wait_for(websocket.send(frame), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket client {websocket.remote_address} too slow, closing")
+            await websocket.close(code=1013, reason="Client too slow")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending message to WebSocket client: {e}")
+        finally:
+            self.clients.pop(websocket, None)
     
     async def handle_data_flow_event(self, flow_event: Dict[str, Any]):
         """Handle data flow event from web panel"""
@@ -175,8 +289,6 @@ class MQTTWebSocketServer:
             
             # Add to data flow history
             self.data_flow_history.append(flow_event)
-            if len(self.data_flow_history) > self.max_data_flow_history:
-                self.data_flow_history.pop(0)
             
             # Broadcast to WebSocket clients
             broadcast_message = {
@@ -189,22 +301,45 @@ class MQTTWebSocketServer:
         except Exception as e:
             logger.error(f"Error handling data flow event: {e}")
     
-    async def handle_websocket(self, websocket, path):
+    @staticmethod
+    def _filters_from_path(path: str) -> Dict[str, List[str]]:
+        """Read subscription filters from ?device_type=...&topic=...&patient=...&batch=true"""
+        params = parse_qs(urlparse(path or "").query)
+        def values(name):
+            return [value for item in params.get(name, []) for value in item.split(",") if value]
+        return {
+            "device_types": values("device_type"),
+            "topics": values("topic"),
+            "patients": values("patient"),
+            "batch": params.get("batch", ["false"])[0].lower() in ("1", "true", "yes")
+        }
+    
+    async def handle_websocket(self, websocket, path=None):
         """Handle WebSocket connection"""
         logger.info(f"New WebSocket connection from {websocket.remote_address}")
-        self.websocket_clients.add(websocket)
+        session = ClientSession(websocket, self.client_queue_size)
+        session.set_filters(**self._filters_from_path(path or getattr(websocket, "path", "")))
         
         try:
             # Send initial data
+            history = [
+                message for message in list(self.message_history)[-200:]
+                if session.wants({"type": "mqtt_message", "data": message})
+            ]
             initial_data = {
                 "type": "initial_data",
-                "message_history": self.message_history[-50:],  # Last 50 messages
-                "data_flow_history": self.data_flow_history[-20:],  # Last 20 data flow events
+                "message_history": history[-50:],  # Last 50 messages
+                "data_flow_history": list(self.data_flow_history)[-20:],  # Last 20 data flow events
                 "statistics": self.mqtt_monitor.get_statistics(),
+                "filters": session.filters(),
                 "timestamp": datetime.utcnow()
             }
             await websocket.send(json.dumps(initial_data, default=str))
             
+            # Register for broadcasts only after the initial snapshot went out
+            self.clients[websocket] = session
+            session.sender_task = asyncio.create_task(self.client_sender(session))
+            
             # Keep connection alive and handle client messages
             async for message in websocket:
                 try:
@@ -218,9 +353,21 @@ class MQTTWebSocketServer:
                             "data": stats,
                             "timestamp": datetime.utcnow()
                         }, default=str))
+                    elif data.get('type') == 'subscribe':
+                        session.set_filters(
+                            device_types=data.get('device_types'),
+                            topics=data.get('topics'),
+                            patients=data.get('patients'),
+                            batch=data.get('batch')
+                        )
+                        await websocket.send(json.dumps({
+                            "type": "subscribed",
+                            "filters": session.filters(),
+                            "timestamp": datetime.utcnow()
+                        }, default=str))
                     elif data.get('type') == 'get_history':
                         limit = data.get('limit', 50)
-                        history = self.message_history[-limit:]
+                        history = list(self.message_history)[-limit:]
                         await websocket.send(json.dumps({
                             "type": "history",
                             "data": history,
@@ -240,12 +387,20 @@ class MQTTWebSocketServer:
         except Exception as e:
             logger.error(f"Error in WebSocket connection: {e}")
         finally:
-            self.websocket_clients.discard(websocket)
+            self.clients.pop(websocket, None)
+            if session.sender_task:
+                session.sender_task.cancel()
+            if session.dropped:
+                logger.info(f"Client {websocket.remote_address} dropped {session.dropped} messages (slow consumer)")
     
     async def run(self):
         """Run the WebSocket server"""
         logger.info(f"Starting MQTT WebSocket Server on {self.ws_host}:{self.ws_port}")
         
+        # The paho thread hands messages to this loop
+        self.loop = asyncio.get_running_loop()
+        self.broadcast_queue = asyncio.Queue(maxsize=self.broadcast_queue_size)
+        
         # Connect to MQTT broker
         self.mqtt_client = self.connect_mqtt()
         if not self.mqtt_client:
@@ -264,8 +419,8 @@ class MQTTWebSocketServer:
         try:
             await start_server
             
-            # Start background task to process pending messages
-            asyncio.create_task(self.process_pending_messages())
+            # Start background task to fan out broadcasts
+            asyncio.create_task(self.dispatch_broadcasts())
             
             await asyncio.Future()  # Run forever
         except KeyboardInterrupt:
@@ -279,24 +434,6 @@ class MQTTWebSocketServer:
             
             # Close database connections
             self.mqtt_monitor.close()
-    
-    async def process_pending_messages(self):
-        """Background task to process pending messages"""
-        while True:
-            try:
-                if self.pending_messages:
-                    # Get all pending messages
-                    messages = self.pending_messages.copy()
-                    self.pending_messages.clear()
-                    
-                    # Broadcast each message
-                    for message in messages:
-                        await self.broadcast_message(message)
-                
-                await asyncio.sleep(0.1)  # Check every 100ms
-            except Exception as e:
-                logger.error(f"Error processing pending messages: {e}")
-                await asyncio.sleep(1)  # Wait longer on error
 
 if __name__ == "__main__":
     server = MQTTWebSocketServer()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the MQTT listeners' FHIR payload validators
+
+Replays recorded payloads (JSON lines of {"device_type", "topic", "payload"})
+through services/mqtt-listeners/shared/fhir_validator.py and reports
+messages per second for each validator.
+
+Usage:
+    python tests/scripts/benchmark_fhir_validator.py
+    python tests/scripts/benchmark_fhir_validator.py --payloads recorded.jsonl --seconds 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(ROOT, 'services', 'mqtt-listeners', 'shared'))
+
+from fhir_validator import fhir_validator
+
+DEFAULT_PAYLOADS = os.path.join(ROOT, 'tests', 'fixtures', 'mqtt_payloads.jsonl')
+
+VALIDATORS = {
+    'Kati': fhir_validator.validate_kati_data_format,
+    'AVA4': fhir_validator.validate_ava4_data_format,
+    'Qube-Vital': fhir_validator.validate_qube_data_format
+}
+
+def load_payloads(path):
+    """Group recorded messages by device type"""
+    grouped = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                grouped[record['device_type']].append((record['topic'], record['payload']))
+    return grouped
+
+def run(validate, messages, seconds):
+    """Validate ``messages`` round-robin for ``seconds``; return (count, elapsed, invalid)"""
+    count = 0
+    invalid = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for topic, payload in messages:
+            if not validate(payload, topic)['valid']:
+                invalid += 1
+        count += len(messages)
+    return count, time.perf_counter() - started, invalid
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FHIR payload validators")
+    parser.add_argument('--payloads', default=DEFAULT_PAYLOADS, help="JSON lines file of recorded MQTT messages")
+    parser.add_argument('--seconds', type=float, default=2.0, help="Run time per validator")
+    args = parser.parse_args()
+
+    grouped = load_payloads(args.payloads)
+
+    print(f"{'validator':<12} {'payloads':>8} {'messages':>10} {'msg/s':>12} {'us/msg':>8} {'invalid':>8}")
+    for device_type, validate in VALIDATORS.items():
+        messages = grouped.get(device_type)
+        if not messages:
+            continue
+        count, elapsed, invalid = run(validate, messages, args.seconds)
+        print(f"{device_type:<12} {len(messages):>8} {count:>10} {count / elapsed:>12,.0f} {elapsed / count * 1e6:>8.2f} {invalid:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for MongoDB response serialization
+
+Compares the previous response path (recursive ``convert_objectids_to_strings``
+walk followed by ``json.dumps(cls=MongoJSONEncoder)``) with the single-pass
+``dumps_mongodb`` used by ``MongoJSONResponse``, over representative admin
+patient lists and FHIR Observation search bundles. Also checks that both
+paths produce the same JSON.
+
+Usage:
+    python tests/scripts/benchmark_json_serialization.py
+    python tests/scripts/benchmark_json_serialization.py --seconds 5 --patients 200 --observations 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from bson import ObjectId, Decimal128
+
+from app.utils.json_encoder import (
+    MongoJSONEncoder, convert_objectids_to_strings, dumps_mongodb, serialize_mongodb_response, orjson
+)
+
+def make_patient(index, now):
+    """Patient document shaped like the admin ``patients`` collection"""
+    return {
+        "_id": ObjectId(),
+        "first_name": f"สมชาย{index}",
+        "last_name": "ใจดี",
+        "nickname": "Chai",
+        "gender": "male",
+        "birth_date": now - timedelta(days=365 * 60 + index),
+        "id_card": f"1{index:012d}",
+        "phone": "0812345678",
+        "email": f"patient{index}@example.com",
+        "new_hospital_ids": [ObjectId(), ObjectId()],
+        "watch_mac_address": f"AA:BB:CC:DD:{index % 256:02X}:01",
+        "ava_mac_address": f"DC:DA:0C:5A:{index % 256:02X}:02",
+        "address": {
+            "province_code": 10,
+            "district_code": 1003,
+            "sub_district_code": 100301,
+            "detail": "99/1 ถนนพระราม 4"
+        },
+        "underlying_diseases": [{"code": "E11", "name": "Diabetes mellitus type 2"}],
+        "emergency_contacts": [{"name": "สมหญิง ใจดี", "phone": "0898765432", "relation": "spouse"}],
+        "weight": Decimal128("68.5"),
+        "registration_status": "active",
+        "is_active": True,
+        "is_deleted": False,
+        "created_at": now - timedelta(days=index),
+        "updated_at": now,
+        "__v": 3
+    }
+
+def make_observation(index, now, patient_id):
+    """FHIR R5 Observation as stored by ``FHIRR5Service``"""
+    effective = now - timedelta(minutes=index)
+    return {
+        "_id": ObjectId(),
+        "resourceType": "Observation",
+        "id": str(uuid.uuid4()),
+        "meta": {"versionId": "1", "lastUpdated": effective, "source": "AVA4"},
+        "status": "final",
+        "category": [{"coding": [{
+            "system": "http://terminology.hl7.org/CodeSystem/observation-category",
+            "code": "vital-signs",
+            "display": "Vital Signs"
+        }]}],
+        "code": {"coding": [{"system": "http://loinc.org", "code": "85354-9", "display": "Blood pressure panel"}]},
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": effective,
+        "component": [
+            {
+                "code": {"coding": [{"system": "http://loinc.org", "code": "8480-6", "display": "Systolic"}]},
+                "valueQuantity": {"value": 120 + index % 20, "unit": "mmHg", "system": "http://unitsofmeasure.org", "code": "mm[Hg]"}
+            },
+            {
+                "code": {"coding": [{"system": "http://loinc.org", "code": "8462-4", "display": "Diastolic"}]},
+                "valueQuantity": {"value": 80 + index % 10, "unit": "mmHg", "system": "http://unitsofmeasure.org", "code": "mm[Hg]"}
+            }
+        ],
+        "device": {"reference": f"Device/{ObjectId()}"},
+        "blockchain_hash": uuid.uuid4().hex + uuid.uuid4().hex,
+        "created_at": effective,
+        "updated_at": effective,
+        "is_deleted": False
+    }
+
+def make_payloads(patients, observations):
+    now = datetime.utcnow().replace(microsecond=123456)
+    patient_docs = [make_patient(i, now) for i in range(patients)]
+    patient_list = {
+        "success": True,
+        "message": "Patients retrieved successfully",
+        "data": {"patients": patient_docs, "total": len(patient_docs), "limit": patients, "skip": 0},
+        "request_id": str(uuid.uuid4()),
+        "timestamp": now.isoformat() + "Z"
+    }
+    subject = patient_docs[0]["_id"]
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": observations,
+        "timestamp": now,
+        "entry": [
+            {"fullUrl": f"Observation/{i}", "resource": make_observation(i, now, subject), "search": {"mode": "match"}}
+            for i in range(observations)
+        ]
+    }
+    return {"patient list": patient_list, "Observation bundle": bundle}
+
+def legacy_dumps(data):
+    """Previous path: recursive walk, then the MongoJSONEncoder render"""
+    return json.dumps(
+        convert_objectids_to_strings(data),
+        cls=MongoJSONEncoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+def run(func, data, seconds):
+    """Call ``func(data)`` repeatedly for ``seconds``; return (calls, elapsed)"""
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        func(data)
+        calls += 1
+    return calls, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MongoDB response serialization")
+    parser.add_argument('--seconds', type=float, default=2.0, help="Run time per case")
+    parser.add_argument('--patients', type=int, default=100, help="Patients per list response")
+    parser.add_argument('--observations', type=int, default=200, help="Observations per bundle")
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("⚠️ orjson is not installed: dumps_mongodb is using the stdlib fallback")
+
+    cases = [
+        ("render", legacy_dumps, dumps_mongodb),
+        ("serialize", convert_objectids_to_strings, serialize_mongodb_response)
+    ]
+
+    print(f"{'payload':<20} {'path':<10} {'KiB':>7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8}")
+    for name, data in make_payloads(args.patients, args.observations).items():
+        legacy_bytes = legacy_dumps(data)
+        if json.loads(legacy_bytes) != json.loads(dumps_mongodb(data)):
+            print(f"❌ {name}: dumps_mongodb output differs from the legacy encoder")
+            sys.exit(1)
+        for label, legacy, new in cases:
+            legacy_calls, legacy_elapsed = run(legacy, data, args.seconds)
+            new_calls, new_elapsed = run(new, data, args.seconds)
+            legacy_ms = legacy_elapsed / legacy_calls * 1000
+            new_ms = new_elapsed / new_calls * 1000
+            print(
+                f"{name:<20} {label:<10} {len(legacy_bytes) / 1024:>7.1f} "
+                f"{legacy_ms:>10.3f} {new_ms:>8.3f} {legacy_ms / new_ms:>7.1f}x"
+            )
+
+if __name__ == '__main__':
+    main()
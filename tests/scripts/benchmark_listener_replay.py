@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark for the MQTT listeners' hot path
+
+Replays recorded payloads (JSON lines of {"device_type", "topic", "payload"})
+through ``KatiMQTTListener.process_message``, ``AVA4MQTTListener.process_message``
+and ``RobustQubeMQTTListener.process_message`` with MongoDB and the HTTP
+services replaced by local stand-ins:
+
+* MongoDB: mongomock by default, or a real/embedded mongod via --mongodb-uri
+  (a throwaway database is seeded and dropped afterwards)
+* Web panel, event log and Stardust FHIR API: a stub HTTP server on
+  127.0.0.1 with configurable response latency
+
+Each listener is driven open-loop at every --rates value (arrivals are
+scheduled, latency is measured from the scheduled arrival so queueing shows
+up) and once closed-loop to find raw throughput. Reports per-stage latency
+percentiles and the maximum sustainable messages per second; with --baseline
+the run fails (exit 1) when throughput or p95 latency regress past --tolerance.
+
+Usage:
+    python tests/scripts/benchmark_listener_replay.py
+    python tests/scripts/benchmark_listener_replay.py --rates 50,100,200,400 --duration 5
+    python tests/scripts/benchmark_listener_replay.py --mongodb-uri mongodb://localhost:27017 --stub-latency-ms 5
+    python tests/scripts/benchmark_listener_replay.py --output report.json
+    python tests/scripts/benchmark_listener_replay.py --baseline report.json --tolerance 0.15
+
+Requires the listeners' runtime dependencies (paho-mqtt, pymongo, requests)
+plus mongomock unless --mongodb-uri is given.
+"""
+
+import argparse
+import functools
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LISTENERS_DIR = os.path.join(ROOT, 'services', 'mqtt-listeners')
+sys.path.insert(0, os.path.join(LISTENERS_DIR, 'shared'))
+
+DEFAULT_PAYLOADS = os.path.join(ROOT, 'tests', 'fixtures', 'mqtt_payloads.jsonl')
+
+LISTENERS = {
+    'Kati': ('kati-listener', 'KatiMQTTListener'),
+    'AVA4': ('ava4-listener', 'AVA4MQTTListener'),
+    'Qube-Vital': ('qube-listener', 'RobustQubeMQTTListener')
+}
+
+STAGES = ('parse', 'validate', 'patient_lookup', 'history_store', 'fhir_transform', 'fhir_store', 'web_panel', 'other', 'total')
+
+LOOKUP_METHODS = (
+    'find_patient_by_kati_imei', 'find_patient_by_ava4_mac', 'find_patient_by_device_mac',
+    'get_device_info', 'find_patient_by_citiz', 'create_unregistered_patient'
+)
+STORE_METHODS = ('store_medical_data', 'process_ava4_data', 'process_kati_data', 'process_qube_data')
+VALIDATE_METHODS = ('validate_kati_data_format', 'validate_ava4_data_format', 'validate_qube_data_format')
+
+# ---------------------------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------------------------
+
+class StageRecorder:
+    """Accumulate per-message stage durations; only the outermost timed call counts"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._local = threading.local()
+
+    def reset(self):
+        self.samples = defaultdict(list)
+
+    def begin(self):
+        self._local.current = defaultdict(float)
+        self._local.depth = 0
+
+    def end(self, total):
+        current = self._local.current
+        self._local.current = None
+        for stage, seconds in current.items():
+            self.samples[stage].append(seconds)
+        self.samples['other'].append(max(total - sum(current.values()), 0.0))
+        self.samples['total'].append(total)
+
+    def timed(self, stage, fn):
+        """Wrap ``fn`` so its run time is charged to ``stage`` (or to ``stage(args)`` if callable)"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = getattr(self._local, 'current', None)
+            if current is None or self._local.depth:
+                return fn(*args, **kwargs)
+            self._local.depth += 1
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.depth -= 1
+                name = stage(*args, **kwargs) if callable(stage) else stage
+                current[name] += time.perf_counter() - started
+        return wrapper
+
+class _TimedJson:
+    """Stand-in for a listener module's ``json`` that times ``loads`` as the parse stage"""
+
+    def __init__(self, recorder):
+        self.loads = recorder.timed('parse', json.loads)
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+def _http_stage(url=None, *args, **kwargs):
+    return 'fhir_store' if '/fhir/' in str(url) else 'web_panel'
+
+def instrument(listener, module, recorder):
+    """Patch a listener instance and its module so each stage is timed"""
+    module.json = _TimedJson(recorder)
+    validator = module.fhir_validator
+    for name in VALIDATE_METHODS:
+        setattr(validator, name, recorder.timed('validate', getattr(type(validator), name)))
+    for name in LOOKUP_METHODS:
+        if hasattr(listener.device_mapper, name):
+            setattr(listener.device_mapper, name, recorder.timed('patient_lookup', getattr(listener.device_mapper, name)))
+    for name in STORE_METHODS:
+        if hasattr(listener.data_processor, name):
+            setattr(listener.data_processor, name, recorder.timed('history_store', getattr(listener.data_processor, name)))
+    if hasattr(listener, '_transform_kati_to_fhir_observation'):
+        listener._transform_kati_to_fhir_observation = recorder.timed(
+            'fhir_transform', listener._transform_kati_to_fhir_observation
+        )
+
+# ---------------------------------------------------------------------------
+# Local stand-ins
+# ---------------------------------------------------------------------------
+
+class StubHTTPServer:
+    """Threaded HTTP server answering the web panel, event log and FHIR endpoints"""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self.requests = defaultdict(int)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, the body
+            # waits for the client's delayed ACK (~40 ms per request)
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests[self.path] += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, response = stub.respond(self.path, body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_PUT = do_POST
+
+            def do_GET(self):
+                self.do_POST()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def respond(path, body):
+        if path.endswith('/Observation/batch'):
+            try:
+                count = len(json.loads(body or b'[]'))
+            except ValueError:
+                count = 0
+            return 200, {'successful': count, 'failed': 0}
+        if '/fhir/' in path:
+            return 201, {'resourceType': 'Observation', 'id': 'benchmark'}
+        return 200, {'success': True}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def connect_mongo(uri):
+    """Return a MongoClient for ``uri`` or a shared mongomock client"""
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        client.admin.command('ping')
+        return client
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is not installed; pip install mongomock or pass --mongodb-uri")
+    return mongomock.MongoClient()
+
+def seed(db, messages_by_type):
+    """Register the devices found in the recorded payloads so lookups hit"""
+    from bson import ObjectId
+
+    def patient(**fields):
+        doc = {'_id': ObjectId(), 'first_name': 'Benchmark', 'last_name': 'Patient'}
+        doc.update(fields)
+        db.patients.insert_one(doc)
+        return doc['_id']
+
+    seen = set()
+    for device_type, messages in messages_by_type.items():
+        for topic, payload in messages:
+            if device_type == 'Kati':
+                imei = payload.get('IMEI')
+                if imei and imei not in seen:
+                    seen.add(imei)
+                    patient_id = patient(watch_mac_address=imei)
+                    db.watches.insert_one({'imei': imei, 'patient_id': str(patient_id)})
+            elif device_type == 'AVA4':
+                mac = payload.get('mac')
+                if mac and mac not in seen:
+                    seen.add(mac)
+                    patient_id = patient(ava_mac_address=mac)
+                    db.ava4_status.insert_one({'ava4_mac': mac, 'ava4_name': payload.get('deviceCode')})
+                for device in ((payload.get('data') or {}).get('value') or {}).get('device_list') or []:
+                    ble_addr = device.get('ble_addr')
+                    if ble_addr and ble_addr not in seen:
+                        seen.add(ble_addr)
+                        db.amy_devices.insert_one({
+                            'mac_address': ble_addr,
+                            'patient_id': patient_id,
+                            'device_type': (payload.get('data') or {}).get('attribute')
+                        })
+            elif device_type == 'Qube-Vital':
+                citiz = ((payload.get('data') or {}).get('value') or {}).get('citiz')
+                if citiz and citiz not in seen:
+                    seen.add(citiz)
+                    patient(id_card=citiz)
+
+# ---------------------------------------------------------------------------
+# Listener loading
+# ---------------------------------------------------------------------------
+
+def load_listener(device_type, mongo_client, database, recorder):
+    """Import a listener's main.py under a unique name and build an instrumented instance"""
+    directory, class_name = LISTENERS[device_type]
+    path = os.path.join(LISTENERS_DIR, directory, 'main.py')
+    spec = importlib.util.spec_from_file_location(f"{directory.replace('-', '_')}_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    import connections
+    connections.MongoClient = lambda *args, **kwargs: mongo_client
+    connections._mongo_clients.clear()
+
+    os.environ['MONGODB_DATABASE'] = database
+    listener = getattr(module, class_name)()
+    instrument(listener, module, recorder)
+    return listener, module
+
+def load_payloads(path, device_types):
+    """Group recorded messages by device type"""
+    grouped = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record['device_type'] in device_types:
+                    grouped[record['device_type']].append((record['topic'], record['payload']))
+    return grouped
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def summarize(samples):
+    """Per-stage p50/p95/p99/max in milliseconds"""
+    summary = {}
+    for stage in STAGES:
+        values = samples.get(stage)
+        if values:
+            summary[stage] = {
+                'count': len(values),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000
+            }
+    return summary
+
+def replay(listener, recorder, encoded, rate, duration):
+    """Drive ``process_message`` at ``rate`` msg/s (open loop) or as fast as possible (rate=None)"""
+    recorder.reset()
+    lags = []
+    sent = 0
+    started = time.perf_counter()
+    deadline = started + duration
+    interval = 1.0 / rate if rate else 0.0
+    while True:
+        scheduled = started + sent * interval
+        if scheduled >= deadline:
+            break
+        now = time.perf_counter()
+        if now < scheduled:
+            time.sleep(scheduled - now)
+        elif not rate and now >= deadline:
+            break
+        topic, payload = encoded[sent % len(encoded)]
+        recorder.begin()
+        begin = time.perf_counter()
+        listener.process_message(topic, payload)
+        finished = time.perf_counter()
+        recorder.end(finished - begin)
+        lags.append(finished - (scheduled if rate else begin))
+        sent += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'offered_per_s': rate,
+        'messages': sent,
+        'achieved_per_s': sent / elapsed if elapsed else 0.0,
+        'lag_p99_ms': percentile(lags, 99) * 1000,
+        'stages': summarize(recorder.samples)
+    }
+
+def benchmark(device_type, listener, recorder, messages, args):
+    encoded = [(topic, json.dumps(payload)) for topic, payload in messages]
+    for i in range(args.warmup):
+        topic, payload = encoded[i % len(encoded)]
+        listener.process_message(topic, payload)
+
+    runs = []
+    sustainable = 0.0
+    for rate in args.rates:
+        run = replay(listener, recorder, encoded, rate, args.duration)
+        run['sustainable'] = (
+            run['achieved_per_s'] >= rate * 0.98 and run['lag_p99_ms'] <= args.max_lag_ms
+        )
+        if run['sustainable']:
+            sustainable = max(sustainable, float(rate))
+        runs.append(run)
+    closed_loop = replay(listener, recorder, encoded, None, args.duration)
+    return {
+        'device_type': device_type,
+        'payloads': len(messages),
+        'max_sustainable_per_s': sustainable,
+        'closed_loop_per_s': closed_loop['achieved_per_s'],
+        'stages': closed_loop['stages'],
+        'runs': runs
+    }
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def print_report(result):
+    print(f"\n=== {result['device_type']} ({result['payloads']} payloads) ===")
+    print(f"{'offered/s':>10} {'achieved/s':>11} {'p99 lag ms':>11} {'sustainable':>12}")
+    for run in result['runs']:
+        print(f"{run['offered_per_s']:>10} {run['achieved_per_s']:>11,.1f} {run['lag_p99_ms']:>11.2f} {'yes' if run['sustainable'] else 'no':>12}")
+    print(f"max sustainable: {result['max_sustainable_per_s']:,.0f} msg/s, closed loop: {result['closed_loop_per_s']:,.1f} msg/s")
+    print(f"{'stage':<16} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, s in result['stages'].items():
+        print(f"{stage:<16} {s['count']:>8} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['p99_ms']:>9.3f} {s['max_ms']:>9.3f}")
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions against a previous --output report"""
+    regressions = []
+    previous = {r['device_type']: r for r in baseline.get('results', [])}
+    for result in results:
+        before = previous.get(result['device_type'])
+        if not before:
+            continue
+        if result['closed_loop_per_s'] < before['closed_loop_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{result['device_type']}: throughput {result['closed_loop_per_s']:,.1f} msg/s "
+                f"vs baseline {before['closed_loop_per_s']:,.1f}"
+            )
+        if result['max_sustainable_per_s'] < before['max_sustainable_per_s']:
+            regressions.append(
+                f"{result['device_type']}: max sustainable {result['max_sustainable_per_s']:,.0f} msg/s "
+                f"vs baseline {before['max_sustainable_per_s']:,.0f}"
+            )
+        for stage, s in result['stages'].items():
+            old = before.get('stages', {}).get(stage)
+            if old and old['p95_ms'] > 0 and s['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f"{result['device_type']}: {stage} p95 {s['p95_ms']:.3f} ms vs baseline {old['p95_ms']:.3f} ms"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded MQTT payloads through the listeners")
+    parser.add_argument('--payloads', default=DEFAULT_PAYLOADS, help="JSON lines file of recorded MQTT messages")
+    parser.add_argument('--device-types', default=','.join(LISTENERS), help="Comma-separated listeners to run")
+    parser.add_argument('--rates', default='50,100,200,400', help="Comma-separated offered rates (msg/s)")
+    parser.add_argument('--duration', type=float, default=3.0, help="Seconds per rate")
+    parser.add_argument('--warmup', type=int, default=50, help="Messages replayed before measuring")
+    parser.add_argument('--max-lag-ms', type=float, default=100.0, help="p99 lag above which a rate is unsustainable")
+    parser.add_argument('--mongodb-uri', help="Use this MongoDB instead of mongomock")
+    parser.add_argument('--database', default='AMY_listener_benchmark', help="Throwaway database to seed")
+    parser.add_argument('--keep-data', action='store_true', help="Do not drop the benchmark database afterwards")
+    parser.add_argument('--unmapped', action='store_true', help="Skip seeding so every lookup misses")
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help="Latency added by the stub HTTP server")
+    parser.add_argument('--log-level', default='CRITICAL', help="Listener log level")
+    parser.add_argument('--output', help="Write the report as JSON")
+    parser.add_argument('--baseline', help="Previous --output report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+    args.rates = [int(r) for r in args.rates.split(',') if r.strip()]
+
+    # Silence the listeners before their own basicConfig runs
+    logging.basicConfig(level=args.log_level.upper(), handlers=[logging.StreamHandler(open(os.devnull, 'w'))])
+
+    stub = StubHTTPServer(args.stub_latency_ms).start()
+    os.environ['WEB_PANEL_URL'] = stub.url
+    os.environ['STARDUST_API_URL'] = stub.url
+    os.environ['EVENT_LOG_API_URL'] = stub.url
+    os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017')
+
+    recorder = StageRecorder()
+    import connections
+    session = connections.http_session()
+    session.post = recorder.timed(_http_stage, session.post)
+    from data_flow_emitter import data_flow_emitter
+    data_flow_emitter.web_panel_url = stub.url
+
+    device_types = [d.strip() for d in args.device_types.split(',') if d.strip()]
+    grouped = load_payloads(args.payloads, device_types)
+    mongo_client = connect_mongo(args.mongodb_uri)
+    db = mongo_client[args.database]
+    if not args.unmapped:
+        seed(db, grouped)
+
+    results = []
+    try:
+        for device_type in device_types:
+            messages = grouped.get(device_type)
+            if not messages:
+                continue
+            listener, _ = load_listener(device_type, mongo_client, args.database, recorder)
+            result = benchmark(device_type, listener, recorder, messages, args)
+            print_report(result)
+            results.append(result)
+    finally:
+        if not args.keep_data:
+            mongo_client.drop_database(args.database)
+        stub.stop()
+
+    print(f"\nstub HTTP requests: {dict(stub.requests)}")
+    report = {'rates': args.rates, 'duration': args.duration, 'stub_latency_ms': args.stub_latency_ms, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nno regressions against baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+SOS latency test for the Kati listener's emergency fast lane
+
+Saturates ``KatiMQTTListener`` with a backlog of heartbeats, then sends
+SOS and fall-down messages and checks that each alarm lands in
+``emergency_alarm`` within the latency budget even though thousands of
+heartbeats are still queued ahead of it. Uses the same local stand-ins as
+benchmark_listener_replay.py: mongomock (or --mongodb-uri) and a stub HTTP
+server answering the web panel and FHIR API with --stub-latency-ms delay.
+
+Messages are delivered through a single FIFO thread standing in for paho's
+network thread. A control run with ``EMERGENCY_FAST_LANE_ENABLED=false``
+(where the listener processes inline on that thread) must miss the budget,
+showing the backlog is real and the fast lane is what meets it.
+
+Usage:
+    python tests/scripts/test_kati_sos_latency.py
+    python tests/scripts/test_kati_sos_latency.py --heartbeats 5000 --stub-latency-ms 20 --budget-ms 250
+
+Requires the listeners' runtime dependencies (paho-mqtt, pymongo, requests)
+plus mongomock unless --mongodb-uri is given.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_listener_replay import (
+    DEFAULT_PAYLOADS, StageRecorder, StubHTTPServer, connect_mongo, load_listener, load_payloads, percentile, seed
+)
+
+def wait_for_alarms(db, count, timeout):
+    """Poll ``emergency_alarm`` until it holds ``count`` documents; return the time it happened"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if db.emergency_alarm.count_documents({}) >= count:
+            return time.perf_counter()
+        time.sleep(0.001)
+    return None
+
+def run(heartbeats=2000, emergencies=10, stub_latency_ms=10.0, budget_ms=250.0, mongodb_uri=None,
+        database='AMY_sos_latency_test', payloads=DEFAULT_PAYLOADS, fast_lane=True):
+    """Send ``emergencies`` SOS / fall-down messages behind ``heartbeats`` queued heartbeats"""
+    os.environ['EMERGENCY_FAST_LANE_ENABLED'] = 'true' if fast_lane else 'false'
+    os.environ.pop('REDIS_URL', None)
+    stub = StubHTTPServer(stub_latency_ms).start()
+    os.environ['WEB_PANEL_URL'] = stub.url
+    os.environ['STARDUST_API_URL'] = stub.url
+    os.environ['EVENT_LOG_API_URL'] = stub.url
+    os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017')
+
+    from data_flow_emitter import data_flow_emitter
+    data_flow_emitter.web_panel_url = stub.url
+
+    messages = load_payloads(payloads, {'Kati'})
+    kati = messages['Kati']
+    heartbeat = next(json.dumps(p) for t, p in kati if t == 'iMEDE_watch/hb')
+    alarms = [(t, json.dumps(p)) for t, p in kati if t in ('iMEDE_watch/sos', 'iMEDE_watch/fallDown')]
+
+    mongo_client = connect_mongo(mongodb_uri)
+    db = mongo_client[database]
+    mongo_client.drop_database(database)
+    seed(db, messages)
+
+    from emergency_lane import MessageLane
+    cancelled = threading.Event()
+    network = None
+
+    try:
+        listener, _ = load_listener('Kati', mongo_client, database, StageRecorder())
+        listener.start_lanes()
+
+        # Stand-in for paho's network thread, which calls on_message in arrival order
+        def deliver(topic, payload):
+            if not cancelled.is_set():
+                listener.dispatch_message(topic, payload)
+        network = MessageLane('mqtt-network', deliver)
+        network.start()
+
+        for _ in range(heartbeats):
+            network.submit(('iMEDE_watch/hb', heartbeat))
+        time.sleep(0.2)  # let the routine lane get busy
+
+        # The control run only needs to show the budget is missed
+        timeout = max(budget_ms / 1000 * 20, 5) if fast_lane else budget_ms / 1000 * 4
+        latencies = []
+        backlog = []
+        for index in range(emergencies):
+            topic, payload = alarms[index % len(alarms)]
+            backlog.append(network.depth() + listener.routine_lane.depth())
+            sent = time.perf_counter()
+            network.submit((topic, payload))
+            stored = wait_for_alarms(db, index + 1, timeout=timeout)
+            latencies.append((stored - sent) * 1000 if stored else float('inf'))
+            if not stored and not fast_lane:
+                break
+
+        from emergency_lane import emergency_dispatcher
+        alarm = db.emergency_alarm.find_one({'alert_type': 'sos'})
+        return {
+            'fast_lane': fast_lane,
+            'heartbeats': heartbeats,
+            'emergencies': emergencies,
+            'routine_backlog_min': min(backlog),
+            'routine_processed': listener.routine_lane.processed if fast_lane else network.processed,
+            'routine_dropped': listener.routine_lane.dropped,
+            'stored_p50_ms': percentile(latencies, 50),
+            'stored_max_ms': max(latencies),
+            'metric': emergency_dispatcher.latency_snapshot(),
+            'alarm_patient_id': alarm.get('patient_id') if alarm else None,
+            'budget_ms': budget_ms
+        }
+    finally:
+        cancelled.set()
+        if network is not None:
+            network.stop()
+        mongo_client.drop_database(database)
+        stub.stop()
+
+def check(result):
+    """Assertions on a ``run`` result"""
+    assert result['routine_backlog_min'] > 0, "heartbeat backlog drained before the SOS was sent; raise --heartbeats"
+    assert result['stored_max_ms'] <= result['budget_ms'], (
+        f"emergency alarm stored after {result['stored_max_ms']:.1f} ms (budget {result['budget_ms']:.0f} ms)"
+    )
+    recorded = sum(h['count'] for h in result['metric'].values())
+    assert recorded == result['emergencies'], f"latency metric recorded {recorded} of {result['emergencies']} alarms"
+    assert max(h['max_ms'] for h in result['metric'].values()) <= result['budget_ms']
+    assert result['alarm_patient_id'] is not None, "SOS alarm was stored without the mapped patient"
+    assert result['routine_dropped'] == 0, f"{result['routine_dropped']} heartbeats dropped by the routine lane"
+
+def check_control(result):
+    """Assertions on a ``run(fast_lane=False)`` result: the same load misses the budget"""
+    assert result['routine_backlog_min'] > 0, "heartbeat backlog drained before the SOS was sent; raise --heartbeats"
+    assert result['stored_max_ms'] > result['budget_ms'], (
+        f"alarm stored in {result['stored_max_ms']:.1f} ms without the fast lane; the load does not exercise it"
+    )
+
+def test_sos_latency_under_heartbeat_load():
+    logging.basicConfig(level=logging.CRITICAL, handlers=[logging.StreamHandler(open(os.devnull, 'w'))])
+    check(run())
+
+def test_sos_waits_behind_heartbeats_without_fast_lane():
+    logging.basicConfig(level=logging.CRITICAL, handlers=[logging.StreamHandler(open(os.devnull, 'w'))])
+    check_control(run(emergencies=1, database='AMY_sos_latency_control', fast_lane=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="SOS latency under a saturated heartbeat load")
+    parser.add_argument('--heartbeats', type=int, default=2000, help="Heartbeats queued ahead of the alarms")
+    parser.add_argument('--emergencies', type=int, default=10, help="SOS / fall-down messages to send")
+    parser.add_argument('--stub-latency-ms', type=float, default=10.0, help="Latency added by the stub HTTP server")
+    parser.add_argument('--budget-ms', type=float, default=250.0, help="Maximum receipt -> alarm stored latency")
+    parser.add_argument('--payloads', default=DEFAULT_PAYLOADS, help="JSON lines file of recorded MQTT messages")
+    parser.add_argument('--mongodb-uri', help="Use this MongoDB instead of mongomock")
+    parser.add_argument('--log-level', default='CRITICAL', help="Listener log level")
+    args = parser.parse_args()
+
+    # Silence the listeners before their own basicConfig runs
+    logging.basicConfig(level=args.log_level.upper(), handlers=[logging.StreamHandler(open(os.devnull, 'w'))])
+
+    print("🚑 Kati SOS Latency Test")
+    print("=" * 60)
+    control = run(args.heartbeats, 1, args.stub_latency_ms, args.budget_ms, args.mongodb_uri,
+                  database='AMY_sos_latency_control', payloads=args.payloads, fast_lane=False)
+    stored = (f"stored after {control['stored_max_ms']:.1f} ms" if control['stored_max_ms'] != float('inf')
+              else f"not stored within {args.budget_ms * 4:.0f} ms")
+    print(f"control (fast lane off):  alarm {stored} (backlog {control['routine_backlog_min']:,})")
+    result = run(args.heartbeats, args.emergencies, args.stub_latency_ms, args.budget_ms,
+                 args.mongodb_uri, payloads=args.payloads)
+    print(f"heartbeats queued:        {result['heartbeats']:,} (backlog at alarm send >= {result['routine_backlog_min']:,})")
+    print(f"routine processed:        {result['routine_processed']:,} ({result['routine_dropped']:,} dropped)")
+    print(f"alarm stored p50 / max:   {result['stored_p50_ms']:.1f} / {result['stored_max_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for alert_type, histogram in result['metric'].items():
+        print(f"metric emergency_{alert_type}: count={histogram['count']} max={histogram['max_ms']:.1f} ms")
+    try:
+        check_control(control)
+        check(result)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print("✅ SOS latency within budget under heartbeat load (and over budget without the fast lane)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Startup time test for the API
+
+Imports ``main`` in fresh interpreters with lazy optional routers
+(``LAZY_ROUTERS=true``) and with every router mounted at import
+(``LAZY_ROUTERS=false``), reports the best wall time of each, and checks
+that the lazy import leaves the optional router modules unloaded and loads
+fewer modules than the eager one. Wall time is only asserted against an
+explicit ``--budget-ms``; on a shared machine it is too noisy to compare.
+
+Each probe writes its result to a temporary file, so log output from the
+app on stdout/stderr cannot interleave with it.
+
+Usage:
+    python tests/scripts/test_startup_time.py
+    python tests/scripts/test_startup_time.py --runs 7 --budget-ms 5000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OPTIONAL_MODULES = [
+    "app.routes.fhir_migration",
+    "app.routes.visualization",
+    "app.routes.reports",
+    "app.routes.fhir_validation",
+    "app.services.scheduler"
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed_ms = (time.perf_counter() - started) * 1000
+with open(sys.argv[1], "w") as handle:
+    json.dump({
+        "import_ms": elapsed_ms,
+        "routes": len(main.app.routes),
+        "modules": len(sys.modules),
+        "loaded": [name for name in %r if name in sys.modules]
+    }, handle)
+""" % (OPTIONAL_MODULES,)
+
+def import_main(lazy, optional_routers=None):
+    """Import ``main`` in a fresh interpreter; return the probe result"""
+    env = dict(os.environ, LAZY_ROUTERS="true" if lazy else "false")
+    if optional_routers is not None:
+        env["OPTIONAL_ROUTERS"] = optional_routers
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "probe.json")
+        result = subprocess.run([sys.executable, "-c", PROBE, output], cwd=ROOT, env=env, capture_output=True, text=True)
+        if result.returncode != 0 or not os.path.exists(output):
+            raise RuntimeError(f"import main failed:\n{result.stderr[-2000:]}")
+        with open(output) as handle:
+            return json.load(handle)
+
+def measure(runs):
+    """Best import time per mode over ``runs`` fresh interpreters, lazy and eager interleaved"""
+    samples = {True: [], False: []}
+    for _ in range(runs):
+        for lazy in (True, False):
+            samples[lazy].append(import_main(lazy))
+    return {
+        lazy: (min(r["import_ms"] for r in results), results[-1])
+        for lazy, results in samples.items()
+    }
+
+def test_lazy_import_skips_optional_routers():
+    """Lazy startup must not import any optional router group"""
+    result = import_main(lazy=True)
+    assert result["loaded"] == [], f"imported at startup: {result['loaded']}"
+
+def test_disabled_groups_are_not_mounted():
+    """Groups left out of OPTIONAL_ROUTERS are not mounted even without lazy loading"""
+    all_groups = import_main(lazy=False)
+    no_groups = import_main(lazy=False, optional_routers="")
+    assert no_groups["loaded"] == []
+    assert no_groups["routes"] < all_groups["routes"]
+
+def test_startup_time(runs=3, budget_ms=None):
+    """Lazy startup imports less than eager startup (and is within budget, if given)"""
+    results = measure(runs)
+    lazy_ms, lazy = results[True]
+    eager_ms, eager = results[False]
+    print(f"⏱️  import main (lazy routers):  {lazy_ms:8.0f} ms, {lazy['modules']} modules, {lazy['routes']} routes at startup")
+    print(f"⏱️  import main (eager routers): {eager_ms:8.0f} ms, {eager['modules']} modules, {eager['routes']} routes at startup")
+    print(f"   saved: {eager_ms - lazy_ms:.0f} ms ({(eager_ms - lazy_ms) / eager_ms * 100:.0f}%), "
+          f"{eager['modules'] - lazy['modules']} modules")
+    assert lazy["loaded"] == [] and eager["loaded"], "optional modules are loaded the same way in both modes"
+    assert lazy["modules"] < eager["modules"], "lazy startup imports as many modules as eager startup"
+    if budget_ms is not None:
+        assert lazy_ms <= budget_ms, f"lazy startup {lazy_ms:.0f} ms is over the {budget_ms:.0f} ms budget"
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API startup (import) time")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per mode")
+    parser.add_argument('--budget-ms', type=float, help="Fail when the lazy import takes longer")
+    args = parser.parse_args()
+
+    print("🚀 API Startup Time Test")
+    print("=" * 60)
+    test_lazy_import_skips_optional_routers()
+    print("✅ Optional router modules are not imported at startup")
+    test_disabled_groups_are_not_mounted()
+    print("✅ Disabled router groups are not mounted")
+    test_startup_time(runs=args.runs, budget_ms=args.budget_ms)
+    print("✅ Startup time check passed")
+
+if __name__ == "__main__":
+    main()